@@ -12,9 +12,18 @@ from functools import wraps
 import os
 import json
 import uuid
+import atexit
 from datetime import datetime, timedelta
 import logging
 
+from document_store import DocumentStore
+import download_service
+import expert_matching
+from submission_model import Submission
+from tutoring_ledger import TutoringLedger
+from report_engine.catalog import ReportCatalog
+from report_engine.jobs import ReportJobQueue, ReportJobError, report_artifact_path
+
 # 配置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -74,10 +83,56 @@ EXPERTS_DB = os.path.join(STORAGE_DIR, 'experts.json')
 EXPERT_EVALUATIONS_DB = os.path.join(STORAGE_DIR, 'expert_evaluations.json')
 SPECIAL_SUBMISSIONS_DB = os.path.join(STORAGE_DIR, 'special_submissions.json')
 
+# 文档存储：wal（默认，追加日志+定期压缩）| json（每次变更重写整表）
+_store = DocumentStore(engine=os.environ.get('DOC_STORE_ENGINE', 'wal'))
+atexit.register(_store.compact_all)
+
+# 各表的二级索引字段
+_TABLE_INDEXES = {
+    ENTERPRISES_DB: ('name', 'level'),
+    EXPERTS_DB: ('name', 'level'),
+    EXPERT_EVALUATIONS_DB: ('expert', 'enterprise'),
+    SPECIAL_SUBMISSIONS_DB: ('status',),
+}
+
+
+
+def _send_generated_report(job):
+    """报告任务完成后发送给收件人"""
+    if job.get('recipient'):
+        # 这里应该实现邮件发送逻辑
+        logger.info(f"发送报告 {os.path.basename(job['artifact'])} 到 {job['recipient']}")
+
+
+# 报告生成任务队列：请求只入队，渲染由后台进程池完成（应用启动时即开始调度）
+# 报告目录：生成时登记元数据，all_reports 查询目录；目录外写入的文件由定期对账补登
+REPORT_CATALOG_DB = os.path.join(STORAGE_DIR, 'report_catalog.sqlite3')
+REPORT_CATALOG_RECONCILE_SECONDS = float(os.environ.get('REPORT_CATALOG_RECONCILE_SECONDS', '300'))
+_report_catalog = ReportCatalog(REPORT_CATALOG_DB, REPORTS_DIR)
+# 对账在后台线程进行（启动时一次，之后按间隔）；REPORT_CATALOG_RECONCILE_SECONDS=0 时关闭，
+# 需在部署前执行 python -m report_engine.catalog reconcile
+if REPORT_CATALOG_RECONCILE_SECONDS > 0:
+    _report_catalog.start_reconciler(REPORT_CATALOG_RECONCILE_SECONDS)
+    atexit.register(_report_catalog.stop_reconciler)
+
+_report_jobs = ReportJobQueue(
+    os.path.join(STORAGE_DIR, 'report_jobs.sqlite3'), SUBMISSIONS_DIR, REPORTS_DIR,
+    workers=int(os.environ.get('REPORT_JOB_WORKERS', '2')),
+    on_complete=_send_generated_report, catalog=REPORT_CATALOG_DB
+)
+atexit.register(_report_jobs.stop)
+# 重启前未完成的任务（排队/待重试，以及执行进程中断遗留的 running）不必等到有新任务入队才继续；
+# REPORT_JOBS_AUTOSTART=0 时仍在首次入队时启动
+if os.environ.get('REPORT_JOBS_AUTOSTART', '1') != '0':
+    _report_jobs.ensure_started()
+
 # 确保存储目录存在
 for d in [STORAGE_DIR, UPLOAD_DIR, REPORTS_DIR, SUBMISSIONS_DIR, SPECIAL_SUBMISSIONS_DIR, TUTORING_LOGS_DIR]:
     os.makedirs(d, exist_ok=True)
 
+# 辅导台账索引（专家/企业 -> 辅导记录），由台账 POST 增量维护
+_tutoring_ledger = TutoringLedger(os.path.join(STORAGE_DIR, 'tutoring_ledger.jsonl'), TUTORING_LOGS_DIR)
+
 
 # ============================================================================
 # 工具函数
@@ -90,12 +145,15 @@ def _ensure_json_file(path, default_data=None):
             json.dump(default_data or {'items': []}, f, ensure_ascii=False, indent=2)
 
 
+def _table(path):
+    """获取 JSON 表（常驻内存并带索引，变更写入预写日志）"""
+    return _store.table(path, indexes=_TABLE_INDEXES.get(path, ()))
+
+
 def _read_json(path):
     """读取 JSON 文件"""
     try:
-        with open(path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        return data.get('items', []) if isinstance(data, dict) and 'items' in data else (data if isinstance(data, list) else [])
+        return _table(path).all()
     except Exception as e:
         logger.error(f"读取 JSON 文件失败: {path}, {e}")
         return []
@@ -104,8 +162,7 @@ def _read_json(path):
 def _write_json(path, items):
     """写入 JSON 文件"""
     try:
-        with open(path, 'w', encoding='utf-8') as f:
-            json.dump({'items': items}, f, ensure_ascii=False, indent=2)
+        _table(path).replace_all(items)
     except Exception as e:
         logger.error(f"写入 JSON 文件失败: {path}, {e}")
 
@@ -311,30 +368,28 @@ def enterprises_api():
 def save_enterprise():
     """保存企业信息"""
     data = request.get_json(force=True)
-    items = _read_json(ENTERPRISES_DB)
+    table = _table(ENTERPRISES_DB)
     now = datetime.now().strftime('%Y-%m-%d %H:%M')
     
     ent_id = data.get('id')
     if ent_id:
         # 更新
-        for it in items:
-            if it.get('id') == ent_id:
-                it.update({
-                    'name': data.get('name', ''),
-                    'region': data.get('region', ''),
-                    'industry': data.get('industry', ''),
-                    'level': data.get('level', 'beginner'),
-                    'contact': data.get('contact', ''),
-                    'email': data.get('email', ''),
-                    'phone': data.get('phone', ''),
-                    'updated_at': now
-                })
-                _write_json(ENTERPRISES_DB, items)
-                return jsonify({'success': True, 'id': ent_id})
+        updated = table.update(ent_id, {
+            'name': data.get('name', ''),
+            'region': data.get('region', ''),
+            'industry': data.get('industry', ''),
+            'level': data.get('level', 'beginner'),
+            'contact': data.get('contact', ''),
+            'email': data.get('email', ''),
+            'phone': data.get('phone', ''),
+            'updated_at': now
+        })
+        if updated:
+            return jsonify({'success': True, 'id': ent_id})
     else:
         # 新增
         new_id = uuid.uuid4().hex[:12]
-        items.append({
+        table.insert({
             'id': new_id,
             'name': data.get('name', ''),
             'region': data.get('region', ''),
@@ -346,7 +401,6 @@ def save_enterprise():
             'created_at': now,
             'updated_at': now
         })
-        _write_json(ENTERPRISES_DB, items)
         return jsonify({'success': True, 'id': new_id})
     
     return jsonify({'success': False, 'error': '保存失败'}), 400
@@ -356,9 +410,7 @@ def save_enterprise():
 @_role_required('chamber_of_commerce')
 def delete_enterprise(ent_id):
     """删除企业"""
-    items = _read_json(ENTERPRISES_DB)
-    items = [x for x in items if x.get('id') != ent_id]
-    _write_json(ENTERPRISES_DB, items)
+    _table(ENTERPRISES_DB).delete(ent_id)
     return jsonify({'success': True})
 
 
@@ -395,13 +447,12 @@ def approve_upgrade():
     username = data.get('username')
     new_level = data.get('new_level')
     
-    items = _read_json(ENTERPRISES_DB)
-    for it in items:
-        if it.get('id') == username:
-            it['level'] = new_level
-            it['updated_at'] = datetime.now().strftime('%Y-%m-%d %H:%M')
-            _write_json(ENTERPRISES_DB, items)
-            return jsonify({'success': True})
+    updated = _table(ENTERPRISES_DB).update(username, {
+        'level': new_level,
+        'updated_at': datetime.now().strftime('%Y-%m-%d %H:%M')
+    })
+    if updated:
+        return jsonify({'success': True})
     
     return jsonify({'success': False, 'error': '企业不存在'}), 404
 
@@ -414,35 +465,129 @@ def upgrade_enterprise():
     enterprise = data.get('enterprise')
     to_level = data.get('to_level')
     
-    items = _read_json(ENTERPRISES_DB)
-    for it in items:
-        if it.get('name') == enterprise:
-            it['level'] = to_level
-            it['updated_at'] = datetime.now().strftime('%Y-%m-%d %H:%M')
-            _write_json(ENTERPRISES_DB, items)
-            return jsonify({'success': True})
+    table = _table(ENTERPRISES_DB)
+    it = table.find_one('name', enterprise)
+    if it:
+        table.update(it['id'], {
+            'level': to_level,
+            'updated_at': datetime.now().strftime('%Y-%m-%d %H:%M')
+        })
+        return jsonify({'success': True})
     
     return jsonify({'success': False, 'error': '企业不存在'}), 404
 
 
 # 专家匹配 API
+_score_calculator = {'instance': None}
+
+
+def _get_score_calculator():
+    """评分计算器（加载指标体系较慢，进程内复用；不可用时返回 None）"""
+    if _score_calculator['instance'] is None:
+        try:
+            from score_calculator import ScoreCalculator
+            _score_calculator['instance'] = ScoreCalculator()
+        except Exception as e:
+            logger.warning(f"评分计算器不可用: {e}")
+    return _score_calculator['instance']
+
+
+def _latest_submission_paths(names=None):
+    """各企业最近一次在线提交的JSON路径 {企业名称: 路径}（文件名 submission_<企业名称>_<日期>_<时间>.json）"""
+    latest = {}
+    try:
+        filenames = os.listdir(SUBMISSIONS_DIR)
+    except OSError:
+        return latest
+    for fn in filenames:
+        if not (fn.startswith('submission_') and fn.endswith('.json')):
+            continue
+        parts = fn[len('submission_'):-len('.json')].rsplit('_', 2)
+        if len(parts) != 3 or (names is not None and parts[0] not in names):
+            continue
+        stamp = parts[1] + parts[2]
+        if parts[0] not in latest or stamp > latest[parts[0]][0]:
+            latest[parts[0]] = (stamp, os.path.join(SUBMISSIONS_DIR, fn))
+    return {name: path for name, (_, path) in latest.items()}
+
+
+def _enterprise_profiles(enterprises):
+    """企业画像（地区、行业、级别，及最近一次提交的得分率）"""
+    names = {it.get('name') for it in enterprises}
+    scores = expert_matching.submission_scores(_latest_submission_paths(names), _get_score_calculator())
+    profiles = []
+    for it in enterprises:
+        score = scores.get(it.get('name'), {})
+        profiles.append({
+            'name': it.get('name', ''),
+            'region': it.get('region', ''),
+            'province': it.get('province', ''),
+            'industry': it.get('industry', ''),
+            'level': it.get('level', ''),
+            'score_pct': score.get('score_pct'),
+            'level1_scores': score.get('level1_scores', {}),
+        })
+    return profiles
+
+
+def _match_summary(profile, experts):
+    pct = profile['score_pct']
+    return {
+        'enterprise': profile['name'],
+        'recommend_group': '、'.join(e['name'] for e in experts),
+        'priority': '高' if pct is not None and pct < 60 else '中',
+        'region': profile['region'],
+        'industry': profile['industry'],
+        'last_score_pct': round(pct, 1) if pct is not None else None,
+        'weakest_dimensions': [dim for dim, _ in expert_matching.weakest_dimensions(profile['level1_scores'])],
+        'experts': experts,
+    }
+
+
 @app.route('/api/portal/chamber/expert-match', methods=['GET'])
 @_role_required('chamber_of_commerce')
 def expert_match():
-    """获取专家匹配方案"""
+    """获取专家匹配方案（按企业短板维度、地区、行业、级别取亲和度最高的专家）"""
     enterprise = request.args.get('enterprise', '').strip()
     if not enterprise:
         return jsonify({'success': False, 'error': '缺少enterprise参数'}), 400
-    
+    try:
+        k = max(1, min(int(request.args.get('k', 3)), 50))
+    except ValueError:
+        return jsonify({'success': False, 'error': 'k参数无效'}), 400
+
+    it = _table(ENTERPRISES_DB).find_one('name', enterprise)
+    if not it:
+        return jsonify({'success': False, 'error': '企业不存在'}), 404
+    profile = _enterprise_profiles([it])[0]
+    index = expert_matching.get_index(_read_json(EXPERTS_DB))
+    return jsonify({'success': True, 'data': _match_summary(profile, index.top_k(profile, k))})
+
+
+@app.route('/api/portal/chamber/expert-match/bulk', methods=['POST'])
+@_role_required('chamber_of_commerce')
+def expert_match_bulk():
+    """批量分配专家：每家企业 k 位，每位专家至多辅导 capacity 家（不传 enterprises 时为全部企业）"""
+    data = request.get_json(force=True) or {}
+    try:
+        k = max(1, min(int(data.get('k', 3)), 50))
+        capacity = max(0, int(data.get('capacity', 5)))
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'error': '参数无效'}), 400
+
+    enterprises = _read_json(ENTERPRISES_DB)
+    wanted = data.get('enterprises')
+    if wanted:
+        wanted = set(wanted)
+        enterprises = [it for it in enterprises if it.get('name') in wanted]
+    profiles = _enterprise_profiles(enterprises)
+    index = expert_matching.get_index(_read_json(EXPERTS_DB))
+    assignments = index.assign(profiles, k=k, capacity=capacity)
+    items = [_match_summary(profile, experts) for profile, experts in zip(profiles, assignments)]
     return jsonify({
         'success': True,
-        'data': {
-            'recommend_group': '张三、李四、王五',
-            'priority': '高',
-            'region': '天津市',
-            'industry': '制造业',
-            'last_score_pct': 82.5
-        }
+        'items': items,
+        'unfilled': sum(1 for experts in assignments if len(experts) < k),
     })
 
 
@@ -479,9 +624,10 @@ def tutoring_ledger():
         if not enterprise:
             return jsonify({'success': False, 'error': '缺少enterprise参数'}), 400
         
-        ledger_file = os.path.join(TUTORING_LOGS_DIR, f'{enterprise}.json')
-        items = _read_json(ledger_file) if os.path.exists(ledger_file) else []
-        return jsonify({'success': True, 'items': items})
+        page = max(request.args.get('page', 1, type=int), 1)
+        limit = request.args.get('limit', type=int)
+        total, items = _tutoring_ledger.for_enterprise(enterprise, page, limit)
+        return jsonify({'success': True, 'items': items, 'total': total})
     
     elif request.method == 'POST':
         data = request.get_json(force=True)
@@ -490,16 +636,19 @@ def tutoring_ledger():
             return jsonify({'success': False, 'error': '缺少enterprise参数'}), 400
         
         ledger_file = os.path.join(TUTORING_LOGS_DIR, f'{enterprise}.json')
-        items = _read_json(ledger_file) if os.path.exists(ledger_file) else []
-        
-        items.append({
+        record = {
             'id': uuid.uuid4().hex[:12],
             'time': data.get('time') or datetime.now().strftime('%Y-%m-%d %H:%M'),
             'expert': data.get('expert', ''),
             'note': data.get('note', '')
-        })
+        }
+        _table(ledger_file).insert(record)
+        try:
+            _tutoring_ledger.append(enterprise, record['expert'], record['note'], record['time'], record['id'])
+        except Exception as e:
+            # 企业台账已写入；索引可用 python tutoring_ledger.py rebuild 重建
+            logger.error(f"辅导台账索引更新失败: {e}")
         
-        _write_json(ledger_file, items)
         return jsonify({'success': True})
 
 
@@ -507,39 +656,116 @@ def tutoring_ledger():
 @app.route('/api/portal/chamber/all-reports', methods=['GET'])
 @_role_required('chamber_of_commerce')
 def all_reports():
-    """获取所有报告"""
-    reports = []
-    if os.path.exists(REPORTS_DIR):
-        for fn in os.listdir(REPORTS_DIR):
-            fp = os.path.join(REPORTS_DIR, fn)
-            if os.path.isfile(fp):
-                reports.append({
-                    'filename': fn,
-                    'enterprise_name': fn.split('_')[1] if '_' in fn else '未知',
-                    'type': 'Word' if fn.endswith('.docx') else 'PDF',
-                    'file_size': os.path.getsize(fp),
-                    'created_time': os.path.getctime(fp)
-                })
-    return jsonify({'success': True, 'reports': reports})
+    """
+    获取报告列表（查询报告目录，含排队/生成中的报告任务）
+    筛选：enterprise、type（word/pdf/professional）、format（Word/PDF）、date_from/date_to（YYYY-MM-DD）、q（文件名）
+    排序：sort（created_at/size/enterprise/filename）、order（asc/desc）；分页：limit、cursor（上一页返回的 next_cursor）
+    """
+    args = request.args
+    try:
+        created_from = datetime.strptime(args['date_from'], '%Y-%m-%d').timestamp() if args.get('date_from') else None
+        created_to = ((datetime.strptime(args['date_to'], '%Y-%m-%d') + timedelta(days=1)).timestamp()
+                      if args.get('date_to') else None)
+        limit = max(1, min(args.get('limit', 100, type=int), 1000))
+        page = _report_catalog.query(
+            enterprise=args.get('enterprise') or None, report_type=args.get('type') or None,
+            fmt=args.get('format') or None, created_from=created_from, created_to=created_to,
+            q=args.get('q') or None, sort=args.get('sort', 'created_at'), order=args.get('order', 'desc'),
+            limit=limit, cursor=args.get('cursor') or None
+        )
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    reports = [{
+        'filename': r['filename'],
+        'enterprise_name': r['enterprise'],
+        'type': r['format'],
+        'report_type': r['report_type'],
+        'submission': r['submission'],
+        'file_size': r['size'],
+        'checksum': r['checksum'],
+        'created_time': r['created_at'],
+    } for r in page['items']]
+    pending_jobs = _report_jobs.list_jobs(['queued', 'running'])
+    return jsonify({'success': True, 'reports': reports, 'next_cursor': page['next_cursor'],
+                    'pending_jobs': pending_jobs})
 
 
 @app.route('/api/portal/chamber/send-report', methods=['POST'])
 @_role_required('chamber_of_commerce')
 def send_report():
-    """发送报告（邮件）"""
+    """
+    发送报告（邮件）
+    传 report_filename 时直接发送已有报告；传 submission 时入队生成任务，
+    报告生成完成后再发送，接口立即返回任务信息（202）
+    """
     data = request.get_json(force=True)
     recipient = data.get('recipient')
     report_filename = data.get('report_filename')
+    submission = data.get('submission')
     
-    if not recipient or not report_filename:
+    if not recipient or not (report_filename or submission):
         return jsonify({'success': False, 'error': '缺少参数'}), 400
     
+    if submission:
+        try:
+            job = _report_jobs.enqueue(submission, data.get('format', 'professional'), recipient=recipient)
+        except ReportJobError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        _report_jobs.ensure_started()
+        return jsonify({'success': True, 'message': '报告生成中，完成后自动发送', 'job': job}), 202
+    
     # 这里应该实现邮件发送逻辑
     logger.info(f"发送报告 {report_filename} 到 {recipient}")
     
     return jsonify({'success': True, 'message': '邮件已发送'})
 
 
+# 报告生成任务 API
+@app.route('/api/portal/chamber/report-jobs', methods=['GET', 'POST'])
+@_role_required('chamber_of_commerce')
+def report_jobs():
+    """报告生成任务：POST 入队，GET 列出（?status=queued,running）"""
+    if request.method == 'POST':
+        data = request.get_json(force=True)
+        try:
+            job = _report_jobs.enqueue(data.get('submission', ''), data.get('format', 'professional'),
+                                       recipient=data.get('recipient'))
+        except ReportJobError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        _report_jobs.ensure_started()
+        return jsonify({'success': True, 'job': job}), 202
+    
+    statuses = [s for s in request.args.get('status', '').split(',') if s]
+    try:
+        limit = min(int(request.args.get('limit', 100)), 500)
+    except ValueError:
+        limit = 100
+    return jsonify({'success': True, 'jobs': _report_jobs.list_jobs(statuses, limit=limit)})
+
+
+@app.route('/api/portal/chamber/report-jobs/<job_id>', methods=['GET'])
+@_role_required('chamber_of_commerce')
+def report_job_status(job_id):
+    """查询报告生成任务状态"""
+    job = _report_jobs.get(job_id)
+    if not job:
+        return jsonify({'success': False, 'error': '任务不存在'}), 404
+    return jsonify({'success': True, 'job': job})
+
+
+@app.route('/api/portal/chamber/report-jobs/<job_id>/artifact', methods=['GET'])
+@_role_required('chamber_of_commerce')
+def report_job_artifact(job_id):
+    """下载报告生成任务的结果"""
+    job = _report_jobs.get(job_id)
+    if not job:
+        return jsonify({'success': False, 'error': '任务不存在'}), 404
+    artifact = report_artifact_path(job)
+    if not artifact:
+        return jsonify({'success': False, 'error': '报告尚未生成', 'status': job['status']}), 409
+    return send_file(os.path.abspath(artifact), as_attachment=True, download_name=os.path.basename(artifact))
+
+
 # 工商联用户管理 API
 @app.route('/api/portal/chamber/users', methods=['GET'])
 @_role_required('chamber_of_commerce')
@@ -600,32 +826,30 @@ def experts_api():
     
     elif request.method == 'POST':
         data = request.get_json(force=True)
-        items = _read_json(EXPERTS_DB)
+        table = _table(EXPERTS_DB)
         now = datetime.now().strftime('%Y-%m-%d %H:%M')
         
         exp_id = data.get('id')
         if exp_id:
             # 更新
-            for it in items:
-                if it.get('id') == exp_id:
-                    it.update({
-                        'name': data.get('name', ''),
-                        'region': data.get('region', ''),
-                        'province': data.get('province', ''),
-                        'industry': data.get('industry', ''),
-                        'level': data.get('level', 'county'),
-                        'phone': data.get('phone', ''),
-                        'email': data.get('email', ''),
-                        'org': data.get('org', ''),
-                        'skills': data.get('skills', ''),
-                        'updated_at': now
-                    })
-                    _write_json(EXPERTS_DB, items)
-                    return jsonify({'success': True, 'id': exp_id})
+            updated = table.update(exp_id, {
+                'name': data.get('name', ''),
+                'region': data.get('region', ''),
+                'province': data.get('province', ''),
+                'industry': data.get('industry', ''),
+                'level': data.get('level', 'county'),
+                'phone': data.get('phone', ''),
+                'email': data.get('email', ''),
+                'org': data.get('org', ''),
+                'skills': data.get('skills', ''),
+                'updated_at': now
+            })
+            if updated:
+                return jsonify({'success': True, 'id': exp_id})
         else:
             # 新增
             new_id = uuid.uuid4().hex[:12]
-            items.append({
+            table.insert({
                 'id': new_id,
                 'name': data.get('name', ''),
                 'region': data.get('region', ''),
@@ -639,7 +863,6 @@ def experts_api():
                 'created_at': now,
                 'updated_at': now
             })
-            _write_json(EXPERTS_DB, items)
             return jsonify({'success': True, 'id': new_id})
         
         return jsonify({'success': False, 'error': '保存失败'}), 400
@@ -649,9 +872,7 @@ def experts_api():
 @_role_required('chamber_of_commerce')
 def delete_expert(exp_id):
     """删除专家"""
-    items = _read_json(EXPERTS_DB)
-    items = [x for x in items if x.get('id') != exp_id]
-    _write_json(EXPERTS_DB, items)
+    _table(EXPERTS_DB).delete(exp_id)
     return jsonify({'success': True})
 
 
@@ -675,8 +896,7 @@ def expert_rate():
         if not expert:
             return jsonify({'success': False, 'error': '缺少expert参数'}), 400
         
-        items = _read_json(EXPERTS_DB)
-        it = next((x for x in items if x.get('name') == expert), None)
+        it = _table(EXPERTS_DB).find_one('name', expert)
         if not it:
             return jsonify({'success': False, 'error': '专家不存在'}), 404
         
@@ -692,13 +912,11 @@ def expert_rate():
         if not expert or not to_level:
             return jsonify({'success': False, 'error': '缺少参数'}), 400
         
-        items = _read_json(EXPERTS_DB)
-        for it in items:
-            if it.get('name') == expert:
-                it['level'] = to_level
-                it['updated_at'] = datetime.now().strftime('%Y-%m-%d %H:%M')
+        table = _table(EXPERTS_DB)
+        now = datetime.now().strftime('%Y-%m-%d %H:%M')
+        for it in table.find('name', expert):
+            table.update(it['id'], {'level': to_level, 'updated_at': now})
         
-        _write_json(EXPERTS_DB, items)
         return jsonify({'success': True})
 
 
@@ -710,27 +928,11 @@ def expert_tutoring():
     if not expert:
         return jsonify({'success': False, 'error': '缺少expert参数'}), 400
     
-    rows = []
-    if os.path.exists(TUTORING_LOGS_DIR):
-        for fn in os.listdir(TUTORING_LOGS_DIR):
-            if not fn.endswith('.json'):
-                continue
-            enterprise = fn[:-5]
-            path = os.path.join(TUTORING_LOGS_DIR, fn)
-            try:
-                items = _read_json(path)
-                for r in items:
-                    if (r.get('expert') or '').strip() == expert:
-                        rows.append({
-                            'time': r.get('time'),
-                            'enterprise': enterprise,
-                            'content': r.get('note', '')
-                        })
-            except Exception:
-                continue
-    
-    rows.sort(key=lambda x: x['time'] or '', reverse=True)
-    return jsonify({'success': True, 'items': rows})
+    page = max(request.args.get('page', 1, type=int), 1)
+    limit = request.args.get('limit', type=int)
+    total, entries = _tutoring_ledger.for_expert(expert, page, limit)
+    rows = [{'time': r['time'], 'enterprise': r['enterprise'], 'content': r['note'] or ''} for r in entries]
+    return jsonify({'success': True, 'items': rows, 'total': total})
 
 
 @app.route('/api/portal/chamber/expert-evaluations', methods=['GET', 'POST'])
@@ -742,8 +944,7 @@ def expert_evaluations():
         if not expert:
             return jsonify({'success': False, 'error': '缺少expert参数'}), 400
         
-        items = _read_json(EXPERT_EVALUATIONS_DB)
-        items = [x for x in items if x.get('expert') == expert]
+        items = _table(EXPERT_EVALUATIONS_DB).find('expert', expert)
         items.sort(key=lambda x: x.get('time', ''), reverse=True)
         return jsonify({'success': True, 'items': items})
     
@@ -757,8 +958,7 @@ def expert_evaluations():
         if not expert or not enterprise:
             return jsonify({'success': False, 'error': '缺少参数'}), 400
         
-        items = _read_json(EXPERT_EVALUATIONS_DB)
-        items.append({
+        _table(EXPERT_EVALUATIONS_DB).insert({
             'id': uuid.uuid4().hex[:12],
             'expert': expert,
             'enterprise': enterprise,
@@ -767,7 +967,6 @@ def expert_evaluations():
             'time': data.get('time') or datetime.now().strftime('%Y-%m-%d %H:%M')
         })
         
-        _write_json(EXPERT_EVALUATIONS_DB, items)
         return jsonify({'success': True})
 
 
@@ -792,14 +991,13 @@ def special_review():
     action = data.get('action')  # approve|reject
     remark = data.get('remark', '')
     
-    items = _read_json(SPECIAL_SUBMISSIONS_DB)
-    for it in items:
-        if it.get('id') == spec_id:
-            it['status'] = 'approved' if action == 'approve' else 'rejected'
-            it['remark'] = remark
-            it['reviewed_at'] = datetime.now().strftime('%Y-%m-%d %H:%M')
-            _write_json(SPECIAL_SUBMISSIONS_DB, items)
-            return jsonify({'success': True})
+    updated = _table(SPECIAL_SUBMISSIONS_DB).update(spec_id, {
+        'status': 'approved' if action == 'approve' else 'rejected',
+        'remark': remark,
+        'reviewed_at': datetime.now().strftime('%Y-%m-%d %H:%M')
+    })
+    if updated:
+        return jsonify({'success': True})
     
     return jsonify({'success': False, 'error': '申请不存在'}), 404
 
@@ -808,9 +1006,9 @@ def special_review():
 @_role_required('chamber_of_commerce')
 def download_special_file(spec_id, filename):
     """下载专项附件"""
-    file_path = os.path.join(SPECIAL_SUBMISSIONS_DIR, spec_id, filename)
-    if os.path.exists(file_path):
-        return send_file(file_path, as_attachment=True)
+    file_path = download_service.resolve(SPECIAL_SUBMISSIONS_DIR, spec_id, filename)
+    if file_path:
+        return download_service.send_download(file_path)
     return jsonify({'success': False, 'error': '文件不存在'}), 404
 
 
@@ -820,19 +1018,48 @@ def download_special_file(spec_id, filename):
 
 @app.route('/download/<filename>')
 def download_file(filename):
-    """下载报告"""
-    file_path = os.path.join(REPORTS_DIR, filename)
-    if os.path.exists(file_path):
-        return send_file(file_path, as_attachment=True)
+    """下载报告（ETag 取报告目录中的 checksum，支持条件请求与断点续传）"""
+    file_path = download_service.resolve(REPORTS_DIR, filename)
+    if file_path:
+        return download_service.send_download(file_path, catalog=_report_catalog)
     return jsonify({'success': False, 'error': '文件不存在'}), 404
 
 
+@app.route('/download/bundle/<enterprise>')
+@_role_required('chamber_of_commerce')
+def download_report_bundle(enterprise):
+    """企业全部报告打包下载（流式 ZIP；可用 type 参数只打包某类报告）"""
+    members, cursor = [], None
+    while True:
+        page = _report_catalog.query(enterprise=enterprise, report_type=request.args.get('type') or None,
+                                     sort='filename', order='asc', limit=500, cursor=cursor)
+        for r in page['items']:
+            file_path = download_service.resolve(REPORTS_DIR, r['filename'])
+            if file_path:
+                members.append((r['filename'], file_path, r['checksum']))
+        cursor = page['next_cursor']
+        if cursor is None:
+            break
+    if not members:
+        return jsonify({'success': False, 'error': '该企业暂无报告'}), 404
+    return download_service.send_bundle(members, f'{enterprise}_报告.zip')
+
+
 @app.route('/download/submission/<filename>')
 def download_submission(filename):
-    """下载问卷提交"""
-    file_path = os.path.join(SUBMISSIONS_DIR, filename)
-    if os.path.exists(file_path):
-        return send_file(file_path, as_attachment=True)
+    """下载问卷提交（问卷Excel在首次下载时由提交JSON按需导出）"""
+    file_path = download_service.resolve(SUBMISSIONS_DIR, filename)
+    if filename.startswith('问卷_') and filename.endswith('.xlsx'):
+        json_path = download_service.resolve(
+            SUBMISSIONS_DIR, filename.replace('问卷_', 'submission_', 1)[:-len('.xlsx')] + '.json')
+        if json_path:
+            try:
+                file_path = Submission.from_json_file(json_path).export_excel()
+            except Exception as e:
+                logger.error(f"导出问卷Excel失败: {filename}, {e}")
+                return jsonify({'success': False, 'error': '导出问卷失败'}), 500
+    if file_path:
+        return download_service.send_download(file_path)
     return jsonify({'success': False, 'error': '文件不存在'}), 404
 
 
@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+"""
+问卷附件内容寻址存储
+同一份营业执照、财务报表在不同提交、不同级别的问卷中反复上传，原先每次都另存一份。现在：
+- 上传时边写临时文件边计算 SHA-256，相同内容只在 <上传目录>/.blobs/<前两位>/<sha256> 保存一份
+  （写完后 os.replace 原子落盘；已存在则丢弃临时文件）
+- 引用计数按（提交, 问题, 内容）记录在 <上传目录>/.blobs/refs.sqlite3，同一问题重复上传同一文件只算一次
+- 提交目录 <上传目录>/<submission_id>/ 下的文件是 blob 的硬链接（不占额外空间，原有按目录列文件的
+  逻辑不变）；不支持硬链接的文件系统上不建链接，附件信息的 file_path 直接指向 blob
+- 删除/清理只删除引用，引用数归零且超过宽限期的 blob 才被回收（gc）
+"""
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+BLOB_DIR_NAME = '.blobs'
+
+# 读取上传流的块大小
+CHUNK_SIZE = 1 << 20
+
+# 新写入、尚未被引用的 blob 在此时长内不回收（避免与正在进行的上传竞争）
+GC_GRACE_SECONDS = 3600
+
+# 提交目录下链接文件名只保留安全字符
+_SAFE_NAME = re.compile(r'[^\w.-]')
+
+
+class AttachmentTooLarge(ValueError):
+    """上传内容超过大小限制"""
+
+
+class AttachmentStore:
+    """内容寻址的附件存储 + 引用计数"""
+
+    def __init__(self, upload_base_dir: str, max_size: Optional[int] = None):
+        self.upload_base_dir = upload_base_dir
+        self.blob_dir = os.path.join(upload_base_dir, BLOB_DIR_NAME)
+        self.db_path = os.path.join(self.blob_dir, 'refs.sqlite3')
+        self.max_size = max_size
+        self._local = threading.local()
+        os.makedirs(self.blob_dir, exist_ok=True)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS blobs ('
+                ' sha256 TEXT PRIMARY KEY,'
+                ' size INTEGER NOT NULL,'
+                ' created_at REAL NOT NULL)'
+            )
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS refs ('
+                ' id TEXT PRIMARY KEY,'
+                ' sha256 TEXT NOT NULL,'
+                ' submission_id TEXT NOT NULL,'
+                ' question_id TEXT NOT NULL,'
+                ' original_name TEXT NOT NULL,'
+                ' file_type TEXT NOT NULL,'
+                ' view_path TEXT NOT NULL,'
+                ' created_at REAL NOT NULL,'
+                ' UNIQUE (submission_id, question_id, sha256))'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_refs_sha256 ON refs (sha256)')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_refs_view ON refs (view_path)')
+            self._local.conn = conn
+        return conn
+
+    def blob_path(self, sha256: str) -> str:
+        return os.path.join(self.blob_dir, sha256[:2], sha256)
+
+    # ------------------------------------------------------------------
+    # 写入
+    # ------------------------------------------------------------------
+
+    def put_stream(self, stream) -> Tuple[str, int, bool]:
+        """
+        边写边算摘要，相同内容只保存一份
+
+        Returns:
+            (sha256, 字节数, 是否为新内容)
+        """
+        digest = hashlib.sha256()
+        size = 0
+        tmp_path = os.path.join(self.blob_dir, f'upload-{uuid.uuid4().hex}.tmp')
+        try:
+            with open(tmp_path, 'wb') as f:
+                for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+                    size += len(chunk)
+                    if self.max_size is not None and size > self.max_size:
+                        raise AttachmentTooLarge(f'文件过大，最大允许 {self.max_size / 1024 / 1024:.0f}MB')
+                    digest.update(chunk)
+                    f.write(chunk)
+            sha256 = digest.hexdigest()
+            final_path = self.blob_path(sha256)
+            conn = self._conn()
+            # 与 gc 互斥：已有的 blob 重新计时，保证在引用写入前不会被回收
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                conn.execute('INSERT INTO blobs (sha256, size, created_at) VALUES (?, ?, ?)'
+                             ' ON CONFLICT (sha256) DO UPDATE SET created_at = excluded.created_at',
+                             (sha256, size, time.time()))
+                created = not os.path.exists(final_path)
+                if created:
+                    os.makedirs(os.path.dirname(final_path), exist_ok=True)
+                    os.replace(tmp_path, final_path)
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+            return sha256, size, created
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _link_view(self, sha256: str, view_path: str) -> str:
+        """在提交目录下建立指向 blob 的硬链接；不支持硬链接时返回 blob 路径"""
+        os.makedirs(os.path.dirname(view_path), exist_ok=True)
+        try:
+            os.link(self.blob_path(sha256), view_path)
+            return view_path
+        except FileExistsError:
+            return view_path
+        except OSError as e:
+            logger.warning(f"无法创建硬链接，直接引用内容文件: {view_path}, {e}")
+            return self.blob_path(sha256)
+
+    def add_ref(self, sha256: str, submission_id: str, question_id: str, original_name: str,
+                file_type: str) -> Tuple[Dict, bool]:
+        """
+        为（提交, 问题）登记对内容的引用，同一问题重复上传同一内容时返回已有引用
+
+        Returns:
+            (引用记录, 是否新建)
+        """
+        conn = self._conn()
+        existing = conn.execute('SELECT * FROM refs WHERE submission_id = ? AND question_id = ? AND sha256 = ?',
+                                (submission_id, question_id, sha256)).fetchone()
+        if existing is not None:
+            return dict(existing), False
+        ref_id = str(uuid.uuid4())
+        view_name = _SAFE_NAME.sub('_', f'{question_id}_{sha256[:8]}.{file_type}')
+        view_path = self._link_view(sha256, os.path.join(self.upload_base_dir, submission_id, view_name))
+        conn.execute('INSERT OR IGNORE INTO refs (id, sha256, submission_id, question_id, original_name, file_type,'
+                     ' view_path, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                     (ref_id, sha256, submission_id, question_id, original_name, file_type, view_path, time.time()))
+        row = conn.execute('SELECT * FROM refs WHERE submission_id = ? AND question_id = ? AND sha256 = ?',
+                           (submission_id, question_id, sha256)).fetchone()
+        return dict(row), row['id'] == ref_id
+
+    # ------------------------------------------------------------------
+    # 引用与回收
+    # ------------------------------------------------------------------
+
+    def refcount(self, sha256: str) -> int:
+        return self._conn().execute('SELECT COUNT(*) FROM refs WHERE sha256 = ?', (sha256,)).fetchone()[0]
+
+    def find_ref(self, view_path: str) -> Optional[Dict]:
+        row = self._conn().execute('SELECT * FROM refs WHERE view_path = ?', (view_path,)).fetchone()
+        return dict(row) if row is not None else None
+
+    def refs_for_submission(self, submission_id: str) -> List[Dict]:
+        rows = self._conn().execute('SELECT * FROM refs WHERE submission_id = ? ORDER BY created_at',
+                                    (submission_id,)).fetchall()
+        return [dict(row) for row in rows]
+
+    def refs_older_than(self, cutoff: float) -> List[Dict]:
+        rows = self._conn().execute('SELECT * FROM refs WHERE created_at < ?', (cutoff,)).fetchall()
+        return [dict(row) for row in rows]
+
+    def remove_ref(self, ref: Dict) -> None:
+        """删除引用及其提交目录下的链接（blob 由 gc 回收）"""
+        self._conn().execute('DELETE FROM refs WHERE id = ?', (ref['id'],))
+        view_path = ref['view_path']
+        if view_path != self.blob_path(ref['sha256']) and os.path.exists(view_path):
+            os.remove(view_path)
+
+    def gc(self, grace_seconds: float = GC_GRACE_SECONDS) -> Dict[str, int]:
+        """回收没有引用、且超过宽限期的 blob"""
+        conn = self._conn()
+        unreferenced = ('SELECT b.sha256, b.size FROM blobs b WHERE b.created_at < ?'
+                        ' AND NOT EXISTS (SELECT 1 FROM refs r WHERE r.sha256 = b.sha256)')
+        cutoff = time.time() - grace_seconds
+        rows = conn.execute(unreferenced, (cutoff,)).fetchall()
+        removed = freed = 0
+        for row in rows:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                # 加锁后再确认一次，期间可能有新的上传或引用
+                if conn.execute(unreferenced + ' AND b.sha256 = ?', (cutoff, row['sha256'])).fetchone() is None:
+                    conn.execute('COMMIT')
+                    continue
+                conn.execute('DELETE FROM blobs WHERE sha256 = ?', (row['sha256'],))
+                path = self.blob_path(row['sha256'])
+                if os.path.exists(path):
+                    os.remove(path)
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+            removed += 1
+            freed += row['size']
+        return {'blobs_removed': removed, 'bytes_freed': freed}
+
+    def stats(self) -> Dict:
+        """去重效果：逻辑大小（按引用计）与实际占用（按内容计）"""
+        conn = self._conn()
+        logical, refs = conn.execute(
+            'SELECT COALESCE(SUM(b.size), 0), COUNT(*) FROM refs r JOIN blobs b ON b.sha256 = r.sha256').fetchone()
+        physical, blobs = conn.execute('SELECT COALESCE(SUM(size), 0), COUNT(*) FROM blobs').fetchone()
+        return {
+            'refs': refs,
+            'blobs': blobs,
+            'logical_bytes': logical,
+            'physical_bytes': physical,
+            'saved_bytes': max(logical - physical, 0),
+            'dedup_ratio': round(logical / physical, 2) if physical else 1.0,
+        }
@@ -0,0 +1,385 @@
+# -*- coding: utf-8 -*-
+"""
+异步批量审计日志
+用户管理的增删改不再在请求内逐条 INSERT + COMMIT 写日志，而是：
+- record() 把日志行放入进程内有界队列后立即返回
+- 后台线程按条数（batch_size）或时间（flush_interval 秒）阈值取出一批，
+  按表合并成一条多行 INSERT，在一个事务中写入 chamber_user_logs / audit_logs
+- 数据库不可用（写入失败）或队列已满时，日志行追加到本地溢出文件（JSON Lines，fsync），
+  之后写入成功时自动回放；回放只忽略重复主键（ON DUPLICATE KEY / ON CONFLICT），重复回放
+  不会产生重复记录，外键、截断等错误仍照常报错
+- 单行被数据库拒绝（外键、截断等）时把该组二分重试，只有出错的行写入拒收文件
+  （<溢出文件>.rejected，附错误信息，不再重试），同组其他行照常写入
+- metrics() 返回队列深度、写入/溢出/回放条数与批量写入耗时
+"""
+from __future__ import annotations
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+try:
+    from sqlalchemy.exc import DataError, IntegrityError
+    # 针对具体行的错误（外键、重复主键、截断等）：拆分重试；其余错误视为数据库不可用
+    ROW_ERRORS: Tuple[type, ...] = (IntegrityError, DataError)
+except ImportError:
+    ROW_ERRORS = ()
+
+logger = logging.getLogger(__name__)
+
+# 表 -> 列（created_at 为事件发生时间，由 record 时写入，不依赖入库时间）
+AUDIT_TABLES = {
+    'chamber_user_logs': ('id', 'operator_id', 'target_user_id', 'action', 'old_value', 'new_value',
+                          'created_at'),
+    'audit_logs': ('id', 'operator_id', 'action', 'target_type', 'target_id', 'old_value', 'new_value',
+                   'ip', 'ua', 'created_at'),
+}
+
+DEFAULT_SPILL_PATH = os.path.join('storage', 'audit_spill.jsonl')
+
+# writer(表名, 行列表, ignore_duplicates=False)
+Writer = Callable[..., None]
+
+
+def now_str() -> str:
+    return datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+
+def multi_row_insert(table: str, rows: List[Dict], on_duplicate: str = '') -> Tuple[str, Dict]:
+    """
+    构造多行 INSERT 语句与绑定参数
+
+    Args:
+        on_duplicate: 追加在语句末尾；回放溢出文件时传入只忽略重复主键的写法
+                      （MySQL: ON DUPLICATE KEY UPDATE id = id；SQLite: ON CONFLICT (id) DO NOTHING）
+    """
+    columns = AUDIT_TABLES[table]
+    values, params = [], {}
+    for i, row in enumerate(rows):
+        values.append('(' + ', '.join(f':{c}_{i}' for c in columns) + ')')
+        for c in columns:
+            params[f'{c}_{i}'] = row.get(c)
+    sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES {', '.join(values)}"
+    if on_duplicate:
+        sql = f'{sql} {on_duplicate}'
+    return sql, params
+
+
+def sqlalchemy_writer(engine) -> Writer:
+    """
+    基于 SQLAlchemy Engine 的批量写入函数（每批一个事务）
+    仅 ignore_duplicates=True（回放溢出文件）时忽略重复主键；不使用 INSERT IGNORE：MySQL 会把
+    外键、截断等错误降级为警告并静默跳过该行
+    """
+    from sqlalchemy import text
+    if engine.dialect.name == 'sqlite':
+        on_duplicate = 'ON CONFLICT (id) DO NOTHING'
+    else:
+        on_duplicate = 'ON DUPLICATE KEY UPDATE id = id'
+
+    def write(table: str, rows: List[Dict], ignore_duplicates: bool = False):
+        sql, params = multi_row_insert(table, rows, on_duplicate if ignore_duplicates else '')
+        with engine.begin() as conn:
+            conn.execute(text(sql), params)
+
+    return write
+
+
+class AuditLogger:
+    """审计日志后台批量写入器"""
+
+    def __init__(self, writer: Writer, batch_size: int = 200, flush_interval: float = 1.0,
+                 max_queue: int = 10000, spill_path: str = DEFAULT_SPILL_PATH):
+        """
+        Args:
+            writer: writer(表名, 行列表, ignore_duplicates=False)，失败时抛出异常
+                    （行被拒绝时抛出 ROW_ERRORS 中的异常）
+            batch_size: 每批最多写入的行数
+            flush_interval: 队列中最早一条日志的最长等待秒数
+            max_queue: 队列容量，满时直接写入溢出文件
+            spill_path: 溢出文件路径
+        """
+        self.writer = writer
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.spill_path = spill_path
+        self._queue: 'queue.Queue[Optional[Tuple[str, Dict]]]' = queue.Queue(maxsize=max_queue)
+        self._spill_lock = threading.Lock()
+        self._metrics_lock = threading.Lock()
+        self._idle = threading.Condition()
+        self._pending = 0
+        self._thread: Optional[threading.Thread] = None
+        self._started_lock = threading.Lock()
+        self._metrics = {
+            'enqueued': 0,
+            'written': 0,
+            'batches': 0,
+            'flush_failures': 0,
+            'spilled': 0,
+            'replayed': 0,
+            'rejected': 0,
+            'last_flush_ms': 0.0,
+            'max_flush_ms': 0.0,
+            'total_flush_ms': 0.0,
+        }
+
+    # ------------------------------------------------------------------
+    # 入队
+    # ------------------------------------------------------------------
+
+    def record(self, table: str, row: Dict):
+        """记录一条日志（非阻塞）"""
+        if table not in AUDIT_TABLES:
+            raise ValueError(f'未知的审计表: {table}')
+        row.setdefault('created_at', now_str())
+        self._ensure_started()
+        with self._idle:
+            self._pending += 1
+        try:
+            self._queue.put_nowait((table, row))
+            self._count('enqueued')
+        except queue.Full:
+            logger.warning("审计日志队列已满，写入溢出文件")
+            self._spill([(table, row)])
+            self._done(1)
+
+    def log_user_operation(self, operator_id, target_user_id, action, old_value=None, new_value=None,
+                           ip: Optional[str] = None, ua: Optional[str] = None, target_deleted: bool = False):
+        """
+        用户管理操作：同时记入 chamber_user_logs 与 audit_logs（target_type=chamber_user）
+
+        Args:
+            target_deleted: 目标用户已被删除。chamber_user_logs.target_user_id 外键引用 chamber_users，
+                            此时该列写 NULL（用户ID保留在 old_value 与 audit_logs.target_id 中）
+        """
+        old_json = json.dumps(old_value, ensure_ascii=False, default=str) if old_value else None
+        new_json = json.dumps(new_value, ensure_ascii=False, default=str) if new_value else None
+        created_at = now_str()
+        self.record('chamber_user_logs', {
+            'id': str(uuid.uuid4()), 'operator_id': operator_id,
+            'target_user_id': None if target_deleted else target_user_id,
+            'action': action, 'old_value': old_json, 'new_value': new_json, 'created_at': created_at,
+        })
+        self.record('audit_logs', {
+            'id': str(uuid.uuid4()), 'operator_id': operator_id, 'action': action,
+            'target_type': 'chamber_user', 'target_id': target_user_id,
+            'old_value': old_json, 'new_value': new_json,
+            'ip': ip, 'ua': (ua or '')[:255] or None, 'created_at': created_at,
+        })
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._started_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='audit-log', daemon=True)
+                self._thread.start()
+
+    # ------------------------------------------------------------------
+    # 后台写入
+    # ------------------------------------------------------------------
+
+    def _run(self):
+        self._replay_spill()
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            stop = False
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            try:
+                if self._write_batch(batch):
+                    self._replay_spill()
+            except Exception as e:
+                logger.error(f"审计日志后台写入出错: {e}")
+            finally:
+                self._done(len(batch))
+            if stop:
+                return
+
+    def _write_batch(self, batch: List[Tuple[str, Dict]]) -> bool:
+        """按表分组写入；失败的组写入溢出文件。全部成功返回 True"""
+        by_table: Dict[str, List[Dict]] = {}
+        for table, row in batch:
+            by_table.setdefault(table, []).append(row)
+        ok = True
+        for table, rows in by_table.items():
+            start = time.perf_counter()
+            written, unwritten, error = self._write_rows(table, rows)
+            if unwritten:
+                ok = False
+                logger.error(f"审计日志写入失败（{len(unwritten)} 条转入溢出文件）: {error}")
+                self._count('flush_failures')
+                self._spill([(table, row) for row in unwritten])
+            if not written:
+                continue
+            elapsed = (time.perf_counter() - start) * 1000
+            with self._metrics_lock:
+                m = self._metrics
+                m['written'] += written
+                m['batches'] += 1
+                m['last_flush_ms'] = elapsed
+                m['max_flush_ms'] = max(m['max_flush_ms'], elapsed)
+                m['total_flush_ms'] += elapsed
+        return ok
+
+    def _write_rows(self, table: str, rows: List[Dict],
+                    ignore_duplicates: bool = False) -> Tuple[int, List[Dict], Optional[Exception]]:
+        """
+        写入一组行；被数据库拒绝时二分重试，出错的单行转入拒收文件
+
+        Returns:
+            (已写入行数, 因数据库不可用而未写入的行, 错误)
+        """
+        written = 0
+        groups = [rows]
+        while groups:
+            group = groups.pop()
+            try:
+                self.writer(table, group, ignore_duplicates=ignore_duplicates)
+                written += len(group)
+            except ROW_ERRORS as e:
+                if len(group) == 1:
+                    self._reject(table, group[0], e)
+                else:
+                    mid = len(group) // 2
+                    groups.append(group[mid:])
+                    groups.append(group[:mid])
+            except Exception as e:
+                return written, group + [row for g in reversed(groups) for row in g], e
+        return written, [], None
+
+    # ------------------------------------------------------------------
+    # 溢出文件
+    # ------------------------------------------------------------------
+
+    def _spill(self, items: List[Tuple[str, Dict]], count: bool = True):
+        lines = ''.join(json.dumps({'table': t, 'row': r}, ensure_ascii=False, default=str) + '\n'
+                        for t, r in items)
+        with self._spill_lock:
+            os.makedirs(os.path.dirname(self.spill_path) or '.', exist_ok=True)
+            with open(self.spill_path, 'a', encoding='utf-8') as f:
+                f.write(lines)
+                f.flush()
+                os.fsync(f.fileno())
+        if count:
+            self._count('spilled', len(items))
+
+    def _reject(self, table: str, row: Dict, error: Exception):
+        """被数据库拒绝的行写入拒收文件（保留原始内容与错误，便于人工处理），不再重试"""
+        logger.error(f"审计日志被数据库拒绝（{table} {row.get('id')}），已写入拒收文件: {error}")
+        line = json.dumps({'table': table, 'row': row, 'error': str(error).splitlines()[0][:500],
+                           'rejected_at': now_str()}, ensure_ascii=False, default=str) + '\n'
+        with self._spill_lock:
+            os.makedirs(os.path.dirname(self.spill_path) or '.', exist_ok=True)
+            with open(self.spill_path + '.rejected', 'a', encoding='utf-8') as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+        self._count('rejected')
+
+    def _replay_spill(self):
+        """回放溢出文件（仅在后台线程中调用）"""
+        replay_path = self.spill_path + '.replay'
+        with self._spill_lock:
+            if not os.path.exists(replay_path):
+                if not os.path.exists(self.spill_path) or os.path.getsize(self.spill_path) == 0:
+                    return
+                os.replace(self.spill_path, replay_path)
+
+        items = []
+        with open(replay_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                    items.append((entry['table'], entry['row']))
+                except (ValueError, KeyError):
+                    continue  # 写入中途崩溃留下的残缺行
+        replayed = 0
+        failed = False
+        for i in range(0, len(items), self.batch_size):
+            batch = items[i:i + self.batch_size]
+            by_table: Dict[str, List[Dict]] = {}
+            for table, row in batch:
+                by_table.setdefault(table, []).append(row)
+            unwritten: List[Tuple[str, Dict]] = []
+            for table, rows in by_table.items():
+                if failed:
+                    unwritten.extend((table, row) for row in rows)
+                    continue
+                written, rest, error = self._write_rows(table, rows, ignore_duplicates=True)
+                replayed += written
+                if rest:
+                    failed = True
+                    logger.warning(f"审计日志溢出文件回放失败，稍后重试: {error}")
+                    unwritten.extend((table, row) for row in rest)
+            if failed:
+                # 未写入的部分放回溢出文件（已写入的行因忽略重复主键而不会重复）
+                self._spill(unwritten + items[i + self.batch_size:], count=False)
+                break
+        os.remove(replay_path)
+        if replayed:
+            logger.info(f"已回放 {replayed} 条溢出的审计日志")
+            self._count('replayed', replayed)
+
+    # ------------------------------------------------------------------
+    # 控制与指标
+    # ------------------------------------------------------------------
+
+    def _count(self, key, value=1):
+        with self._metrics_lock:
+            self._metrics[key] += value
+
+    def _done(self, n: int):
+        with self._idle:
+            self._pending -= n
+            if self._pending <= 0:
+                self._idle.notify_all()
+
+    def flush(self, timeout: float = 10.0) -> bool:
+        """等待已入队的日志全部写入（或转入溢出文件）"""
+        deadline = time.monotonic() + timeout
+        with self._idle:
+            while self._pending > 0:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._idle.wait(remaining)
+        return True
+
+    def close(self, timeout: float = 10.0):
+        """停止后台线程（先写完队列中的日志）"""
+        thread = self._thread
+        if thread is None or not thread.is_alive():
+            return
+        self._queue.put(None)
+        thread.join(timeout)
+
+    def metrics(self) -> Dict:
+        with self._metrics_lock:
+            m = dict(self._metrics)
+        total = m.pop('total_flush_ms')
+        m['avg_flush_ms'] = round(total / m['batches'], 3) if m['batches'] else 0.0
+        m['last_flush_ms'] = round(m['last_flush_ms'], 3)
+        m['max_flush_ms'] = round(m['max_flush_ms'], 3)
+        m['queue_depth'] = self._queue.qsize()
+        m['spill_pending'] = os.path.exists(self.spill_path) or os.path.exists(self.spill_path + '.replay')
+        return m
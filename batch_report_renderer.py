@@ -0,0 +1,269 @@
+# -*- coding: utf-8 -*-
+"""
+批量报告并行渲染器
+manage_submissions / send_professional_reports 的批量模式使用：
+- 基于 ProcessPoolExecutor 多进程并行生成 Word/PDF 报告（matplotlib 绘图与
+  python-docx/reportlab 排版均为 CPU 密集型，多线程无法加速）
+- 每个工作进程只预热一次：设置 Agg 后端、加载字体缓存、创建报告生成器
+  （生成器构造时加载 ScoreCalculator 指标体系），之后复用处理多份问卷
+- 每完成一项立即返回结果（成功/失败），调用方可实时打印进度
+- 任务状态写入可续跑的清单文件 storage/batch_jobs/<job_id>.json，
+  中断后再次运行会跳过已完成且报告文件仍存在的条目
+"""
+import importlib
+import json
+import os
+import sys
+import time
+import traceback
+import uuid
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+# 清单文件目录
+MANIFEST_DIR = os.path.join('storage', 'batch_jobs')
+
+# 报告格式 -> (模块, 生成器类, 输出文件名模板)
+REPORT_FORMATS = {
+    'word': ('enterprise_report_generator', 'EnterpriseReportGenerator', '自评报告_{base}.docx'),
+    'pdf': ('pdf_report_generator', 'PDFReportGenerator', '专业评价报告_{base}.pdf'),
+    'professional': ('professional_report_generator', 'ProfessionalReportGenerator', '专业报告_{base}.docx'),
+}
+
+
+def default_workers():
+    """默认并行进程数：环境变量 REPORT_WORKERS，否则为CPU核数"""
+    try:
+        return max(1, int(os.environ.get('REPORT_WORKERS', '')))
+    except ValueError:
+        return os.cpu_count() or 1
+
+
+def report_output_path(source_path, fmt, output_dir='reports'):
+    """根据问卷/提交文件名生成固定的报告路径，保证续跑时可识别已生成的报告"""
+    base = os.path.splitext(os.path.basename(source_path))[0]
+    for prefix in ('问卷_', 'submission_'):
+        if base.startswith(prefix):
+            base = base[len(prefix):]
+    return os.path.join(output_dir, REPORT_FORMATS[fmt][2].format(base=base))
+
+
+# ----------------------------------------------------------------------
+# 工作进程
+# ----------------------------------------------------------------------
+
+# 每个工作进程内的报告生成器（由 _init_worker 创建）
+_worker_generators = {}
+
+
+def _init_worker(formats, quiet=True):
+    """工作进程预热：绘图后端、字体、报告生成器（含指标体系）只加载一次"""
+    if quiet:
+        # 生成器内部输出较多，多进程同时打印会相互穿插，进度由主进程统一输出
+        sys.stdout = open(os.devnull, 'w', encoding='utf-8')
+
+    import matplotlib
+    matplotlib.use('Agg')
+    from matplotlib import font_manager
+    for family in matplotlib.rcParams.get('font.sans-serif', [])[:1]:
+        try:
+            font_manager.findfont(family, fallback_to_default=True)
+        except Exception:
+            pass
+
+    for fmt in formats:
+        _get_generator(fmt)
+
+
+def _get_generator(fmt):
+    """取得（必要时创建）当前进程内某一格式的报告生成器"""
+    generator = _worker_generators.get(fmt)
+    if generator is None:
+        module_name, class_name, _ = REPORT_FORMATS[fmt]
+        module = importlib.import_module(module_name)
+        generator = _worker_generators[fmt] = getattr(module, class_name)()
+    return generator
+
+
+def _render_item(item):
+    """在工作进程中为一份问卷生成所需格式的报告"""
+    start = time.perf_counter()
+    result = {'key': item['key'], 'status': 'done', 'outputs': {}, 'error': ''}
+    try:
+        os.makedirs(item['output_dir'], exist_ok=True)
+        for fmt in item['formats']:
+            output_path = report_output_path(item['source_path'], fmt, item['output_dir'])
+            result['outputs'][fmt] = _get_generator(fmt).generate_report(item['source_path'], output_path)
+            if item.get('catalog'):
+                from report_engine.catalog import record_report
+                record_report(item['catalog'], item['output_dir'], result['outputs'][fmt],
+                              submission=os.path.basename(item['source_path']), report_type=fmt)
+    except Exception as e:
+        result['status'] = 'failed'
+        result['error'] = f'{type(e).__name__}: {e}'
+        result['traceback'] = traceback.format_exc(limit=5)
+    result['seconds'] = round(time.perf_counter() - start, 3)
+    return result
+
+
+# ----------------------------------------------------------------------
+# 任务清单
+# ----------------------------------------------------------------------
+
+class BatchManifest:
+    """可续跑的批量任务清单（JSON 文件，每次更新原子替换）"""
+
+    def __init__(self, path, data):
+        self.path = path
+        self.data = data
+
+    @classmethod
+    def create(cls, tool, formats, manifest_dir=MANIFEST_DIR):
+        job_id = f"{tool}_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}"
+        now = datetime.now().isoformat()
+        data = {
+            'job_id': job_id,
+            'tool': tool,
+            'formats': list(formats),
+            'status': 'running',
+            'created_at': now,
+            'updated_at': now,
+            'items': {}
+        }
+        return cls(os.path.join(manifest_dir, f'{job_id}.json'), data)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(path, json.load(f))
+
+    @classmethod
+    def find_unfinished(cls, tool, manifest_dir=MANIFEST_DIR):
+        """返回该工具最近一次未完成的任务清单，没有则返回 None"""
+        if not os.path.isdir(manifest_dir):
+            return None
+        candidates = []
+        for fn in os.listdir(manifest_dir):
+            if fn.startswith(f'{tool}_') and fn.endswith('.json'):
+                path = os.path.join(manifest_dir, fn)
+                candidates.append((os.path.getmtime(path), path))
+        for _, path in sorted(candidates, reverse=True):
+            try:
+                manifest = cls.load(path)
+            except Exception:
+                continue
+            if manifest.data.get('status') != 'completed':
+                return manifest
+        return None
+
+    @property
+    def job_id(self):
+        return self.data['job_id']
+
+    @property
+    def items(self):
+        return self.data['items']
+
+    def add(self, key, **fields):
+        """登记条目（已存在则保留原有状态）"""
+        entry = self.items.setdefault(key, {'status': 'pending', 'outputs': {}, 'error': '', 'attempts': 0})
+        for k, v in fields.items():
+            entry.setdefault(k, v)
+        return entry
+
+    def update(self, key, **fields):
+        self.items.setdefault(key, {}).update(fields)
+        self.save()
+
+    def is_rendered(self, key):
+        """条目已渲染成功且报告文件仍存在"""
+        entry = self.items.get(key) or {}
+        outputs = entry.get('outputs') or {}
+        return (entry.get('status') == 'done' and bool(outputs)
+                and all(os.path.exists(p) for p in outputs.values()))
+
+    def is_finished(self):
+        """所有条目均已完成（或被跳过），且没有发送失败的邮件"""
+        return all(entry.get('status') in ('done', 'skipped') and entry.get('email') != 'failed'
+                   for entry in self.items.values())
+
+    def finalize(self):
+        """判定任务是否完成并保存（邮件发送结果全部登记后调用，有失败的邮件时保持可续跑）"""
+        self.data['status'] = 'completed' if self.is_finished() else 'incomplete'
+        self.save()
+
+    def summary(self):
+        counts = {}
+        for entry in self.items.values():
+            counts[entry.get('status', 'pending')] = counts.get(entry.get('status', 'pending'), 0) + 1
+        return counts
+
+    def save(self):
+        self.data['updated_at'] = datetime.now().isoformat()
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = f'{self.path}.{uuid.uuid4().hex[:8]}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+
+# ----------------------------------------------------------------------
+# 批量渲染
+# ----------------------------------------------------------------------
+
+def render_batch(items, manifest, workers=None, output_dir='reports', quiet=True, catalog=None):
+    """
+    并行生成报告，按完成顺序逐项产出结果
+
+    Args:
+        items: [{'key': 唯一标识, 'source_path': 提交JSON路径或问卷Excel路径}, ...]
+        manifest: BatchManifest，记录每项状态；已渲染的条目直接产出（resumed=True）
+        workers: 并行进程数，默认 default_workers()；为1时在当前进程内顺序执行
+        output_dir: 报告输出目录
+        catalog: 报告目录数据库路径（report_engine.catalog），给出时生成的报告逐份登记
+
+    Yields:
+        {'key', 'status': 'done'/'failed', 'outputs': {格式: 路径}, 'error', 'seconds', 'resumed'}
+    """
+    formats = manifest.data['formats']
+    workers = workers or default_workers()
+
+    pending = []
+    for item in items:
+        manifest.add(item['key'], source_path=item['source_path'])
+        if manifest.is_rendered(item['key']):
+            entry = manifest.items[item['key']]
+            yield {'key': item['key'], 'status': 'done', 'outputs': dict(entry['outputs']),
+                   'error': '', 'seconds': 0.0, 'resumed': True}
+        else:
+            pending.append({'key': item['key'], 'source_path': item['source_path'],
+                            'formats': formats, 'output_dir': output_dir, 'catalog': catalog})
+    manifest.save()
+
+    def _record(result):
+        entry = manifest.items[result['key']]
+        manifest.update(result['key'], status=result['status'], outputs=result['outputs'],
+                        error=result['error'], attempts=entry.get('attempts', 0) + 1,
+                        seconds=result['seconds'])
+        result['resumed'] = False
+        return result
+
+    if pending and workers <= 1:
+        _init_worker(formats, quiet=False)
+        for task in pending:
+            yield _record(_render_item(task))
+    elif pending:
+        with ProcessPoolExecutor(max_workers=min(workers, len(pending)),
+                                 initializer=_init_worker, initargs=(formats, quiet)) as pool:
+            futures = {pool.submit(_render_item, task): task for task in pending}
+            for future in as_completed(futures):
+                try:
+                    result = future.result()
+                except Exception as e:
+                    # 工作进程异常退出（如内存不足）
+                    result = {'key': futures[future]['key'], 'status': 'failed', 'outputs': {},
+                              'error': f'{type(e).__name__}: {e}', 'seconds': 0.0}
+                yield _record(result)
+
+    # 仅反映渲染结果；之后还要登记邮件发送结果的调用方需在全部登记后再调用 manifest.finalize()
+    manifest.finalize()
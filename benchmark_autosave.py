@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""
+问卷自动保存耗时对比：questionnaires.json 整表读写（旧方式）vs 分片存储整份答案保存 vs 增量草稿（PATCH /draft）
+用法：python benchmark_autosave.py [重复次数]
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+
+from questionnaire_submission_store import SubmissionStore
+
+QUESTIONS = 120
+
+
+def _answers(seed):
+    return {f'q{i}': f'答案{(i + seed) % 4}' for i in range(QUESTIONS)}
+
+
+def legacy_save(path, submission_id, answers):
+    """旧方式：读整表 → 线性查找提交 → 覆盖答案 → 写整表"""
+    with open(path, 'r', encoding='utf-8') as f:
+        db = json.load(f)
+    for sub in db['submissions']:
+        if sub['id'] == submission_id:
+            sub['updated_at'] = str(time.time())
+            break
+    db['answers'][submission_id] = answers
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(db, f, ensure_ascii=False, indent=2)
+
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    print(f"每份问卷 {QUESTIONS} 题，每次自动保存修改 1 题，重复 {repeat} 次")
+    for enterprises in (100, 1000, 5000):
+        with tempfile.TemporaryDirectory() as tmp:
+            ids = [f'sub-{i:06d}' for i in range(enterprises)]
+            submissions = [{'id': sid, 'enterprise_id': f'e{i}', 'survey_id': 's1', 'status': 'draft'}
+                           for i, sid in enumerate(ids)]
+            path = os.path.join(tmp, 'questionnaires.json')
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump({'surveys': [], 'questions': [], 'submissions': submissions,
+                           'answers': {sid: _answers(0) for sid in ids}}, f, ensure_ascii=False, indent=2)
+            store = SubmissionStore(os.path.join(tmp, 'submissions'))
+            for sub in submissions:
+                store.create(sub, _answers(0))
+
+            target = ids[-1]
+            start = time.perf_counter()
+            for n in range(repeat):
+                legacy_save(path, target, _answers(0) | {'q0': f'修改{n}'})
+            legacy_ms = (time.perf_counter() - start) / repeat * 1000
+
+            start = time.perf_counter()
+            for n in range(repeat):
+                store.replace_answers(target, _answers(0) | {'q0': f'修改{n}'})
+            store_ms = (time.perf_counter() - start) / repeat * 1000
+
+            revision = store.load(target)['revision']
+            start = time.perf_counter()
+            for n in range(repeat):
+                record, _ = store.patch_answers(target, {'q1': f'修改{n}'}, base_revision=revision)
+                revision = record['revision']
+            delta_ms = (time.perf_counter() - start) / repeat * 1000
+            print(f"  {enterprises:>5} 份提交: 整表读写 {legacy_ms:8.2f} ms/次，"
+                  f"分片存储 {store_ms:6.2f} ms/次，增量草稿 {delta_ms:6.2f} ms/次")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""
+报告图表渲染耗时对比：pyplot + 临时PNG文件（旧方式）vs 图表服务（内存渲染，首次/命中缓存）
+用法：python benchmark_chart_service.py [重复次数]
+"""
+import os
+import sys
+import tempfile
+import time
+import warnings
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+
+from chart_service import CHART_TEMPLATES, ChartService, risk_pie_data
+
+DIMENSIONS = [
+    {'name': name, 'percentage': p, 'risk_level': risk}
+    for name, p, risk in [('公司治理结构', 85.3, '低风险'), ('财务管理', 62.0, '中等风险'),
+                          ('人力资源', 45.5, '高风险'), ('党建引领', 74.1, '较低风险'),
+                          ('社会责任', 68.0, '中等风险'), ('风险防控', 91.2, '低风险')]
+]
+
+# 一份专业版报告中的三张图
+CHARTS = [
+    ('dimension_bar', {'names': [d['name'] for d in DIMENSIONS],
+                       'percentages': [d['percentage'] for d in DIMENSIONS]}),
+    ('dimension_radar', {'categories': [d['name'][:4] for d in DIMENSIONS],
+                         'values': [d['percentage'] for d in DIMENSIONS]}),
+    ('risk_pie', risk_pie_data(d['risk_level'] for d in DIMENSIONS)),
+]
+
+
+def legacy(tmp):
+    """旧方式：pyplot 全局图 + 当前目录临时文件 + 读回"""
+    for kind, data in CHARTS:
+        fig = plt.figure(figsize=CHART_TEMPLATES[kind]['figsize'])
+        CHART_TEMPLATES[kind]['draw'](fig, data, {})
+        path = os.path.join(tmp, f'temp_{kind}_{os.getpid()}.png')
+        plt.savefig(path, dpi=150, bbox_inches='tight')
+        plt.close()
+        with open(path, 'rb') as f:
+            f.read()
+        os.remove(path)
+
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    warnings.simplefilter('ignore')
+    service = ChartService()
+    uncached = ChartService(max_entries=0)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cases = [
+            ('pyplot + 临时文件', lambda: legacy(tmp)),
+            ('图表服务（未命中缓存）', lambda: [uncached.render(k, d) for k, d in CHARTS]),
+            ('图表服务（命中缓存）', lambda: [service.render(k, d) for k, d in CHARTS]),
+        ]
+        [service.render(k, d) for k, d in CHARTS]
+        print(f"每份报告 {len(CHARTS)} 张图，重复 {repeat} 次")
+        for name, fn in cases:
+            fn()  # 预热
+            start = time.perf_counter()
+            for _ in range(repeat):
+                fn()
+            print(f"  {name}: {(time.perf_counter() - start) / repeat * 1000:.1f} ms/份")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+文档存储性能对比：旧的整表读写 vs 带索引的预写日志存储
+用法：python benchmark_document_store.py [企业数量]
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+
+from document_store import DEFAULT_COMPACT_EVERY, WalTable
+
+
+def _legacy_read(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f).get('items', [])
+
+
+def _legacy_write(path, items):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'items': items}, f, ensure_ascii=False, indent=2)
+
+
+def _make_items(n):
+    levels = ['beginner', 'intermediate', 'advanced']
+    return [{
+        'id': f'ent{i:06d}',
+        'name': f'企业{i}',
+        'region': '天津市',
+        'industry': '制造业',
+        'level': levels[i % 3],
+        'contact': '张经理',
+        'email': f'e{i}@example.com',
+        'phone': '13800138000',
+        'created_at': '2024-01-01 10:00',
+        'updated_at': '2024-01-01 10:00'
+    } for i in range(n)]
+
+
+def _timeit(fn, repeat):
+    start = time.perf_counter()
+    for i in range(repeat):
+        fn(i)
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    print(f"企业数量: {n}")
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_path = os.path.join(tmp, 'legacy.json')
+        wal_path = os.path.join(tmp, 'wal.json')
+        items = _make_items(n)
+        _legacy_write(legacy_path, items)
+        _legacy_write(wal_path, items)
+
+        # 旧实现：按 id 查找 = 整表解析 + 线性扫描
+        def legacy_lookup(i):
+            target = f'ent{(i * 7919) % n:06d}'
+            next(x for x in _legacy_read(legacy_path) if x.get('id') == target)
+
+        def legacy_update(i):
+            rows = _legacy_read(legacy_path)
+            rows[(i * 7919) % n]['level'] = 'advanced'
+            _legacy_write(legacy_path, rows)
+
+        t0 = time.perf_counter()
+        # 压缩单独计时，循环内只测日志追加
+        table = WalTable(wal_path, indexes=('name', 'level'), compact_every=10 ** 9)
+        load_ms = (time.perf_counter() - t0) * 1000
+
+        def wal_lookup(i):
+            table.get(f'ent{(i * 7919) % n:06d}')
+
+        def wal_name_lookup(i):
+            table.find_one('name', f'企业{(i * 7919) % n}')
+
+        def wal_update(i):
+            table.update(f'ent{(i * 7919) % n:06d}', {'level': 'advanced'})
+
+        def wal_append(i):
+            table.insert({'id': f'new{i:06d}', 'name': f'新企业{i}', 'level': 'beginner'})
+
+        print(f"  预写日志存储首次加载: {load_ms:.1f} ms")
+        print(f"  旧实现 按id查找:      {_timeit(legacy_lookup, 5):.2f} ms/次")
+        print(f"  旧实现 更新一条:      {_timeit(legacy_update, 5):.2f} ms/次")
+        print(f"  新实现 按id查找:      {_timeit(wal_lookup, 20000) * 1000:.2f} us/次")
+        print(f"  新实现 按名称查找:    {_timeit(wal_name_lookup, 20000) * 1000:.2f} us/次")
+        print(f"  新实现 更新一条:      {_timeit(wal_update, 500) * 1000:.2f} us/次")
+        print(f"  新实现 追加一条:      {_timeit(wal_append, 500) * 1000:.2f} us/次")
+
+        t0 = time.perf_counter()
+        table.compact()
+        compact_ms = (time.perf_counter() - t0) * 1000
+        print(f"  新实现 压缩快照:      {compact_ms:.1f} ms（每 {DEFAULT_COMPACT_EVERY} 次变更一次，均摊 {compact_ms / DEFAULT_COMPACT_EVERY:.2f} ms）")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""
+get_questions 延迟对比：每次读取Excel vs 进程级指标缓存
+用法：python benchmark_indicator_cache.py [指标文件]
+（默认用 指标体系.xlsx 的题目生成一个包含 初级/中级/高级 三个工作表的临时文件）
+"""
+import os
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+from nankai_indicator_loader import load_questions_by_level
+from survey_engine.services.indicator_cache import IndicatorCache
+
+LEVELS = ['beginner', 'intermediate', 'advanced']
+
+
+def _timeit(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def _build_workbook(path):
+    df = pd.read_excel('指标体系.xlsx', sheet_name=0)
+    with pd.ExcelWriter(path, engine='openpyxl') as writer:
+        for sheet in ['初级', '中级', '高级']:
+            df.to_excel(writer, sheet_name=sheet, index=False)
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        if len(sys.argv) > 1:
+            path = sys.argv[1]
+        else:
+            path = os.path.join(tmp, 'indicators.xlsx')
+            _build_workbook(path)
+
+        cache = IndicatorCache()
+        before_one = _timeit(lambda: load_questions_by_level(path, 'advanced'), 5)
+        before_all = _timeit(lambda: [load_questions_by_level(path, lv) for lv in LEVELS], 3)
+
+        t0 = time.perf_counter()
+        cache.get_questions(path, 'advanced')
+        cold = (time.perf_counter() - t0) * 1000
+
+        after_one = _timeit(lambda: cache.get_questions(path, 'advanced'), 2000)
+        after_json = _timeit(lambda: cache.get_questions_json(path, 'advanced'), 2000)
+        after_all = _timeit(lambda: [cache.count(path, lv) for lv in LEVELS], 2000)
+
+        print(f"指标文件: {path}  题目数: {cache.count(path, 'advanced')}")
+        print(f"  改造前 get_questions:        {before_one:.2f} ms/次")
+        print(f"  改造前 /health 三个级别:     {before_all:.2f} ms/次")
+        print(f"  缓存首次加载(三个级别):      {cold:.2f} ms")
+        print(f"  改造后 get_questions:        {after_one * 1000:.2f} us/次")
+        print(f"  改造后 题目JSON字节:         {after_json * 1000:.2f} us/次")
+        print(f"  改造后 /health 三个级别:     {after_all * 1000:.2f} us/次")
+
+
+if __name__ == '__main__':
+    main()
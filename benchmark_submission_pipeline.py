@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""
+提交→报告 延迟对比：旧流程（保存JSON+生成Excel，报告再读Excel）vs 直接使用 Submission
+用法：python benchmark_submission_pipeline.py [重复次数]
+"""
+import glob
+import json
+import os
+import sys
+import tempfile
+import time
+
+from score_calculator import ScoreCalculator
+from submission_model import Submission, write_questionnaire_excel
+
+
+def _load_sample():
+    for path in sorted(glob.glob('storage/submissions/submission_*.json')):
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('questions_snapshot'):
+            return data
+    raise SystemExit('没有带题目快照的提交样例')
+
+
+def _report_generator(calculator):
+    """报告渲染部分两种流程相同；指标体系默认路径不可用时只比较到计分为止"""
+    try:
+        from enterprise_report_generator import EnterpriseReportGenerator
+        generator = EnterpriseReportGenerator()
+        generator.calculator = calculator
+        return generator
+    except Exception:
+        return None
+
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    data = _load_sample()
+    calculator = ScoreCalculator('指标体系.xlsx')
+    calculator.score_cache = None
+    generator = _report_generator(calculator)
+    print(f"题目数: {len(data['questions_snapshot'])}，重复 {repeat} 次，"
+          f"{'含Word报告渲染' if generator else '不含报告渲染（仅到计分为止）'}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        def legacy(i):
+            json_path = os.path.join(tmp, f'submission_旧_{i}.json')
+            with open(json_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+            excel_path = os.path.join(tmp, f'问卷_旧_{i}.xlsx')
+            write_questionnaire_excel(data, excel_path)
+            if generator:
+                return generator.generate_report(excel_path, os.path.join(tmp, f'旧_{i}.docx'))
+            return calculator.calculate_total_score(calculator.parse_questionnaire(excel_path))
+
+        def direct(i):
+            json_path = os.path.join(tmp, f'submission_新_{i}.json')
+            with open(json_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+            submission = Submission(data, json_path)
+            if generator:
+                return generator.generate_report(submission, os.path.join(tmp, f'新_{i}.docx'))
+            return calculator.calculate_total_score(calculator.load_questionnaire(submission))
+
+        stdout = sys.stdout
+        results = {}
+        for name, fn in [('旧流程（Excel中转）', legacy), ('新流程（Submission）', direct)]:
+            sys.stdout = open(os.devnull, 'w', encoding='utf-8')
+            try:
+                start = time.perf_counter()
+                for i in range(repeat):
+                    fn(i)
+                results[name] = (time.perf_counter() - start) / repeat * 1000
+            finally:
+                sys.stdout.close()
+                sys.stdout = stdout
+        for name, ms in results.items():
+            print(f"  {name}: {ms:.1f} ms/份")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+工商联用户导出耗时与内存对比（默认 20 万用户）：
+旧方式（fetchall + 普通 Workbook + 逐单元格计算列宽）vs 流式 Excel / CSV / Parquet
+每种方式在独立子进程中运行，以进程峰值内存（ru_maxrss）衡量
+用法：python benchmark_user_export.py [用户数]
+"""
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import chamber_users_export as exporter
+
+CASES = ['legacy', 'xlsx', 'csv', 'parquet']
+
+
+class SyntheticCursor:
+    """模拟服务端游标：按需生成行"""
+
+    def __init__(self, count):
+        self.count = count
+        self.next_id = 0
+        self.base = datetime(2024, 1, 1)
+
+    def _row(self, i):
+        return {'id': f'{i:032x}', 'username': f'user{i}', 'email': f'user{i}@example.com',
+                'real_name': f'用户{i}', 'phone': f'138{i:08d}', 'level': ('county', 'province')[i % 2],
+                'region': '北京', 'role': 'operator', 'review_level': 'county', 'department': '会员部',
+                'position': '专员', 'status': 'active', 'created_at': self.base + timedelta(seconds=i)}
+
+    def fetchmany(self, size):
+        end = min(self.next_id + size, self.count)
+        rows = [self._row(i) for i in range(self.next_id, end)]
+        self.next_id = end
+        return rows
+
+    def fetchall(self):
+        return self.fetchmany(self.count)
+
+
+def legacy(cursor, path):
+    """旧实现：全部行读入内存，普通 Workbook，遍历所有单元格计算列宽"""
+    from openpyxl import Workbook
+    from openpyxl.styles import Font, PatternFill, Alignment
+    results = cursor.fetchall()
+    wb = Workbook()
+    ws = wb.active
+    ws.title = '工商联用户'
+    ws.append(exporter.HEADERS)
+    for cell in ws[1]:
+        cell.fill = PatternFill(start_color='4472C4', end_color='4472C4', fill_type='solid')
+        cell.font = Font(bold=True, color='FFFFFF')
+        cell.alignment = Alignment(horizontal='center', vertical='center')
+    for row in results:
+        ws.append(exporter.format_row(row))
+    for column in ws.columns:
+        max_length = max(len(str(cell.value)) for cell in column)
+        ws.column_dimensions[column[0].column_letter].width = min(max_length + 2, 50)
+    wb.save(path)
+
+
+def run_case(case, count):
+    cursor = SyntheticCursor(count)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, f'users.{case}')
+        start = time.perf_counter()
+        if case == 'legacy':
+            legacy(cursor, path)
+        elif case == 'csv':
+            with open(path, 'wb') as f:
+                for part in exporter.iter_csv(exporter.iter_chunks(cursor)):
+                    f.write(part)
+        elif case == 'parquet':
+            exporter.write_parquet(exporter.iter_chunks(cursor), path)
+        else:
+            exporter.write_xlsx(exporter.iter_chunks(cursor), path)
+        elapsed = time.perf_counter() - start
+        size = os.path.getsize(path)
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"  {case:8s} {elapsed:7.2f} s  峰值内存 {peak_mb:7.1f} MB  文件 {size / 1024 / 1024:6.1f} MB")
+
+
+def main():
+    if len(sys.argv) > 2 and sys.argv[1] == '--case':
+        run_case(sys.argv[2], int(sys.argv[3]))
+        return
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    print(f"导出 {count} 个用户")
+    for case in CASES:
+        if case == 'parquet' and exporter.pyarrow is None:
+            print(f"  {case:8s} 跳过（未安装 pyarrow）")
+            continue
+        subprocess.run([sys.executable, __file__, '--case', case, str(count)], check=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,501 @@
+# -*- coding: utf-8 -*-
+"""
+批量邮件发送
+manage_submissions / send_professional_reports 的批量模式使用，替代逐封调用
+NotificationService.send_email（每封都重新建立连接、STARTTLS、登录）：
+- SMTPPool：持久 SMTP 会话池，会话在多封邮件间复用；空闲过久先 NOOP 探活，
+  连接被服务器断开时丢弃并重连重发；单个会话发送 max_messages_per_session 封后主动轮换
+- 多个发送线程并发投递（workers，默认环境变量 MAIL_WORKERS 或 4）
+- RateLimiter：按服务商（SMTP 服务器）限速，同一服务商的多个发送器共享配额
+- 附件缓存：同一文件发给多个收件人时只读取、base64 编码一次
+- MailOutbox：可重试的发件箱（storage/mail_outbox/<名称>.jsonl），记录每封邮件的状态、
+  尝试次数与错误；临时错误（断线、4xx）自动退避重试，永久错误（5xx、收件人被拒）直接记为失败；
+  中断后重新运行时已发送的邮件不会重复发送，失败的可用 retry_failed() 重发
+
+可选配置（config.json 的 email 段）：workers（发送线程数）、rate_limit_per_minute（每分钟发送上限）
+"""
+import base64
+import json
+import logging
+import os
+import smtplib
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from email.mime.base import MIMEBase
+from typing import Callable, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_DIR = os.path.join('storage', 'mail_outbox')
+
+
+def default_mail_workers():
+    """默认发送线程数：环境变量 MAIL_WORKERS，否则为 4"""
+    try:
+        return max(1, int(os.environ.get('MAIL_WORKERS', '')))
+    except ValueError:
+        return 4
+
+
+def is_permanent_error(error: Exception) -> bool:
+    """永久错误（重试无意义）：5xx 响应（收件人/发件人被拒等）、认证失败、附件不存在等"""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(500 <= code < 600 for code, _ in error.recipients.values())
+    if isinstance(error, (smtplib.SMTPAuthenticationError, smtplib.SMTPNotSupportedError)):
+        return True
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 500 <= error.smtp_code < 600
+    return isinstance(error, (ValueError, FileNotFoundError))
+
+
+def _close_quietly(session):
+    try:
+        session.quit()
+    except Exception:
+        try:
+            session.close()
+        except Exception:
+            pass
+
+
+# ----------------------------------------------------------------------
+# SMTP 会话池
+# ----------------------------------------------------------------------
+
+class SMTPSession:
+    """池中的一个 SMTP 会话"""
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.sent = 0
+        self.last_used = time.monotonic()
+
+
+class SMTPPool:
+    """线程安全的 SMTP 会话池"""
+
+    def __init__(self, connect: Callable[[], smtplib.SMTP], size: int = 4,
+                 health_check_interval: float = 30.0, max_messages_per_session: int = 100):
+        """
+        Args:
+            connect: 建立已认证会话的函数（如 NotificationService.open_smtp，测试可替换为本地替身）
+            size: 最大会话数
+            health_check_interval: 空闲超过该秒数的会话借出前先 NOOP
+            max_messages_per_session: 单个会话最多发送的邮件数（多数服务商对此有限制）
+        """
+        self._connect = connect
+        self.size = size
+        self.health_check_interval = health_check_interval
+        self.max_messages_per_session = max_messages_per_session
+        self._idle: List[SMTPSession] = []
+        self._total = 0
+        self._cond = threading.Condition()
+        self._metrics = {
+            'sessions_opened': 0,
+            'sessions_closed': 0,
+            'reconnects': 0,
+            'health_check_failures': 0,
+            'messages_sent': 0,
+        }
+
+    def _count(self, key, value=1):
+        with self._cond:
+            self._metrics[key] += value
+
+    def _healthy(self, session: SMTPSession) -> bool:
+        if time.monotonic() - session.last_used < self.health_check_interval:
+            return True
+        try:
+            code, _ = session.raw.noop()
+            if code == 250:
+                return True
+        except Exception:
+            pass
+        self._count('health_check_failures')
+        return False
+
+    def acquire(self) -> SMTPSession:
+        """借出一个会话（优先复用空闲会话；会话数已满时等待归还）"""
+        while True:
+            with self._cond:
+                if self._idle:
+                    session = self._idle.pop()
+                elif self._total < self.size:
+                    self._total += 1
+                    session = None
+                else:
+                    self._cond.wait()
+                    continue
+            if session is None:
+                try:
+                    session = SMTPSession(self._connect())
+                except Exception:
+                    with self._cond:
+                        self._total -= 1
+                        self._cond.notify()
+                    raise
+                self._count('sessions_opened')
+                return session
+            if self._healthy(session):
+                return session
+            self._discard(session)
+
+    def release(self, session: SMTPSession, discard: bool = False):
+        if discard or session.sent >= self.max_messages_per_session:
+            self._discard(session)
+            return
+        session.last_used = time.monotonic()
+        with self._cond:
+            self._idle.append(session)
+            self._cond.notify()
+
+    def _discard(self, session: SMTPSession):
+        _close_quietly(session.raw)
+        with self._cond:
+            self._total -= 1
+            self._metrics['sessions_closed'] += 1
+            self._cond.notify()
+
+    def send(self, msg):
+        """发送一封邮件；会话已被服务器断开时重连并重发一次"""
+        for attempt in (1, 2):
+            session = self.acquire()
+            try:
+                session.raw.send_message(msg)
+            except (smtplib.SMTPServerDisconnected, ConnectionError) as e:
+                self._discard(session)
+                if attempt == 2:
+                    raise
+                logger.info(f"SMTP 会话已断开，重连后重发: {e}")
+                self._count('reconnects')
+                continue
+            except (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused):
+                # 服务器拒绝了这封邮件，会话本身可继续使用（先 RSET 清理事务状态）
+                try:
+                    session.raw.rset()
+                except Exception:
+                    self._discard(session)
+                else:
+                    self.release(session)
+                raise
+            except Exception:
+                self._discard(session)
+                raise
+            session.sent += 1
+            self._count('messages_sent')
+            self.release(session)
+            return
+
+    def stats(self) -> Dict:
+        with self._cond:
+            stats = dict(self._metrics)
+            stats.update(size=self.size, open=self._total, idle=len(self._idle))
+        return stats
+
+    def close(self):
+        """关闭所有空闲会话"""
+        with self._cond:
+            idle, self._idle = self._idle, []
+        for session in idle:
+            self._discard(session)
+
+
+# ----------------------------------------------------------------------
+# 限速
+# ----------------------------------------------------------------------
+
+class RateLimiter:
+    """令牌桶限速（每分钟 rate_per_minute 封，允许 burst 封的突发）"""
+
+    def __init__(self, rate_per_minute: float, burst: Optional[int] = None,
+                 clock: Callable[[], float] = time.monotonic, sleep: Callable[[float], None] = time.sleep):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = float(burst or max(1, int(rate_per_minute // 60) or 1))
+        self._tokens = self.capacity
+        self._clock = clock
+        self._sleep = sleep
+        self._updated = clock()
+        self._lock = threading.Lock()
+        self.waited = 0.0
+
+    def acquire(self):
+        """取得一个发送配额（配额不足时阻塞等待）"""
+        while True:
+            with self._lock:
+                now = self._clock()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+                self.waited += wait
+            self._sleep(wait)
+
+
+_limiters: Dict[str, RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(provider: str, rate_per_minute: Optional[float]) -> Optional[RateLimiter]:
+    """按服务商取得进程内共享的限速器（未配置限速时返回 None）"""
+    if not rate_per_minute:
+        return None
+    with _limiters_lock:
+        limiter = _limiters.get(provider)
+        if limiter is None:
+            limiter = _limiters[provider] = RateLimiter(rate_per_minute)
+        return limiter
+
+
+# ----------------------------------------------------------------------
+# 附件缓存
+# ----------------------------------------------------------------------
+
+class AttachmentCache:
+    """按文件（路径 + 修改时间 + 大小）缓存 base64 编码后的附件内容"""
+
+    def __init__(self, max_entries: int = 16):
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[tuple, str]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def part(self, path: str) -> MIMEBase:
+        """返回新的附件对象（编码后的内容在多封邮件间共享）"""
+        st = os.stat(path)
+        key = (os.path.abspath(path), st.st_mtime_ns, st.st_size)
+        with self._lock:
+            encoded = self._entries.get(key)
+            if encoded is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+        if encoded is None:
+            with open(path, 'rb') as f:
+                encoded = base64.encodebytes(f.read()).decode('ascii')
+            with self._lock:
+                self.misses += 1
+                self._entries[key] = encoded
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        part = MIMEBase('application', 'octet-stream')
+        part.set_payload(encoded)
+        part['Content-Transfer-Encoding'] = 'base64'
+        part.add_header('Content-Disposition', 'attachment', filename=('utf-8', '', os.path.basename(path)))
+        return part
+
+
+# ----------------------------------------------------------------------
+# 发件箱
+# ----------------------------------------------------------------------
+
+class MailOutbox:
+    """
+    可重试的发件箱（JSON Lines，每行为某封邮件的最新状态，读取时后写的覆盖先写的）
+    状态：pending / sent / failed
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        """
+        Args:
+            path: 发件箱文件路径；为 None 时只在内存中记录
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self.entries: Dict[str, Dict] = {}
+        self._lines = 0
+        self._load()
+
+    @classmethod
+    def for_job(cls, job_id: str, outbox_dir: str = OUTBOX_DIR) -> 'MailOutbox':
+        return cls(os.path.join(outbox_dir, f'{job_id}.jsonl'))
+
+    def _load(self):
+        if self.path is None:
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # 写入中途崩溃留下的残缺行
+                    self.entries[entry['key']] = entry
+                    self._lines += 1
+        except FileNotFoundError:
+            return
+        if self._lines > 2 * len(self.entries):
+            self._compact()
+
+    def _compact(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = f'{self.path}.{uuid.uuid4().hex[:8]}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for entry in self.entries.values():
+                f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        os.replace(tmp_path, self.path)
+        self._lines = len(self.entries)
+
+    def _write(self, entry: Dict):
+        entry['updated_at'] = datetime.now().isoformat()
+        with self._lock:
+            self.entries[entry['key']] = entry
+            if self.path is None:
+                return
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+            self._lines += 1
+
+    def add(self, key: str, message: Dict) -> Dict:
+        """登记一封邮件；已登记的保留原状态（已发送的不会重发）"""
+        with self._lock:
+            existing = self.entries.get(key)
+        if existing is not None and existing.get('status') == 'sent':
+            return existing
+        entry = {'key': key, 'message': message, 'status': 'pending',
+                 'attempts': (existing or {}).get('attempts', 0), 'error': ''}
+        self._write(entry)
+        return entry
+
+    def update(self, key: str, **fields) -> Dict:
+        with self._lock:
+            entry = dict(self.entries[key], **fields)
+        self._write(entry)
+        return entry
+
+    def get(self, key: str) -> Optional[Dict]:
+        with self._lock:
+            return self.entries.get(key)
+
+    def by_status(self, status: str) -> List[Dict]:
+        with self._lock:
+            return [e for e in self.entries.values() if e.get('status') == status]
+
+    def summary(self) -> Dict:
+        counts = {}
+        with self._lock:
+            for entry in self.entries.values():
+                counts[entry['status']] = counts.get(entry['status'], 0) + 1
+        return counts
+
+
+# ----------------------------------------------------------------------
+# 批量发送
+# ----------------------------------------------------------------------
+
+class BulkMailer:
+    """并发批量发送报告通知邮件"""
+
+    def __init__(self, service, workers: Optional[int] = None, outbox: Optional[MailOutbox] = None,
+                 pool: Optional[SMTPPool] = None, rate_per_minute: Optional[float] = None,
+                 max_attempts: int = 3, retry_delay: float = 2.0):
+        """
+        Args:
+            service: NotificationService（提供邮件配置、build_email、open_smtp）
+            workers: 并发发送线程数（同时也是 SMTP 会话数上限）
+            outbox: 发件箱，默认只在内存中记录
+            pool: SMTP 会话池，默认按 workers 创建
+            rate_per_minute: 每分钟最多发送封数，默认取邮件配置 rate_limit_per_minute（不配置不限速）
+            max_attempts: 临时错误的最大尝试次数
+            retry_delay: 首次重试前的等待秒数（之后每次翻倍）
+        """
+        email_config = service.config.get('email', {})
+        self.service = service
+        self.workers = workers or email_config.get('workers') or default_mail_workers()
+        self.outbox = outbox or MailOutbox()
+        self.pool = pool or SMTPPool(service.open_smtp, size=self.workers)
+        self.limiter = get_rate_limiter(email_config.get('smtp_server', ''),
+                                        rate_per_minute or email_config.get('rate_limit_per_minute'))
+        self.attachments = AttachmentCache()
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='mail')
+        self._futures = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def submit(self, key: str, to_email: str, enterprise_name: str, contact_name: str,
+               report_url: str = '', attachment_path: Optional[str] = None):
+        """
+        登记到发件箱并提交发送（非阻塞）
+
+        Returns:
+            Future；该邮件此前已发送时返回 None
+        """
+        message = {'to_email': to_email, 'enterprise_name': enterprise_name, 'contact_name': contact_name,
+                   'report_url': report_url, 'attachment_path': attachment_path}
+        entry = self.outbox.add(key, message)
+        if entry['status'] == 'sent':
+            return None
+        return self._submit(entry)
+
+    def _submit(self, entry: Dict):
+        future = self._executor.submit(self._deliver, entry['key'], entry['message'])
+        self._futures.append(future)
+        return future
+
+    def retry_failed(self) -> int:
+        """重新提交发件箱中失败的邮件，返回提交数量"""
+        failed = self.outbox.by_status('failed')
+        for entry in failed:
+            self._submit(self.outbox.update(entry['key'], status='pending', attempts=0))
+        return len(failed)
+
+    def _build(self, message: Dict):
+        path = message.get('attachment_path')
+        part = self.attachments.part(path) if path and os.path.exists(path) else None
+        return self.service.build_email(message['to_email'], message['enterprise_name'],
+                                        message['contact_name'], message.get('report_url', ''),
+                                        attachment_part=part)
+
+    def _deliver(self, key: str, message: Dict) -> Dict:
+        attempts = (self.outbox.get(key) or {}).get('attempts', 0)
+        error = None
+        for attempt in range(self.max_attempts):
+            attempts += 1
+            try:
+                msg = self._build(message)
+                if self.limiter:
+                    self.limiter.acquire()
+                self.pool.send(msg)
+            except Exception as e:
+                error = e
+                if is_permanent_error(e) or attempt == self.max_attempts - 1:
+                    break
+                logger.info(f"邮件发送临时失败，稍后重试: {message['to_email']}, {e}")
+                time.sleep(self.retry_delay * (2 ** attempt))
+                continue
+            entry = self.outbox.update(key, status='sent', attempts=attempts, error='')
+            return dict(entry, to_email=message['to_email'])
+        logger.warning(f"邮件发送失败: {message['to_email']}, {error}")
+        entry = self.outbox.update(key, status='failed', attempts=attempts, error=str(error),
+                                   permanent=is_permanent_error(error))
+        return dict(entry, to_email=message['to_email'])
+
+    def as_completed(self) -> Iterator[Dict]:
+        """按完成顺序返回已提交邮件的发送结果（outbox 条目 + to_email）"""
+        futures, self._futures = self._futures, []
+        for future in as_completed(futures):
+            yield future.result()
+
+    def stats(self) -> Dict:
+        stats = self.pool.stats()
+        stats.update(outbox=self.outbox.summary(), attachment_cache_hits=self.attachments.hits,
+                     attachment_cache_misses=self.attachments.misses,
+                     rate_limit_wait_seconds=round(self.limiter.waited, 3) if self.limiter else 0.0)
+        return stats
+
+    def close(self):
+        """等待已提交的邮件发送完毕并关闭会话"""
+        self._executor.shutdown(wait=True)
+        self.pool.close()
@@ -7,6 +7,8 @@
 from flask import Blueprint, request, jsonify, session, send_file
 from sqlalchemy import and_, or_
 from datetime import datetime
+import atexit
+import threading
 import uuid
 import bcrypt
 import json
@@ -14,6 +16,8 @@ import io
 from openpyxl import Workbook
 from openpyxl.styles import Font, PatternFill, Alignment
 
+from audit_log import AuditLogger, sqlalchemy_writer
+
 # 假设这些是已定义的模块
 # from models import ChamberUser, ChamberUserLog, db
 # from utils import PermissionChecker, log_operation
@@ -147,20 +151,27 @@ class PermissionChecker:
 # 辅助函数
 # ============================================================
 
-def log_operation(operator_id, target_user_id, action, old_value, new_value):
-    """记录用户操作日志"""
+_audit_logger = None
+_audit_logger_lock = threading.Lock()
+
+
+def get_audit_logger():
+    """审计日志后台写入器（首次使用时绑定当前数据库引擎）"""
+    global _audit_logger
+    if _audit_logger is None:
+        with _audit_logger_lock:
+            if _audit_logger is None:
+                _audit_logger = AuditLogger(sqlalchemy_writer(db.engine))
+                atexit.register(_audit_logger.close)
+    return _audit_logger
+
+
+def log_operation(operator_id, target_user_id, action, old_value, new_value, target_deleted=False):
+    """记录用户操作日志（入队后由后台线程批量写入，见 audit_log）"""
     try:
-        from models import ChamberUserLog
-        log = ChamberUserLog(
-            id=str(uuid.uuid4()),
-            operator_id=operator_id,
-            target_user_id=target_user_id,
-            action=action,
-            old_value=json.dumps(old_value, default=str) if old_value else None,
-            new_value=json.dumps(new_value, default=str) if new_value else None
-        )
-        db.session.add(log)
-        db.session.commit()
+        get_audit_logger().log_user_operation(operator_id, target_user_id, action, old_value, new_value,
+                                              request.remote_addr, request.headers.get('User-Agent'),
+                                              target_deleted=target_deleted)
     except Exception as e:
         print(f"记录日志失败: {e}")
 
@@ -494,7 +505,7 @@ def delete_user(user_id):
         db.session.commit()
         
         # 记录操作日志
-        log_operation(current_user.id, user_id, 'delete', old_value, None)
+        log_operation(current_user.id, user_id, 'delete', old_value, None, target_deleted=True)
         
         return jsonify({'success': True, 'message': '用户删除成功'})
     
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+"""
+工商联用户流式导出
+chamber_users_management.export_users 的导出实现，按块处理，内存占用与用户总数无关：
+- 数据库端使用服务端游标（stream_results），每次取 chunk_size 行
+- Excel 使用 openpyxl 只写模式（write_only），行直接写入临时文件；
+  列宽按表头与首块数据的逐列最大长度计算（只写模式下列宽必须在第一行数据之前写出）
+- CSV 边查边写，直接作为分块 HTTP 响应返回（UTF-8 BOM，Excel 可直接打开）
+- Parquet 按块写入 row group，需要安装 pyarrow（可选依赖）
+"""
+import csv
+import io
+import itertools
+from typing import Dict, Iterable, Iterator, List, Sequence
+
+try:
+    import pyarrow
+    import pyarrow.parquet as pq
+except ImportError:  # 未安装时仅 Parquet 格式不可用
+    pyarrow = None
+
+# 导出列：(数据库字段, 表头)
+EXPORT_COLUMNS = [
+    ('id', '用户ID'),
+    ('username', '用户名'),
+    ('email', '邮箱'),
+    ('real_name', '真实姓名'),
+    ('phone', '手机号'),
+    ('level', '层级'),
+    ('region', '地区'),
+    ('role', '角色'),
+    ('review_level', '审核权限'),
+    ('department', '部门'),
+    ('position', '职位'),
+    ('status', '状态'),
+    ('created_at', '创建时间'),
+]
+HEADERS = [header for _, header in EXPORT_COLUMNS]
+
+# 格式 -> (MIME 类型, 扩展名)
+EXPORT_FORMATS = {
+    'xlsx': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'xlsx'),
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+
+DEFAULT_CHUNK_SIZE = 2000
+MAX_COLUMN_WIDTH = 50
+
+
+class ExportFormatError(ValueError):
+    """不支持的导出格式（或缺少对应依赖）"""
+
+
+def check_format(fmt: str) -> str:
+    fmt = (fmt or 'xlsx').lower()
+    if fmt not in EXPORT_FORMATS:
+        raise ExportFormatError(f'不支持的导出格式: {fmt}（可选: {", ".join(EXPORT_FORMATS)}）')
+    if fmt == 'parquet' and pyarrow is None:
+        raise ExportFormatError('导出 Parquet 需要安装 pyarrow')
+    return fmt
+
+
+def format_row(row: Dict) -> List:
+    """数据库行（字典）转为导出行"""
+    values = [row.get(column) for column, _ in EXPORT_COLUMNS[:-1]]
+    created_at = row.get('created_at')
+    if hasattr(created_at, 'isoformat'):
+        created_at = created_at.isoformat()
+    values.append(created_at or '')
+    return values
+
+
+def iter_chunks(result, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[List[List]]:
+    """
+    从查询结果中按块读取并格式化
+
+    Args:
+        result: SQLAlchemy Result（使用 partitions）或 DB-API 游标（使用 fetchmany）
+    """
+    if hasattr(result, 'partitions'):
+        batches = result.partitions(chunk_size)
+    else:
+        batches = iter(lambda: result.fetchmany(chunk_size), [])
+    for batch in batches:
+        if not batch:
+            break
+        yield [format_row(_as_dict(row)) for row in batch]
+
+
+def _as_dict(row) -> Dict:
+    if isinstance(row, dict):
+        return row
+    return dict(row._mapping) if hasattr(row, '_mapping') else dict(row)
+
+
+def column_widths(widths: List[int], rows: Iterable[Sequence]) -> List[int]:
+    """用一批行更新逐列最大长度（就地修改并返回）"""
+    for row in rows:
+        for i, value in enumerate(row):
+            length = len(str(value)) if value is not None else 0
+            if length > widths[i]:
+                widths[i] = length
+    return widths
+
+
+def iter_csv(chunks: Iterable[List[List]]) -> Iterator[bytes]:
+    """CSV 分块输出（首块带 UTF-8 BOM）"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write('\ufeff')
+    writer.writerow(HEADERS)
+    for chunk in chunks:
+        writer.writerows(chunk)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+def write_xlsx(chunks: Iterable[List[List]], output) -> int:
+    """
+    以只写模式写出 Excel，返回数据行数
+
+    Args:
+        output: 文件路径或可写文件对象
+    """
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font, PatternFill, Alignment
+    from openpyxl.utils import get_column_letter
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet('工商联用户')
+
+    chunks = iter(chunks)
+    first = next(chunks, [])
+    widths = column_widths([len(h) for h in HEADERS], first)
+    for i, width in enumerate(widths, 1):
+        ws.column_dimensions[get_column_letter(i)].width = min(width + 2, MAX_COLUMN_WIDTH)
+
+    header_fill = PatternFill(start_color='4472C4', end_color='4472C4', fill_type='solid')
+    header_font = Font(bold=True, color='FFFFFF')
+    header_alignment = Alignment(horizontal='center', vertical='center')
+    header_row = []
+    for header in HEADERS:
+        cell = WriteOnlyCell(ws, value=header)
+        cell.fill = header_fill
+        cell.font = header_font
+        cell.alignment = header_alignment
+        header_row.append(cell)
+    ws.append(header_row)
+
+    count = 0
+    for chunk in itertools.chain([first], chunks):
+        for row in chunk:
+            ws.append(row)
+        count += len(chunk)
+    wb.save(output)
+    return count
+
+
+def write_parquet(chunks: Iterable[List[List]], output) -> int:
+    """按块写出 Parquet（每块一个 row group），返回数据行数"""
+    if pyarrow is None:
+        raise ExportFormatError('导出 Parquet 需要安装 pyarrow')
+    schema = pyarrow.schema([(column, pyarrow.string()) for column, _ in EXPORT_COLUMNS])
+    count = 0
+    with pq.ParquetWriter(output, schema) as writer:
+        for chunk in chunks:
+            columns = [[None if v is None else str(v) for v in values] for values in zip(*chunk)]
+            writer.write_table(pyarrow.Table.from_arrays(columns, schema=schema))
+            count += len(chunk)
+    return count
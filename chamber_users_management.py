@@ -4,14 +4,19 @@
 包含：数据库操作、权限检查、API 接口、日志记录
 """
 
-from flask import Blueprint, request, jsonify, session
+from flask import Blueprint, request, jsonify, session, g, has_request_context
 from datetime import datetime
+import atexit
+import threading
 import uuid
 import json
 import logging
 from functools import wraps
 import bcrypt
 
+import chamber_users_query
+from audit_log import AuditLogger, sqlalchemy_writer
+
 # 配置日志
 logger = logging.getLogger(__name__)
 
@@ -40,29 +45,50 @@ class PermissionChecker:
     
     @staticmethod
     def get_current_user():
-        """获取当前登录用户"""
+        """
+        获取当前登录用户（id/用户名/层级/地区/角色等，不含密码）
+        同一请求内只查询一次（flask.g）；跨请求在 CHAMBER_USER_CONTEXT_TTL 秒内复用
+        """
         user_id = session.get('user_id')
         if not user_id:
             return None
         
-        try:
-            db = get_db()
-            if not db:
+        current = g.get('chamber_current_user')
+        if current is not None and current.get('id') == user_id:
+            return current
+        
+        user = chamber_users_query.user_context_cache.get(user_id)
+        if user is None:
+            try:
+                db = get_db()
+                if not db:
+                    return None
+                
+                # 使用原生 SQL 查询
+                from sqlalchemy import text
+                result = db.session.execute(
+                    text(chamber_users_query.USER_CONTEXT_SQL),
+                    {'id': user_id}
+                ).fetchone()
+                
+                if not result:
+                    return None
+                user = dict(result._mapping) if hasattr(result, '_mapping') else dict(result)
+                chamber_users_query.user_context_cache.put(user_id, user)
+            except Exception as e:
+                logger.error(f"获取当前用户失败: {e}")
                 return None
-            
-            # 使用原生 SQL 查询
-            from sqlalchemy import text
-            result = db.session.execute(
-                text('SELECT * FROM chamber_users WHERE id = :id'),
-                {'id': user_id}
-            ).fetchone()
-            
-            if result:
-                return dict(result._mapping) if hasattr(result, '_mapping') else dict(result)
-            return None
-        except Exception as e:
-            logger.error(f"获取当前用户失败: {e}")
-            return None
+        
+        g.chamber_current_user = user
+        return user
+    
+    @staticmethod
+    def invalidate_user(user_id):
+        """用户被修改/删除：清除其上下文缓存"""
+        chamber_users_query.user_context_cache.invalidate(user_id)
+        current = g.get('chamber_current_user')
+        if current is not None and current.get('id') == user_id:
+            g.pop('chamber_current_user', None)
     
     @staticmethod
     def can_view_user(current_user, target_user):
@@ -170,33 +196,40 @@ class PermissionChecker:
 # 日志记录函数
 # ============================================================================
 
-def log_operation(operator_id, target_user_id, action, old_value=None, new_value=None):
-    """记录用户操作日志"""
+_audit_logger = None
+_audit_logger_lock = threading.Lock()
+
+
+def get_audit_logger():
+    """审计日志后台写入器（首次使用时绑定当前数据库引擎）"""
+    global _audit_logger
+    if _audit_logger is None:
+        with _audit_logger_lock:
+            if _audit_logger is None:
+                db = get_db()
+                if not db:
+                    return None
+                _audit_logger = AuditLogger(sqlalchemy_writer(db.engine))
+                atexit.register(_audit_logger.close)
+    return _audit_logger
+
+
+def log_operation(operator_id, target_user_id, action, old_value=None, new_value=None, target_deleted=False):
+    """
+    记录用户操作日志（写入 chamber_user_logs 与 audit_logs）
+    只入队不等待数据库，由 audit_log.AuditLogger 在后台批量写入
+    """
     try:
-        db = get_db()
-        if not db:
+        audit = get_audit_logger()
+        if not audit:
             return False
         
-        from sqlalchemy import text
-        
-        log_id = str(uuid.uuid4())
-        
-        db.session.execute(
-            text('''
-                INSERT INTO chamber_user_logs 
-                (id, operator_id, target_user_id, action, old_value, new_value)
-                VALUES (:id, :operator_id, :target_user_id, :action, :old_value, :new_value)
-            '''),
-            {
-                'id': log_id,
-                'operator_id': operator_id,
-                'target_user_id': target_user_id,
-                'action': action,
-                'old_value': json.dumps(old_value, ensure_ascii=False) if old_value else None,
-                'new_value': json.dumps(new_value, ensure_ascii=False) if new_value else None
-            }
-        )
-        db.session.commit()
+        if has_request_context():
+            ip, ua = request.remote_addr, request.headers.get('User-Agent')
+        else:
+            ip, ua = None, None
+        audit.log_user_operation(operator_id, target_user_id, action, old_value, new_value, ip, ua,
+                                 target_deleted=target_deleted)
         return True
     except Exception as e:
         logger.error(f"记录操作日志失败: {e}")
@@ -237,88 +270,94 @@ def require_chamber_admin(f):
 @require_login
 @require_chamber_admin
 def list_users():
-    """获取用户列表（支持分页和筛选）"""
+    """
+    获取用户列表（支持分页和筛选）
+
+    分页方式:
+    - 游标分页（推荐）：传 cursor 参数（首页传空字符串），响应中的 next_cursor 用于取下一页
+    - 页码分页（兼容）：page / page_size，深分页时较慢
+    total 为按权限范围与筛选条件缓存的总数（CHAMBER_USER_COUNT_TTL 秒内可能略有滞后）
+    """
     try:
         current_user = PermissionChecker.get_current_user()
         
         # 获取查询参数
-        page = request.args.get('page', 1, type=int)
-        page_size = request.args.get('page_size', 10, type=int)
-        level = request.args.get('level', '')
-        region = request.args.get('region', '')
-        role = request.args.get('role', '')
-        status = request.args.get('status', '')
-        keyword = request.args.get('keyword', '')
+        page = max(request.args.get('page', 1, type=int), 1)
+        page_size = min(max(request.args.get('page_size', 10, type=int), 1), 100)
+        cursor = request.args.get('cursor')
+        filters = {
+            'level': request.args.get('level', ''),
+            'region': request.args.get('region', ''),
+            'role': request.args.get('role', ''),
+            'status': request.args.get('status', ''),
+            'keyword': request.args.get('keyword', ''),
+        }
         
         db = get_db()
         if not db:
             return jsonify({'code': 500, 'message': '数据库连接失败'}), 500
         
         from sqlalchemy import text
-        
-        # 构建查询条件
-        conditions = []
-        params = {}
-        
-        # 权限检查：只能看到自己权限范围内的用户
-        if current_user.get('level') == 'national':
-            pass  # 全联可以看所有
-        elif current_user.get('level') == 'province':
-            conditions.append('(level IN ("county", "province") AND region = :region)')
-            params['region'] = current_user.get('region')
-        elif current_user.get('level') == 'county':
-            conditions.append('(level = "county" AND region = :region)')
-            params['region'] = current_user.get('region')
-        
-        # 其他筛选条件
-        if level:
-            conditions.append('level = :level')
-            params['level'] = level
-        
-        if region:
-            conditions.append('region = :region')
-            params['region'] = region
-        
-        if role:
-            conditions.append('role = :role')
-            params['role'] = role
-        
-        if status:
-            conditions.append('status = :status')
-            params['status'] = status
-        
-        if keyword:
-            conditions.append('(username LIKE :keyword OR real_name LIKE :keyword OR email LIKE :keyword)')
-            params['keyword'] = f'%{keyword}%'
-        
-        where_clause = ' AND '.join(conditions) if conditions else '1=1'
-        
-        # 获取总数
-        count_sql = f'SELECT COUNT(*) as total FROM chamber_users WHERE {where_clause}'
-        count_result = db.session.execute(text(count_sql), params).fetchone()
-        total = dict(count_result._mapping)['total'] if count_result else 0
-        
-        # 获取分页数据
-        offset = (page - 1) * page_size
-        data_sql = f'''
-            SELECT id, username, email, real_name, phone, level, region, role, 
-                   review_level, department, position, status, created_at, updated_at
-            FROM chamber_users 
-            WHERE {where_clause}
-            ORDER BY created_at DESC
-            LIMIT :offset, :limit
-        '''
-        params['offset'] = offset
-        params['limit'] = page_size
-        
-        results = db.session.execute(text(data_sql), params).fetchall()
-        users = [dict(row._mapping) for row in results]
+
+        keyset = None
+        if cursor:
+            try:
+                keyset = chamber_users_query.keyset_condition(cursor)
+            except ValueError as e:
+                return jsonify({'code': 400, 'message': str(e)}), 400
+
+        def run(fulltext_retry=True):
+            # 构建查询条件：权限范围 + 筛选（只能看到自己权限范围内的用户）
+            conditions, params = chamber_users_query.filter_conditions(current_user, filters)
+            where = chamber_users_query.where_clause(conditions)
+            try:
+                # 获取总数（缓存）
+                total = chamber_users_query.count_cache.get(
+                    chamber_users_query.CountCache.key(conditions, params),
+                    lambda: db.session.execute(
+                        text(f'SELECT COUNT(*) AS total FROM chamber_users WHERE {where}'), params
+                    ).scalar() or 0
+                )
+
+                page_conditions, page_params = list(conditions), dict(params)
+                if keyset:
+                    page_conditions.append(keyset[0])
+                    page_params.update(keyset[1])
+                data_sql = f'''
+                    SELECT id, username, email, real_name, phone, level, region, role, 
+                           review_level, department, position, status, created_at, updated_at
+                    FROM chamber_users 
+                    WHERE {chamber_users_query.where_clause(page_conditions)}
+                    ORDER BY created_at DESC, id DESC
+                    LIMIT :offset, :limit
+                '''
+                # 多取一行判断是否还有下一页
+                page_params['offset'] = 0 if cursor is not None else (page - 1) * page_size
+                page_params['limit'] = page_size + 1
+                rows = db.session.execute(text(data_sql), page_params).fetchall()
+                return total, [dict(row._mapping) for row in rows]
+            except Exception as e:
+                if fulltext_retry and chamber_users_query.fulltext_enabled() and 'MATCH(' in where:
+                    # 全文索引尚未创建：回退到 LIKE 搜索
+                    logger.warning(f"用户全文检索不可用，改用 LIKE: {e}")
+                    db.session.rollback()
+                    chamber_users_query.disable_fulltext()
+                    return run(fulltext_retry=False)
+                raise
+
+        total, users = run()
+
+        has_more = len(users) > page_size
+        users = users[:page_size]
+        next_cursor = None
+        if has_more and users:
+            next_cursor = chamber_users_query.encode_cursor(users[-1]['created_at'], users[-1]['id'])
         
         # 转换时间格式
         for user in users:
-            if user.get('created_at'):
+            if hasattr(user.get('created_at'), 'isoformat'):
                 user['created_at'] = user['created_at'].isoformat()
-            if user.get('updated_at'):
+            if hasattr(user.get('updated_at'), 'isoformat'):
                 user['updated_at'] = user['updated_at'].isoformat()
         
         return jsonify({
@@ -329,7 +368,9 @@ def list_users():
                 'total': total,
                 'page': page,
                 'page_size': page_size,
-                'total_pages': (total + page_size - 1) // page_size
+                'total_pages': (total + page_size - 1) // page_size,
+                'has_more': has_more,
+                'next_cursor': next_cursor
             }
         })
     
@@ -451,6 +492,9 @@ def create_user():
         )
         db.session.commit()
         
+        # 用户数变化：总数缓存失效
+        chamber_users_query.count_cache.invalidate()
+        
         # 记录日志
         log_operation(current_user['id'], user_id, 'create', None, data)
         
@@ -519,6 +563,10 @@ def update_user(user_id):
         db.session.execute(text(update_sql), params)
         db.session.commit()
         
+        # 用户数变化：总数缓存失效；被修改用户的上下文缓存失效
+        chamber_users_query.count_cache.invalidate()
+        PermissionChecker.invalidate_user(user_id)
+        
         # 记录日志
         old_value = {k: target_user.get(k) for k in allowed_fields}
         new_value = {k: data.get(k) for k in allowed_fields if k in data}
@@ -570,8 +618,12 @@ def delete_user(user_id):
         )
         db.session.commit()
         
+        # 用户数变化：总数缓存失效；被删除用户的上下文缓存失效
+        chamber_users_query.count_cache.invalidate()
+        PermissionChecker.invalidate_user(user_id)
+        
         # 记录日志
-        log_operation(current_user['id'], user_id, 'delete', target_user, None)
+        log_operation(current_user['id'], user_id, 'delete', target_user, None, target_deleted=True)
         
         return jsonify({
             'code': 200,
@@ -587,7 +639,12 @@ def delete_user(user_id):
 @require_login
 @require_chamber_admin
 def export_users():
-    """导出用户列表为 Excel"""
+    """
+    导出用户列表（流式，见 chamber_users_export）
+
+    查询参数:
+    - format: xlsx（默认）/ csv / parquet
+    """
     try:
         current_user = PermissionChecker.get_current_user()
         
@@ -596,98 +653,64 @@ def export_users():
             return jsonify({'code': 500, 'message': '数据库连接失败'}), 500
         
         from sqlalchemy import text
-        from openpyxl import Workbook
-        from openpyxl.styles import Font, PatternFill, Alignment
-        from io import BytesIO
-        
-        # 构建查询条件（同列表接口）
-        conditions = []
-        params = {}
-        
-        if current_user.get('level') == 'national':
-            pass
-        elif current_user.get('level') == 'province':
-            conditions.append('(level IN ("county", "province") AND region = :region)')
-            params['region'] = current_user.get('region')
-        elif current_user.get('level') == 'county':
-            conditions.append('(level = "county" AND region = :region)')
-            params['region'] = current_user.get('region')
+        from flask import Response, send_file, stream_with_context
+        import tempfile
+        import chamber_users_export as exporter
+
+        try:
+            fmt = exporter.check_format(request.args.get('format'))
+        except exporter.ExportFormatError as e:
+            return jsonify({'code': 400, 'message': str(e)}), 400
         
+        # 构建查询条件（权限范围同列表接口）
+        conditions, params = chamber_users_query.scope_conditions(current_user)
         where_clause = ' AND '.join(conditions) if conditions else '1=1'
         
-        # 获取数据
+        # 服务端游标按块读取，不一次性 fetchall
         sql = f'''
             SELECT id, username, email, real_name, phone, level, region, role, 
                    review_level, department, position, status, created_at
             FROM chamber_users 
             WHERE {where_clause}
-            ORDER BY created_at DESC
+            ORDER BY created_at DESC, id DESC
         '''
-        
-        results = db.session.execute(text(sql), params).fetchall()
-        
-        # 创建 Excel
-        wb = Workbook()
-        ws = wb.active
-        ws.title = '工商联用户'
-        
-        # 设置表头
-        headers = ['用户ID', '用户名', '邮箱', '真实姓名', '手机号', '层级', '地区', '角色', 
-                   '审核权限', '部门', '职位', '状态', '创建时间']
-        ws.append(headers)
-        
-        # 设置表头样式
-        header_fill = PatternFill(start_color='4472C4', end_color='4472C4', fill_type='solid')
-        header_font = Font(bold=True, color='FFFFFF')
-        
-        for cell in ws[1]:
-            cell.fill = header_fill
-            cell.font = header_font
-            cell.alignment = Alignment(horizontal='center', vertical='center')
-        
-        # 添加数据
-        for row in results:
-            row_dict = dict(row._mapping)
-            ws.append([
-                row_dict['id'],
-                row_dict['username'],
-                row_dict['email'],
-                row_dict['real_name'],
-                row_dict['phone'],
-                row_dict['level'],
-                row_dict['region'],
-                row_dict['role'],
-                row_dict['review_level'],
-                row_dict['department'],
-                row_dict['position'],
-                row_dict['status'],
-                row_dict['created_at'].isoformat() if row_dict['created_at'] else ''
-            ])
-        
-        # 调整列宽
-        for column in ws.columns:
-            max_length = 0
-            column_letter = column[0].column_letter
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = min(max_length + 2, 50)
-            ws.column_dimensions[column_letter].width = adjusted_width
-        
-        # 保存到内存
-        output = BytesIO()
-        wb.save(output)
-        output.seek(0)
-        
-        from flask import send_file
+        result = db.session.execute(
+            text(sql), params,
+            execution_options={'stream_results': True, 'yield_per': exporter.DEFAULT_CHUNK_SIZE}
+        )
+        chunks = exporter.iter_chunks(result)
+
+        mimetype, ext = exporter.EXPORT_FORMATS[fmt]
+        download_name = f'工商联用户_{datetime.now().strftime("%Y%m%d_%H%M%S")}.{ext}'
+
+        if fmt == 'csv':
+            # 边查边写，分块响应
+            from urllib.parse import quote
+            response = Response(stream_with_context(exporter.iter_csv(chunks)), mimetype=mimetype)
+            response.headers['Content-Disposition'] = (
+                f"attachment; filename=users.{ext}; filename*=UTF-8''{quote(download_name)}"
+            )
+            return response
+
+        # Excel / Parquet 需要完整文件结构：写入临时文件后分块发送（关闭响应时删除）
+        output = tempfile.TemporaryFile()
+        try:
+            if fmt == 'parquet':
+                exporter.write_parquet(chunks, output)
+            else:
+                exporter.write_xlsx(chunks, output)
+            output.seek(0)
+        except Exception:
+            output.close()
+            raise
+        finally:
+            result.close()
+
         return send_file(
             output,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+            mimetype=mimetype,
             as_attachment=True,
-            download_name=f'工商联用户_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx'
+            download_name=download_name
         )
     
     except Exception as e:
@@ -695,6 +718,15 @@ def export_users():
         return jsonify({'code': 500, 'message': f'导出失败: {str(e)}'}), 500
 
 
+@chamber_users_bp.route('/audit/metrics', methods=['GET'])
+@require_login
+@require_chamber_admin
+def audit_metrics():
+    """审计日志写入器指标：队列深度、写入/溢出条数、批量写入耗时"""
+    audit = get_audit_logger()
+    return jsonify({'code': 200, 'message': '获取成功', 'data': audit.metrics() if audit else None})
+
+
 @chamber_users_bp.route('/logs', methods=['GET'])
 @require_login
 @require_chamber_admin
@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+"""
+工商联用户列表查询构建
+供 chamber_users_management 的列表/导出接口使用：
+- 权限范围与筛选条件（参数名互不覆盖）
+- 关键词搜索：用户名/真实姓名走 FULLTEXT(ngram) 索引，含 @ 的关键词按邮箱前缀匹配，
+  单字关键词（短于 ngram_token_size）退回 LIKE；索引缺失时自动退回 LIKE（见 db/015_chamber_users.sql）
+- 游标（keyset）分页：按 (created_at, id) 倒序，游标为上一页最后一行的 (created_at, id)
+- 总数缓存：按权限范围 + 筛选条件缓存 COUNT(*)，TTL 内复用，用户增删改时失效
+- 当前用户上下文缓存：登录管理员的层级/地区/角色跨请求缓存（TTL），用户被修改/删除时失效
+"""
+import base64
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+
+# MySQL ngram 全文解析器的默认分词长度（ngram_token_size）
+NGRAM_TOKEN_SIZE = 2
+
+# 全文索引可用性：首次查询失败（索引未创建）后改用 LIKE
+_fulltext = {'enabled': os.environ.get('CHAMBER_USER_SEARCH', 'fulltext') == 'fulltext'}
+
+
+def fulltext_enabled() -> bool:
+    return _fulltext['enabled']
+
+
+def disable_fulltext():
+    _fulltext['enabled'] = False
+
+
+# 各层级管理员可见范围的 SQL 片段（全联不限制；未知层级按最严格的县市级处理）
+SCOPE_FRAGMENTS = {
+    'national': None,
+    'province': "(level IN ('county', 'province') AND region = :scope_region)",
+    'county': "(level = 'county' AND region = :scope_region)",
+}
+
+
+def scope_conditions(current_user: Dict) -> Tuple[List[str], Dict]:
+    """当前管理员可见的用户范围"""
+    level = current_user.get('level')
+    fragment = SCOPE_FRAGMENTS.get(level, SCOPE_FRAGMENTS['county'])
+    if fragment is None:
+        return [], {}
+    return [fragment], {'scope_region': current_user.get('region')}
+
+
+def _like_escape(keyword: str) -> str:
+    return keyword.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def search_condition(keyword: str, fulltext: Optional[bool] = None) -> Tuple[str, Dict]:
+    """关键词搜索条件"""
+    keyword = keyword.strip()
+    if fulltext is None:
+        fulltext = fulltext_enabled()
+    if '@' in keyword:
+        # 邮箱前缀匹配（走 email 唯一索引）
+        return 'email LIKE :kw_prefix', {'kw_prefix': _like_escape(keyword) + '%'}
+    phrase = keyword.replace('"', ' ').strip()
+    if fulltext and len(phrase) >= NGRAM_TOKEN_SIZE:
+        # 短语检索：连续的 n-gram 序列，相当于子串匹配
+        return ('MATCH(username, real_name) AGAINST (:kw_phrase IN BOOLEAN MODE)',
+                {'kw_phrase': f'"{phrase}"'})
+    return ('(username LIKE :keyword OR real_name LIKE :keyword OR email LIKE :keyword)',
+            {'keyword': f'%{_like_escape(keyword)}%'})
+
+
+def filter_conditions(current_user: Dict, filters: Dict) -> Tuple[List[str], Dict]:
+    """
+    权限范围 + 列表筛选条件
+
+    Args:
+        filters: level / region / role / status / keyword（空值忽略）
+    """
+    conditions, params = scope_conditions(current_user)
+    for field in ('level', 'region', 'role', 'status'):
+        if filters.get(field):
+            conditions.append(f'{field} = :{field}')
+            params[field] = filters[field]
+    if filters.get('keyword', '').strip():
+        condition, search_params = search_condition(filters['keyword'])
+        conditions.append(condition)
+        params.update(search_params)
+    return conditions, params
+
+
+def where_clause(conditions: List[str]) -> str:
+    return ' AND '.join(conditions) if conditions else '1=1'
+
+
+# ----------------------------------------------------------------------
+# 游标分页
+# ----------------------------------------------------------------------
+
+def encode_cursor(created_at, user_id: str) -> str:
+    if hasattr(created_at, 'isoformat'):
+        created_at = created_at.isoformat(sep=' ')
+    raw = json.dumps([created_at, user_id], ensure_ascii=False).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    """解析游标，格式错误时抛出 ValueError"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        created_at, user_id = json.loads(raw.decode('utf-8'))
+    except Exception:
+        raise ValueError('无效的分页游标')
+    if not isinstance(created_at, str) or not isinstance(user_id, str):
+        raise ValueError('无效的分页游标')
+    return created_at, user_id
+
+
+def keyset_condition(cursor: str) -> Tuple[str, Dict]:
+    """(created_at, id) 倒序下“在游标之后”的条件"""
+    created_at, user_id = decode_cursor(cursor)
+    return ('(created_at < :cursor_at OR (created_at = :cursor_at AND id < :cursor_id))',
+            {'cursor_at': created_at, 'cursor_id': user_id})
+
+
+# ----------------------------------------------------------------------
+# 总数缓存
+# ----------------------------------------------------------------------
+
+class CountCache:
+    """按查询签名缓存 COUNT(*)（进程内，TTL + 代际失效）"""
+
+    def __init__(self, ttl: float = 60.0, max_entries: int = 1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: Dict[Hashable, Tuple[int, float, int]] = {}
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(conditions: List[str], params: Dict) -> Hashable:
+        return (tuple(conditions), tuple(sorted((k, str(v)) for k, v in params.items())))
+
+    def get(self, key: Hashable, loader: Callable[[], int]) -> int:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] == self.generation and entry[1] > now:
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+            generation = self.generation
+        total = loader()
+        with self._lock:
+            if generation == self.generation:
+                if len(self._entries) >= self.max_entries:
+                    self._entries.clear()
+                self._entries[key] = (total, now + self.ttl, generation)
+        return total
+
+    def invalidate(self):
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+
+
+# ----------------------------------------------------------------------
+# 当前用户上下文缓存
+# ----------------------------------------------------------------------
+
+# 权限判断所需的用户字段（不含密码哈希）
+USER_CONTEXT_SQL = ('SELECT id, username, real_name, level, region, role, review_level, status '
+                    'FROM chamber_users WHERE id = :id')
+
+
+class UserContextCache:
+    """登录用户上下文的跨请求缓存（进程内，TTL；修改/删除用户时按ID失效）"""
+
+    def __init__(self, ttl: float = 30.0, max_entries: int = 4096):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Tuple[Dict, float]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id: str) -> Optional[Dict]:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[1] > time.monotonic():
+                self.hits += 1
+                return dict(entry[0])
+            self.misses += 1
+            return None
+
+    def put(self, user_id: str, user: Dict):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                self._entries.clear()
+            self._entries[user_id] = (dict(user), time.monotonic() + self.ttl)
+
+    def invalidate(self, user_id: Optional[str] = None):
+        with self._lock:
+            if user_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(user_id, None)
+
+
+def _env_ttl(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+# 进程级单例
+count_cache = CountCache(ttl=_env_ttl('CHAMBER_USER_COUNT_TTL', 60.0))
+user_context_cache = UserContextCache(ttl=_env_ttl('CHAMBER_USER_CONTEXT_TTL', 30.0))
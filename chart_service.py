@@ -0,0 +1,347 @@
+# -*- coding: utf-8 -*-
+"""
+报告图表服务
+各报告生成器（Word/PDF）的统计图统一由这里绘制：
+- 基于 matplotlib 面向对象接口（Figure + FigureCanvasAgg），不使用 pyplot 全局状态，
+  多线程/多进程渲染互不干扰
+- 图片直接渲染到内存（PNG 字节），调用方拿到 BytesIO 交给 python-docx 的
+  add_picture 或 reportlab 的 Image，不再在当前目录写临时文件
+- 按“图表类型 + 数据 + 样式”的哈希缓存 PNG，相同输入（如同一企业重复生成
+  Word/专业版报告、批量报告中得分相同的维度图）不再重复绘制
+- 每种图表的画布尺寸、坐标系等在 CHART_TEMPLATES 中预先配置，中文字体在模块加载时设置一次
+"""
+import hashlib
+import io
+import json
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import matplotlib
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+# 中文字体（与各报告生成器原设置一致）
+matplotlib.rcParams['font.sans-serif'] = ['Microsoft YaHei', 'SimHei']
+matplotlib.rcParams['axes.unicode_minus'] = False
+
+# 默认输出分辨率
+DEFAULT_DPI = 150
+
+# 内存中最多缓存的图片数
+DEFAULT_MAX_ENTRIES = 256
+
+# 风险等级顺序与颜色（风险分布饼图）
+RISK_ORDER = ['低风险', '较低风险', '中等风险', '较高风险', '高风险']
+RISK_COLORS = {
+    '低风险': '#2E7D32',
+    '较低风险': '#66BB6A',
+    '中等风险': '#FDD835',
+    '较高风险': '#FF9800',
+    '高风险': '#E53935'
+}
+
+
+# ----------------------------------------------------------------------
+# 各类图表的绘制函数：draw(fig, data, style)
+# ----------------------------------------------------------------------
+
+def _percentage_color(p):
+    if p >= 80:
+        return '#2E7D32'  # 深绿色
+    elif p >= 70:
+        return '#66BB6A'  # 浅绿色
+    elif p >= 60:
+        return '#FFA726'  # 橙色
+    return '#EF5350'  # 红色
+
+
+def _draw_dimension_bar(fig, data, style):
+    """各维度建设水平柱状图（专业版报告）"""
+    names = data['names']
+    percentages = data['percentages']
+    ax = fig.add_subplot(111)
+
+    bars = ax.bar(range(len(names)), percentages, color=[_percentage_color(p) for p in percentages],
+                  alpha=0.8, edgecolor='black', linewidth=1.2)
+
+    # 添加数值标签
+    for bar, p in zip(bars, percentages):
+        ax.text(bar.get_x() + bar.get_width() / 2., bar.get_height() + 1, f'{p:.1f}%',
+                ha='center', va='bottom', fontsize=10, fontweight='bold')
+
+    ax.set_title(style.get('title', '企业现代制度建设各维度评分对比'), fontsize=16, fontweight='bold', pad=20)
+    ax.set_xlabel('评价维度', fontsize=12, fontweight='bold')
+    ax.set_ylabel('建设水平（%）', fontsize=12, fontweight='bold')
+    ax.set_xticks(range(len(names)))
+    ax.set_xticklabels(names, rotation=45, ha='right', fontsize=10)
+    ax.grid(axis='y', alpha=0.3, linestyle='--')
+
+    # 参考线
+    ax.axhline(y=80, color='green', linestyle='--', alpha=0.5, label='良好水平(80%)')
+    ax.axhline(y=60, color='orange', linestyle='--', alpha=0.5, label='合格水平(60%)')
+
+    ax.legend(loc='upper right', fontsize=10)
+    ax.set_ylim(0, 105)
+    fig.tight_layout()
+
+
+def _draw_dimension_radar(fig, data, style):
+    """各维度建设水平雷达图（专业版报告，含优秀水平参考线）"""
+    categories = data['categories']
+    values = data['values'] + data['values'][:1]
+    angles = [n / float(len(categories)) * 2 * 3.14159 for n in range(len(categories))]
+    angles += angles[:1]
+
+    ax = fig.add_subplot(111, projection='polar')
+    ax.plot(angles, values, 'o-', linewidth=2, color='#1976D2', label='当前水平')
+    ax.fill(angles, values, alpha=0.25, color='#1976D2')
+
+    # 参考线（理想水平）
+    ax.plot(angles, [90] * len(angles), '--', linewidth=1.5, color='#4CAF50', alpha=0.6, label='优秀水平(90%)')
+
+    ax.set_xticks(angles[:-1])
+    ax.set_xticklabels(categories, fontsize=11)
+    ax.set_ylim(0, 100)
+    ax.set_yticks([20, 40, 60, 80, 100])
+    ax.set_yticklabels(['20%', '40%', '60%', '80%', '100%'], fontsize=9)
+    ax.grid(True, linestyle='--', alpha=0.7)
+
+    ax.set_title(style.get('title', '企业现代制度建设雷达图'), fontsize=16, fontweight='bold', pad=30)
+    ax.legend(loc='upper right', bbox_to_anchor=(1.3, 1.1), fontsize=10)
+    fig.tight_layout()
+
+
+def _draw_risk_pie(fig, data, style):
+    """风险分布饼图"""
+    sizes = data['sizes']
+    ax = fig.add_subplot(111)
+    _, _, autotexts = ax.pie(sizes, labels=data['labels'], colors=data['colors'],
+                             autopct='%1.1f%%', startangle=90,
+                             textprops={'fontsize': 11},
+                             explode=[0.05] * len(sizes))  # 稍微分离各扇区
+    for autotext in autotexts:
+        autotext.set_color('white')
+        autotext.set_fontweight('bold')
+        autotext.set_fontsize(12)
+
+    ax.set_title(style.get('title', '企业制度建设风险分布'), fontsize=16, fontweight='bold', pad=20)
+    fig.tight_layout()
+
+
+def _draw_score_radar(fig, data, style):
+    """单个企业各维度得分雷达图（Word/PDF 自评报告）"""
+    categories = data['categories']
+    values = data['values'] + data['values'][:1]
+    angles = [n / float(len(categories)) * 2 * 3.14159 for n in range(len(categories))]
+    angles += angles[:1]
+
+    ax = fig.add_subplot(111, projection='polar')
+    ax.plot(angles, values, 'o-', linewidth=2, label=style.get('label'))
+    ax.fill(angles, values, alpha=0.25)
+    ax.set_xticks(angles[:-1])
+    ax.set_xticklabels(categories, size=10)
+    ax.set_ylim(0, 100)
+    ax.set_yticks([20, 40, 60, 80, 100])
+    ax.set_yticklabels(['20%', '40%', '60%', '80%', '100%'])
+    ax.grid(True)
+
+    ax.set_title(style.get('title', ''), size=14, pad=20)
+    ax.legend(loc='upper right', bbox_to_anchor=(1.3, 1.1))
+
+
+def _draw_average_radar(fig, data, style):
+    """多企业各维度平均得分率雷达图（综合分析报告）"""
+    categories = data['categories']
+    values = data['values'] + data['values'][:1]
+    angles = [n / float(len(categories)) * 2 * np.pi for n in range(len(categories))]
+    angles = angles + [angles[0]]
+
+    ax = fig.add_subplot(111, projection='polar')
+    ax.plot(angles, values, 'o-', linewidth=2, label='平均水平', color='#2E5090')
+    ax.fill(angles, values, alpha=0.25, color='#2E5090')
+    ax.set_xticks(angles[:-1])
+    ax.set_xticklabels(categories, size=12)
+    ax.set_ylim(0, 100)
+    ax.set_yticks([20, 40, 60, 80, 100])
+    ax.set_yticklabels(['20%', '40%', '60%', '80%', '100%'])
+    ax.grid(True)
+
+    ax.set_title(style.get('title', '各维度平均得分率'), size=16, pad=20, fontweight='bold')
+
+
+def _draw_score_distribution(fig, data, style):
+    """企业得分等级分布柱状图（总体报告）"""
+    labels = ['E级\n(<60%)', 'D级\n(60-70%)', 'C级\n(70-80%)', 'B级\n(80-90%)', 'A级\n(>=90%)']
+    ax = fig.add_subplot(111)
+
+    x = range(len(labels))
+    bars = ax.bar(x, data['counts'], color=['#d62728', '#ff7f0e', '#ffbb00', '#2ca02c', '#1f77b4'])
+
+    ax.set_xlabel('评价等级', fontsize=12)
+    ax.set_ylabel('企业数量', fontsize=12)
+    ax.set_title(style.get('title', '企业得分分布'), fontsize=14, fontweight='bold')
+    ax.set_xticks(x)
+    ax.set_xticklabels(labels)
+
+    for bar in bars:
+        height = bar.get_height()
+        if height > 0:
+            ax.text(bar.get_x() + bar.get_width() / 2., height, f'{int(height)}家',
+                    ha='center', va='bottom', fontsize=10)
+    fig.tight_layout()
+
+
+def _draw_dimension_average_bar(fig, data, style):
+    """各维度平均得分对比柱状图（总体报告）"""
+    dimensions = data['dimensions']
+    avg_scores = data['avg_scores']
+    ax = fig.add_subplot(111)
+
+    x = range(len(dimensions))
+    bars = ax.bar(x, avg_scores, color='steelblue')
+
+    ax.set_xlabel('维度', fontsize=12)
+    ax.set_ylabel('平均得分率 (%)', fontsize=12)
+    ax.set_title(style.get('title', '各维度平均得分对比'), fontsize=14, fontweight='bold')
+    ax.set_xticks(x)
+    ax.set_xticklabels(dimensions, rotation=15, ha='right')
+    ax.set_ylim(0, 100)
+
+    # 平均线
+    overall_avg = np.mean(avg_scores)
+    ax.axhline(y=overall_avg, color='r', linestyle='--', label=f'总体平均: {overall_avg:.2f}%')
+
+    for bar in bars:
+        height = bar.get_height()
+        ax.text(bar.get_x() + bar.get_width() / 2., height, f'{height:.1f}%',
+                ha='center', va='bottom', fontsize=9)
+
+    ax.legend()
+    fig.tight_layout()
+
+
+# 图表模板：类型 -> 画布尺寸（英寸）与绘制函数
+CHART_TEMPLATES: Dict[str, Dict] = {
+    'dimension_bar': {'figsize': (12, 6), 'draw': _draw_dimension_bar},
+    'dimension_radar': {'figsize': (8, 8), 'draw': _draw_dimension_radar},
+    'risk_pie': {'figsize': (9, 7), 'draw': _draw_risk_pie},
+    'score_radar': {'figsize': (8, 8), 'draw': _draw_score_radar},
+    'average_radar': {'figsize': (10, 10), 'draw': _draw_average_radar},
+    'score_distribution': {'figsize': (10, 6), 'draw': _draw_score_distribution},
+    'dimension_average_bar': {'figsize': (12, 6), 'draw': _draw_dimension_average_bar},
+}
+
+
+def _to_plain(value):
+    """numpy 数值等转为可 JSON 序列化的 Python 类型（用于计算缓存键）"""
+    if hasattr(value, 'item'):
+        return value.item()
+    return str(value)
+
+
+class ChartService:
+    """图表渲染服务：渲染到内存 PNG，并按输入哈希缓存（LRU）"""
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, dpi: int = DEFAULT_DPI):
+        self.max_entries = max_entries
+        self.dpi = dpi
+        self._cache: 'OrderedDict[str, bytes]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def cache_key(self, kind: str, data: Dict, style: Optional[Dict] = None) -> str:
+        payload = json.dumps({'kind': kind, 'data': data, 'style': style or {}, 'dpi': self.dpi},
+                             sort_keys=True, ensure_ascii=False, default=_to_plain)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def render_png(self, kind: str, data: Dict, style: Optional[Dict] = None) -> bytes:
+        """
+        渲染图表，返回 PNG 字节
+
+        Args:
+            kind: 图表类型（CHART_TEMPLATES 中的键）
+            data: 图表数据
+            style: 样式参数（标题、图例标签等）
+        """
+        if kind not in CHART_TEMPLATES:
+            raise ValueError(f'未知的图表类型: {kind}')
+        key = self.cache_key(kind, data, style)
+        with self._lock:
+            png = self._cache.get(key)
+            if png is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return png
+            self.misses += 1
+
+        template = CHART_TEMPLATES[kind]
+        fig = Figure(figsize=template['figsize'])
+        FigureCanvasAgg(fig)
+        template['draw'](fig, data, style or {})
+        buf = io.BytesIO()
+        fig.savefig(buf, format='png', dpi=self.dpi, bbox_inches='tight')
+        png = buf.getvalue()
+
+        if self.max_entries > 0:
+            with self._lock:
+                self._cache[key] = png
+                self._cache.move_to_end(key)
+                while len(self._cache) > self.max_entries:
+                    self._cache.popitem(last=False)
+        return png
+
+    def render(self, kind: str, data: Dict, style: Optional[Dict] = None) -> io.BytesIO:
+        """渲染图表，返回可直接交给 add_picture / reportlab Image 的 BytesIO"""
+        return io.BytesIO(self.render_png(kind, data, style))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+_default_service: Optional[ChartService] = None
+
+
+def default_chart_service() -> ChartService:
+    """进程内共享的图表服务"""
+    global _default_service
+    if _default_service is None:
+        _default_service = ChartService()
+    return _default_service
+
+
+# ----------------------------------------------------------------------
+# 报告中常用图表的数据整理
+# ----------------------------------------------------------------------
+
+def risk_pie_data(risk_levels) -> Optional[Dict]:
+    """按风险等级统计维度数量，生成饼图数据；没有可统计的维度时返回 None"""
+    risk_counts = {}
+    for risk in risk_levels:
+        risk_counts[risk] = risk_counts.get(risk, 0) + 1
+
+    data = {'labels': [], 'sizes': [], 'colors': []}
+    for risk in RISK_ORDER:
+        if risk in risk_counts:
+            data['labels'].append(f'{risk}\n({risk_counts[risk]}个维度)')
+            data['sizes'].append(risk_counts[risk])
+            data['colors'].append(RISK_COLORS[risk])
+    return data if data['sizes'] else None
+
+
+def score_radar(score_summary: Dict, enterprise_name: str, service: Optional[ChartService] = None) -> Optional[io.BytesIO]:
+    """单个企业各维度得分雷达图；没有维度得分时返回 None"""
+    level1_scores = score_summary.get('score_by_level1') or {}
+    if not level1_scores:
+        return None
+    categories = list(level1_scores.keys())
+    return (service or default_chart_service()).render(
+        'score_radar',
+        {'categories': categories, 'values': [level1_scores[c]['percentage'] for c in categories]},
+        {'label': enterprise_name, 'title': f'{enterprise_name} - 各维度得分雷达图'}
+    )
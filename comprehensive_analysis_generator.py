@@ -10,18 +10,12 @@ from docx import Document
 from docx.shared import Pt, Inches, RGBColor
 from docx.enum.text import WD_PARAGRAPH_ALIGNMENT
 from docx.oxml.ns import qn
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
 import numpy as np
 from datetime import datetime
 import os
 from collections import defaultdict
 from score_calculator import ScoreCalculator
-
-# 设置中文字体
-matplotlib.rcParams['font.sans-serif'] = ['Microsoft YaHei', 'SimHei']
-matplotlib.rcParams['axes.unicode_minus'] = False
+from chart_service import default_chart_service
 
 
 class ComprehensiveAnalysisGenerator:
@@ -31,6 +25,7 @@ class ComprehensiveAnalysisGenerator:
         """初始化"""
         self.calculator = ScoreCalculator()
         self.all_enterprises_data = []
+        self.level1_matrix = None
 
     def generate_comprehensive_report(self, questionnaire_files: list, output_path: str = None) -> str:
         """
@@ -46,20 +41,18 @@ class ComprehensiveAnalysisGenerator:
         print(f"\n[INFO] 开始生成综合数据分析报告...")
         print(f"[INFO] 共{len(questionnaire_files)}家企业参与评价")
 
-        # 解析所有企业数据
-        for idx, file in enumerate(questionnaire_files, 1):
-            try:
-                print(f"  [{idx}/{len(questionnaire_files)}] 解析: {os.path.basename(file)}")
-                questionnaire_data = self.calculator.parse_questionnaire(file)
-                score_summary = self.calculator.calculate_total_score(questionnaire_data)
-
-                self.all_enterprises_data.append({
-                    'file': file,
-                    'enterprise_info': questionnaire_data['enterprise_info'],
-                    'score_summary': score_summary
-                })
-            except Exception as e:
-                print(f"  [ERROR] 解析失败: {e}")
+        # 解析并批量计分所有企业数据
+        batch = self.calculator.score_many(questionnaire_files)
+        for err in batch['errors']:
+            print(f"  [ERROR] 解析失败 {os.path.basename(str(err['source']))}: {err['error']}")
+        for result in batch['results']:
+            self.all_enterprises_data.append({
+                'file': result['source'],
+                'enterprise_info': result['enterprise_info'],
+                'score_summary': result['score_summary']
+            })
+        self.level1_matrix = batch['level1_matrix']
+        print(f"[INFO] 成功计分 {len(batch['results'])} 家企业")
 
         if not self.all_enterprises_data:
             raise ValueError("没有成功解析的企业数据")
@@ -245,53 +238,21 @@ class ComprehensiveAnalysisGenerator:
 
     def _calculate_dimension_average(self):
         """计算各维度平均得分率"""
-        dimension_scores = defaultdict(list)
-
-        for data in self.all_enterprises_data:
-            for dim_name, dim_data in data['score_summary']['score_by_level1'].items():
-                dimension_scores[dim_name].append(dim_data['percentage'])
-
         dimension_avg = {}
-        for dim_name, scores in dimension_scores.items():
-            dimension_avg[dim_name] = np.mean(scores)
+        for dim_name in self.level1_matrix.columns:
+            dimension_avg[dim_name] = np.mean(self.level1_matrix[dim_name].dropna().tolist())
 
         return dimension_avg
 
     def _create_dimension_radar_chart(self, dimension_avg, doc):
         """创建维度雷达图"""
         try:
-            categories = list(dimension_avg.keys())
-            values = list(dimension_avg.values())
-
-            fig = plt.figure(figsize=(10, 10))
-            ax = fig.add_subplot(111, projection='polar')
-
-            angles = [n / float(len(categories)) * 2 * np.pi for n in range(len(categories))]
-            values = values + [values[0]]
-            angles = angles + [angles[0]]
-
-            ax.plot(angles, values, 'o-', linewidth=2, label='平均水平', color='#2E5090')
-            ax.fill(angles, values, alpha=0.25, color='#2E5090')
-            ax.set_xticks(angles[:-1])
-            ax.set_xticklabels(categories, size=12)
-            ax.set_ylim(0, 100)
-            ax.set_yticks([20, 40, 60, 80, 100])
-            ax.set_yticklabels(['20%', '40%', '60%', '80%', '100%'])
-            ax.grid(True)
-
-            plt.title('各维度平均得分率', size=16, pad=20, fontweight='bold')
-
-            chart_path = f'temp_comprehensive_radar_{datetime.now().strftime("%Y%m%d%H%M%S")}.png'
-            plt.savefig(chart_path, dpi=150, bbox_inches='tight')
-            plt.close()
-
+            chart = default_chart_service().render('average_radar', {
+                'categories': list(dimension_avg.keys()),
+                'values': [float(v) for v in dimension_avg.values()],
+            })
             doc.add_paragraph('\n')
-            doc.add_picture(chart_path, width=Inches(5.5))
-
-            try:
-                os.remove(chart_path)
-            except:
-                pass
+            doc.add_picture(chart, width=Inches(5.5))
 
         except Exception as e:
             print(f"[WARN] 生成雷达图失败: {e}")
@@ -5,13 +5,12 @@
 """
 import os
 import sys
-import mysql.connector
-from mysql.connector import Error
+from mysql_pool import DB_CONFIG, MySQLPool, get_pool
 
-HOST = os.environ.get('DB_HOST', 'localhost')
-USER = os.environ.get('DB_USER', 'root')
-PASSWORD = os.environ.get('DB_PASSWORD', '123456')
-DB_NAME = os.environ.get('DB_NAME', 'localhost_3306')
+HOST = DB_CONFIG['host']
+USER = DB_CONFIG['user']
+PASSWORD = DB_CONFIG['password']
+DB_NAME = DB_CONFIG['database']
 
 SQL_FILE = os.path.join(os.path.dirname(__file__), 'db', '095_questionnaire_submissions.sql')
 
@@ -34,18 +33,18 @@ def run_sql_file(conn, sql_path):
 
 def main():
     print(f"连接到 MySQL: {HOST} ...")
-    conn = mysql.connector.connect(host=HOST, user=USER, password=PASSWORD)
-    cur = conn.cursor()
-    cur.execute(f"CREATE DATABASE IF NOT EXISTS `{DB_NAME}` DEFAULT CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci")
-    conn.commit()
-    cur.close()
-    conn.close()
+    # 建库时尚未有目标数据库，使用不指定 database 的单连接池
+    server_pool = MySQLPool({'host': HOST, 'user': USER, 'password': PASSWORD}, size=1)
+    with server_pool.transaction() as conn:
+        cur = conn.cursor()
+        cur.execute(f"CREATE DATABASE IF NOT EXISTS `{DB_NAME}` DEFAULT CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci")
+        cur.close()
+    server_pool.close()
     print(f"数据库已准备: {DB_NAME}")
 
     print("初始化表结构...")
-    conn = mysql.connector.connect(host=HOST, user=USER, password=PASSWORD, database=DB_NAME)
-    run_sql_file(conn, SQL_FILE)
-    conn.close()
+    with get_pool().connection() as conn:
+        run_sql_file(conn, SQL_FILE)
     print("表结构初始化完成。")
     return 0
 
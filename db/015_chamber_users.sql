@@ -27,9 +27,20 @@ CREATE TABLE IF NOT EXISTS chamber_users (
   INDEX idx_username (username),
   INDEX idx_email (email),
   INDEX idx_status (status),
-  INDEX idx_created_at (created_at)
+  -- 列表游标分页：ORDER BY created_at DESC, id DESC
+  INDEX idx_created_id (created_at, id),
+  -- 省/县管理员按权限范围分页
+  INDEX idx_region_level_created (region, level, created_at, id),
+  -- 用户名/真实姓名关键词搜索（ngram 分词，支持中文；ngram_token_size 默认 2）
+  FULLTEXT INDEX ft_username_real_name (username, real_name) WITH PARSER ngram
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='工商联用户表';
 
+-- 已有库升级（表已存在时上面的 CREATE TABLE 不会生效，执行一次）：
+-- ALTER TABLE chamber_users DROP INDEX idx_created_at;
+-- ALTER TABLE chamber_users ADD INDEX idx_created_id (created_at, id);
+-- ALTER TABLE chamber_users ADD INDEX idx_region_level_created (region, level, created_at, id);
+-- ALTER TABLE chamber_users ADD FULLTEXT INDEX ft_username_real_name (username, real_name) WITH PARSER ngram;
+
 -- 工商联用户操作日志表
 CREATE TABLE IF NOT EXISTS chamber_user_logs (
   id VARCHAR(36) PRIMARY KEY COMMENT '日志ID',
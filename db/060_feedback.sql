@@ -20,10 +20,18 @@ CREATE TABLE IF NOT EXISTS special_feedbacks (
   created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
   updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
   INDEX idx_cat_stat_time(category, status, submitted_at),
+  -- 统计分析（/analysis/trend、rating、metrics）：按提交时间范围扫描，所需列均在索引中，无需回表
+  INDEX idx_time_cover(submitted_at, category, status, rating, priority, reviewed_at),
+  -- 评分分布：按评分分组
+  INDEX idx_rating_time(rating, submitted_at),
   INDEX idx_ent(enterprise_id)
   -- 外键：enterprise_id -> enterprises.id（如存在企业表）可在确认后添加
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
+-- 已有库升级（表已存在时上面的 CREATE TABLE 不会生效，执行一次）：
+-- ALTER TABLE special_feedbacks ADD INDEX idx_time_cover (submitted_at, category, status, rating, priority, reviewed_at);
+-- ALTER TABLE special_feedbacks ADD INDEX idx_rating_time (rating, submitted_at);
+
 CREATE TABLE IF NOT EXISTS feedback_attachments (
   id VARCHAR(36) PRIMARY KEY,
   feedback_id VARCHAR(36) NOT NULL,
@@ -85,3 +93,26 @@ CREATE TABLE IF NOT EXISTS feedback_statistics (
   UNIQUE KEY uk_stat(stat_date, stat_type)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
+
+-- 按日汇总（feedback_rollup.py 维护）：/analysis/* 接口按日期范围累加汇总行，不扫描明细表
+-- 反馈创建/审核/删除时与明细在同一事务内增量更新；重建/校验：python feedback_rollup.py rebuild|check
+-- day 为提交日期，未提交的反馈记在 '1000-01-01'
+CREATE TABLE IF NOT EXISTS feedback_daily_rollup (
+  day DATE NOT NULL,
+  category VARCHAR(32) NOT NULL,
+  subcategory VARCHAR(50) NOT NULL DEFAULT '',
+  status VARCHAR(16) NOT NULL DEFAULT '',
+  priority VARCHAR(16) NOT NULL DEFAULT '',
+  feedback_count INT NOT NULL DEFAULT 0,
+  rated_count INT NOT NULL DEFAULT 0,             -- 有效评分（非空且非 0）条数
+  rating_sum BIGINT NOT NULL DEFAULT 0,
+  rating_1 INT NOT NULL DEFAULT 0,
+  rating_2 INT NOT NULL DEFAULT 0,
+  rating_3 INT NOT NULL DEFAULT 0,
+  rating_4 INT NOT NULL DEFAULT 0,
+  rating_5 INT NOT NULL DEFAULT 0,
+  reviewed_count INT NOT NULL DEFAULT 0,          -- 已提交且已审核的条数
+  processing_days_sum BIGINT NOT NULL DEFAULT 0,  -- 处理天数（审核时间 - 提交时间，整天）之和
+  PRIMARY KEY (day, category, subcategory, status, priority),
+  INDEX idx_cat_day(category, day)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
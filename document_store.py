@@ -0,0 +1,401 @@
+# -*- coding: utf-8 -*-
+"""
+JSON 文档存储引擎
+替代 app.py 中每次请求整表解析/整表重写的 _read_json/_write_json：
+- 表常驻内存，按主键 id 与若干二级索引字段（name/level/expert 等）建立索引
+- 每次变更只向 <表文件>.wal 追加一行 JSON（预写日志），达到阈值后再压缩
+- 压缩时先写临时文件，再 os.replace 原子替换快照文件，快照格式保持 {'items': [...]}
+- 读取前仅做一次 stat，若其他进程写入了快照或日志，则增量回放日志尾部
+- 变更与压缩持有 <表文件>.lock 文件锁（跨进程），加锁后先回放其他进程的日志再写入，
+  压缩不会丢掉其他进程/实例刚追加的记录
+
+可插拔：DocumentStore(engine='wal') 为默认引擎；engine='json' 退化为每次变更
+都原子重写整表快照（与旧实现等价，仅多了锁与索引）。
+"""
+from __future__ import annotations
+import json
+import logging
+import os
+import threading
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger(__name__)
+
+# 日志条数超过该值后压缩为新的快照
+DEFAULT_COMPACT_EVERY = 1000
+
+
+def _atomic_write_json(path: str, data: Any) -> None:
+    """写临时文件后原子替换，避免读到写了一半的文件"""
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = f'{path}.{uuid.uuid4().hex[:8]}.tmp'
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _file_signature(path: str):
+    try:
+        st = os.stat(path)
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+    except OSError:
+        return None
+
+
+def _lock_file(path: str):
+    """打开并独占锁定锁文件（阻塞等待），返回需交给 _unlock_file 的文件对象"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    f = open(path, 'a+b')
+    try:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    # LK_LOCK 重试约 10 秒后仍失败，继续等待
+                    continue
+    except BaseException:
+        f.close()
+        raise
+    return f
+
+
+def _unlock_file(f) -> None:
+    try:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+    finally:
+        f.close()
+
+
+class WalTable:
+    """单个 JSON 表：内存 + 索引 + 预写日志"""
+
+    def __init__(self, path: str, indexes: Iterable[str] = (), compact_every: int = DEFAULT_COMPACT_EVERY):
+        self.path = path
+        self.wal_path = f'{path}.wal'
+        self.lock_path = f'{path}.lock'
+        self.index_fields = tuple(indexes)
+        self.compact_every = compact_every
+        self._lock = threading.RLock()
+        self._file_lock = None
+        self._file_lock_depth = 0
+        self._items: Dict[str, Dict] = {}
+        self._indexes: Dict[str, Dict[Any, Dict[str, None]]] = {}
+        self._wal_entries = 0
+        self._wal_offset = 0
+        self._snapshot_sig = None
+        self._load()
+
+    # ------------------------------------------------------------------
+    # 加载 / 同步
+    # ------------------------------------------------------------------
+
+    def _load(self) -> None:
+        """读取快照并回放预写日志"""
+        self._items = {}
+        self._indexes = {field: {} for field in self.index_fields}
+        self._wal_entries = 0
+        self._wal_offset = 0
+        items = []
+        snapshot_sig = None
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    # 取已打开文件的签名：读取期间快照被替换时，下次同步能发现
+                    st = os.fstat(f.fileno())
+                    snapshot_sig = (st.st_ino, st.st_mtime_ns, st.st_size)
+                    data = json.load(f)
+                if isinstance(data, dict) and 'items' in data:
+                    items = data.get('items') or []
+                elif isinstance(data, list):
+                    items = data
+            except Exception as e:
+                logger.error(f"读取 JSON 文件失败: {self.path}, {e}")
+        for record in items:
+            if isinstance(record, dict):
+                self._put(record)
+        self._snapshot_sig = snapshot_sig
+        self._replay_wal()
+
+    def _replay_wal(self) -> None:
+        """从上次读到的位置继续回放日志"""
+        if not os.path.exists(self.wal_path):
+            return
+        with open(self.wal_path, 'rb') as f:
+            f.seek(self._wal_offset)
+            for raw in f:
+                if not raw.endswith(b'\n'):
+                    # 另一个写入者尚未写完这一行，下次再读
+                    break
+                self._wal_offset += len(raw)
+                try:
+                    entry = json.loads(raw.decode('utf-8'))
+                except Exception:
+                    logger.warning(f"跳过损坏的日志行: {self.wal_path}")
+                    continue
+                self._apply(entry)
+                self._wal_entries += 1
+
+    def _sync(self) -> None:
+        """若快照或日志被其他进程修改，则重新加载或回放日志尾部"""
+        if _file_signature(self.path) != self._snapshot_sig:
+            self._load()
+            return
+        try:
+            wal_size = os.path.getsize(self.wal_path)
+        except OSError:
+            wal_size = 0
+        if wal_size < self._wal_offset:
+            self._load()
+        elif wal_size > self._wal_offset:
+            self._replay_wal()
+
+    @contextmanager
+    def _exclusive(self):
+        """线程锁 + 跨进程文件锁（可重入），进入后先同步其他进程的写入"""
+        with self._lock:
+            if self._file_lock_depth == 0:
+                self._file_lock = _lock_file(self.lock_path)
+            self._file_lock_depth += 1
+            try:
+                self._sync()
+                yield
+            finally:
+                self._file_lock_depth -= 1
+                if self._file_lock_depth == 0:
+                    _unlock_file(self._file_lock)
+                    self._file_lock = None
+
+    # ------------------------------------------------------------------
+    # 内存结构维护
+    # ------------------------------------------------------------------
+
+    def _key(self, record: Dict) -> str:
+        key = record.get('id')
+        if key is None or key == '':
+            # 旧数据缺少 id 时补一个，保证主键唯一
+            key = uuid.uuid4().hex[:12]
+            record['id'] = key
+        return str(key)
+
+    def _index_add(self, key: str, record: Dict) -> None:
+        for field in self.index_fields:
+            self._indexes[field].setdefault(record.get(field), {})[key] = None
+
+    def _index_remove(self, key: str, record: Dict) -> None:
+        for field in self.index_fields:
+            bucket = self._indexes[field].get(record.get(field))
+            if bucket is not None:
+                bucket.pop(key, None)
+                if not bucket:
+                    del self._indexes[field][record.get(field)]
+
+    def _put(self, record: Dict) -> str:
+        key = self._key(record)
+        old = self._items.get(key)
+        if old is not None:
+            self._index_remove(key, old)
+        self._items[key] = record
+        self._index_add(key, record)
+        return key
+
+    def _remove(self, key: str) -> Optional[Dict]:
+        old = self._items.pop(key, None)
+        if old is not None:
+            self._index_remove(key, old)
+        return old
+
+    def _apply(self, entry: Dict) -> None:
+        op = entry.get('op')
+        if op == 'put':
+            self._put(dict(entry['record']))
+        elif op == 'update':
+            key = str(entry['id'])
+            old = self._items.get(key)
+            if old is not None:
+                new = dict(old)
+                new.update(entry['changes'])
+                self._put(new)
+        elif op == 'delete':
+            self._remove(str(entry['id']))
+
+    # ------------------------------------------------------------------
+    # 持久化
+    # ------------------------------------------------------------------
+
+    def _log(self, entry: Dict) -> None:
+        """追加一条日志；达到阈值后压缩（调用方持有 _exclusive）"""
+        if self._snapshot_sig is None:
+            # 新表先落一份快照，保证表文件存在
+            self.compact()
+            return
+        line = (json.dumps(entry, ensure_ascii=False) + '\n').encode('utf-8')
+        with open(self.wal_path, 'ab') as f:
+            f.write(line)
+            f.flush()
+        self._wal_offset += len(line)
+        self._wal_entries += 1
+        if self._wal_entries >= self.compact_every:
+            self.compact()
+
+    def compact(self) -> None:
+        """将内存数据（加锁后已回放全部日志）写为新快照，并清空预写日志"""
+        with self._exclusive():
+            _atomic_write_json(self.path, {'items': list(self._items.values())})
+            self._snapshot_sig = _file_signature(self.path)
+            if os.path.exists(self.wal_path):
+                os.remove(self.wal_path)
+            self._wal_entries = 0
+            self._wal_offset = 0
+
+    # ------------------------------------------------------------------
+    # 查询接口（返回副本，调用方修改不会影响表内数据）
+    # ------------------------------------------------------------------
+
+    def all(self) -> List[Dict]:
+        with self._lock:
+            self._sync()
+            return [dict(r) for r in self._items.values()]
+
+    def get(self, key) -> Optional[Dict]:
+        with self._lock:
+            self._sync()
+            record = self._items.get(str(key))
+            return dict(record) if record is not None else None
+
+    def find(self, field: str, value) -> List[Dict]:
+        """按字段精确匹配；有二级索引时为 O(命中数)"""
+        with self._lock:
+            self._sync()
+            if field in self._indexes:
+                keys = self._indexes[field].get(value, {})
+                return [dict(self._items[k]) for k in keys]
+            return [dict(r) for r in self._items.values() if r.get(field) == value]
+
+    def find_one(self, field: str, value) -> Optional[Dict]:
+        with self._lock:
+            self._sync()
+            if field in self._indexes:
+                for k in self._indexes[field].get(value, {}):
+                    return dict(self._items[k])
+                return None
+            for r in self._items.values():
+                if r.get(field) == value:
+                    return dict(r)
+            return None
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._sync()
+            return len(self._items)
+
+    # ------------------------------------------------------------------
+    # 变更接口
+    # ------------------------------------------------------------------
+
+    def insert(self, record: Dict) -> str:
+        """新增或覆盖一条记录，返回主键"""
+        with self._exclusive():
+            record = dict(record)
+            key = self._put(record)
+            self._log({'op': 'put', 'record': record})
+            return key
+
+    def update(self, key, changes: Dict) -> Optional[Dict]:
+        """局部更新记录，记录不存在时返回 None"""
+        with self._exclusive():
+            key = str(key)
+            old = self._items.get(key)
+            if old is None:
+                return None
+            new = dict(old)
+            new.update(changes)
+            self._put(new)
+            self._log({'op': 'update', 'id': key, 'changes': changes})
+            return dict(new)
+
+    def delete(self, key) -> bool:
+        with self._exclusive():
+            key = str(key)
+            if self._remove(key) is None:
+                return False
+            self._log({'op': 'delete', 'id': key})
+            return True
+
+    def replace_all(self, items: List[Dict]) -> None:
+        """整表替换（兼容旧的 _write_json 调用），直接写快照"""
+        with self._exclusive():
+            self._items = {}
+            self._indexes = {field: {} for field in self.index_fields}
+            for record in items:
+                if isinstance(record, dict):
+                    self._put(dict(record))
+            self.compact()
+
+
+class JsonTable(WalTable):
+    """旧引擎：每次变更都原子重写整表快照，不使用预写日志"""
+
+    def _log(self, entry: Dict) -> None:
+        self.compact()
+
+
+ENGINES = {
+    'wal': WalTable,
+    'json': JsonTable,
+}
+
+
+class DocumentStore:
+    """按文件路径管理表实例，同一路径在进程内只加载一次"""
+
+    def __init__(self, engine: str = 'wal', compact_every: int = DEFAULT_COMPACT_EVERY):
+        if engine not in ENGINES:
+            raise ValueError(f'未知的存储引擎: {engine}')
+        self.engine = engine
+        self.compact_every = compact_every
+        self._tables: Dict[str, WalTable] = {}
+        self._lock = threading.Lock()
+
+    def table(self, path: str, indexes: Iterable[str] = ()) -> WalTable:
+        key = os.path.abspath(path)
+        with self._lock:
+            tbl = self._tables.get(key)
+            if tbl is None:
+                tbl = ENGINES[self.engine](path, indexes=indexes, compact_every=self.compact_every)
+                self._tables[key] = tbl
+            return tbl
+
+    def compact_all(self) -> None:
+        """压缩所有已打开的表（进程退出前调用）"""
+        with self._lock:
+            tables = list(self._tables.values())
+        for tbl in tables:
+            try:
+                if tbl._wal_entries:
+                    tbl.compact()
+            except Exception as e:
+                logger.error(f"压缩存储失败: {tbl.path}, {e}")
@@ -11,8 +11,8 @@ from docx import Document
 from docx.table import Table
 import logging
 import os
-import mysql.connector
-from mysql.connector import Error
+from mysql_pool import DB_CONFIG, get_pool
+from questionnaire_template_cache import template_cache
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -31,12 +31,7 @@ class DocxQuestionnaireImporter:
         """
         self.db_path = db_path
         self.ensure_db_exists()
-        self.db_config = db_config or {
-            'host': os.environ.get('DB_HOST', 'localhost'),
-            'user': os.environ.get('DB_USER', 'root'),
-            'password': os.environ.get('DB_PASSWORD', '123456'),
-            'database': os.environ.get('DB_NAME', 'localhost_3306')
-        }
+        self.db_config = db_config or DB_CONFIG
 
     def ensure_db_exists(self):
         """确保数据库文件存在"""
@@ -212,64 +207,61 @@ class DocxQuestionnaireImporter:
 
         # 同步写入 MySQL（主存储）
         try:
-            conn = mysql.connector.connect(**self.db_config)
-            cur = conn.cursor(dictionary=True)
-            # upsert template by level
-            cur.execute("SELECT id FROM questionnaire_templates WHERE level=%s", (level,))
-            row = cur.fetchone()
-            if row:
-                template_id = row['id']
-                cur.execute(
-                    "UPDATE questionnaire_templates SET name=%s, description=%s, total_questions=%s, source_file=%s, status='active', updated_at=NOW() WHERE id=%s",
-                    (survey['name'], survey['description'], len(questions), survey['source_file'], template_id)
-                )
-            else:
-                template_id = str(uuid.uuid4())
-                cur.execute(
-                    "INSERT INTO questionnaire_templates (id, level, name, description, total_questions, status, source_file) VALUES (%s,%s,%s,%s,%s,'active',%s)",
-                    (template_id, level, survey['name'], survey['description'], len(questions), survey['source_file'])
+            with get_pool(self.db_config).transaction() as conn:
+                # upsert template by level
+                row = conn.fetch_one("SELECT id FROM questionnaire_templates WHERE level=%s", (level,))
+                if row:
+                    template_id = row['id']
+                    conn.execute(
+                        "UPDATE questionnaire_templates SET name=%s, description=%s, total_questions=%s, source_file=%s, status='active', updated_at=NOW() WHERE id=%s",
+                        (survey['name'], survey['description'], len(questions), survey['source_file'], template_id)
+                    )
+                else:
+                    template_id = str(uuid.uuid4())
+                    conn.execute(
+                        "INSERT INTO questionnaire_templates (id, level, name, description, total_questions, status, source_file) VALUES (%s,%s,%s,%s,%s,'active',%s)",
+                        (template_id, level, survey['name'], survey['description'], len(questions), survey['source_file'])
+                    )
+                # replace questions（与模板更新在同一事务中提交）
+                conn.execute("DELETE FROM questionnaire_template_questions WHERE template_id=%s", (template_id,))
+                insert_sql = (
+                    "INSERT INTO questionnaire_template_questions "
+                    "(id, template_id, seq_no, level1, level2, question_text, question_type, score, applicable, remarks, requires_file, sort_order) "
+                    "VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)"
                 )
-            # replace questions
-            conn.commit()
-            cur.execute("DELETE FROM questionnaire_template_questions WHERE template_id=%s", (template_id,))
-            insert_sql = (
-                "INSERT INTO questionnaire_template_questions "
-                "(id, template_id, seq_no, level1, level2, question_text, question_type, score, applicable, remarks, requires_file, sort_order) "
-                "VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)"
-            )
-            data = []
-            for idx, q in enumerate(questions, start=1):
-                # 解析分值为数字（如果可能）
-                score_val = None
-                try:
-                    if isinstance(q.get('score'), (int, float)):
-                        score_val = float(q.get('score'))
-                    else:
-                        score_val = float(str(q.get('score')).strip()) if str(q.get('score') or '').replace('.', '', 1).isdigit() else None
-                except Exception:
+                data = []
+                for idx, q in enumerate(questions, start=1):
+                    # 解析分值为数字（如果可能）
                     score_val = None
-                data.append((
-                    str(uuid.uuid4()),
-                    template_id,
-                    q.get('seq_no'),
-                    q.get('level1'),
-                    q.get('level2'),
-                    q.get('question_text'),
-                    q.get('question_type'),
-                    score_val,
-                    q.get('applicable'),
-                    q.get('remarks'),
-                    1 if q.get('requires_file') else 0,
-                    idx
-                ))
-            if data:
-                cur.executemany(insert_sql, data)
-            conn.commit()
-            cur.close(); conn.close()
+                    try:
+                        if isinstance(q.get('score'), (int, float)):
+                            score_val = float(q.get('score'))
+                        else:
+                            score_val = float(str(q.get('score')).strip()) if str(q.get('score') or '').replace('.', '', 1).isdigit() else None
+                    except Exception:
+                        score_val = None
+                    data.append((
+                        str(uuid.uuid4()),
+                        template_id,
+                        q.get('seq_no'),
+                        q.get('level1'),
+                        q.get('level2'),
+                        q.get('question_text'),
+                        q.get('question_type'),
+                        score_val,
+                        q.get('applicable'),
+                        q.get('remarks'),
+                        1 if q.get('requires_file') else 0,
+                        idx
+                    ))
+                if data:
+                    conn.execute_many(insert_sql, data)
             logger.info(f"[MySQL] 模板已写入 level={level}, 模板题目={len(questions)}")
         except Exception as e:
             logger.error(f"[MySQL] 写入失败（已使用JSON备份）：{e}")
 
+        # 模板已变化，使查询接口的模板缓存失效
+        template_cache.invalidate()
         logger.info(f"问卷导入成功: {survey_id} ({level}级, {len(questions)} 个问题)")
         return survey_id
 
@@ -340,6 +332,7 @@ class DocxQuestionnaireImporter:
         db['questions'] = [q for q in db['questions'] if q['survey_id'] != survey_id]
         
         self.save_db(db)
+        template_cache.invalidate()
         logger.info(f"问卷已删除: {survey_id}")
 
 
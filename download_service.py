@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+"""
+文件下载
+供 app.py 的报告、问卷提交、专项附件下载接口使用：
+- 强 ETag 取文件内容 SHA-256：报告取自报告目录（report_engine.catalog）的 checksum，
+  目录记录与文件不一致或不在目录中的文件按内容计算（按 mtime/size 记忆，不重复读取）
+- Last-Modified、If-None-Match / If-Modified-Since（304）、Range / If-Range（206）由
+  send_file 的条件响应处理，断点续传不再整份重发
+- 可交给前端服务器传输（DOWNLOAD_OFFLOAD）：
+    x-sendfile        Apache/lighttpd，响应头 X-Sendfile: <绝对路径>
+    x-accel-redirect  nginx，响应头 X-Accel-Redirect: <DOWNLOAD_ACCEL_PREFIX>/<相对 DOWNLOAD_ACCEL_ROOT 的路径>
+  交出前先在应用内判断条件请求，命中缓存直接 304
+- 企业报告打包：多个文件流式写成 ZIP（报告本身已压缩，按存储方式写入），
+  边读边发，不在内存或磁盘中生成完整压缩包
+"""
+import hashlib
+import logging
+import os
+import zipfile
+from datetime import datetime, timezone
+from typing import Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import quote
+
+from flask import Response, request, send_file, stream_with_context
+from werkzeug.security import safe_join
+
+from score_cache import file_digest
+
+logger = logging.getLogger(__name__)
+
+# 交给前端服务器传输的方式（'' 表示由应用直接发送）
+_offload = {
+    'mode': os.environ.get('DOWNLOAD_OFFLOAD', '').strip().lower(),
+    'accel_prefix': os.environ.get('DOWNLOAD_ACCEL_PREFIX', '/protected'),
+    'accel_root': os.environ.get('DOWNLOAD_ACCEL_ROOT', 'storage'),
+}
+
+# ZIP 流式输出时每次读取的块大小
+CHUNK_SIZE = 1 << 20
+
+
+def resolve(base_dir: str, *parts: str) -> Optional[str]:
+    """base_dir 下的文件路径；越出目录或文件不存在时返回 None"""
+    path = safe_join(base_dir, *parts)
+    return path if path and os.path.isfile(path) else None
+
+
+def file_etag(path: str, catalog=None) -> str:
+    """文件内容 SHA-256（报告优先使用报告目录中与文件一致的 checksum）"""
+    if catalog is not None:
+        try:
+            filename = os.path.relpath(os.path.abspath(path), os.path.abspath(catalog.reports_dir))
+            entry = catalog.get(filename)
+            st = os.stat(path)
+            if entry is None or (entry['size'], entry['mtime_ns']) != (st.st_size, st.st_mtime_ns):
+                entry = catalog.record(path, source='reconciler')
+            return entry['checksum']
+        except Exception as e:
+            logger.warning(f"读取报告目录失败，按文件内容计算 ETag: {path}, {e}")
+    return file_digest(path)
+
+
+def _content_disposition(download_name: str) -> str:
+    try:
+        download_name.encode('ascii')
+        return f'attachment; filename="{download_name}"'
+    except UnicodeEncodeError:
+        fallback = download_name.encode('ascii', 'ignore').decode('ascii').strip() or 'download'
+        return f"attachment; filename=\"{fallback}\"; filename*=UTF-8''{quote(download_name, safe='')}"
+
+
+def _offload_response(path: str, etag: str, download_name: str) -> Response:
+    """由前端服务器传输文件：应用只返回头部（条件请求先在应用内判断）"""
+    st = os.stat(path)
+    response = Response(status=200)
+    response.set_etag(etag)
+    response.last_modified = datetime.fromtimestamp(int(st.st_mtime), tz=timezone.utc)
+    response.headers['Content-Disposition'] = _content_disposition(download_name)
+    response.headers['Accept-Ranges'] = 'bytes'
+    if request.if_none_match.contains(etag) or (
+            not request.if_none_match and request.if_modified_since
+            and request.if_modified_since >= response.last_modified):
+        response.status_code = 304
+        return response
+    if _offload['mode'] == 'x-sendfile':
+        response.headers['X-Sendfile'] = os.path.abspath(path)
+    else:
+        relative = os.path.relpath(os.path.abspath(path), os.path.abspath(_offload['accel_root']))
+        location = _offload['accel_prefix'].rstrip('/') + '/' + quote(relative.replace(os.sep, '/'))
+        response.headers['X-Accel-Redirect'] = location
+    response.mimetype = 'application/octet-stream'
+    return response
+
+
+def send_download(path: str, download_name: Optional[str] = None, etag: Optional[str] = None,
+                  catalog=None) -> Response:
+    """
+    以附件形式发送文件（ETag / Last-Modified / 条件请求 / Range）
+
+    Args:
+        path: 文件路径（调用方已用 resolve 校验）
+        download_name: 下载文件名，默认取文件名
+        etag: 已知的内容摘要；缺省时由 file_etag 计算
+        catalog: 报告目录（发送报告时传入，复用其 checksum）
+    """
+    download_name = download_name or os.path.basename(path)
+    etag = etag or file_etag(path, catalog)
+    if _offload['mode'] in ('x-sendfile', 'x-accel-redirect'):
+        return _offload_response(path, etag, download_name)
+    return send_file(path, as_attachment=True, download_name=download_name, etag=etag, conditional=True)
+
+
+class _StreamBuffer:
+    """只追加的输出流：ZipFile 写入后由生成器取走已写入的字节"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._written = 0
+
+    def write(self, data) -> int:
+        if data:
+            self._chunks.append(bytes(data))
+            self._written += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._written
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def iter_zip(members: Iterable[Tuple[str, str]]) -> Iterator[bytes]:
+    """
+    流式生成 ZIP
+
+    Args:
+        members: [(包内文件名, 文件路径), ...]；读取失败的文件跳过
+    """
+    buffer = _StreamBuffer()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_STORED, allowZip64=True) as archive:
+        for arcname, path in members:
+            try:
+                st = os.stat(path)
+                info = zipfile.ZipInfo(arcname, date_time=datetime.fromtimestamp(st.st_mtime).timetuple()[:6])
+                info.file_size = st.st_size
+                with open(path, 'rb') as src, archive.open(info, 'w') as dst:
+                    for chunk in iter(lambda: src.read(CHUNK_SIZE), b''):
+                        dst.write(chunk)
+                        yield buffer.drain()
+            except OSError as e:
+                logger.warning(f"打包时跳过文件: {path}, {e}")
+            yield buffer.drain()
+    yield buffer.drain()
+
+
+def send_bundle(members: List[Tuple[str, str, str]], download_name: str) -> Response:
+    """
+    以 ZIP 附件流式发送多个文件
+
+    Args:
+        members: [(包内文件名, 文件路径, 内容摘要), ...]；ETag 由各文件名与摘要计算，内容未变时返回 304
+    """
+    digest = hashlib.sha256()
+    for arcname, _, checksum in members:
+        digest.update(f'{arcname}\0{checksum}\n'.encode('utf-8'))
+    etag = digest.hexdigest()
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+    stream = (chunk for chunk in iter_zip((arcname, path) for arcname, path, _ in members) if chunk)
+    response = Response(stream_with_context(stream), mimetype='application/zip')
+    response.set_etag(etag)
+    response.headers['Content-Disposition'] = _content_disposition(download_name)
+    return response
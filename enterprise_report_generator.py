@@ -5,16 +5,10 @@ from docx import Document
 from docx.shared import Pt, Inches, RGBColor
 from docx.enum.text import WD_PARAGRAPH_ALIGNMENT
 from docx.oxml.ns import qn
-import matplotlib
-matplotlib.use('Agg')  # 使用非交互式后端，适合多线程
-import matplotlib.pyplot as plt
 from datetime import datetime
 import os
 from score_calculator import ScoreCalculator
-
-# 设置中文字体
-matplotlib.rcParams['font.sans-serif'] = ['Microsoft YaHei', 'SimHei']
-matplotlib.rcParams['axes.unicode_minus'] = False
+from chart_service import score_radar
 
 
 class EnterpriseReportGenerator:
@@ -29,7 +23,7 @@ class EnterpriseReportGenerator:
         生成企业自评报告
 
         Args:
-            questionnaire_file: 已填写的问卷文件路径
+            questionnaire_file: 已填写的问卷Excel路径、提交JSON路径或 Submission 对象
             output_path: 输出报告文件路径
 
         Returns:
@@ -38,12 +32,12 @@ class EnterpriseReportGenerator:
         print(f"\n[INFO] 开始生成企业自评报告...")
 
         # 解析问卷
-        questionnaire_data = self.calculator.parse_questionnaire(questionnaire_file)
+        questionnaire_data = self.calculator.load_questionnaire(questionnaire_file)
         enterprise_info = questionnaire_data['enterprise_info']
         enterprise_name = enterprise_info.get('企业名称', '企业')
 
         # 计算得分
-        score_summary = self.calculator.calculate_total_score(questionnaire_data)
+        score_summary = self.calculator.get_score_summary(questionnaire_file, questionnaire_data)
 
         # 生成输出路径
         if output_path is None:
@@ -260,15 +254,10 @@ class EnterpriseReportGenerator:
         doc.add_paragraph(overview_text.strip())
 
         # 生成雷达图
-        chart_path = self._generate_radar_chart(score_summary, enterprise_name)
-        if chart_path and os.path.exists(chart_path):
+        chart = self._generate_radar_chart(score_summary, enterprise_name)
+        if chart:
             doc.add_paragraph('\n各维度得分雷达图：')
-            doc.add_picture(chart_path, width=Inches(5.5))
-            # 删除临时图片文件
-            try:
-                os.remove(chart_path)
-            except:
-                pass
+            doc.add_picture(chart, width=Inches(5.5))
 
         # 各维度得分表
         doc.add_paragraph('\n各维度得分详情：')
@@ -303,43 +292,9 @@ class EnterpriseReportGenerator:
             row_cells[4].text = rating
 
     def _generate_radar_chart(self, score_summary, enterprise_name):
-        """生成雷达图"""
+        """生成雷达图（返回PNG内存图片）"""
         try:
-            level1_scores = score_summary['score_by_level1']
-            if not level1_scores:
-                return None
-
-            categories = list(level1_scores.keys())
-            values = [level1_scores[cat]['percentage'] for cat in categories]
-
-            # 创建雷达图
-            fig = plt.figure(figsize=(8, 8))
-            ax = fig.add_subplot(111, projection='polar')
-
-            # 计算角度
-            angles = [n / float(len(categories)) * 2 * 3.14159 for n in range(len(categories))]
-            values += values[:1]
-            angles += angles[:1]
-
-            # 绘制
-            ax.plot(angles, values, 'o-', linewidth=2, label=enterprise_name)
-            ax.fill(angles, values, alpha=0.25)
-            ax.set_xticks(angles[:-1])
-            ax.set_xticklabels(categories, size=10)
-            ax.set_ylim(0, 100)
-            ax.set_yticks([20, 40, 60, 80, 100])
-            ax.set_yticklabels(['20%', '40%', '60%', '80%', '100%'])
-            ax.grid(True)
-
-            plt.title(f'{enterprise_name} - 各维度得分雷达图', size=14, pad=20)
-            plt.legend(loc='upper right', bbox_to_anchor=(1.3, 1.1))
-
-            # 保存
-            chart_path = f'temp_radar_{datetime.now().strftime("%Y%m%d%H%M%S")}.png'
-            plt.savefig(chart_path, dpi=150, bbox_inches='tight')
-            plt.close()
-
-            return chart_path
+            return score_radar(score_summary, enterprise_name)
         except Exception as e:
             print(f"[WARN] 生成雷达图失败: {e}")
             return None
@@ -0,0 +1,343 @@
+# -*- coding: utf-8 -*-
+"""
+企业-专家匹配引擎
+供 /api/portal/chamber/expert-match 接口使用：
+- ExpertIndex：对 storage/experts.json 建内存倒排索引（地区、省份、行业、专家级别、分词后的擅长领域）
+- 亲和度：企业得分率最低的若干一级指标按"短板程度"加权，与专家擅长领域命中的维度累加，
+  再加上地区/省份/行业相同、专家级别与企业级别相称的加分
+- top_k：只在倒排列表上累加得分，部分选择（argpartition）取前 k 名，不对全部专家排序
+- assign：批量为成千上万家企业分配专家，全局按亲和度从高到低（堆）分配，遵守每位专家的辅导容量
+专家表变更后（get_index 以专家记录签名判断）自动重建索引。
+"""
+import hashlib
+import heapq
+import json
+import logging
+import re
+import threading
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# 专家级别 / 企业级别 -> 层级（专家级别与企业级别相称时加分）
+EXPERT_LEVEL_RANK = {'county': 0, 'province': 1, 'national': 2}
+ENTERPRISE_LEVEL_RANK = {'beginner': 0, 'intermediate': 1, 'advanced': 2}
+
+# 一级指标 -> 擅长领域关键词（专家擅长领域的词包含关键词即视为覆盖该维度）
+DIMENSION_KEYWORDS = {
+    '党建引领': ('党建', '党组织', '思想政治'),
+    '产权结构': ('产权', '股权', '法律', '法务'),
+    '公司治理结构和机制': ('公司治理', '治理', '董事会', '企业管理'),
+    '战略管理': ('战略', '规划', '企业管理'),
+    '内控、风险与合规管理': ('内控', '风险', '合规', '审计', '财务', '质量控制'),
+    '科学民主管理': ('民主管理', '人力资源', '劳动关系', '职工'),
+    '科技创新': ('科技', '创新', '研发', '数字化', '技术', 'IT'),
+    '社会责任与企业文化': ('社会责任', '企业文化', '品牌', '公益', 'ESG'),
+    '家族企业治理': ('家族', '传承', '接班'),
+}
+
+# 亲和度各部分权重
+WEIGHTS = {
+    'skill': 1.0,      # 命中一个短板维度（乘以短板程度 0~1）
+    'region': 0.6,
+    'province': 0.3,
+    'industry': 0.8,
+    'level': 0.4,      # 级别完全相称；每差一级减半
+}
+
+# 参与匹配的短板维度数
+WEAKEST_DIMENSIONS = 3
+
+_SKILL_SEPARATORS = re.compile(r'[、,，;；/|\s]+')
+_DIMENSION_SEPARATORS = re.compile(r'[、,，和与及]+')
+_PLACE_SUFFIX = re.compile(r'(省|市|自治区|特别行政区)$')
+
+
+def _normalize(field: str, value) -> str:
+    """索引键：地区/省份去掉行政区划后缀（'天津市' 与 '天津' 视为相同）"""
+    value = str(value or '').strip()
+    if field in ('region', 'province'):
+        value = _PLACE_SUFFIX.sub('', value) or value
+    return value
+
+
+def tokenize_skills(skills) -> List[str]:
+    """擅长领域分词（'企业管理、质量控制' -> ['企业管理', '质量控制']，也接受列表）"""
+    if not skills:
+        return []
+    if isinstance(skills, str):
+        skills = _SKILL_SEPARATORS.split(skills)
+    tokens = []
+    for token in skills:
+        token = str(token).strip()
+        if token and token not in tokens:
+            tokens.append(token)
+    return tokens
+
+
+def dimension_keywords(dimension: str) -> Tuple[str, ...]:
+    """一级指标对应的关键词（未配置的维度按名称拆分）"""
+    keywords = DIMENSION_KEYWORDS.get(dimension)
+    if keywords:
+        return keywords
+    return tuple(part for part in _DIMENSION_SEPARATORS.split(dimension) if len(part) >= 2) or (dimension,)
+
+
+def weakest_dimensions(level1_scores: Optional[Dict[str, float]],
+                       n: int = WEAKEST_DIMENSIONS) -> List[Tuple[str, float]]:
+    """得分率最低的 n 个一级指标 [(维度, 短板程度 0~1)]，已满分的维度不计入"""
+    if not level1_scores:
+        return []
+    weakest = heapq.nsmallest(n, ((float(pct or 0), dim) for dim, pct in level1_scores.items()))
+    return [(dim, min(1.0, (100.0 - pct) / 100.0)) for pct, dim in weakest if pct < 100]
+
+
+def submission_scores(paths: Dict[str, str], calculator) -> Dict[str, Dict]:
+    """
+    批量计算企业最近一次提交的总得分率与一级指标得分率
+
+    Args:
+        paths: {企业名称: 提交JSON路径}
+        calculator: ScoreCalculator（使用 score_many 批量计分及其缓存）
+
+    Returns:
+        {企业名称: {'score_pct', 'level1_scores': {一级指标: 得分率}}}（计分失败的企业不出现在结果中）
+    """
+    if not paths or calculator is None:
+        return {}
+    owners = {}
+    for name, path in paths.items():
+        owners.setdefault(path, []).append(name)
+    try:
+        batch = calculator.score_many(list(owners))
+    except Exception as e:
+        logger.warning(f"批量计分失败，按地区/行业/级别匹配: {e}")
+        return {}
+    scores = {}
+    for result in batch['results']:
+        summary = result['score_summary']
+        entry = {
+            'score_pct': summary['score_percentage'],
+            'level1_scores': {dim: data.get('percentage', 0.0)
+                              for dim, data in summary.get('score_by_level1', {}).items()},
+        }
+        for name in owners.get(result['source'], ()):
+            scores[name] = entry
+    return scores
+
+
+def _select(scores: np.ndarray, k: int) -> np.ndarray:
+    """得分最高的 k 个位置（部分选择后只对这 k 个排序；同分按位置），-inf 视为不可选"""
+    k = min(k, int(np.isfinite(scores).sum()))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    if k < len(scores):
+        picked = np.argpartition(-scores, k - 1)[:k]
+    else:
+        picked = np.flatnonzero(np.isfinite(scores))
+    return picked[np.lexsort((picked, -scores[picked]))]
+
+
+class ExpertIndex:
+    """专家内存索引：字段值 -> 专家位置数组的倒排列表，擅长领域按词建倒排"""
+
+    FIELDS = ('region', 'province', 'industry', 'level')
+    BASE_CACHE_SIZE = 4096
+
+    def __init__(self, experts: Iterable[Dict]):
+        self.experts = list(experts)
+        self.size = len(self.experts)
+        postings = {field: {} for field in self.FIELDS}
+        tokens = {}
+        for pos, expert in enumerate(self.experts):
+            for field in self.FIELDS:
+                value = _normalize(field, expert.get(field))
+                if value:
+                    postings[field].setdefault(value, []).append(pos)
+            for token in tokenize_skills(expert.get('skills')):
+                tokens.setdefault(token, []).append(pos)
+        self._postings = {field: {value: np.asarray(positions, dtype=np.int64)
+                                  for value, positions in values.items()}
+                          for field, values in postings.items()}
+        self._tokens = {token: np.asarray(positions, dtype=np.int64) for token, positions in tokens.items()}
+        self._dimensions: Dict[str, np.ndarray] = {}
+        self._dimension_sets: Dict[str, frozenset] = {}
+        self._base: Dict[tuple, np.ndarray] = {}
+        self._lock = threading.Lock()
+
+    def postings(self, field: str, value: Optional[str]) -> np.ndarray:
+        """字段取值对应的专家位置"""
+        return self._postings[field].get(_normalize(field, value), np.empty(0, dtype=np.int64))
+
+    def lookup(self, **filters) -> List[Dict]:
+        """按字段精确筛选专家（如 lookup(region='天津市', level='province')）"""
+        positions = None
+        for field, value in filters.items():
+            matched = self.postings(field, value)
+            positions = matched if positions is None else np.intersect1d(positions, matched, assume_unique=True)
+        if positions is None:
+            return list(self.experts)
+        return [self.experts[pos] for pos in positions]
+
+    def dimension_postings(self, dimension: str) -> np.ndarray:
+        """擅长领域覆盖该一级指标的专家位置（按词表匹配一次后缓存）"""
+        cached = self._dimensions.get(dimension)
+        if cached is not None:
+            return cached
+        keywords = dimension_keywords(dimension)
+        parts = [positions for token, positions in self._tokens.items()
+                 if any(kw in token or (len(token) >= 2 and token in kw) for kw in keywords)]
+        merged = np.unique(np.concatenate(parts)) if parts else np.empty(0, dtype=np.int64)
+        with self._lock:
+            self._dimensions[dimension] = merged
+            self._dimension_sets[dimension] = frozenset(merged.tolist())
+        return merged
+
+    def scores(self, profile: Dict) -> np.ndarray:
+        """
+        企业对全部专家的亲和度
+
+        Args:
+            profile: {'region', 'province', 'industry', 'level', 'level1_scores': {一级指标: 得分率}}
+        """
+        scores = self._base_scores(profile).copy()
+        for dimension, need in weakest_dimensions(profile.get('level1_scores')):
+            scores[self.dimension_postings(dimension)] += WEIGHTS['skill'] * need
+        return scores
+
+    def _base_scores(self, profile: Dict) -> np.ndarray:
+        """地区/省份/行业/级别部分的得分（企业画像组合有限，按组合缓存）"""
+        region = profile.get('region')
+        key = (_normalize('region', region), _normalize('province', profile.get('province') or region),
+               _normalize('industry', profile.get('industry')), profile.get('level'))
+        cached = self._base.get(key)
+        if cached is not None:
+            return cached
+        scores = np.zeros(self.size)
+        scores[self.postings('region', key[0])] += WEIGHTS['region']
+        scores[self.postings('province', key[1])] += WEIGHTS['province']
+        scores[self.postings('industry', key[2])] += WEIGHTS['industry']
+        target = ENTERPRISE_LEVEL_RANK.get(key[3], 1)
+        for level, positions in self._postings['level'].items():
+            gap = abs(EXPERT_LEVEL_RANK.get(level, 0) - target)
+            scores[positions] += WEIGHTS['level'] / (2 ** gap)
+        with self._lock:
+            if len(self._base) >= self.BASE_CACHE_SIZE:
+                self._base.clear()
+            self._base[key] = scores
+        return scores
+
+    def match(self, pos: int, score: float, profile: Dict) -> Dict:
+        """匹配结果（专家基本信息、亲和度、命中的短板维度）"""
+        expert = self.experts[pos]
+        matched = []
+        for dimension, _ in weakest_dimensions(profile.get('level1_scores')):
+            self.dimension_postings(dimension)
+            if pos in self._dimension_sets[dimension]:
+                matched.append(dimension)
+        return {
+            'id': expert.get('id'),
+            'name': expert.get('name', ''),
+            'region': expert.get('region', ''),
+            'province': expert.get('province', ''),
+            'industry': expert.get('industry', ''),
+            'level': expert.get('level', ''),
+            'org': expert.get('org', ''),
+            'skills': expert.get('skills', ''),
+            'score': round(float(score), 3),
+            'matched_dimensions': matched,
+        }
+
+    def top_k(self, profile: Dict, k: int = 3, available: Optional[np.ndarray] = None) -> List[Dict]:
+        """亲和度最高的 k 位专家（available 为布尔数组时只在可用专家中选）"""
+        scores = self.scores(profile)
+        if available is not None:
+            scores[~available] = -np.inf
+        return [self.match(pos, scores[pos], profile) for pos in _select(scores, k)]
+
+    def assign(self, profiles: Sequence[Dict], k: int = 3,
+               capacity: Union[int, Dict[str, int]] = 5, shortlist: Optional[int] = None) -> List[List[Dict]]:
+        """
+        批量分配：每家企业至多 k 位专家，每位专家至多辅导 capacity 家企业
+
+        先为每家企业取亲和度前 shortlist 名候选，全部 (亲和度, 企业, 专家) 放入一个堆，
+        按亲和度从高到低依次分配；专家满额则跳过，某企业候选用完仍不足 k 位时，
+        在尚有余量的专家中重新取候选入堆（每轮候选数翻倍）。
+
+        Args:
+            profiles: 企业画像列表（同 scores）
+            capacity: 统一容量，或 {专家id: 容量}（未列出的专家容量为 0）
+            shortlist: 每家企业每轮候选数（默认 3k）
+
+        Returns:
+            与 profiles 顺序一致的匹配结果列表（各企业内按亲和度降序）
+        """
+        if isinstance(capacity, dict):
+            remaining = np.array([int(capacity.get(e.get('id'), 0)) for e in self.experts], dtype=np.int64)
+        else:
+            remaining = np.full(self.size, int(capacity), dtype=np.int64)
+        shortlist = max(shortlist or 3 * k, k)
+        rounds = [0] * len(profiles)
+        assigned: List[List[Tuple[int, float]]] = [[] for _ in profiles]
+        offered = [set() for _ in profiles]
+        pending = [0] * len(profiles)
+
+        def offer(index, heap_push):
+            # 在尚有余量、且未向该企业提供过的专家中取候选
+            scores = self.scores(profiles[index])
+            scores[remaining <= 0] = -np.inf
+            if offered[index]:
+                scores[np.fromiter(offered[index], dtype=np.int64)] = -np.inf
+            rounds[index] += 1
+            picked = _select(scores, shortlist << min(rounds[index] - 1, 10))
+            for pos, score in zip(picked.tolist(), scores[picked].tolist()):
+                offered[index].add(pos)
+                pending[index] += 1
+                heap_push((-score, index, pos))
+
+        heap = []
+        for index in range(len(profiles)):
+            offer(index, heap.append)
+        heapq.heapify(heap)
+
+        def push(item):
+            heapq.heappush(heap, item)
+
+        while heap:
+            neg_score, index, pos = heapq.heappop(heap)
+            pending[index] -= 1
+            if len(assigned[index]) >= k:
+                continue
+            if remaining[pos] > 0:
+                remaining[pos] -= 1
+                assigned[index].append((pos, -neg_score))
+            if pending[index] == 0 and len(assigned[index]) < k and remaining.any():
+                offer(index, push)
+
+        return [[self.match(pos, score, profile) for pos, score in pairs]
+                for profile, pairs in zip(profiles, assigned)]
+
+
+_cache = {'signature': None, 'index': None}
+_cache_lock = threading.Lock()
+
+
+def _signature(experts: Sequence[Dict]) -> str:
+    """专家表签名：按完整记录计算（match 直接返回缓存中的姓名、单位等字段，不只是索引字段）"""
+    digest = hashlib.blake2b(digest_size=16)
+    for e in experts:
+        digest.update(json.dumps(e, ensure_ascii=False, sort_keys=True, default=str).encode('utf-8'))
+        digest.update(b'\n')
+    return digest.hexdigest()
+
+
+def get_index(experts: Sequence[Dict]) -> ExpertIndex:
+    """专家索引（专家表未变化时复用，新增/修改/删除专家后重建）"""
+    signature = _signature(experts)
+    with _cache_lock:
+        if _cache['signature'] != signature:
+            _cache['index'] = ExpertIndex(experts)
+            _cache['signature'] = signature
+        return _cache['index']
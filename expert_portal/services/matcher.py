@@ -1,9 +1,14 @@
 import os
 import json
+import logging
 from datetime import datetime
 from flask import current_app
 import pandas as pd
 
+from submission_model import Submission
+
+logger = logging.getLogger(__name__)
+
 
 def _list_submission_jsons(limit=200):
     base = current_app.config.get('SUBMISSIONS_FOLDER', 'storage/submissions')
@@ -74,27 +79,50 @@ def _compute_score_from_excel(xlsx_path):
         return {'total': 0.0, 'max': 0.0, 'percentage': 0.0, 'error': str(e)}
 
 
-def _load_submission(json_path):
+_calculator = None
+
+
+def _get_calculator():
+    """延迟创建评分计算器（加载指标体系较慢，进程内复用）"""
+    global _calculator
+    if _calculator is None:
+        from score_calculator import ScoreCalculator
+        _calculator = ScoreCalculator()
+    return _calculator
+
+
+def _score_percentages(submissions):
+    """批量计算各提交得分率（直接使用提交JSON数据），返回与输入顺序一致的得分率列表"""
     try:
-        with open(json_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        # 派生Excel路径：与JSON同目录
-        base_dir = os.path.dirname(json_path)
-        base_name = os.path.basename(json_path)
-        xlsx = os.path.join(base_dir, base_name.replace('submission_', '问卷_').replace('.json', '.xlsx'))
-        return data, xlsx
-    except Exception:
-        return None, None
+        calculator = _get_calculator()
+    except (OSError, ValueError, ImportError) as e:
+        logger.warning(f"指标体系不可用，退回简化打分: {e}")
+    else:
+        # 单份提交计分失败时 score_many 将其记入 errors，得分率按 0 处理
+        batch = calculator.score_many(submissions)
+        pcts = {id(r['source']): r['score_summary']['score_percentage'] for r in batch['results']}
+        return [pcts.get(id(sub), 0.0) for sub in submissions]
+
+    # 指标体系不可用时退回简化打分（需要已导出的Excel）
+    pcts = []
+    for sub in submissions:
+        try:
+            pcts.append(_compute_score_from_excel(sub.export_excel()).get('percentage', 0.0))
+        except Exception:
+            pcts.append(0.0)
+    return pcts
 
 
 def get_expert_matches():
-    items = []
+    submissions = []
     for jp in _list_submission_jsons():
-        data, xlsx = _load_submission(jp)
-        if not data or not os.path.exists(xlsx):
+        try:
+            submissions.append(Submission.from_json_file(jp))
+        except Exception:
             continue
-        sc = _compute_score_from_excel(xlsx)
-        pct = sc.get('percentage', 0.0)
+
+    items = []
+    for sub, pct in zip(submissions, _score_percentages(submissions)):
         if pct >= 80:
             match_level = 'advanced'; priority = '中'
         elif pct >= 60:
@@ -102,11 +130,10 @@ def get_expert_matches():
         else:
             match_level = 'beginner'; priority = '高'
         items.append({
-            'enterprise_name': data.get('enterprise_info', {}).get('企业名称', ''),
-            'current_level': data.get('user_level', 'advanced'),
+            'enterprise_name': sub.enterprise_info.get('企业名称', ''),
+            'current_level': sub.user_level or 'advanced',
             'score_percentage': pct,
             'match_level': match_level,
             'priority': priority
         })
     return items
-
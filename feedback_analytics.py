@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""
+专项反馈统计查询
+供 special_feedback_api 的 /analysis/* 接口使用，统计全部在数据库端用 GROUP BY / 聚合函数完成，
+只返回分组结果，不再把 special_feedbacks 整表读到 Python 中循环：
+- 时间趋势：按日/周/月截断 submitted_at 后分组计数
+- 评分分析：按 rating 分组计数，平均分由分组结果计算
+- 关键指标：一条聚合查询得到总数、通过数、平均评分、平均处理天数、紧急数
+- 分类 / 问题子分类：按 category / subcategory 分组计数
+默认由 feedback_rollup 的按日汇总表回答，本模块为汇总表停用（FEEDBACK_ANALYTICS_SOURCE=table）
+或不可用时的明细表查询。
+查询命中 db/060_feedback.sql 中以 submitted_at 开头的覆盖索引（idx_time_cover）。
+SQL 按方言生成（MySQL；SQLite 用于本地测试）。
+"""
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+
+# 统计的评分档位
+RATING_LEVELS = (1, 2, 3, 4, 5)
+
+# 周期 -> 分组键（与原 Python 实现的 strftime 格式一致：'%Y-%m-%d' / '%Y-W%W' / '%Y-%m'）
+# MySQL WEEK(d, 5)：周一为一周第一天，第一个周一之前为第 0 周，与 strftime('%W') 相同
+PERIOD_KEYS = {
+    'mysql': {
+        'day': "DATE_FORMAT(submitted_at, '%Y-%m-%d')",
+        'week': "CONCAT(YEAR(submitted_at), '-W', LPAD(WEEK(submitted_at, 5), 2, '0'))",
+        'month': "DATE_FORMAT(submitted_at, '%Y-%m')",
+    },
+    'sqlite': {
+        'day': "strftime('%Y-%m-%d', submitted_at)",
+        'week': "strftime('%Y-W%W', submitted_at)",
+        'month': "strftime('%Y-%m', submitted_at)",
+    },
+}
+
+# 处理天数（审核时间 - 提交时间，取整天）
+PROCESSING_DAYS = {
+    'mysql': 'TIMESTAMPDIFF(DAY, submitted_at, reviewed_at)',
+    'sqlite': 'CAST(julianday(reviewed_at) - julianday(submitted_at) AS INTEGER)',
+}
+
+
+def dialect_name(conn) -> str:
+    """连接/会话对应的方言（未知方言按 MySQL 处理）"""
+    bind = conn.get_bind() if hasattr(conn, 'get_bind') else conn
+    name = getattr(getattr(bind, 'dialect', None), 'name', 'mysql')
+    return name if name in PERIOD_KEYS else 'mysql'
+
+
+def period_key(period: str, dialect: str = 'mysql') -> str:
+    """分组键表达式（未知周期按月）"""
+    keys = PERIOD_KEYS.get(dialect, PERIOD_KEYS['mysql'])
+    return keys.get(period, keys['month'])
+
+
+def date_conditions(date_from: Optional[str] = None, date_to: Optional[str] = None) -> Tuple[List[str], Dict]:
+    """提交时间范围条件（空值忽略）"""
+    conditions, params = [], {}
+    if date_from:
+        conditions.append('submitted_at >= :date_from')
+        params['date_from'] = date_from
+    if date_to:
+        conditions.append('submitted_at <= :date_to')
+        params['date_to'] = date_to
+    return conditions, params
+
+
+def _where(conditions: List[str]) -> str:
+    return ' AND '.join(conditions) if conditions else '1=1'
+
+
+def category_breakdown(conn, date_from=None, date_to=None) -> List[Tuple[str, int]]:
+    """按分类计数 [(分类, 数量)]"""
+    conditions, params = date_conditions(date_from, date_to)
+    rows = conn.execute(text(
+        f'SELECT category, COUNT(*) FROM special_feedbacks WHERE {_where(conditions)} GROUP BY category'
+    ), params).all()
+    return [(category, int(count)) for category, count in rows]
+
+
+def issue_breakdown(conn, date_from=None, date_to=None) -> List[Tuple[Optional[str], int]]:
+    """问题意见反馈按子分类计数 [(子分类, 数量)]"""
+    conditions, params = date_conditions(date_from, date_to)
+    conditions.insert(0, "category = 'issue_feedback'")
+    rows = conn.execute(text(
+        f'SELECT subcategory, COUNT(*) FROM special_feedbacks WHERE {_where(conditions)} GROUP BY subcategory'
+    ), params).all()
+    return [(subcategory, int(count)) for subcategory, count in rows]
+
+
+def trend(conn, date_from=None, date_to=None, period: str = 'day') -> List[Dict]:
+    """按周期统计提交数量 [{'date', 'count'}]（按日期升序）"""
+    conditions, params = date_conditions(date_from, date_to)
+    conditions.append('submitted_at IS NOT NULL')
+    bucket = period_key(period, dialect_name(conn))
+    rows = conn.execute(text(
+        f'SELECT {bucket} AS bucket, COUNT(*) AS cnt FROM special_feedbacks '
+        f'WHERE {_where(conditions)} GROUP BY bucket ORDER BY bucket'
+    ), params).all()
+    return [{'date': bucket, 'count': int(count)} for bucket, count in rows]
+
+
+def rating_summary(conn, date_from=None, date_to=None) -> Dict:
+    """评分分布与平均分 {'average_rating', 'distribution'}"""
+    conditions, params = date_conditions(date_from, date_to)
+    conditions.append('rating IS NOT NULL')
+    rows = conn.execute(text(
+        f'SELECT rating, COUNT(*) AS cnt FROM special_feedbacks WHERE {_where(conditions)} GROUP BY rating'
+    ), params).all()
+    distribution = {level: 0 for level in RATING_LEVELS}
+    total = count = 0
+    for rating, cnt in rows:
+        rating, cnt = int(rating), int(cnt)
+        if rating:  # 与原实现一致：0 分不计入平均
+            total += rating * cnt
+            count += cnt
+        if rating in distribution:
+            distribution[rating] += cnt
+    return {
+        'average_rating': round(total / count, 2) if count else 0,
+        'distribution': distribution,
+    }
+
+
+def key_metrics(conn, date_from=None, date_to=None) -> Dict:
+    """关键指标（总数、平均评分、通过率、平均处理天数、紧急占比）"""
+    conditions, params = date_conditions(date_from, date_to)
+    days = PROCESSING_DAYS[dialect_name(conn)]
+    row = conn.execute(text(
+        'SELECT COUNT(*) AS total, '
+        "SUM(CASE WHEN status = 'approved' THEN 1 ELSE 0 END) AS approved, "
+        'AVG(NULLIF(rating, 0)) AS avg_rating, '
+        f'AVG(CASE WHEN submitted_at IS NOT NULL AND reviewed_at IS NOT NULL THEN {days} END) AS avg_days, '
+        "SUM(CASE WHEN priority = 'urgent' THEN 1 ELSE 0 END) AS urgent "
+        f'FROM special_feedbacks WHERE {_where(conditions)}'
+    ), params).one()
+    total = int(row.total or 0)
+    return {
+        'total_feedbacks': total,
+        'average_rating': round(float(row.avg_rating or 0), 2),
+        'approval_rate': round(int(row.approved or 0) / total, 2) if total else 0,
+        'avg_processing_time': round(float(row.avg_days or 0), 1),
+        'high_priority_ratio': round(int(row.urgent or 0) / total, 2) if total else 0,
+    }
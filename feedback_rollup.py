@@ -0,0 +1,313 @@
+# -*- coding: utf-8 -*-
+"""
+专项反馈按日汇总表（feedback_daily_rollup）
+/analysis/* 接口从汇总表统计：任意日期范围只需累加范围内的汇总行（天数 × 维度组合，通常几百行），
+不再扫描 special_feedbacks 明细表。
+- 汇总键：(day, category, subcategory, status, priority)，day 为提交日期；未提交（submitted_at 为空）的
+  反馈记在 UNSUBMITTED_DAY 下，只在不限日期时计入
+- 汇总值：反馈数、有效评分数/评分和/1~5 分分布、已审核数/处理天数和
+- 增量维护：创建/审核(更新)/删除反馈时，在同一事务内对新旧两个汇总键做 +1/-1（record_change），
+  与反馈本身一起提交或回滚
+- rebuild() 用一条 INSERT ... SELECT ... GROUP BY 从明细表重建；check() 对比汇总表与明细表的聚合结果
+
+命令行：
+    python feedback_rollup.py rebuild   # 重建汇总表
+    python feedback_rollup.py check     # 一致性检查（不一致时退出码为 1）
+"""
+import logging
+import os
+from datetime import date, datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_TABLE = 'feedback_daily_rollup'
+ROLLUP_KEY = ('day', 'category', 'subcategory', 'status', 'priority')
+RATING_LEVELS = (1, 2, 3, 4, 5)
+ROLLUP_MEASURES = (('feedback_count', 'rated_count', 'rating_sum')
+                   + tuple(f'rating_{level}' for level in RATING_LEVELS)
+                   + ('reviewed_count', 'processing_days_sum'))
+
+# 未提交反馈的汇总日期（MySQL DATE 的最小值）
+UNSUBMITTED_DAY = '1000-01-01'
+
+# 统计数据来源：rollup（汇总表，默认）/ table（明细表聚合查询，见 feedback_analytics）
+_source = {'rollup': os.environ.get('FEEDBACK_ANALYTICS_SOURCE', 'rollup') == 'rollup'}
+
+
+def rollup_enabled() -> bool:
+    return _source['rollup']
+
+
+Contribution = Tuple[Tuple, Tuple[int, ...]]
+
+
+def _dialect(conn) -> str:
+    bind = conn.get_bind() if hasattr(conn, 'get_bind') else conn
+    return getattr(getattr(bind, 'dialect', None), 'name', 'mysql')
+
+
+def _value(feedback, name):
+    if isinstance(feedback, dict):
+        return feedback.get(name)
+    return getattr(feedback, name, None)
+
+
+def _as_datetime(value) -> Optional[datetime]:
+    if value is None or isinstance(value, datetime):
+        return value
+    if isinstance(value, date):
+        return datetime(value.year, value.month, value.day)
+    return datetime.fromisoformat(str(value))
+
+
+# ----------------------------------------------------------------------
+# 增量维护
+# ----------------------------------------------------------------------
+
+def contribution(feedback) -> Contribution:
+    """一条反馈对汇总表的贡献：(汇总键, 汇总值)；feedback 为模型对象或字典"""
+    submitted_at = _as_datetime(_value(feedback, 'submitted_at'))
+    reviewed_at = _as_datetime(_value(feedback, 'reviewed_at'))
+    rating = _value(feedback, 'rating')
+    rating = int(rating) if rating is not None else None
+    key = (
+        submitted_at.date().isoformat() if submitted_at else UNSUBMITTED_DAY,
+        _value(feedback, 'category') or '',
+        _value(feedback, 'subcategory') or '',
+        _value(feedback, 'status') or '',
+        _value(feedback, 'priority') or '',
+    )
+    reviewed = submitted_at is not None and reviewed_at is not None
+    measures = ((1, 1 if rating else 0, rating or 0)
+                + tuple(1 if rating == level else 0 for level in RATING_LEVELS)
+                + (1 if reviewed else 0, (reviewed_at - submitted_at).days if reviewed else 0))
+    return key, measures
+
+
+def _upsert_sql(dialect: str) -> str:
+    columns = ROLLUP_KEY + ROLLUP_MEASURES
+    insert = (f"INSERT INTO {ROLLUP_TABLE} ({', '.join(columns)}) "
+              f"VALUES ({', '.join(':' + c for c in columns)})")
+    if dialect == 'sqlite':
+        updates = ', '.join(f'{m} = {m} + excluded.{m}' for m in ROLLUP_MEASURES)
+        return f"{insert} ON CONFLICT ({', '.join(ROLLUP_KEY)}) DO UPDATE SET {updates}"
+    updates = ', '.join(f'{m} = {m} + VALUES({m})' for m in ROLLUP_MEASURES)
+    return f'{insert} ON DUPLICATE KEY UPDATE {updates}'
+
+
+def record_change(conn, before: Optional[Contribution], after: Optional[Contribution]):
+    """
+    把一条反馈的变化记入汇总表（调用方负责提交事务）
+
+    Args:
+        before: 变化前的贡献（新建时为 None）
+        after: 变化后的贡献（删除时为 None）
+    """
+    if not rollup_enabled():
+        return
+    deltas: Dict[Tuple, List[int]] = {}
+    for item, sign in ((before, -1), (after, 1)):
+        if item is None:
+            continue
+        key, measures = item
+        delta = deltas.setdefault(key, [0] * len(ROLLUP_MEASURES))
+        for i, value in enumerate(measures):
+            delta[i] += sign * value
+    sql = text(_upsert_sql(_dialect(conn)))
+    for key, delta in deltas.items():
+        if not any(delta):
+            continue
+        conn.execute(sql, dict(zip(ROLLUP_KEY + ROLLUP_MEASURES, key + tuple(delta))))
+        if delta[0] < 0:
+            conn.execute(text(
+                f"DELETE FROM {ROLLUP_TABLE} WHERE feedback_count <= 0 AND "
+                + ' AND '.join(f'{k} = :{k}' for k in ROLLUP_KEY)
+            ), dict(zip(ROLLUP_KEY, key)))
+
+
+# ----------------------------------------------------------------------
+# 重建与一致性检查
+# ----------------------------------------------------------------------
+
+def _aggregate_select(dialect: str) -> str:
+    """从明细表按汇总键聚合（列顺序同 ROLLUP_KEY + ROLLUP_MEASURES）"""
+    if dialect == 'sqlite':
+        day = f"COALESCE(date(submitted_at), '{UNSUBMITTED_DAY}')"
+        days = 'CAST(julianday(reviewed_at) - julianday(submitted_at) AS INTEGER)'
+    else:
+        day = f"COALESCE(DATE(submitted_at), '{UNSUBMITTED_DAY}')"
+        days = 'TIMESTAMPDIFF(DAY, submitted_at, reviewed_at)'
+    reviewed = 'submitted_at IS NOT NULL AND reviewed_at IS NOT NULL'
+    measures = [
+        'COUNT(*)',
+        'SUM(CASE WHEN rating IS NOT NULL AND rating <> 0 THEN 1 ELSE 0 END)',
+        'COALESCE(SUM(rating), 0)',
+    ] + [f'SUM(CASE WHEN rating = {level} THEN 1 ELSE 0 END)' for level in RATING_LEVELS] + [
+        f'SUM(CASE WHEN {reviewed} THEN 1 ELSE 0 END)',
+        f'COALESCE(SUM(CASE WHEN {reviewed} THEN {days} END), 0)',
+    ]
+    return (f"SELECT {day} AS day, category, COALESCE(subcategory, '') AS subcategory, "
+            f"COALESCE(status, '') AS status, COALESCE(priority, '') AS priority, "
+            f"{', '.join(measures)} FROM special_feedbacks GROUP BY 1, 2, 3, 4, 5")
+
+
+def rebuild(conn) -> int:
+    """从明细表重建汇总表（调用方负责提交事务），返回汇总行数"""
+    conn.execute(text(f'DELETE FROM {ROLLUP_TABLE}'))
+    columns = ', '.join(ROLLUP_KEY + ROLLUP_MEASURES)
+    conn.execute(text(f'INSERT INTO {ROLLUP_TABLE} ({columns}) {_aggregate_select(_dialect(conn))}'))
+    return int(conn.execute(text(f'SELECT COUNT(*) FROM {ROLLUP_TABLE}')).scalar())
+
+
+def _rows_by_key(rows) -> Dict[Tuple, Tuple[int, ...]]:
+    result = {}
+    for row in rows:
+        key = (str(row[0])[:10],) + tuple(row[1:5])
+        result[key] = tuple(int(v or 0) for v in row[5:])
+    return result
+
+
+def check(conn) -> List[Dict]:
+    """
+    一致性检查：汇总表与明细表的实时聚合逐键比较
+
+    Returns:
+        不一致的汇总键列表 [{'key', 'expected', 'actual'}]（一致时为空）
+    """
+    expected = _rows_by_key(conn.execute(text(_aggregate_select(_dialect(conn)))).all())
+    columns = ', '.join(ROLLUP_KEY + ROLLUP_MEASURES)
+    actual = _rows_by_key(conn.execute(
+        text(f'SELECT {columns} FROM {ROLLUP_TABLE} WHERE feedback_count <> 0')).all())
+    mismatches = []
+    for key in sorted(set(expected) | set(actual)):
+        if expected.get(key) != actual.get(key):
+            mismatches.append({
+                'key': dict(zip(ROLLUP_KEY, key)),
+                'expected': dict(zip(ROLLUP_MEASURES, expected[key])) if key in expected else None,
+                'actual': dict(zip(ROLLUP_MEASURES, actual[key])) if key in actual else None,
+            })
+    return mismatches
+
+
+# ----------------------------------------------------------------------
+# 统计查询（返回结构与 feedback_analytics 相同）
+# ----------------------------------------------------------------------
+
+def _range(date_from: Optional[str], date_to: Optional[str]) -> Tuple[str, Dict]:
+    """日期范围（按天，含首尾两天）；限定范围时排除未提交的反馈"""
+    conditions, params = [], {}
+    if date_from:
+        conditions.append('day >= :day_from')
+        params['day_from'] = str(date_from)[:10]
+    if date_to:
+        conditions.append('day <= :day_to')
+        params['day_to'] = str(date_to)[:10]
+    if conditions:
+        conditions.append('day <> :unsubmitted')
+        params['unsubmitted'] = UNSUBMITTED_DAY
+    return ' AND '.join(conditions) if conditions else '1=1', params
+
+
+def category_breakdown(conn, date_from=None, date_to=None) -> List[Tuple[str, int]]:
+    """按分类计数 [(分类, 数量)]"""
+    where, params = _range(date_from, date_to)
+    rows = conn.execute(text(
+        f'SELECT category, SUM(feedback_count) FROM {ROLLUP_TABLE} WHERE {where} '
+        f'GROUP BY category HAVING SUM(feedback_count) > 0'
+    ), params).all()
+    return [(category, int(count)) for category, count in rows]
+
+
+def issue_breakdown(conn, date_from=None, date_to=None) -> List[Tuple[Optional[str], int]]:
+    """问题意见反馈按子分类计数 [(子分类, 数量)]"""
+    where, params = _range(date_from, date_to)
+    rows = conn.execute(text(
+        f"SELECT subcategory, SUM(feedback_count) FROM {ROLLUP_TABLE} "
+        f"WHERE category = 'issue_feedback' AND {where} "
+        f"GROUP BY subcategory HAVING SUM(feedback_count) > 0"
+    ), params).all()
+    return [(subcategory or None, int(count)) for subcategory, count in rows]
+
+
+def trend(conn, date_from=None, date_to=None, period: str = 'day') -> List[Dict]:
+    """按周期统计提交数量 [{'date', 'count'}]（先按天汇总，再在 Python 中归并到周/月）"""
+    where, params = _range(date_from, date_to)
+    params['unsubmitted'] = UNSUBMITTED_DAY
+    rows = conn.execute(text(
+        f'SELECT day, SUM(feedback_count) FROM {ROLLUP_TABLE} WHERE {where} AND day <> :unsubmitted GROUP BY day'
+    ), params).all()
+    fmt = {'day': '%Y-%m-%d', 'week': '%Y-W%W'}.get(period, '%Y-%m')
+    buckets: Dict[str, int] = {}
+    for day, count in rows:
+        key = _as_datetime(str(day)[:10]).strftime(fmt)
+        buckets[key] = buckets.get(key, 0) + int(count)
+    return [{'date': key, 'count': count} for key, count in sorted(buckets.items()) if count]
+
+
+def _sums(conn, date_from, date_to, extra: str = '') -> Dict:
+    where, params = _range(date_from, date_to)
+    columns = ', '.join(f'SUM({m}) AS {m}' for m in ROLLUP_MEASURES)
+    row = conn.execute(text(f'SELECT {columns}{extra} FROM {ROLLUP_TABLE} WHERE {where}'), params).one()
+    return {k: int(v or 0) for k, v in row._mapping.items()}
+
+
+def rating_summary(conn, date_from=None, date_to=None) -> Dict:
+    """评分分布与平均分 {'average_rating', 'distribution'}"""
+    sums = _sums(conn, date_from, date_to)
+    rated = sums['rated_count']
+    return {
+        'average_rating': round(sums['rating_sum'] / rated, 2) if rated else 0,
+        'distribution': {level: sums[f'rating_{level}'] for level in RATING_LEVELS},
+    }
+
+
+def key_metrics(conn, date_from=None, date_to=None) -> Dict:
+    """关键指标（总数、平均评分、通过率、平均处理天数、紧急占比）"""
+    sums = _sums(conn, date_from, date_to, extra=(
+        ", SUM(CASE WHEN status = 'approved' THEN feedback_count ELSE 0 END) AS approved"
+        ", SUM(CASE WHEN priority = 'urgent' THEN feedback_count ELSE 0 END) AS urgent"))
+    total, rated, reviewed = sums['feedback_count'], sums['rated_count'], sums['reviewed_count']
+    return {
+        'total_feedbacks': total,
+        'average_rating': round(sums['rating_sum'] / rated, 2) if rated else 0,
+        'approval_rate': round(sums['approved'] / total, 2) if total else 0,
+        'avg_processing_time': round(sums['processing_days_sum'] / reviewed, 1) if reviewed else 0,
+        'high_priority_ratio': round(sums['urgent'] / total, 2) if total else 0,
+    }
+
+
+# ----------------------------------------------------------------------
+# 命令行
+# ----------------------------------------------------------------------
+
+def main(argv=None) -> int:
+    import argparse
+    from sqlalchemy import create_engine
+    from init_chamber_users_db import get_connection_string
+
+    parser = argparse.ArgumentParser(description='专项反馈汇总表维护')
+    parser.add_argument('command', choices=['rebuild', 'check'], help='rebuild: 从明细表重建；check: 一致性检查')
+    parser.add_argument('--url', default=None, help='数据库连接串（默认按 DB_* 环境变量连接 MySQL）')
+    args = parser.parse_args(argv)
+
+    engine = create_engine(args.url or get_connection_string())
+    with engine.begin() as conn:
+        if args.command == 'rebuild':
+            count = rebuild(conn)
+            print(f"汇总表已重建: {count} 行")
+            return 0
+        mismatches = check(conn)
+    for item in mismatches[:20]:
+        print(f"[不一致] {item['key']}: 应为 {item['expected']}，实际 {item['actual']}")
+    if mismatches:
+        print(f"共 {len(mismatches)} 个汇总键不一致，可执行 rebuild 修复")
+        return 1
+    print("汇总表与明细表一致")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
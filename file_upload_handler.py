@@ -2,14 +2,17 @@
 """
 文件上传处理模块
 处理问卷附件的上传、存储和管理
+附件内容按 SHA-256 只保存一份（attachment_store），提交目录下是指向内容的硬链接；
+删除与清理只删除引用，无引用的内容由 gc 回收
 """
 import os
 import json
-import uuid
 from datetime import datetime
 from werkzeug.utils import secure_filename
 import logging
 
+from attachment_store import BLOB_DIR_NAME, AttachmentStore
+
 logger = logging.getLogger(__name__)
 
 # 允许的文件类型
@@ -35,6 +38,7 @@ class FileUploadHandler:
         """
         self.upload_base_dir = upload_base_dir
         self.ensure_upload_dir()
+        self.store = AttachmentStore(upload_base_dir, MAX_FILE_SIZE)
 
     def ensure_upload_dir(self):
         """确保上传目录存在"""
@@ -107,41 +111,50 @@ class FileUploadHandler:
             if not is_valid:
                 return False, error_msg
 
-            # 创建提交目录
-            submission_dir = os.path.join(self.upload_base_dir, submission_id)
-            os.makedirs(submission_dir, exist_ok=True)
-
-            # 生成安全的文件名
-            file_ext = original_filename.rsplit('.', 1)[1].lower()
-            safe_filename = f"{question_id}_{uuid.uuid4().hex[:8]}.{file_ext}"
-            file_path = os.path.join(submission_dir, safe_filename)
-
-            # 保存文件
             file_obj.seek(0)
-            file_obj.save(file_path)
-
-            # 获取文件信息
-            file_size = os.path.getsize(file_path)
-            file_info = {
-                'id': str(uuid.uuid4()),
-                'submission_id': submission_id,
-                'question_id': question_id,
-                'original_name': original_filename,
-                'saved_name': safe_filename,
-                'file_path': file_path,
-                'file_size': file_size,
-                'file_type': file_ext,
-                'upload_time': datetime.now().isoformat(),
-                'status': 'uploaded'
-            }
-
-            logger.info(f"文件保存成功: {file_path}")
-            return True, file_info
+            return True, self.store_file(file_obj, submission_id, question_id, original_filename)
 
         except Exception as e:
             logger.error(f"保存文件失败: {e}")
             return False, f"保存文件失败: {str(e)}"
 
+    def store_file(self, file_obj, submission_id, question_id, original_filename):
+        """
+        写入附件存储并登记引用（不做类型校验；超过大小限制时抛出 AttachmentTooLarge）
+
+        Args:
+            file_obj: 文件对象（FileStorage 或可读的二进制流）
+            submission_id: 问卷提交ID
+            question_id: 问题ID
+            original_filename: 原始文件名
+
+        Returns:
+            文件信息
+        """
+        file_ext = original_filename.rsplit('.', 1)[1].lower() if '.' in original_filename else 'bin'
+        sha256, file_size, created = self.store.put_stream(getattr(file_obj, 'stream', file_obj))
+        ref, new_ref = self.store.add_ref(sha256, submission_id, question_id, original_filename, file_ext)
+        file_path = ref['view_path']
+        file_info = {
+            'id': ref['id'],
+            'submission_id': submission_id,
+            'question_id': question_id,
+            'original_name': original_filename,
+            'saved_name': os.path.basename(file_path),
+            'file_path': file_path,
+            'file_size': file_size,
+            'file_type': file_ext,
+            'sha256': sha256,
+            'deduplicated': not created,
+            # 同一问题此前已上传过相同内容时为 False（id/file_path 为已有引用）
+            'new_ref': new_ref,
+            'upload_time': datetime.now().isoformat(),
+            'status': 'uploaded'
+        }
+
+        logger.info(f"文件保存成功: {file_path}{'（内容已存在，未重复存储）' if not created else ''}")
+        return file_info
+
     def delete_file(self, file_path):
         """
         删除文件
@@ -153,6 +166,12 @@ class FileUploadHandler:
             是否成功
         """
         try:
+            ref = self.store.find_ref(file_path)
+            if ref is not None:
+                self.store.remove_ref(ref)
+                self.store.gc()
+                logger.info(f"文件已删除: {file_path}")
+                return True
             if os.path.exists(file_path):
                 os.remove(file_path)
                 logger.info(f"文件已删除: {file_path}")
@@ -213,6 +232,16 @@ class FileUploadHandler:
                             ).isoformat()
                         })
 
+            # 不支持硬链接时引用直接指向内容文件，不在提交目录中
+            for ref in self.store.refs_for_submission(submission_id):
+                if ref['view_path'] == self.store.blob_path(ref['sha256']) and os.path.isfile(ref['view_path']):
+                    files.append({
+                        'name': ref['original_name'],
+                        'path': ref['view_path'],
+                        'size': os.path.getsize(ref['view_path']),
+                        'modified_time': datetime.fromtimestamp(ref['created_at']).isoformat()
+                    })
+
             return files
         except Exception as e:
             logger.error(f"列出文件失败: {e}")
@@ -221,6 +250,8 @@ class FileUploadHandler:
     def cleanup_old_files(self, days=30):
         """
         清理旧文件（超过指定天数）
+        按引用的登记时间删除引用（硬链接与内容共用 mtime，不能按文件时间判断），
+        再回收无引用的内容；未登记引用的旧文件仍按修改时间删除
         
         Args:
             days: 天数
@@ -233,19 +264,28 @@ class FileUploadHandler:
             cutoff_time = time.time() - (days * 24 * 60 * 60)
             cleaned_count = 0
 
+            for ref in self.store.refs_older_than(cutoff_time):
+                self.store.remove_ref(ref)
+                cleaned_count += 1
+                logger.info(f"已删除旧文件: {ref['view_path']}")
+
             for submission_id in os.listdir(self.upload_base_dir):
                 submission_dir = os.path.join(self.upload_base_dir, submission_id)
-                if not os.path.isdir(submission_dir):
+                if submission_id == BLOB_DIR_NAME or not os.path.isdir(submission_dir):
                     continue
 
                 for filename in os.listdir(submission_dir):
                     file_path = os.path.join(submission_dir, filename)
-                    if os.path.isfile(file_path):
+                    if os.path.isfile(file_path) and self.store.find_ref(file_path) is None:
                         if os.path.getmtime(file_path) < cutoff_time:
                             os.remove(file_path)
                             cleaned_count += 1
                             logger.info(f"已删除旧文件: {file_path}")
 
+            result = self.store.gc()
+            if result['blobs_removed']:
+                logger.info(f"已回收附件内容 {result['blobs_removed']} 份，释放 {result['bytes_freed']} 字节")
+
             return cleaned_count
         except Exception as e:
             logger.error(f"清理旧文件失败: {e}")
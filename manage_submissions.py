@@ -12,6 +12,8 @@ from questionnaire_submission_manager import QuestionnaireSubmissionManager
 from enterprise_report_generator import EnterpriseReportGenerator
 from pdf_report_generator import PDFReportGenerator
 from notification_service import NotificationService
+from batch_report_renderer import BatchManifest, default_workers, render_batch
+from bulk_mailer import BulkMailer, MailOutbox
 
 
 def print_menu():
@@ -72,13 +74,9 @@ def generate_word_report_for_submission(manager):
 
             for idx, sub in enumerate(submissions, 1):
                 try:
-                    excel_path = sub['filepath'].replace('.json', '.xlsx').replace('submission_', '问卷_')
-
-                    if os.path.exists(excel_path):
-                        report_path = report_generator.generate_report(excel_path)
-                        print(f"  [{idx}/{len(submissions)}] {sub['enterprise_name']}: {report_path}")
-                    else:
-                        print(f"  [{idx}/{len(submissions)}] {sub['enterprise_name']}: Excel文件不存在")
+                    # 直接使用提交的JSON数据，无需Excel中转
+                    report_path = report_generator.generate_report(sub['filepath'])
+                    print(f"  [{idx}/{len(submissions)}] {sub['enterprise_name']}: {report_path}")
 
                 except Exception as e:
                     print(f"  [{idx}/{len(submissions)}] {sub['enterprise_name']}: 生成失败 - {e}")
@@ -88,14 +86,9 @@ def generate_word_report_for_submission(manager):
         elif 1 <= choice <= len(submissions):
             # 生成单个
             selected_sub = submissions[choice - 1]
-            excel_path = selected_sub['filepath'].replace('.json', '.xlsx').replace('submission_', '问卷_')
-
-            if not os.path.exists(excel_path):
-                print(f"\n[ERROR] Excel文件不存在: {excel_path}")
-                return
 
             report_generator = EnterpriseReportGenerator()
-            report_path = report_generator.generate_report(excel_path)
+            report_path = report_generator.generate_report(selected_sub['filepath'])
 
             print(f"\n[SUCCESS] Word报告已生成: {report_path}")
 
@@ -135,13 +128,9 @@ def generate_pdf_report_for_submission(manager):
 
             for idx, sub in enumerate(submissions, 1):
                 try:
-                    excel_path = sub['filepath'].replace('.json', '.xlsx').replace('submission_', '问卷_')
-
-                    if os.path.exists(excel_path):
-                        report_path = report_generator.generate_report(excel_path)
-                        print(f"  [{idx}/{len(submissions)}] {sub['enterprise_name']}: {report_path}")
-                    else:
-                        print(f"  [{idx}/{len(submissions)}] {sub['enterprise_name']}: Excel文件不存在")
+                    # 直接使用提交的JSON数据，无需Excel中转
+                    report_path = report_generator.generate_report(sub['filepath'])
+                    print(f"  [{idx}/{len(submissions)}] {sub['enterprise_name']}: {report_path}")
 
                 except Exception as e:
                     print(f"  [{idx}/{len(submissions)}] {sub['enterprise_name']}: 生成失败 - {e}")
@@ -151,14 +140,9 @@ def generate_pdf_report_for_submission(manager):
         elif 1 <= choice <= len(submissions):
             # 生成单个
             selected_sub = submissions[choice - 1]
-            excel_path = selected_sub['filepath'].replace('.json', '.xlsx').replace('submission_', '问卷_')
-
-            if not os.path.exists(excel_path):
-                print(f"\n[ERROR] Excel文件不存在: {excel_path}")
-                return
 
             report_generator = PDFReportGenerator()
-            report_path = report_generator.generate_report(excel_path)
+            report_path = report_generator.generate_report(selected_sub['filepath'])
 
             print(f"\n[SUCCESS] PDF报告已生成: {report_path}")
 
@@ -192,82 +176,117 @@ def batch_generate_and_send_email(manager):
         print("\n[INFO] 操作已取消")
         return
 
-    # 选择报告格式
-    print("\n请选择报告格式:")
-    print("1. Word格式")
-    print("2. PDF格式")
-    print("3. Word + PDF（两种格式都生成）")
-
-    format_choice = input("\n请输入选项 (1-3): ").strip()
+    # 检查是否有中断的批量任务
+    manifest = BatchManifest.find_unfinished('manage_submissions')
+    if manifest:
+        counts = manifest.summary()
+        print(f"\n[INFO] 检测到未完成的批量任务 {manifest.job_id}"
+              f"（已完成 {counts.get('done', 0)}/{len(manifest.items)}）")
+        if input("是否继续该任务? (y/n): ").strip().lower() != 'y':
+            manifest = None
+
+    if manifest is None:
+        # 选择报告格式
+        print("\n请选择报告格式:")
+        print("1. Word格式")
+        print("2. PDF格式")
+        print("3. Word + PDF（两种格式都生成）")
+
+        format_choice = input("\n请输入选项 (1-3): ").strip()
+        formats = {'1': ['word'], '2': ['pdf'], '3': ['word', 'pdf']}.get(format_choice)
+        if not formats:
+            print("\n[ERROR] 无效的选项")
+            return
+        manifest = BatchManifest.create('manage_submissions', formats)
+
+    workers_input = input(f"\n并行进程数 (直接回车使用 {default_workers()}): ").strip()
+    workers = int(workers_input) if workers_input.isdigit() and int(workers_input) > 0 else default_workers()
 
     # 初始化
     notification_service = NotificationService()
-    word_generator = EnterpriseReportGenerator() if format_choice in ['1', '3'] else None
-    pdf_generator = PDFReportGenerator() if format_choice in ['2', '3'] else None
 
     success_count = 0
     failed_count = 0
 
-    print("\n[INFO] 开始处理...\n")
+    print(f"\n[INFO] 开始处理（任务 {manifest.job_id}，{workers} 个进程）...\n")
 
-    for idx, sub in enumerate(submissions, 1):
+    # 先筛选出可生成报告的提交
+    items = []
+    contacts = {}
+    for sub in submissions:
+        key = sub['filename']
         try:
-            # 获取提交数据
-            submission_data = manager.get_submission_by_filename(sub['filename'])
+            submission_data = manager.get_submission_by_filename(key)
             enterprise_info = submission_data['enterprise_info']
             enterprise_name = enterprise_info.get('企业名称', '')
             email = enterprise_info.get('联系人邮箱', '')
-            contact_name = enterprise_info.get('联系人姓名', '')
 
             if not email:
-                print(f"  [{idx}/{len(submissions)}] {enterprise_name}: 跳过（无邮箱地址）")
+                print(f"  {enterprise_name}: 跳过（无邮箱地址）")
+                manifest.update(key, status='skipped', error='无邮箱地址')
                 failed_count += 1
                 continue
 
-            # 查找Excel文件
-            excel_path = sub['filepath'].replace('.json', '.xlsx').replace('submission_', '问卷_')
+            contacts[key] = (enterprise_name, email, enterprise_info.get('联系人姓名', ''))
+            items.append({'key': key, 'source_path': sub['filepath']})
+        except Exception as e:
+            print(f"  {sub['enterprise_name']}: 失败 - {e}")
+            failed_count += 1
 
-            if not os.path.exists(excel_path):
-                print(f"  [{idx}/{len(submissions)}] {enterprise_name}: 跳过（Excel文件不存在）")
-                failed_count += 1
-                continue
+    # 邮件由发送线程复用 SMTP 会话并发发送，发送状态记入任务对应的发件箱
+    mailer = BulkMailer(notification_service, outbox=MailOutbox.for_job(manifest.job_id))
 
-            # 生成报告
-            report_paths = []
-
-            if word_generator:
-                word_path = word_generator.generate_report(excel_path)
-                report_paths.append(word_path)
-
-            if pdf_generator:
-                pdf_path = pdf_generator.generate_report(excel_path)
-                report_paths.append(pdf_path)
-
-            # 发送邮件
-            email_sent = notification_service.send_email(
-                to_email=email,
-                enterprise_name=enterprise_name,
-                contact_name=contact_name,
-                report_url='',  # 终端生成不需要URL
-                attachment_path=report_paths[0] if report_paths else None
-            )
-
-            if email_sent:
-                print(f"  [{idx}/{len(submissions)}] {enterprise_name}: 成功")
-                success_count += 1
-            else:
-                print(f"  [{idx}/{len(submissions)}] {enterprise_name}: 邮件发送失败")
-                failed_count += 1
+    # 并行生成报告，每完成一份立即加入发送队列
+    for idx, result in enumerate(render_batch(items, manifest, workers=workers), 1):
+        key = result['key']
+        enterprise_name, email, contact_name = contacts[key]
+        prefix = f"  [{idx}/{len(items)}] {enterprise_name}"
 
-        except Exception as e:
-            print(f"  [{idx}/{len(submissions)}] {sub['enterprise_name']}: 失败 - {e}")
+        if result['status'] != 'done':
+            print(f"{prefix}: 失败 - {result['error']}")
+            failed_count += 1
+            continue
+
+        if result['resumed'] and manifest.items[key].get('email') == 'sent':
+            print(f"{prefix}: 成功（此前已完成）")
+            success_count += 1
+            continue
+
+        report_paths = [result['outputs'][fmt] for fmt in manifest.data['formats']]
+        queued = mailer.submit(key, to_email=email, enterprise_name=enterprise_name,
+                               contact_name=contact_name,
+                               report_url='',  # 终端生成不需要URL
+                               attachment_path=report_paths[0] if report_paths else None)
+        if queued is None:
+            # 发件箱中已记录发送成功（上次运行在更新清单前中断）
+            manifest.update(key, email='sent')
+            print(f"{prefix}: 成功（邮件此前已发送）")
+            success_count += 1
+            continue
+        print(f"{prefix}: 报告已生成（{result['seconds']:.1f}s），邮件已加入发送队列")
+
+    # 等待邮件发送完成
+    for result in mailer.as_completed():
+        key = result['key']
+        enterprise_name = contacts[key][0]
+        email_sent = result['status'] == 'sent'
+        manifest.update(key, email='sent' if email_sent else 'failed')
+        if email_sent:
+            print(f"  {enterprise_name}: 成功")
+            success_count += 1
+        else:
+            print(f"  {enterprise_name}: 邮件发送失败 - {result['error']}")
             failed_count += 1
+    mailer.close()
+    # 邮件结果全部登记后再判定任务状态：有发送失败的邮件时保持可续跑
+    manifest.finalize()
 
     print("\n" + "="*60)
     print(f"[总结] 处理完成")
     print(f"  成功: {success_count}")
     print(f"  失败: {failed_count}")
     print(f"  总计: {len(submissions)}")
+    print(f"  任务清单: {manifest.path}")
     print("="*60)
 
 
@@ -16,30 +16,13 @@ import sys
 import json
 import uuid
 from datetime import datetime
-import mysql.connector
-from mysql.connector import Error
+from mysql_pool import Error, get_pool
 
 DEFAULT_JSON_PATHS = [
     os.path.join('storage', 'questionnaires.json'),
     os.path.join(os.path.expanduser('~'), 'storage', 'questionnaires.json')
 ]
 
-DB_CONFIG = {
-    'host': os.environ.get('DB_HOST', 'localhost'),
-    'user': os.environ.get('DB_USER', 'root'),
-    'password': os.environ.get('DB_PASSWORD', '123456'),
-    'database': os.environ.get('DB_NAME', 'localhost_3306')
-}
-
-
-def get_db_conn():
-    try:
-        return mysql.connector.connect(**DB_CONFIG)
-    except Error as e:
-        print(f"[ERROR] 数据库连接失败: {e}")
-        return None
-
-
 def load_json(path: str):
     try:
         with open(path, 'r', encoding='utf-8') as f:
@@ -107,29 +90,25 @@ def ensure_tables(conn):
 
 
 def upsert_template(conn, level: str, name: str, description: str, total_questions: int, source_file: str):
-    cur = conn.cursor(dictionary=True)
-    cur.execute("SELECT id FROM questionnaire_templates WHERE level=%s", (level,))
-    row = cur.fetchone()
+    row = conn.fetch_one("SELECT id FROM questionnaire_templates WHERE level=%s", (level,))
     if row:
         template_id = row['id']
-        cur.execute(
+        conn.execute(
             "UPDATE questionnaire_templates SET name=%s, description=%s, total_questions=%s, source_file=%s, updated_at=NOW() WHERE id=%s",
             (name, description, total_questions, source_file, template_id)
         )
     else:
         template_id = str(uuid.uuid4())
-        cur.execute(
+        conn.execute(
             "INSERT INTO questionnaire_templates (id, level, name, description, total_questions, status, source_file) VALUES (%s,%s,%s,%s,%s,'active',%s)",
             (template_id, level, name, description, total_questions, source_file)
         )
     conn.commit()
-    cur.close()
     return template_id
 
 
 def replace_questions(conn, template_id: str, questions: list):
-    cur = conn.cursor()
-    cur.execute("DELETE FROM questionnaire_template_questions WHERE template_id=%s", (template_id,))
+    conn.execute("DELETE FROM questionnaire_template_questions WHERE template_id=%s", (template_id,))
     insert_sql = (
         "INSERT INTO questionnaire_template_questions "
         "(id, template_id, seq_no, level1, level2, question_text, question_type, score, applicable, remarks, requires_file, sort_order) "
@@ -157,9 +136,8 @@ def replace_questions(conn, template_id: str, questions: list):
             idx
         ))
     if data:
-        cur.executemany(insert_sql, data)
+        conn.execute_many(insert_sql, data)
     conn.commit()
-    cur.close()
 
 
 def main():
@@ -184,30 +162,30 @@ def main():
         print("[ERROR] 读取 JSON 失败。")
         return 1
 
-    conn = get_db_conn()
-    if not conn:
-        return 1
-
-    ensure_tables(conn)
+    try:
+        with get_pool().connection() as conn:
+            ensure_tables(conn)
 
-    surveys = db.get('surveys', [])
-    questions_all = db.get('questions', [])
+            surveys = db.get('surveys', [])
+            questions_all = db.get('questions', [])
 
-    print(f"发现 {len(surveys)} 个问卷，开始迁移...")
+            print(f"发现 {len(surveys)} 个问卷，开始迁移...")
 
-    for s in surveys:
-        level = s.get('level')
-        name = s.get('name')
-        desc = s.get('description')
-        total_questions = s.get('total_questions', 0)
-        source_file = s.get('source_file')
-        template_id = upsert_template(conn, level, name, desc, total_questions, source_file)
+            for s in surveys:
+                level = s.get('level')
+                name = s.get('name')
+                desc = s.get('description')
+                total_questions = s.get('total_questions', 0)
+                source_file = s.get('source_file')
+                template_id = upsert_template(conn, level, name, desc, total_questions, source_file)
 
-        qs = [q for q in questions_all if q.get('survey_id') == s.get('id')]
-        replace_questions(conn, template_id, qs)
-        print(f"  - {level} {name}: 已写入 {len(qs)} 个题目 (template_id={template_id})")
+                qs = [q for q in questions_all if q.get('survey_id') == s.get('id')]
+                replace_questions(conn, template_id, qs)
+                print(f"  - {level} {name}: 已写入 {len(qs)} 个题目 (template_id={template_id})")
+    except Error as e:
+        print(f"[ERROR] 数据库操作失败: {e}")
+        return 1
 
-    conn.close()
     print("迁移完成，可在 Navicat 查看 questionnaire_templates / questionnaire_template_questions 表。")
     return 0
 
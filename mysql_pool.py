@@ -0,0 +1,322 @@
+# -*- coding: utf-8 -*-
+"""
+MySQL 连接池与数据访问层
+问卷管理 API、Word 问卷导入器、迁移/建库脚本统一通过这里访问 MySQL：
+- 进程内按连接配置共享连接池，请求结束归还连接，不再每次查询都重新握手+认证
+- 上下文管理：with pool.connection() as conn: ...；异常时回滚，归还时结束未提交的事务
+  （避免复用连接读到旧的一致性快照）
+- 语句复用：同一连接上相同 SQL 的查询复用服务端预处理语句（prepared cursor）
+- 健康检查：空闲超过 health_check_interval 秒的连接在借出前 ping，失效则重建
+- 指标：stats() 返回连接创建/借出/等待/超时/健康检查失败/语句复用等计数
+
+配置来自环境变量 DB_HOST / DB_USER / DB_PASSWORD / DB_NAME，
+池大小 DB_POOL_SIZE（默认 5），借连接超时 DB_POOL_TIMEOUT（秒，默认 10）。
+"""
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+
+try:
+    import mysql.connector
+    from mysql.connector import Error
+except ImportError:  # 未安装驱动时模块仍可导入（调用时才报错）
+    mysql = None
+
+    class Error(Exception):
+        pass
+
+logger = logging.getLogger(__name__)
+
+# 默认数据库配置
+DB_CONFIG = {
+    'host': os.environ.get('DB_HOST', 'localhost'),
+    'user': os.environ.get('DB_USER', 'root'),
+    'password': os.environ.get('DB_PASSWORD', '123456'),
+    'database': os.environ.get('DB_NAME', 'localhost_3306')
+}
+
+
+def _env_number(name, default, cast=int):
+    try:
+        return cast(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+class PoolTimeout(Error):
+    """连接池已满且在超时时间内没有连接归还"""
+
+
+class PooledConnection:
+    """从池中借出的连接：封装原始连接与其预处理语句缓存"""
+
+    def __init__(self, pool: 'MySQLPool', raw):
+        self.pool = pool
+        self.raw = raw
+        self.last_used = time.monotonic()
+        self._statements: 'OrderedDict[str, tuple]' = OrderedDict()
+
+    # 常用查询 ------------------------------------------------------------
+
+    def _prepared(self, sql: str):
+        """
+        取得该 SQL 的预处理游标（同一连接上复用）
+        返回 (游标, 缓存的 SQL)：mysql.connector 按对象身份判断是否需要重新预处理，
+        执行时须传入缓存中的同一个字符串对象
+        """
+        entry = self._statements.get(sql)
+        if entry is not None:
+            self._statements.move_to_end(sql)
+            self.pool._count('statements_reused')
+            return entry
+        entry = self._statements[sql] = (self.raw.cursor(prepared=True), sql)
+        self.pool._count('statements_prepared')
+        while len(self._statements) > self.pool.statement_cache_size:
+            _, (old, _) = self._statements.popitem(last=False)
+            _close_quietly(old)
+        return entry
+
+    def fetch_all(self, sql: str, params: tuple = ()) -> List[Dict]:
+        """执行查询，返回字典行列表"""
+        cursor, sql = self._prepared(sql)
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+        columns = cursor.column_names
+        return [dict(zip(columns, row)) for row in rows]
+
+    def fetch_one(self, sql: str, params: tuple = ()) -> Optional[Dict]:
+        """执行查询，返回第一行（字典）或 None"""
+        rows = self.fetch_all(sql, params)
+        return rows[0] if rows else None
+
+    def execute(self, sql: str, params: tuple = ()) -> int:
+        """执行写语句，返回影响行数（不自动提交）"""
+        cursor, sql = self._prepared(sql)
+        cursor.execute(sql, params)
+        return cursor.rowcount
+
+    def execute_many(self, sql: str, seq_params) -> int:
+        """批量写入（普通游标的 executemany 会合并为多值 INSERT，比逐条预处理快）"""
+        cursor = self.raw.cursor()
+        try:
+            cursor.executemany(sql, seq_params)
+            return cursor.rowcount
+        finally:
+            cursor.close()
+
+    def cursor(self, **kwargs):
+        return self.raw.cursor(**kwargs)
+
+    def commit(self):
+        self.raw.commit()
+
+    def rollback(self):
+        self.raw.rollback()
+
+    def close_statements(self):
+        for cursor, _ in self._statements.values():
+            _close_quietly(cursor)
+        self._statements.clear()
+
+
+def _close_quietly(obj):
+    try:
+        obj.close()
+    except Exception:
+        pass
+
+
+class MySQLPool:
+    """线程安全的 MySQL 连接池"""
+
+    def __init__(self, config: Optional[Dict] = None, size: Optional[int] = None,
+                 timeout: Optional[float] = None, health_check_interval: float = 30.0,
+                 statement_cache_size: int = 32, connect: Optional[Callable] = None):
+        """
+        Args:
+            config: 连接配置（host/user/password/database），默认 DB_CONFIG
+            size: 最大连接数，默认环境变量 DB_POOL_SIZE 或 5
+            timeout: 连接全部借出时的最长等待秒数，默认 DB_POOL_TIMEOUT 或 10
+            health_check_interval: 空闲超过该秒数的连接借出前先 ping
+            statement_cache_size: 每个连接缓存的预处理语句数
+            connect: 建立原始连接的函数，默认 mysql.connector.connect（测试可替换为本地替身）
+        """
+        self.config = dict(config or DB_CONFIG)
+        self.size = size or _env_number('DB_POOL_SIZE', 5)
+        self.timeout = timeout if timeout is not None else _env_number('DB_POOL_TIMEOUT', 10.0, float)
+        self.health_check_interval = health_check_interval
+        self.statement_cache_size = statement_cache_size
+        self._connect = connect
+        self._idle: List[PooledConnection] = []
+        self._total = 0
+        self._cond = threading.Condition()
+        self._metrics = {
+            'connections_created': 0,
+            'connections_discarded': 0,
+            'acquired': 0,
+            'waits': 0,
+            'wait_seconds': 0.0,
+            'timeouts': 0,
+            'health_checks': 0,
+            'health_check_failures': 0,
+            'statements_prepared': 0,
+            'statements_reused': 0,
+        }
+
+    def _count(self, key, value=1):
+        with self._cond:
+            self._metrics[key] += value
+
+    def _new_connection(self) -> PooledConnection:
+        if self._connect is not None:
+            raw = self._connect(**self.config)
+        else:
+            if mysql is None:
+                raise Error('未安装 mysql-connector-python')
+            raw = mysql.connector.connect(**self.config)
+        self._count('connections_created')
+        return PooledConnection(self, raw)
+
+    def _discard(self, conn: PooledConnection):
+        conn.close_statements()
+        _close_quietly(conn.raw)
+        with self._cond:
+            self._total -= 1
+            self._metrics['connections_discarded'] += 1
+            self._cond.notify()
+
+    def _healthy(self, conn: PooledConnection) -> bool:
+        if time.monotonic() - conn.last_used < self.health_check_interval:
+            return True
+        self._count('health_checks')
+        try:
+            conn.raw.ping(reconnect=False)
+            return True
+        except Exception as e:
+            logger.warning(f"MySQL 连接健康检查失败，重建连接: {e}")
+            self._count('health_check_failures')
+            return False
+
+    def acquire(self) -> PooledConnection:
+        """借出一个连接（优先复用空闲连接；池满时等待归还）"""
+        deadline = None
+        while True:
+            with self._cond:
+                if self._idle:
+                    conn = self._idle.pop()
+                elif self._total < self.size:
+                    self._total += 1
+                    conn = None
+                else:
+                    now = time.monotonic()
+                    if deadline is None:
+                        deadline = now + self.timeout
+                        self._metrics['waits'] += 1
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        self._metrics['timeouts'] += 1
+                        raise PoolTimeout(f'等待数据库连接超时（{self.timeout}s，池大小 {self.size}）')
+                    start = time.monotonic()
+                    self._cond.wait(remaining)
+                    self._metrics['wait_seconds'] += time.monotonic() - start
+                    continue
+
+            if conn is None:
+                try:
+                    conn = self._new_connection()
+                except Exception:
+                    with self._cond:
+                        self._total -= 1
+                        self._cond.notify()
+                    raise
+            elif not self._healthy(conn):
+                self._discard(conn)
+                continue
+            self._count('acquired')
+            return conn
+
+    def release(self, conn: PooledConnection, discard: bool = False):
+        """归还连接：结束未提交的事务；连接异常时丢弃"""
+        if not discard:
+            try:
+                if getattr(conn.raw, 'in_transaction', True):
+                    conn.raw.rollback()
+            except Exception:
+                discard = True
+        if discard:
+            self._discard(conn)
+            return
+        conn.last_used = time.monotonic()
+        with self._cond:
+            self._idle.append(conn)
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        """借出连接的上下文：退出时归还（未提交的修改回滚，回滚失败的连接丢弃）"""
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    @contextmanager
+    def transaction(self):
+        """借出连接并在正常退出时提交"""
+        with self.connection() as conn:
+            yield conn
+            conn.commit()
+
+    # 单语句快捷方式 -------------------------------------------------------
+
+    def fetch_all(self, sql: str, params: tuple = ()) -> List[Dict]:
+        with self.connection() as conn:
+            return conn.fetch_all(sql, params)
+
+    def fetch_one(self, sql: str, params: tuple = ()) -> Optional[Dict]:
+        with self.connection() as conn:
+            return conn.fetch_one(sql, params)
+
+    def stats(self) -> Dict:
+        """连接池指标"""
+        with self._cond:
+            stats = dict(self._metrics)
+            stats.update(size=self.size, open=self._total, idle=len(self._idle),
+                         in_use=self._total - len(self._idle))
+        stats['wait_seconds'] = round(stats['wait_seconds'], 3)
+        return stats
+
+    def close(self):
+        """关闭所有空闲连接"""
+        with self._cond:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            self._discard(conn)
+
+
+_pools: Dict[tuple, MySQLPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(config: Optional[Dict] = None) -> MySQLPool:
+    """按连接配置取得进程内共享的连接池"""
+    config = dict(config or DB_CONFIG)
+    key = tuple(sorted((k, str(v)) for k, v in config.items()))
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = MySQLPool(config)
+        return pool
+
+
+def close_pools():
+    """关闭所有连接池（测试与进程退出时使用）"""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
@@ -52,10 +52,79 @@ class NotificationService:
                 }
             }
 
+    def build_email(self, to_email, enterprise_name, contact_name,
+                    report_url, attachment_path=None, attachment_part=None):
+        """
+        构造报告通知邮件
+
+        Args:
+            attachment_part: 已编码的附件（批量发送时同一文件只读取、编码一次，见 bulk_mailer）；
+                为 None 时读取 attachment_path
+
+        Returns:
+            MIMEMultipart: 邮件对象
+        """
+        email_config = self.config.get('email', {})
+
+        # 创建邮件对象
+        msg = MIMEMultipart()
+        msg['From'] = formataddr((
+            email_config.get('from_name', '企业评价系统'),
+            email_config.get('username')
+        ))
+        msg['To'] = to_email
+        msg['Subject'] = Header(
+            f'{enterprise_name} - 现代企业制度评价自评报告',
+            'utf-8'
+        )
+
+        # 邮件正文
+        html_content = self._generate_email_html(
+            enterprise_name,
+            contact_name,
+            report_url
+        )
+
+        msg.attach(MIMEText(html_content, 'html', 'utf-8'))
+
+        # 添加附件
+        if attachment_part is None and attachment_path and os.path.exists(attachment_path):
+            with open(attachment_path, 'rb') as f:
+                attachment_part = MIMEApplication(f.read())
+            attachment_part.add_header(
+                'Content-Disposition',
+                'attachment',
+                filename=('utf-8', '', os.path.basename(attachment_path))
+            )
+        if attachment_part is not None:
+            msg.attach(attachment_part)
+
+        return msg
+
+    def open_smtp(self):
+        """建立已认证的 SMTP 会话（587 端口 STARTTLS，否则 SSL）"""
+        email_config = self.config.get('email', {})
+        smtp_server = email_config.get('smtp_server')
+        smtp_port = email_config.get('smtp_port', 587)
+        username = email_config.get('username')
+        password = email_config.get('password')
+        use_tls = email_config.get('use_tls', True)
+        timeout = email_config.get('timeout', 30)
+
+        if use_tls:
+            server = smtplib.SMTP(smtp_server, smtp_port, timeout=timeout)
+            server.starttls()
+        else:
+            server = smtplib.SMTP_SSL(smtp_server, smtp_port, timeout=timeout)
+
+        if username:
+            server.login(username, password)
+        return server
+
     def send_email(self, to_email, enterprise_name, contact_name,
                    report_url, attachment_path=None):
         """
-        发送邮件通知
+        发送邮件通知（单封，每次新建连接；批量发送请使用 bulk_mailer.BulkMailer）
 
         Args:
             to_email: 收件人邮箱
@@ -68,55 +137,11 @@ class NotificationService:
             bool: 发送是否成功
         """
         try:
-            email_config = self.config.get('email', {})
-
-            # 创建邮件对象
-            msg = MIMEMultipart()
-            msg['From'] = formataddr((
-                email_config.get('from_name', '企业评价系统'),
-                email_config.get('username')
-            ))
-            msg['To'] = to_email
-            msg['Subject'] = Header(
-                f'{enterprise_name} - 现代企业制度评价自评报告',
-                'utf-8'
-            )
-
-            # 邮件正文
-            html_content = self._generate_email_html(
-                enterprise_name,
-                contact_name,
-                report_url
-            )
-
-            msg.attach(MIMEText(html_content, 'html', 'utf-8'))
-
-            # 添加附件
-            if attachment_path and os.path.exists(attachment_path):
-                with open(attachment_path, 'rb') as f:
-                    attachment = MIMEApplication(f.read())
-                    filename = os.path.basename(attachment_path)
-                    attachment.add_header(
-                        'Content-Disposition',
-                        'attachment',
-                        filename=('utf-8', '', filename)
-                    )
-                    msg.attach(attachment)
+            msg = self.build_email(to_email, enterprise_name, contact_name,
+                                   report_url, attachment_path)
 
             # 发送邮件
-            smtp_server = email_config.get('smtp_server')
-            smtp_port = email_config.get('smtp_port', 587)
-            username = email_config.get('username')
-            password = email_config.get('password')
-            use_tls = email_config.get('use_tls', True)
-
-            if use_tls:
-                server = smtplib.SMTP(smtp_server, smtp_port)
-                server.starttls()
-            else:
-                server = smtplib.SMTP_SSL(smtp_server, smtp_port)
-
-            server.login(username, password)
+            server = self.open_smtp()
             server.send_message(msg)
             server.quit()
 
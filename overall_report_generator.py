@@ -5,18 +5,13 @@ from docx import Document
 from docx.shared import Pt, Inches, RGBColor
 from docx.enum.text import WD_PARAGRAPH_ALIGNMENT
 from docx.oxml.ns import qn
-import matplotlib.pyplot as plt
-import matplotlib
 import pandas as pd
 import numpy as np
 from datetime import datetime
 import os
 from typing import List, Dict
 from score_calculator import ScoreCalculator
-
-# 设置中文字体
-matplotlib.rcParams['font.sans-serif'] = ['Microsoft YaHei', 'SimHei']
-matplotlib.rcParams['axes.unicode_minus'] = False
+from chart_service import default_chart_service
 
 
 class OverallAnalysisReportGenerator:
@@ -25,6 +20,7 @@ class OverallAnalysisReportGenerator:
     def __init__(self):
         """初始化报告生成器"""
         self.calculator = ScoreCalculator()
+        self.level1_matrix = pd.DataFrame()
 
     def generate_report(self, questionnaire_files: List[str], output_path: str = None) -> str:
         """
@@ -39,20 +35,19 @@ class OverallAnalysisReportGenerator:
         """
         print(f"\n[INFO] 开始生成整体分析报告，共{len(questionnaire_files)}家企业...")
 
-        # 收集所有企业的数据
+        # 收集所有企业的数据（批量计分）
+        batch = self.calculator.score_many(questionnaire_files)
+        for err in batch['errors']:
+            print(f"[WARN] 处理失败 {err['source']}: {err['error']}")
         all_enterprise_data = []
-        for qf in questionnaire_files:
-            try:
-                questionnaire_data = self.calculator.parse_questionnaire(qf)
-                score_summary = self.calculator.calculate_total_score(questionnaire_data)
-                all_enterprise_data.append({
-                    'file': qf,
-                    'info': questionnaire_data['enterprise_info'],
-                    'score': score_summary
-                })
-                print(f"[OK] 已处理: {questionnaire_data['enterprise_info'].get('企业名称', qf)}")
-            except Exception as e:
-                print(f"[WARN] 处理失败 {qf}: {e}")
+        for result in batch['results']:
+            all_enterprise_data.append({
+                'file': result['source'],
+                'info': result['enterprise_info'],
+                'score': result['score_summary']
+            })
+            print(f"[OK] 已处理: {result['enterprise_info'].get('企业名称', result['source'])}")
+        self.level1_matrix = batch['level1_matrix']
 
         if not all_enterprise_data:
             raise ValueError("没有有效的问卷数据")
@@ -232,54 +227,18 @@ class OverallAnalysisReportGenerator:
         doc.add_paragraph(stats_text.strip())
 
         # 生成得分分布柱状图
-        chart_path = self._generate_score_distribution_chart(all_data)
-        if chart_path and os.path.exists(chart_path):
+        chart = self._generate_score_distribution_chart(all_data)
+        if chart:
             doc.add_paragraph('\n得分分布图：')
-            doc.add_picture(chart_path, width=Inches(6))
-            try:
-                os.remove(chart_path)
-            except:
-                pass
+            doc.add_picture(chart, width=Inches(6))
 
     def _generate_score_distribution_chart(self, all_data):
-        """生成得分分布柱状图"""
+        """生成得分分布柱状图（返回PNG内存图片）"""
         try:
             percentages = [d['score']['score_percentage'] for d in all_data]
-
-            fig, ax = plt.subplots(figsize=(10, 6))
-
-            # 定义分数区间
-            bins = [0, 60, 70, 80, 90, 100]
-            labels = ['E级\n(<60%)', 'D级\n(60-70%)', 'C级\n(70-80%)', 'B级\n(80-90%)', 'A级\n(>=90%)']
-
-            # 统计各区间人数
-            hist, _ = np.histogram(percentages, bins=bins)
-
-            # 绘制柱状图
-            x = range(len(labels))
-            bars = ax.bar(x, hist, color=['#d62728', '#ff7f0e', '#ffbb00', '#2ca02c', '#1f77b4'])
-
-            ax.set_xlabel('评价等级', fontsize=12)
-            ax.set_ylabel('企业数量', fontsize=12)
-            ax.set_title('企业得分分布', fontsize=14, fontweight='bold')
-            ax.set_xticks(x)
-            ax.set_xticklabels(labels)
-
-            # 在柱状图上显示数值
-            for i, bar in enumerate(bars):
-                height = bar.get_height()
-                if height > 0:
-                    ax.text(bar.get_x() + bar.get_width()/2., height,
-                           f'{int(height)}家',
-                           ha='center', va='bottom', fontsize=10)
-
-            plt.tight_layout()
-
-            chart_path = f'temp_distribution_{datetime.now().strftime("%Y%m%d%H%M%S")}.png'
-            plt.savefig(chart_path, dpi=150, bbox_inches='tight')
-            plt.close()
-
-            return chart_path
+            # 统计各等级区间企业数
+            hist, _ = np.histogram(percentages, bins=[0, 60, 70, 80, 90, 100])
+            return default_chart_service().render('score_distribution', {'counts': hist.tolist()})
         except Exception as e:
             print(f"[WARN] 生成分布图失败: {e}")
             return None
@@ -288,13 +247,11 @@ class OverallAnalysisReportGenerator:
         """创建各维度对比分析"""
         doc.add_heading('四、各维度对比分析', level=1)
 
-        # 收集所有一级指标的数据
-        all_level1_data = {}
-        for data in all_data:
-            for level1, level1_data in data['score']['score_by_level1'].items():
-                if level1 not in all_level1_data:
-                    all_level1_data[level1] = []
-                all_level1_data[level1].append(level1_data['percentage'])
+        # 收集所有一级指标的数据（批量计分得到的企业×一级指标得分率矩阵）
+        all_level1_data = {
+            level1: self.level1_matrix[level1].dropna().tolist()
+            for level1 in self.level1_matrix.columns
+        }
 
         # 计算各维度的平均得分
         doc.add_paragraph('各维度平均得分情况：\n')
@@ -319,52 +276,19 @@ class OverallAnalysisReportGenerator:
             row_cells[4].text = f'{np.std(percentages):.2f}%'
 
         # 生成对比柱状图
-        chart_path = self._generate_dimension_comparison_chart(all_level1_data)
-        if chart_path and os.path.exists(chart_path):
+        chart = self._generate_dimension_comparison_chart(all_level1_data)
+        if chart:
             doc.add_paragraph('\n各维度平均得分对比图：')
-            doc.add_picture(chart_path, width=Inches(6.5))
-            try:
-                os.remove(chart_path)
-            except:
-                pass
+            doc.add_picture(chart, width=Inches(6.5))
 
     def _generate_dimension_comparison_chart(self, all_level1_data):
-        """生成维度对比柱状图"""
+        """生成维度对比柱状图（返回PNG内存图片）"""
         try:
             dimensions = list(all_level1_data.keys())
-            avg_scores = [np.mean(all_level1_data[d]) for d in dimensions]
-
-            fig, ax = plt.subplots(figsize=(12, 6))
-
-            x = range(len(dimensions))
-            bars = ax.bar(x, avg_scores, color='steelblue')
-
-            ax.set_xlabel('维度', fontsize=12)
-            ax.set_ylabel('平均得分率 (%)', fontsize=12)
-            ax.set_title('各维度平均得分对比', fontsize=14, fontweight='bold')
-            ax.set_xticks(x)
-            ax.set_xticklabels(dimensions, rotation=15, ha='right')
-            ax.set_ylim(0, 100)
-
-            # 添加平均线
-            overall_avg = np.mean(avg_scores)
-            ax.axhline(y=overall_avg, color='r', linestyle='--', label=f'总体平均: {overall_avg:.2f}%')
-
-            # 在柱状图上显示数值
-            for bar in bars:
-                height = bar.get_height()
-                ax.text(bar.get_x() + bar.get_width()/2., height,
-                       f'{height:.1f}%',
-                       ha='center', va='bottom', fontsize=9)
-
-            ax.legend()
-            plt.tight_layout()
-
-            chart_path = f'temp_dimension_{datetime.now().strftime("%Y%m%d%H%M%S")}.png'
-            plt.savefig(chart_path, dpi=150, bbox_inches='tight')
-            plt.close()
-
-            return chart_path
+            return default_chart_service().render('dimension_average_bar', {
+                'dimensions': dimensions,
+                'avg_scores': [float(np.mean(all_level1_data[d])) for d in dimensions],
+            })
         except Exception as e:
             print(f"[WARN] 生成维度对比图失败: {e}")
             return None
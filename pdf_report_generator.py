@@ -11,16 +11,10 @@ from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT, TA_JUSTIFY
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
 from datetime import datetime
-import matplotlib
-matplotlib.use('Agg')  # 使用非交互式后端，适合多线程
-import matplotlib.pyplot as plt
 import numpy as np
 import os
 from score_calculator import ScoreCalculator
-
-# 设置中文字体
-matplotlib.rcParams['font.sans-serif'] = ['Microsoft YaHei', 'SimHei']
-matplotlib.rcParams['axes.unicode_minus'] = False
+from chart_service import score_radar
 
 # 注册中文字体（需要系统有微软雅黑字体）
 try:
@@ -104,7 +98,7 @@ class PDFReportGenerator:
         生成PDF报告
 
         Args:
-            questionnaire_file: 已填写的问卷文件
+            questionnaire_file: 已填写的问卷Excel路径、提交JSON路径或 Submission 对象
             output_path: 输出PDF路径
 
         Returns:
@@ -113,9 +107,9 @@ class PDFReportGenerator:
         print(f"\n[INFO] 开始生成PDF专业报告...")
 
         # 解析问卷并计算得分
-        questionnaire_data = self.calculator.parse_questionnaire(questionnaire_file)
+        questionnaire_data = self.calculator.load_questionnaire(questionnaire_file)
         enterprise_info = questionnaire_data['enterprise_info']
-        score_summary = self.calculator.calculate_total_score(questionnaire_data)
+        score_summary = self.calculator.get_score_summary(questionnaire_file, questionnaire_data)
         enterprise_name = enterprise_info.get('企业名称', '企业')
 
         # 生成输出路径
@@ -439,6 +433,15 @@ class PDFReportGenerator:
 
         elements.append(overview_table)
 
+        # 各维度得分雷达图（内存图片直接嵌入）
+        try:
+            chart = score_radar(score_summary, enterprise_name)
+            if chart:
+                elements.append(Spacer(1, 0.8*cm))
+                elements.append(Image(chart, width=12*cm, height=12*cm, kind='proportional'))
+        except Exception as e:
+            print(f"[WARN] 生成雷达图失败: {e}")
+
         return elements
 
     def _create_dimension_analysis(self, score_summary):
@@ -11,16 +11,11 @@ from docx.shared import Pt, Inches, RGBColor
 from docx.enum.text import WD_PARAGRAPH_ALIGNMENT
 from docx.oxml.ns import qn
 from docx.enum.style import WD_STYLE_TYPE
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
 from datetime import datetime
 import os
 from score_calculator import ScoreCalculator
-
-# 设置中文字体
-matplotlib.rcParams['font.sans-serif'] = ['Microsoft YaHei', 'SimHei']
-matplotlib.rcParams['axes.unicode_minus'] = False
+from submission_model import source_basename
+from chart_service import default_chart_service, risk_pie_data
 
 
 class ProfessionalReportGenerator:
@@ -35,7 +30,7 @@ class ProfessionalReportGenerator:
         生成专业版企业报告
 
         Args:
-            questionnaire_file: 已填写的问卷文件路径
+            questionnaire_file: 已填写的问卷Excel路径、提交JSON路径或 Submission 对象
             output_path: 输出报告文件路径
 
         Returns:
@@ -44,16 +39,16 @@ class ProfessionalReportGenerator:
         print(f"\n[INFO] 开始生成专业版企业报告...")
 
         # 解析问卷
-        questionnaire_data = self.calculator.parse_questionnaire(questionnaire_file)
+        questionnaire_data = self.calculator.load_questionnaire(questionnaire_file)
         enterprise_info = questionnaire_data['enterprise_info']
         enterprise_name = enterprise_info.get('企业名称', '企业')
 
         # 计算得分
-        score_summary = self.calculator.calculate_total_score(questionnaire_data)
+        score_summary = self.calculator.get_score_summary(questionnaire_file, questionnaire_data)
 
         # 从问卷文件名生成报告文件名，确保关联性
         if output_path is None:
-            base_name = os.path.basename(questionnaire_file)
+            base_name = source_basename(questionnaire_file)
             report_base_name = base_name.replace('问卷_', '专业报告_').replace('.xlsx', '')
             output_path = os.path.join('reports', f"{report_base_name}.docx")
 
@@ -880,11 +875,9 @@ class ProfessionalReportGenerator:
         # 生成图表
         try:
             # 1. 柱状图 - 各维度建设水平对比
-            chart_path = self._create_dimension_bar_chart(dimension_data)
-            if chart_path and os.path.exists(chart_path):
-                doc.add_picture(chart_path, width=Inches(6))
-                # 删除临时文件
-                os.remove(chart_path)
+            chart = self._create_dimension_bar_chart(dimension_data)
+            if chart:
+                doc.add_picture(chart, width=Inches(6))
 
             # 图表说明
             bar_chart_desc = """
@@ -894,10 +887,9 @@ class ProfessionalReportGenerator:
             para.paragraph_format.first_line_indent = Inches(0.5)
 
             # 2. 雷达图 - 整体制度建设轮廓
-            radar_path = self._create_dimension_radar_chart(dimension_data)
-            if radar_path and os.path.exists(radar_path):
-                doc.add_picture(radar_path, width=Inches(5.5))
-                os.remove(radar_path)
+            radar = self._create_dimension_radar_chart(dimension_data)
+            if radar:
+                doc.add_picture(radar, width=Inches(5.5))
 
             # 雷达图说明
             radar_desc = """
@@ -907,10 +899,9 @@ class ProfessionalReportGenerator:
             para.paragraph_format.first_line_indent = Inches(0.5)
 
             # 3. 风险分布饼图
-            pie_path = self._create_risk_distribution_pie_chart(dimension_data)
-            if pie_path and os.path.exists(pie_path):
-                doc.add_picture(pie_path, width=Inches(5))
-                os.remove(pie_path)
+            pie = self._create_risk_distribution_pie_chart(dimension_data)
+            if pie:
+                doc.add_picture(pie, width=Inches(5))
 
             # 饼图说明
             pie_desc = """
@@ -925,183 +916,37 @@ class ProfessionalReportGenerator:
             error_para.paragraph_format.first_line_indent = Inches(0.5)
 
     def _create_dimension_bar_chart(self, dimension_data):
-        """创建维度柱状图"""
+        """创建维度柱状图（返回PNG内存图片）"""
         try:
-            # 准备数据
-            names = [d['name'] for d in dimension_data]
-            percentages = [d['percentage'] for d in dimension_data]
-
-            # 创建图表
-            plt.figure(figsize=(12, 6))
-
-            # 根据得分率设置颜色
-            colors = []
-            for p in percentages:
-                if p >= 80:
-                    colors.append('#2E7D32')  # 深绿色
-                elif p >= 70:
-                    colors.append('#66BB6A')  # 浅绿色
-                elif p >= 60:
-                    colors.append('#FFA726')  # 橙色
-                else:
-                    colors.append('#EF5350')  # 红色
-
-            bars = plt.bar(range(len(names)), percentages, color=colors, alpha=0.8, edgecolor='black', linewidth=1.2)
-
-            # 添加数值标签
-            for i, (bar, p) in enumerate(zip(bars, percentages)):
-                height = bar.get_height()
-                plt.text(bar.get_x() + bar.get_width()/2., height + 1,
-                        f'{p:.1f}%',
-                        ha='center', va='bottom', fontsize=10, fontweight='bold')
-
-            # 设置标题和标签
-            plt.title('企业现代制度建设各维度评分对比', fontsize=16, fontweight='bold', pad=20)
-            plt.xlabel('评价维度', fontsize=12, fontweight='bold')
-            plt.ylabel('建设水平（%）', fontsize=12, fontweight='bold')
-
-            # 设置X轴标签
-            plt.xticks(range(len(names)), names, rotation=45, ha='right', fontsize=10)
-
-            # 添加网格线
-            plt.grid(axis='y', alpha=0.3, linestyle='--')
-
-            # 添加参考线
-            plt.axhline(y=80, color='green', linestyle='--', alpha=0.5, label='良好水平(80%)')
-            plt.axhline(y=60, color='orange', linestyle='--', alpha=0.5, label='合格水平(60%)')
-
-            plt.legend(loc='upper right', fontsize=10)
-            plt.ylim(0, 105)
-            plt.tight_layout()
-
-            # 保存图表
-            chart_path = 'temp_bar_chart.png'
-            plt.savefig(chart_path, dpi=150, bbox_inches='tight')
-            plt.close()
-
-            return chart_path
-
+            return default_chart_service().render('dimension_bar', {
+                'names': [d['name'] for d in dimension_data],
+                'percentages': [d['percentage'] for d in dimension_data],
+            })
         except Exception as e:
             print(f"[ERROR] 柱状图生成失败: {e}")
-            plt.close()
             return None
 
     def _create_dimension_radar_chart(self, dimension_data):
-        """创建维度雷达图"""
+        """创建维度雷达图（返回PNG内存图片）"""
         try:
-            # 准备数据
-            categories = [d['name'][:4] if len(d['name']) > 4 else d['name'] for d in dimension_data]  # 缩短标签
-            values = [d['percentage'] for d in dimension_data]
-
-            # 闭合雷达图
-            categories_closed = categories + [categories[0]]
-            values_closed = values + [values[0]]
-
-            # 计算角度
-            angles = [n / float(len(categories)) * 2 * 3.14159 for n in range(len(categories))]
-            angles += angles[:1]
-
-            # 创建图表
-            fig, ax = plt.subplots(figsize=(8, 8), subplot_kw=dict(projection='polar'))
-
-            # 绘制雷达图
-            ax.plot(angles, values_closed, 'o-', linewidth=2, color='#1976D2', label='当前水平')
-            ax.fill(angles, values_closed, alpha=0.25, color='#1976D2')
-
-            # 添加参考线（理想水平）
-            ideal_values = [90] * len(angles)
-            ax.plot(angles, ideal_values, '--', linewidth=1.5, color='#4CAF50', alpha=0.6, label='优秀水平(90%)')
-
-            # 设置标签
-            ax.set_xticks(angles[:-1])
-            ax.set_xticklabels(categories, fontsize=11)
-
-            # 设置Y轴
-            ax.set_ylim(0, 100)
-            ax.set_yticks([20, 40, 60, 80, 100])
-            ax.set_yticklabels(['20%', '40%', '60%', '80%', '100%'], fontsize=9)
-            ax.grid(True, linestyle='--', alpha=0.7)
-
-            # 标题和图例
-            plt.title('企业现代制度建设雷达图', fontsize=16, fontweight='bold', pad=30)
-            plt.legend(loc='upper right', bbox_to_anchor=(1.3, 1.1), fontsize=10)
-
-            plt.tight_layout()
-
-            # 保存图表
-            chart_path = 'temp_radar_chart.png'
-            plt.savefig(chart_path, dpi=150, bbox_inches='tight')
-            plt.close()
-
-            return chart_path
-
+            return default_chart_service().render('dimension_radar', {
+                # 缩短标签
+                'categories': [d['name'][:4] if len(d['name']) > 4 else d['name'] for d in dimension_data],
+                'values': [d['percentage'] for d in dimension_data],
+            })
         except Exception as e:
             print(f"[ERROR] 雷达图生成失败: {e}")
-            plt.close()
             return None
 
     def _create_risk_distribution_pie_chart(self, dimension_data):
-        """创建风险分布饼图"""
+        """创建风险分布饼图（返回PNG内存图片）"""
         try:
-            # 统计各风险等级数量
-            risk_counts = {}
-            for dim in dimension_data:
-                risk = dim['risk_level']
-                risk_counts[risk] = risk_counts.get(risk, 0) + 1
-
-            # 定义风险等级顺序和颜色
-            risk_order = ['低风险', '较低风险', '中等风险', '较高风险', '高风险']
-            risk_colors = {
-                '低风险': '#2E7D32',
-                '较低风险': '#66BB6A',
-                '中等风险': '#FDD835',
-                '较高风险': '#FF9800',
-                '高风险': '#E53935'
-            }
-
-            # 准备数据
-            labels = []
-            sizes = []
-            colors = []
-
-            for risk in risk_order:
-                if risk in risk_counts:
-                    labels.append(f'{risk}\n({risk_counts[risk]}个维度)')
-                    sizes.append(risk_counts[risk])
-                    colors.append(risk_colors[risk])
-
-            if not sizes:
+            data = risk_pie_data(d['risk_level'] for d in dimension_data)
+            if not data:
                 return None
-
-            # 创建饼图
-            fig, ax = plt.subplots(figsize=(9, 7))
-
-            wedges, texts, autotexts = ax.pie(sizes, labels=labels, colors=colors,
-                                               autopct='%1.1f%%', startangle=90,
-                                               textprops={'fontsize': 11},
-                                               explode=[0.05] * len(sizes))  # 稍微分离各扇区
-
-            # 美化百分比文字
-            for autotext in autotexts:
-                autotext.set_color('white')
-                autotext.set_fontweight('bold')
-                autotext.set_fontsize(12)
-
-            # 标题
-            plt.title('企业制度建设风险分布', fontsize=16, fontweight='bold', pad=20)
-
-            plt.tight_layout()
-
-            # 保存图表
-            chart_path = 'temp_pie_chart.png'
-            plt.savefig(chart_path, dpi=150, bbox_inches='tight')
-            plt.close()
-
-            return chart_path
-
+            return default_chart_service().render('risk_pie', data)
         except Exception as e:
             print(f"[ERROR] 饼图生成失败: {e}")
-            plt.close()
             return None
 
     def _get_ranking_phrase(self, percentage):
@@ -10,9 +10,12 @@ import json
 import uuid
 from datetime import datetime
 import logging
+import threading
 from docx_questionnaire_importer import DocxQuestionnaireImporter
-import mysql.connector
-from mysql.connector import Error
+from file_upload_handler import FileUploadHandler
+from mysql_pool import get_pool
+from questionnaire_template_cache import template_cache
+from questionnaire_submission_store import RevisionConflict, SubmissionStore
 
 logger = logging.getLogger(__name__)
 
@@ -22,71 +25,65 @@ questionnaire_bp = Blueprint('questionnaire', __name__, url_prefix='/api/questio
 # 初始化导入器（JSON 回退）
 importer = DocxQuestionnaireImporter()
 
-# 数据库配置（MySQL 主）
-DB_CONFIG = {
-    'host': os.environ.get('DB_HOST', 'localhost'),
-    'user': os.environ.get('DB_USER', 'root'),
-    'password': os.environ.get('DB_PASSWORD', '123456'),
-    'database': os.environ.get('DB_NAME', 'localhost_3306')
-}
-
-
-def get_db_connection():
-    """获取数据库连接"""
-    try:
-        conn = mysql.connector.connect(**DB_CONFIG)
-        return conn
-    except Error as e:
-        logger.error(f"数据库连接失败: {e}")
-        return None
-
-
+# 问卷附件（按内容去重存储）
+upload_handler = FileUploadHandler(os.path.join('storage', 'questionnaire_uploads'))
+
+# 问卷填报记录：每份提交单独存储（不再整表读写 questionnaires.json）
+submission_store = SubmissionStore()
+_legacy_lock = threading.Lock()
+
+
+def _submissions() -> SubmissionStore:
+    """取得填报记录存储；首次使用时把 questionnaires.json 中的旧提交迁移过来"""
+    store = submission_store
+    if not store.legacy_checked:
+        with _legacy_lock:
+            if not store.legacy_checked:
+                db = importer.load_db()
+                if db.get('submissions') or db.get('answers') or db.get('attachments'):
+                    store.import_legacy(db)
+                    for key in ('submissions', 'answers', 'attachments'):
+                        db.pop(key, None)
+                    importer.save_db(db)
+                store.legacy_checked = True
+    return store
+
+
+def _find_submission(submission_id: str):
+    """读取提交记录并校验归属；返回 (记录, 错误响应)"""
+    record = _submissions().load(submission_id)
+    if not record:
+        return None, (jsonify({'success': False, 'error': '问卷提交不存在'}), 404)
+    if record['submission']['enterprise_id'] != session.get('enterprise_id'):
+        return None, (jsonify({'success': False, 'error': '无权访问'}), 403)
+    return record, None
+
+
+# MySQL 主存储：通过共享连接池访问（配置见 mysql_pool.DB_CONFIG）
 def _db_get_template_by_level(level: str):
-    conn = get_db_connection()
-    if not conn:
-        return None
     try:
-        cur = conn.cursor(dictionary=True)
-        cur.execute("SELECT * FROM questionnaire_templates WHERE level=%s AND status='active'", (level,))
-        row = cur.fetchone()
-        cur.close(); conn.close()
-        return row
+        return get_pool().fetch_one(
+            "SELECT * FROM questionnaire_templates WHERE level=%s AND status='active'", (level,)
+        )
     except Exception as e:
         logger.error(f"查询模板失败: {e}")
-        try:
-            cur.close(); conn.close()
-        except Exception:
-            pass
         return None
 
 
 def _db_get_template_by_id(template_id: str):
-    conn = get_db_connection()
-    if not conn:
-        return None
     try:
-        cur = conn.cursor(dictionary=True)
-        cur.execute("SELECT * FROM questionnaire_templates WHERE id=%s", (template_id,))
-        row = cur.fetchone()
-        cur.close(); conn.close()
-        return row
+        return get_pool().fetch_one("SELECT * FROM questionnaire_templates WHERE id=%s", (template_id,))
     except Exception as e:
         logger.error(f"按ID查询模板失败: {e}")
         return None
 
 
 def _db_get_questions_by_template(template_id: str):
-    conn = get_db_connection()
-    if not conn:
-        return []
     try:
-        cur = conn.cursor(dictionary=True)
-        cur.execute(
+        rows = get_pool().fetch_all(
             "SELECT * FROM questionnaire_template_questions WHERE template_id=%s ORDER BY sort_order, id",
             (template_id,)
         )
-        rows = cur.fetchall()
-        cur.close(); conn.close()
         # 规范化字段
         questions = []
         for r in rows:
@@ -123,6 +120,42 @@ def _survey_from_template_row(row: dict):
     }
 
 
+def _load_template(by: str, value: str, prefer_db: bool = True):
+    """
+    加载问卷模板与题目：MySQL（主）→ JSON（备）
+
+    Args:
+        by: 'id' 或 'level'
+        value: 问卷ID或级别
+        prefer_db: False 时只读 JSON（填报流程的提交记录关联的是 JSON 问卷ID）
+
+    Returns:
+        {'survey': ..., 'questions': [...]}，不存在时返回 None
+    """
+    if prefer_db:
+        row = _db_get_template_by_id(value) if by == 'id' else _db_get_template_by_level(value)
+        if row:
+            return {'survey': _survey_from_template_row(row), 'questions': _db_get_questions_by_template(row['id'])}
+    survey = importer.get_survey(value) if by == 'id' else importer.get_survey_by_level(value)
+    if not survey:
+        return None
+    return {'survey': survey, 'questions': importer.get_survey_questions(survey['id'])}
+
+
+def _get_template(by: str, value: str, prefer_db: bool = True):
+    """经模板缓存读取问卷与题目（返回 TemplateEntry，内容请勿修改）"""
+    key = ('db' if prefer_db else 'json', by, value)
+    return template_cache.get(key, lambda: _load_template(by, value, prefer_db))
+
+
+def _conditional_json(payload: dict, etag: str):
+    """带 ETag 的 JSON 响应；客户端 If-None-Match 命中时返回 304"""
+    response = jsonify(payload)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response.make_conditional(request)
+
+
 
 def login_required(f):
     """登录检查装饰器"""
@@ -239,17 +272,12 @@ def list_surveys():
     """获取所有问卷列表（优先 MySQL）"""
     try:
         # MySQL 主
-        conn = get_db_connection()
         surveys = None
-        if conn:
-            try:
-                cur = conn.cursor(dictionary=True)
-                cur.execute("SELECT * FROM questionnaire_templates WHERE status='active' ORDER BY level")
-                rows = cur.fetchall()
-                cur.close(); conn.close()
-                surveys = [_survey_from_template_row(r) for r in rows]
-            except Exception as e:
-                logger.warning(f"从 MySQL 读取问卷列表失败，退回 JSON: {e}")
+        try:
+            rows = get_pool().fetch_all("SELECT * FROM questionnaire_templates WHERE status='active' ORDER BY level")
+            surveys = [_survey_from_template_row(r) for r in rows]
+        except Exception as e:
+            logger.warning(f"从 MySQL 读取问卷列表失败，退回 JSON: {e}")
         # JSON 备
         if surveys is None:
             surveys = importer.list_surveys()
@@ -263,24 +291,16 @@ def list_surveys():
 def get_survey(survey_id):
     """获取问卷详情（优先 MySQL）"""
     try:
-        # MySQL 主
-        row = _db_get_template_by_id(survey_id)
-        if row:
-            survey = _survey_from_template_row(row)
-            questions = _db_get_questions_by_template(survey_id)
-            return jsonify({
-                'success': True,
-                'survey': survey,
-                'questions': questions,
-                'total_questions': len(questions)
-            }), 200
-
-        # JSON 备
-        survey = importer.get_survey(survey_id)
-        if not survey:
+        # MySQL 主，JSON 备（经模板缓存）
+        template = _get_template('id', survey_id)
+        if not template:
             return jsonify({'success': False, 'error': '问卷不存在'}), 404
-        questions = importer.get_survey_questions(survey_id)
-        return jsonify({'success': True, 'survey': survey, 'questions': questions, 'total_questions': len(questions)}), 200
+        return _conditional_json({
+            'success': True,
+            'survey': template.survey,
+            'questions': template.questions,
+            'total_questions': len(template.questions)
+        }, template.etag)
     except Exception as e:
         logger.error(f"获取问卷详情出错: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -293,19 +313,16 @@ def get_survey_by_level(level):
         if level not in ['初级', '中级', '高级']:
             return jsonify({'success': False, 'error': '无效的问卷级别'}), 400
 
-        # MySQL 主
-        row = _db_get_template_by_level(level)
-        if row:
-            survey = _survey_from_template_row(row)
-            questions = _db_get_questions_by_template(row['id'])
-            return jsonify({'success': True, 'survey': survey, 'questions': questions, 'total_questions': len(questions)}), 200
-
-        # JSON 备
-        survey = importer.get_survey_by_level(level)
-        if not survey:
+        # MySQL 主，JSON 备（经模板缓存）
+        template = _get_template('level', level)
+        if not template:
             return jsonify({'success': False, 'error': f'未找到{level}级问卷'}), 404
-        questions = importer.get_survey_questions(survey['id'])
-        return jsonify({'success': True, 'survey': survey, 'questions': questions, 'total_questions': len(questions)}), 200
+        return _conditional_json({
+            'success': True,
+            'survey': template.survey,
+            'questions': template.questions,
+            'total_questions': len(template.questions)
+        }, template.etag)
     except Exception as e:
         logger.error(f"获取问卷出错: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -336,9 +353,10 @@ def create_submission():
             return jsonify({'success': False, 'error': '无效的问卷级别'}), 400
 
         # 获取问卷
-        survey = importer.get_survey_by_level(survey_level)
-        if not survey:
+        template = _get_template('level', survey_level, prefer_db=False)
+        if not template:
             return jsonify({'success': False, 'error': f'未找到{survey_level}级问卷'}), 404
+        survey = template.survey
 
         # 创建提交记录
         submission_id = str(uuid.uuid4())
@@ -352,21 +370,14 @@ def create_submission():
             'updated_at': datetime.now().isoformat()
         }
 
-        # 保存到数据库
-        db = importer.load_db()
-        if 'submissions' not in db:
-            db['submissions'] = []
-        db['submissions'].append(submission)
-        importer.save_db(db)
-
-        # 获取问卷问题
-        questions = importer.get_survey_questions(survey['id'])
+        # 保存提交记录
+        _submissions().create(submission)
 
         return jsonify({
             'success': True,
             'submission_id': submission_id,
             'survey': survey,
-            'questions': questions,
+            'questions': template.questions,
             'message': '问卷创建成功'
         }), 201
 
@@ -381,34 +392,26 @@ def create_submission():
 def get_submission(submission_id):
     """获取问卷提交详情"""
     try:
-        db = importer.load_db()
-        submission = None
-        
-        for sub in db.get('submissions', []):
-            if sub['id'] == submission_id:
-                submission = sub
-                break
-
-        if not submission:
-            return jsonify({'success': False, 'error': '问卷提交不存在'}), 404
-
-        # 权限检查
-        if submission['enterprise_id'] != session.get('enterprise_id'):
-            return jsonify({'success': False, 'error': '无权访问'}), 403
+        record, error = _find_submission(submission_id)
+        if error:
+            return error
+        submission = record['submission']
 
         # 获取问卷和问题
-        survey = importer.get_survey(submission['survey_id'])
-        questions = importer.get_survey_questions(submission['survey_id'])
+        template = _get_template('id', submission['survey_id'], prefer_db=False)
+        survey = template.survey if template else None
+        questions = template.questions if template else []
 
         # 获取已填写的答案
-        answers = db.get('answers', {}).get(submission_id, {})
+        answers = record.get('answers', {})
 
         return jsonify({
             'success': True,
             'submission': submission,
             'survey': survey,
             'questions': questions,
-            'answers': answers
+            'answers': answers,
+            'revision': record['revision']
         }), 200
 
     except Exception as e:
@@ -435,35 +438,19 @@ def save_submission(submission_id):
         data = request.get_json()
         answers = data.get('answers', {})
 
-        db = importer.load_db()
-        
-        # 查找提交记录
-        submission = None
-        for sub in db.get('submissions', []):
-            if sub['id'] == submission_id:
-                submission = sub
-                break
-
-        if not submission:
-            return jsonify({'success': False, 'error': '问卷提交不存在'}), 404
-
-        # 权限检查
-        if submission['enterprise_id'] != session.get('enterprise_id'):
-            return jsonify({'success': False, 'error': '无权访问'}), 403
-
-        # 保存答案
-        if 'answers' not in db:
-            db['answers'] = {}
-        db['answers'][submission_id] = answers
-        
-        # 更新提交时间
-        submission['updated_at'] = datetime.now().isoformat()
-        importer.save_db(db)
+        record, error = _find_submission(submission_id)
+        if error:
+            return error
+
+        # 保存答案（只写入有变化的题目，没有变化时不落盘）
+        record, changed = _submissions().replace_answers(submission_id, answers)
 
         return jsonify({
             'success': True,
             'message': '答案已保存',
-            'submission_id': submission_id
+            'submission_id': submission_id,
+            'changed': len(changed),
+            'revision': record['revision']
         }), 200
 
     except Exception as e:
@@ -471,6 +458,76 @@ def save_submission(submission_id):
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+@questionnaire_bp.route('/submission/<submission_id>/draft', methods=['PATCH'])
+@login_required
+@enterprise_required
+def patch_draft(submission_id):
+    """
+    增量保存问卷草稿（自动保存）
+
+    请求体:
+    {
+        "revision": 12,                          // 客户端当前所基于的版本号
+        "changes": {"question_id": "answer_value", ...},
+        "removed": ["question_id", ...]          // 清空答案的题目（可选）
+    }
+
+    响应:
+    - 200: {"revision": 新版本号, "changed": [...], "remote_changes": {其他标签页修改过的题目: 当前答案}}
+    - 409: 本次修改的题目已被其他标签页改成不同的值，
+           {"revision": 服务端版本号, "conflicts": {题目ID: 服务端答案},
+            "remote_changes": {base revision 之后服务端改过的全部题目（含冲突题目）: 当前答案}}，
+           客户端合并 remote_changes 后基于新版本重试
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        changes = data.get('changes') or {}
+        removed = data.get('removed') or []
+        base_revision = data.get('revision')
+        if not isinstance(changes, dict) or not isinstance(removed, list) \
+                or not isinstance(base_revision, int) or isinstance(base_revision, bool):
+            return jsonify({'success': False, 'error': '请求格式错误：需要 revision（整数）、changes（对象）'}), 400
+
+        record, error = _find_submission(submission_id)
+        if error:
+            return error
+        if record['submission'].get('status') == 'submitted':
+            return jsonify({'success': False, 'error': '问卷已提交，不能修改'}), 409
+
+        try:
+            record, changed = _submissions().patch_answers(
+                submission_id, changes, removed, base_revision=base_revision
+            )
+        except RevisionConflict as conflict:
+            return jsonify({
+                'success': False,
+                'error': '答案冲突：部分题目已在其他页面修改',
+                'revision': conflict.revision,
+                'conflicts': conflict.conflicts,
+                'remote_changes': conflict.remote_changes
+            }), 409
+
+        # 其他标签页在 base_revision 之后修改、本次未涉及的题目，供客户端同步
+        sent = set(map(str, changes)) | set(map(str, removed))
+        remote_changes = {
+            qid: record['answers'].get(qid)
+            for qid, rev in record['answer_revisions'].items()
+            if rev > base_revision and qid not in sent
+        }
+
+        return jsonify({
+            'success': True,
+            'submission_id': submission_id,
+            'revision': record['revision'],
+            'changed': changed,
+            'remote_changes': remote_changes
+        }), 200
+
+    except Exception as e:
+        logger.error(f"增量保存问卷草稿出错: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
 @questionnaire_bp.route('/submission/<submission_id>/submit', methods=['POST'])
 @login_required
 @enterprise_required
@@ -490,24 +547,14 @@ def submit_questionnaire(submission_id):
         data = request.get_json()
         answers = data.get('answers', {})
 
-        db = importer.load_db()
-        
-        # 查找提交记录
-        submission = None
-        for sub in db.get('submissions', []):
-            if sub['id'] == submission_id:
-                submission = sub
-                break
-
-        if not submission:
-            return jsonify({'success': False, 'error': '问卷提交不存在'}), 404
-
-        # 权限检查
-        if submission['enterprise_id'] != session.get('enterprise_id'):
-            return jsonify({'success': False, 'error': '无权访问'}), 403
+        record, error = _find_submission(submission_id)
+        if error:
+            return error
+        submission = record['submission']
 
         # 验证必填项
-        questions = importer.get_survey_questions(submission['survey_id'])
+        template = _get_template('id', submission['survey_id'], prefer_db=False)
+        questions = template.questions if template else []
         for question in questions:
             if question.get('requires_file') and question['id'] not in answers:
                 return jsonify({
@@ -515,23 +562,18 @@ def submit_questionnaire(submission_id):
                     'error': f'问题"{question["question_text"]}"需要上传文件'
                 }), 400
 
-        # 保存答案
-        if 'answers' not in db:
-            db['answers'] = {}
-        db['answers'][submission_id] = answers
-
-        # 更新提交状态
-        submission['status'] = 'submitted'
-        submission['submitted_at'] = datetime.now().isoformat()
-        submission['updated_at'] = datetime.now().isoformat()
-        
-        importer.save_db(db)
+        # 保存答案并更新提交状态
+        submitted_at = datetime.now().isoformat()
+        record, _ = _submissions().replace_answers(
+            submission_id, answers, extra={'status': 'submitted', 'submitted_at': submitted_at}
+        )
 
         return jsonify({
             'success': True,
             'message': '问卷已提交',
             'submission_id': submission_id,
-            'submitted_at': submission['submitted_at']
+            'submitted_at': submitted_at,
+            'revision': record['revision']
         }), 200
 
     except Exception as e:
@@ -564,47 +606,37 @@ def upload_attachment(submission_id):
         if not file or not question_id:
             return jsonify({'success': False, 'error': '缺少必要参数'}), 400
 
-        db = importer.load_db()
-        
-        # 查找提交记录
-        submission = None
-        for sub in db.get('submissions', []):
-            if sub['id'] == submission_id:
-                submission = sub
-                break
-
-        if not submission:
-            return jsonify({'success': False, 'error': '问卷提交不存在'}), 404
-
-        # 权限检查
-        if submission['enterprise_id'] != session.get('enterprise_id'):
-            return jsonify({'success': False, 'error': '无权访问'}), 403
+        record, error = _find_submission(submission_id)
+        if error:
+            return error
 
-        # 创建上传目录
-        upload_dir = os.path.join('storage', 'questionnaire_uploads', submission_id)
-        os.makedirs(upload_dir, exist_ok=True)
-
-        # 保存文件
-        filename = f"{question_id}_{file.filename}"
-        file_path = os.path.join(upload_dir, filename)
-        file.save(file_path)
+        # 保存文件（相同内容只存一份，提交目录下为硬链接）
+        try:
+            file_info = upload_handler.store_file(file, submission_id, question_id, file.filename)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 413
+
+        # 同一问题重复上传相同内容：返回已登记的附件，不重复记录
+        if not file_info['new_ref']:
+            existing = next((a for a in record.get('attachments') or [] if a.get('id') == file_info['id']), None)
+            if existing is not None:
+                return jsonify({
+                    'success': True,
+                    'message': '文件已上传过',
+                    'attachment': existing
+                }), 200
 
         # 记录附件信息
-        if 'attachments' not in db:
-            db['attachments'] = {}
-        if submission_id not in db['attachments']:
-            db['attachments'][submission_id] = []
-
         attachment = {
-            'id': str(uuid.uuid4()),
+            'id': file_info['id'],
             'question_id': question_id,
             'file_name': file.filename,
-            'file_path': file_path,
-            'file_size': os.path.getsize(file_path),
-            'upload_time': datetime.now().isoformat()
+            'file_path': file_info['file_path'],
+            'file_size': file_info['file_size'],
+            'sha256': file_info['sha256'],
+            'upload_time': file_info['upload_time']
         }
-        db['attachments'][submission_id].append(attachment)
-        importer.save_db(db)
+        _submissions().add_attachment(submission_id, attachment)
 
         return jsonify({
             'success': True,
@@ -641,13 +673,8 @@ def list_submissions():
     """获取当前用户的问卷提交列表"""
     try:
         enterprise_id = session.get('enterprise_id')
-        db = importer.load_db()
-        
-        # 过滤当前企业的提交
-        submissions = [
-            sub for sub in db.get('submissions', [])
-            if sub['enterprise_id'] == enterprise_id
-        ]
+        # 按企业索引读取当前企业的提交
+        submissions = _submissions().list_by_enterprise(enterprise_id)
 
         return jsonify({
             'success': True,
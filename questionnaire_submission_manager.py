@@ -1,6 +1,6 @@
 """
 问卷提交管理模块
-功能：接收在线问卷提交、保存数据、生成Excel文件
+功能：接收在线问卷提交、保存数据、按需导出Excel文件
 """
 import os
 import json
@@ -8,6 +8,7 @@ from datetime import datetime
 import pandas as pd
 # from questionnaire_generator import QuestionnaireGenerator  # 已移除未使用依赖
 from score_calculator import ScoreCalculator
+from submission_model import Submission, write_questionnaire_excel
 
 
 class QuestionnaireSubmissionManager:
@@ -24,7 +25,7 @@ class QuestionnaireSubmissionManager:
         self.calculator = ScoreCalculator()
         os.makedirs(storage_folder, exist_ok=True)
 
-    def save_submission(self, submission_data):
+    def save_submission(self, submission_data, export_excel=False):
         """
         保存问卷提交数据
 
@@ -38,33 +39,33 @@ class QuestionnaireSubmissionManager:
                     'user_type': 'enterprise',
                     'user_level': 'beginner'
                 }
+            export_excel: 是否立即导出问卷Excel（默认在下载时按需生成）
 
         Returns:
-            保存的文件路径
+            保存结果，submission 为可直接用于计分/生成报告的 Submission 对象
         """
         try:
             # 生成文件名
             enterprise_name = submission_data['enterprise_info'].get('企业名称', '未命名企业')
             timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
 
-            # 保存为JSON（备份）
+            # 保存为JSON（规范数据）
             json_filename = f"submission_{enterprise_name}_{timestamp}.json"
             json_filepath = os.path.join(self.storage_folder, json_filename)
 
             with open(json_filepath, 'w', encoding='utf-8') as f:
                 json.dump(submission_data, f, ensure_ascii=False, indent=2)
 
-            # 生成Excel文件（用于后续处理）
-            excel_filename = f"问卷_{enterprise_name}_{timestamp}.xlsx"
-            excel_filepath = os.path.join(self.storage_folder, excel_filename)
-
-            self._create_filled_questionnaire(submission_data, excel_filepath)
+            submission = Submission(submission_data, json_filepath)
+            if export_excel:
+                submission.export_excel()
 
             return {
                 'json_path': json_filepath,
-                'excel_path': excel_filepath,
+                'excel_path': submission.excel_path,
                 'enterprise_name': enterprise_name,
-                'timestamp': timestamp
+                'timestamp': timestamp,
+                'submission': submission
             }
 
         except Exception as e:
@@ -80,136 +81,40 @@ class QuestionnaireSubmissionManager:
             output_path: 输出文件路径
         """
         try:
-            from openpyxl import Workbook
-            from openpyxl.styles import Font, Alignment, PatternFill
-            from openpyxl.utils.dataframe import dataframe_to_rows
-
-            # 题目来源：优先使用提交时的题目快照（与本次分级一致）；否则退回读取本地指标文件
-            questions_snapshot = submission_data.get('questions_snapshot')
-
-            # 创建工作簿
-            wb = Workbook()
-
-            # 1. 企业信息工作表
-            ws_info = wb.active
-            ws_info.title = "企业信息"
-
-            enterprise_info = submission_data['enterprise_info']
-            info_data = [
-                ['项目', '内容'],
-                ['企业名称', enterprise_info.get('企业名称', '')],
-                ['统一社会信用代码', enterprise_info.get('统一社会信用代码', '')],
-                ['企业类型', enterprise_info.get('企业类型', '')],
-                ['所属行业', enterprise_info.get('所属行业', '')],
-                ['注册资本（万元）', enterprise_info.get('注册资本（万元）', '')],
-                ['成立时间', enterprise_info.get('成立时间', '')],
-                ['员工人数', enterprise_info.get('员工人数', '')],
-                ['年营业收入（万元）', enterprise_info.get('年营业收入（万元）', '')],
-                ['联系人姓名', enterprise_info.get('联系人姓名', '')],
-                ['联系人邮箱', enterprise_info.get('联系人邮箱', '')],
-                ['联系人电话', enterprise_info.get('联系人电话', '')],
-                ['填写时间', datetime.now().strftime('%Y-%m-%d %H:%M:%S')]
-            ]
-
-            for row in info_data:
-                ws_info.append(row)
-
-            # 设置样式
-            header_fill = PatternFill(start_color='4472C4', end_color='4472C4', fill_type='solid')
-            header_font = Font(color='FFFFFF', bold=True, size=11)
-
-            ws_info['A1'].fill = header_fill
-            ws_info['B1'].fill = header_fill
-            ws_info['A1'].font = header_font
-            ws_info['B1'].font = header_font
-
-            ws_info.column_dimensions['A'].width = 25
-            ws_info.column_dimensions['B'].width = 40
-
-            # 2. 问卷工作表
-            ws_questionnaire = wb.create_sheet("问卷")
-
-            # 表头（兼容清单打分）
-            headers = ['序号', '一级指标', '二级指标', '三级指标（问题）', '问题类型', '分值', '答案/清单选择', '打分标准', '计算分数']
-            ws_questionnaire.append(headers)
-
-            # 设置表头样式
-            for col_num, header in enumerate(headers, 1):
-                cell = ws_questionnaire.cell(row=1, column=col_num)
-                cell.fill = header_fill
-                cell.font = header_font
-                cell.alignment = Alignment(horizontal='center', vertical='center')
-
-            # 填充问题和答案
-            answers = submission_data.get('answers', {})
-            scores = submission_data.get('scores', {})
-
-            if questions_snapshot:
-                for q in questions_snapshot:
-                    seq = q.get('sequence')
-                    seq_str = str(seq)
-                    answer_raw = answers.get(seq_str, '')
-                    # 如为JSON字符串（清单题），直接写入，便于后续解析
-                    try:
-                        # 尝试缩短显示
-                        disp = answer_raw
-                        if isinstance(answer_raw, str) and answer_raw.startswith('{'):
-                            disp = answer_raw
-                        answer_disp = disp
-                    except Exception:
-                        answer_disp = answer_raw
-
-                    data_row = [
-                        seq,
-                        q.get('level1', ''),
-                        q.get('level2', ''),
-                        q.get('question', ''),
-                        q.get('question_type', ''),
-                        q.get('base_score', ''),
-                        answer_disp,
-                        q.get('criteria', ''),
-                        scores.get(seq_str, '')
-                    ]
-                    ws_questionnaire.append(data_row)
-            else:
-                # 兼容旧路径：读取本地指标文件
-                indicators_df = pd.read_excel('指标体系.xlsx')
-                for idx, row in indicators_df.iterrows():
-                    sequence = row.get('序号', idx + 1)
-                    seq_str = str(sequence)
-                    answer = answers.get(seq_str, '未填写')
-                    data_row = [
-                        sequence,
-                        row.get('一级指标', ''),
-                        row.get('二级指标', ''),
-                        row.get('三级指标（问题）', ''),
-                        row.get('问题类型', ''),
-                        row.get('分值', 0),
-                        answer,
-                        '',
-                        scores.get(seq_str, '')
-                    ]
-                    ws_questionnaire.append(data_row)
-
-            # 设置列宽
-            ws_questionnaire.column_dimensions['A'].width = 8
-            ws_questionnaire.column_dimensions['B'].width = 20
-            ws_questionnaire.column_dimensions['C'].width = 20
-            ws_questionnaire.column_dimensions['D'].width = 52
-            ws_questionnaire.column_dimensions['E'].width = 12
-            ws_questionnaire.column_dimensions['F'].width = 8
-            ws_questionnaire.column_dimensions['G'].width = 26
-            ws_questionnaire.column_dimensions['H'].width = 46
-            ws_questionnaire.column_dimensions['I'].width = 10
-
-            # 保存文件
-            wb.save(output_path)
-            print(f"[OK] 已填写问卷文件已生成: {output_path}")
-
+            write_questionnaire_excel(submission_data, output_path)
         except Exception as e:
             print(f"[ERROR] 生成Excel文件失败: {e}")
             raise
 
+    def get_submission(self, filename):
+        """
+        根据文件名获取 Submission 对象
+
+        Args:
+            filename: JSON文件名
+
+        Returns:
+            Submission
+        """
+        filepath = os.path.join(self.storage_folder, filename)
+
+        if not os.path.exists(filepath):
+            raise FileNotFoundError(f"提交记录不存在: {filename}")
+
+        return Submission.from_json_file(filepath)
+
+    def export_excel(self, filename):
+        """
+        按需导出提交对应的问卷Excel（已导出且未过期时直接返回）
+
+        Args:
+            filename: JSON文件名
+
+        Returns:
+            Excel文件路径
+        """
+        return self.get_submission(filename).export_excel()
+
     def get_all_submissions(self):
         """
         获取所有提交记录
@@ -0,0 +1,326 @@
+# -*- coding: utf-8 -*-
+"""
+问卷填报记录分片存储
+替代 questionnaires.json 中的 submissions / answers / attachments 三个整表字段：
+- 每份提交一个记录文件 storage/questionnaire_submissions/<id前2位>/<id>.json，
+  内容为 {'submission': {...}, 'answers': {题目ID: 答案}, 'attachments': [...]}
+- 按ID直接定位记录文件（路径由ID推出，无需扫描）；按企业查询走
+  by_enterprise/<企业ID>.json 索引
+- 自动保存只比较、写入有变化的题目答案，没有变化时不落盘
+- 答案增量追加到同目录的 <id>.log（每行一个 JSON：版本号、修改/清除的题目、元数据变化），
+  读取时在快照上重放；日志满 LOG_COMPACT_EVERY 条时合并回快照（临时文件 + os.replace 原子替换）
+- 每份提交带版本号（revision），每道题记录最后修改它的版本号，用于多标签页并发填写的冲突检测
+- 每份提交一把锁，不同企业的保存互不阻塞
+自动保存的开销只与本次修改的题目数有关，与问卷大小、平台上的企业/提交数量无关。
+"""
+from __future__ import annotations
+import json
+import logging
+import os
+import re
+import threading
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from document_store import _atomic_write_json
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STORE_DIR = os.path.join('storage', 'questionnaire_submissions')
+
+_ID_PATTERN = re.compile(r'^[0-9A-Za-z_-]{8,64}$')
+
+# 增量日志达到该条数时合并回快照
+LOG_COMPACT_EVERY = 64
+
+_MISSING = object()
+
+
+class RevisionConflict(Exception):
+    """客户端基于旧版本修改的题目已被其他标签页/设备改成了不同的值"""
+
+    def __init__(self, revision: int, conflicts: Dict, remote_changes: Optional[Dict] = None):
+        super().__init__(f'答案冲突: {sorted(conflicts)}')
+        self.revision = revision
+        # {题目ID: 服务端当前答案（已清除为 None）}
+        self.conflicts = conflicts
+        # base_revision 之后服务端改过的全部题目（含冲突题目），格式同上；
+        # 客户端合并后才能把版本号推进到 revision
+        self.remote_changes = remote_changes if remote_changes is not None else dict(conflicts)
+
+
+class SubmissionStore:
+    """问卷填报记录存储"""
+
+    def __init__(self, base_dir: str = DEFAULT_STORE_DIR):
+        self.base_dir = base_dir
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+        self._index_lock = threading.Lock()
+        # 是否已检查过 questionnaires.json 中的旧提交（见 import_legacy）
+        self.legacy_checked = False
+
+    # ------------------------------------------------------------------
+    # 路径与锁
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def valid_id(submission_id: str) -> bool:
+        return bool(submission_id) and bool(_ID_PATTERN.match(str(submission_id)))
+
+    def record_path(self, submission_id: str) -> str:
+        return os.path.join(self.base_dir, submission_id[:2], f'{submission_id}.json')
+
+    def log_path(self, submission_id: str) -> str:
+        return os.path.join(self.base_dir, submission_id[:2], f'{submission_id}.log')
+
+    def _enterprise_index_path(self, enterprise_id: str) -> str:
+        safe = re.sub(r'[^0-9A-Za-z_\-一-鿿]', '_', str(enterprise_id))
+        return os.path.join(self.base_dir, 'by_enterprise', f'{safe}.json')
+
+    def _lock_for(self, submission_id: str) -> threading.Lock:
+        with self._locks_guard:
+            lock = self._locks.get(submission_id)
+            if lock is None:
+                lock = self._locks[submission_id] = threading.Lock()
+            return lock
+
+    @staticmethod
+    def _read(path: str) -> Optional[Dict]:
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    @staticmethod
+    def _read_log(path: str) -> Tuple[List[Dict], bool]:
+        """返回 (日志条目, 是否有写入中途崩溃留下的半行)"""
+        entries = []
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entries.append(json.loads(line))
+                    except ValueError:
+                        return entries, True
+        except FileNotFoundError:
+            pass
+        return entries, False
+
+    def _load_record(self, submission_id: str) -> Tuple[Optional[Dict], int]:
+        """读取快照并重放增量日志，返回 (记录, 日志条数)；日志有残缺行时条数按已满计，下次写入即合并"""
+        # 先读日志再读快照：与合并（先替换快照、再删除日志）交错时，
+        # 读到的日志要么仍能重放到快照之上，要么其条目已包含在新快照中（按版本号跳过）
+        entries, torn = self._read_log(self.log_path(submission_id))
+        record = self._read(self.record_path(submission_id))
+        if record is None:
+            return None, 0
+        record.setdefault('answers', {})
+        record.setdefault('attachments', [])
+        record.setdefault('revision', 0)
+        record.setdefault('answer_revisions', {})
+        for entry in entries:
+            if entry['rev'] > record['revision']:
+                _apply_entry(record, entry)
+        return record, LOG_COMPACT_EVERY if torn else len(entries)
+
+    def _write_snapshot(self, submission_id: str, record: Dict):
+        _atomic_write_json(self.record_path(submission_id), record)
+        try:
+            os.remove(self.log_path(submission_id))
+        except FileNotFoundError:
+            pass
+
+    def _append_log(self, submission_id: str, entry: Dict):
+        line = json.dumps(entry, ensure_ascii=False, separators=(',', ':')) + '\n'
+        with open(self.log_path(submission_id), 'a', encoding='utf-8') as f:
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+
+    # ------------------------------------------------------------------
+    # 读取
+    # ------------------------------------------------------------------
+
+    def load(self, submission_id: str) -> Optional[Dict]:
+        """
+        读取完整记录，不存在时返回 None
+        {'submission', 'answers', 'attachments', 'revision', 'answer_revisions'}
+        """
+        if not self.valid_id(submission_id):
+            return None
+        return self._load_record(submission_id)[0]
+
+    def get(self, submission_id: str) -> Optional[Dict]:
+        """读取提交元数据"""
+        record = self.load(submission_id)
+        return record['submission'] if record else None
+
+    def list_by_enterprise(self, enterprise_id: str) -> List[Dict]:
+        """某企业的全部提交（按创建顺序）"""
+        ids = self._read(self._enterprise_index_path(enterprise_id)) or []
+        submissions = []
+        for submission_id in ids:
+            submission = self.get(submission_id)
+            if submission is not None:
+                submissions.append(submission)
+        return submissions
+
+    # ------------------------------------------------------------------
+    # 写入
+    # ------------------------------------------------------------------
+
+    def create(self, submission: Dict, answers: Optional[Dict] = None,
+               attachments: Optional[List[Dict]] = None) -> Dict:
+        """新建提交记录并登记到企业索引"""
+        submission_id = submission['id']
+        if not self.valid_id(submission_id):
+            raise ValueError(f'无效的提交ID: {submission_id}')
+        record = {'submission': submission, 'answers': answers or {}, 'attachments': attachments or [],
+                  'revision': 0, 'answer_revisions': {}}
+        with self._lock_for(submission_id):
+            self._write_snapshot(submission_id, record)
+        enterprise_id = submission.get('enterprise_id')
+        if enterprise_id is not None:
+            with self._index_lock:
+                index_path = self._enterprise_index_path(enterprise_id)
+                ids = self._read(index_path) or []
+                if submission_id not in ids:
+                    ids.append(submission_id)
+                    _atomic_write_json(index_path, ids)
+        return record
+
+    def mutate(self, submission_id: str, fn: Callable[[Dict], bool]) -> Optional[Dict]:
+        """
+        在该提交的锁内读取-修改-写回记录（整份快照，并合并增量日志）
+
+        Args:
+            fn: 接收记录并就地修改，返回 False 表示没有变化（不写盘）
+
+        Returns:
+            修改后的记录；提交不存在时返回 None
+        """
+        if not self.valid_id(submission_id):
+            return None
+        with self._lock_for(submission_id):
+            record, _ = self._load_record(submission_id)
+            if record is None:
+                return None
+            if fn(record) is not False:
+                self._write_snapshot(submission_id, record)
+            return record
+
+    def patch_answers(self, submission_id: str, changes: Dict, removed: Iterable[str] = (),
+                      extra: Optional[Dict] = None,
+                      base_revision: Optional[int] = None) -> Tuple[Optional[Dict], List[str]]:
+        """
+        只写入有变化的题目答案（追加一条增量日志）
+
+        Args:
+            changes: {题目ID: 新答案}
+            removed: 需要清除答案的题目ID
+            extra: 同时更新的提交元数据字段（如 status/submitted_at）
+            base_revision: 客户端修改所基于的版本号；为 None 时不做冲突检测
+
+        Returns:
+            (记录, 实际变化的题目ID列表)；提交不存在时记录为 None
+
+        Raises:
+            RevisionConflict: 本次修改的题目在 base_revision 之后被改成了不同的值
+        """
+        if not self.valid_id(submission_id):
+            return None, []
+        changes = {str(qid): value for qid, value in changes.items()}
+        removed = [str(qid) for qid in removed if str(qid) not in changes]
+
+        with self._lock_for(submission_id):
+            record, log_entries = self._load_record(submission_id)
+            if record is None:
+                return None, []
+            answers = record['answers']
+
+            if base_revision is not None and base_revision < record['revision']:
+                conflicts = {}
+                for qid in list(changes) + removed:
+                    if record['answer_revisions'].get(qid, 0) <= base_revision:
+                        continue
+                    if changes.get(qid, _MISSING) != answers.get(qid, _MISSING):
+                        conflicts[qid] = answers.get(qid)
+                if conflicts:
+                    remote_changes = {qid: answers.get(qid)
+                                      for qid, rev in record['answer_revisions'].items() if rev > base_revision}
+                    raise RevisionConflict(record['revision'], conflicts, remote_changes)
+
+            entry = {
+                'rev': record['revision'] + 1,
+                'set': {qid: v for qid, v in changes.items() if answers.get(qid, _MISSING) != v},
+                'removed': [qid for qid in removed if qid in answers],
+            }
+            changed = list(entry['set']) + entry['removed']
+            if not changed and not extra:
+                return record, []
+            entry['submission'] = dict(extra or {}, updated_at=datetime.now().isoformat())
+
+            _apply_entry(record, entry)
+            if log_entries + 1 >= LOG_COMPACT_EVERY:
+                self._write_snapshot(submission_id, record)
+            else:
+                self._append_log(submission_id, entry)
+        return record, changed
+
+    def replace_answers(self, submission_id: str, answers: Dict,
+                        extra: Optional[Dict] = None) -> Tuple[Optional[Dict], List[str]]:
+        """以完整答案集覆盖（内部换算为增量：新增/修改的题目与被清除的题目）"""
+        answers = {str(k): v for k, v in answers.items()}
+        record = self.load(submission_id)
+        if record is None:
+            return None, []
+        removed = [qid for qid in record['answers'] if qid not in answers]
+        return self.patch_answers(submission_id, answers, removed, extra)
+
+    def add_attachment(self, submission_id: str, attachment: Dict) -> Optional[Dict]:
+        """登记附件；同 id 的附件已存在时不重复登记（附件按内容去重，重复上传返回同一 id）"""
+        def apply(record):
+            attachments = record.setdefault('attachments', [])
+            if attachment.get('id') is not None and any(a.get('id') == attachment['id'] for a in attachments):
+                return False
+            attachments.append(attachment)
+        return self.mutate(submission_id, apply)
+
+    # ------------------------------------------------------------------
+    # 迁移
+    # ------------------------------------------------------------------
+
+    def import_legacy(self, db: Dict) -> int:
+        """
+        将 questionnaires.json 中旧的 submissions/answers/attachments 导入分片存储
+        已存在的记录不覆盖；返回导入条数
+        """
+        answers = db.get('answers') or {}
+        attachments = db.get('attachments') or {}
+        imported = 0
+        for submission in db.get('submissions') or []:
+            submission_id = submission.get('id')
+            if not self.valid_id(submission_id) or os.path.exists(self.record_path(submission_id)):
+                continue
+            self.create(submission, answers.get(submission_id), attachments.get(submission_id))
+            imported += 1
+        if imported:
+            logger.info(f"已迁移 {imported} 份问卷提交到分片存储: {self.base_dir}")
+        return imported
+
+
+def _apply_entry(record: Dict, entry: Dict):
+    """把一条增量日志应用到记录上"""
+    rev = entry['rev']
+    answers = record['answers']
+    answer_revisions = record['answer_revisions']
+    for qid, value in entry.get('set', {}).items():
+        answers[qid] = value
+        answer_revisions[qid] = rev
+    for qid in entry.get('removed', ()):
+        answers.pop(qid, None)
+        answer_revisions[qid] = rev
+    record['submission'].update(entry.get('submission') or {})
+    record['revision'] = rev
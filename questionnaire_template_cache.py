@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+问卷模板读穿缓存（进程内）
+问卷模板与题目只在管理员导入/删除问卷时变化，查询与填报接口却每次都要读 MySQL 或 JSON。
+TemplateCache 按键缓存“模板 + 题目列表”：
+- 带代际号（generation）：DocxQuestionnaireImporter 导入/删除问卷时调用 invalidate()
+  使代际号加一，旧代际的条目全部失效
+- 带 TTL（环境变量 TEMPLATE_CACHE_TTL，默认 300 秒）：其他进程（迁移脚本、另一个 worker）
+  修改模板后最多在 TTL 内收敛
+- 每个条目带内容哈希 ETag，接口据此响应 If-None-Match（304）
+"""
+from __future__ import annotations
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict, Hashable, List, Optional
+
+
+def _env_ttl() -> float:
+    try:
+        return float(os.environ.get('TEMPLATE_CACHE_TTL', '300'))
+    except ValueError:
+        return 300.0
+
+
+def content_etag(payload) -> str:
+    """按内容计算 ETag（跨进程、重启后保持一致）"""
+    raw = json.dumps(payload, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+class TemplateEntry:
+    """缓存条目（survey/questions 为共享对象，调用方请勿修改）"""
+    __slots__ = ('survey', 'questions', 'etag', 'generation', 'expires_at')
+
+    def __init__(self, survey, questions: List[Dict], generation: int, expires_at: float):
+        self.survey = survey
+        self.questions = questions
+        self.etag = content_etag({'survey': survey, 'questions': questions})
+        self.generation = generation
+        self.expires_at = expires_at
+
+
+class TemplateCache:
+    def __init__(self, ttl: Optional[float] = None) -> None:
+        self.ttl = _env_ttl() if ttl is None else ttl
+        self._lock = threading.Lock()
+        self._entries: Dict[Hashable, TemplateEntry] = {}
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, loader: Callable[[], Optional[Dict]]) -> Optional[TemplateEntry]:
+        """
+        读穿：命中且未过期直接返回；否则调用 loader 加载
+
+        Args:
+            key: 缓存键，如 ('db', 'level', '初级')
+            loader: 返回 {'survey': ..., 'questions': [...]}，不存在时返回 None（不缓存）
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.generation == self.generation and entry.expires_at > now:
+                self.hits += 1
+                return entry
+            self.misses += 1
+            generation = self.generation
+
+        loaded = loader()
+        if loaded is None:
+            return None
+        entry = TemplateEntry(loaded['survey'], loaded['questions'], generation, now + self.ttl)
+        with self._lock:
+            # 加载期间发生失效时不写入旧数据
+            if generation == self.generation:
+                self._entries[key] = entry
+        return entry
+
+    def invalidate(self) -> int:
+        """模板变化：代际号加一并清空条目，返回新的代际号"""
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+            return self.generation
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {'generation': self.generation, 'entries': len(self._entries),
+                    'hits': self.hits, 'misses': self.misses, 'ttl': self.ttl}
+
+
+# 进程级单例
+template_cache = TemplateCache()
@@ -0,0 +1,328 @@
+# -*- coding: utf-8 -*-
+"""
+report_engine.catalog
+报告目录：每份报告一条元数据（企业、来源提交、报告类型、大小、SHA-256、生成时间），
+保存在 SQLite（默认 storage/report_catalog.sqlite3），替代 all_reports 每次请求
+listdir + 逐个 stat 报告目录、按文件名猜测企业名称的做法。
+
+- 生成器保存报告后由 batch_report_renderer._render_item 调用 record_report 登记（单条事务写入）
+- query 支持按企业/类型/格式/时间范围/文件名筛选，按生成时间/大小/企业/文件名排序，
+  以游标（上一页最后一条的排序值 + 文件名）翻页，翻页深度不影响查询代价
+- reconcile 扫描报告目录，登记目录外写入（或被覆盖）的文件、删除已不存在文件的记录；
+  应用内由 start_reconciler 在后台线程定期执行，也可手动执行：
+    python -m report_engine.catalog reconcile [--db storage/report_catalog.sqlite3] [--reports-dir storage/reports]
+"""
+from __future__ import annotations
+import argparse
+import base64
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+from score_cache import file_digest
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DB_PATH = os.path.join('storage', 'report_catalog.sqlite3')
+DEFAULT_REPORTS_DIR = os.path.join('storage', 'reports')
+
+# 报告文件扩展名 -> 格式
+REPORT_EXTENSIONS = {'.docx': 'Word', '.pdf': 'PDF'}
+
+# 文件名前缀 -> 报告类型（与 batch_report_renderer.REPORT_FORMATS 的文件名模板一致）
+REPORT_TYPES = {'自评报告': 'word', '专业评价报告': 'pdf', '专业报告': 'professional'}
+
+# 可排序字段 -> 列
+SORT_COLUMNS = {'created_at': 'created_at', 'size': 'size', 'enterprise': 'enterprise', 'filename': 'filename'}
+
+_COLUMNS = ('filename', 'enterprise', 'submission', 'report_type', 'format', 'size', 'checksum',
+            'created_at', 'mtime_ns', 'source')
+
+_STAMP = re.compile(r'^\d{8}$')
+
+
+def parse_report_filename(filename: str) -> Dict:
+    """由文件名推断报告类型与企业名称（<类型>_<企业名称>[_<日期>_<时间>].<扩展名>）"""
+    stem, ext = os.path.splitext(filename)
+    prefix, _, rest = stem.partition('_')
+    parts = rest.rsplit('_', 2)
+    if len(parts) == 3 and _STAMP.match(parts[1]) and parts[2].isdigit():
+        enterprise = parts[0]
+    else:
+        enterprise = rest
+    return {
+        'report_type': REPORT_TYPES.get(prefix, ''),
+        'format': REPORT_EXTENSIONS.get(ext.lower(), ext.lstrip('.').upper()),
+        'enterprise': enterprise or '未知',
+    }
+
+
+def _encode_cursor(values) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values, ensure_ascii=False).encode('utf-8')).decode('ascii')
+
+
+def _decode_cursor(cursor: str):
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8'))
+    except Exception:
+        raise ValueError('无效的分页游标')
+
+
+class ReportCatalog:
+    """报告元数据目录"""
+
+    def __init__(self, db_path: str = DEFAULT_DB_PATH, reports_dir: str = DEFAULT_REPORTS_DIR):
+        self.db_path = db_path
+        self.reports_dir = reports_dir
+        self._local = threading.local()
+        self._reconcile_lock = threading.Lock()
+        self._reconciled_at = 0.0
+        self._reconciler: Optional[threading.Thread] = None
+        self._reconciler_stopping = threading.Event()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS reports ('
+                ' filename TEXT PRIMARY KEY,'
+                " enterprise TEXT NOT NULL DEFAULT '',"
+                " submission TEXT NOT NULL DEFAULT '',"
+                " report_type TEXT NOT NULL DEFAULT '',"
+                " format TEXT NOT NULL DEFAULT '',"
+                ' size INTEGER NOT NULL,'
+                " checksum TEXT NOT NULL DEFAULT '',"
+                ' created_at REAL NOT NULL,'
+                ' mtime_ns INTEGER NOT NULL,'
+                " source TEXT NOT NULL DEFAULT 'generator')"
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_reports_created ON reports (created_at, filename)')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_reports_enterprise ON reports (enterprise, created_at)')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_reports_type ON reports (report_type, created_at)')
+            self._local.conn = conn
+        return conn
+
+    # ------------------------------------------------------------------
+    # 登记
+    # ------------------------------------------------------------------
+
+    def _entry(self, filename: str, st: os.stat_result, source: str, **meta) -> Dict:
+        entry = parse_report_filename(filename)
+        entry.update({k: v for k, v in meta.items() if v})
+        entry.update({
+            'filename': filename,
+            'submission': meta.get('submission') or '',
+            'size': st.st_size,
+            'checksum': file_digest(os.path.join(self.reports_dir, filename)),
+            'created_at': st.st_mtime,
+            'mtime_ns': st.st_mtime_ns,
+            'source': source,
+        })
+        return entry
+
+    def _upsert(self, conn: sqlite3.Connection, entries: List[Dict]) -> None:
+        conn.executemany(
+            f"INSERT OR REPLACE INTO reports ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' * len(_COLUMNS))})",
+            [tuple(entry[c] for c in _COLUMNS) for entry in entries]
+        )
+
+    def record(self, path: str, enterprise: Optional[str] = None, submission: Optional[str] = None,
+               report_type: Optional[str] = None, source: str = 'generator') -> Dict:
+        """
+        登记一份已保存的报告（文件须位于 reports_dir 下）
+
+        Args:
+            path: 报告文件路径
+            enterprise / report_type: 缺省时由文件名推断
+            submission: 来源提交文件名
+        """
+        filename = os.path.relpath(os.path.abspath(path), os.path.abspath(self.reports_dir))
+        if filename.startswith('..'):
+            raise ValueError(f'报告不在报告目录下: {path}')
+        st = os.stat(path)
+        entry = self._entry(filename, st, source, enterprise=enterprise, submission=submission,
+                            report_type=report_type)
+        self._upsert(self._conn(), [entry])
+        return entry
+
+    def remove(self, filename: str) -> bool:
+        cur = self._conn().execute('DELETE FROM reports WHERE filename = ?', (filename,))
+        return cur.rowcount > 0
+
+    def get(self, filename: str) -> Optional[Dict]:
+        row = self._conn().execute('SELECT * FROM reports WHERE filename = ?', (filename,)).fetchone()
+        return dict(row) if row is not None else None
+
+    # ------------------------------------------------------------------
+    # 查询
+    # ------------------------------------------------------------------
+
+    def query(self, enterprise: Optional[str] = None, report_type: Optional[str] = None,
+              fmt: Optional[str] = None, created_from: Optional[float] = None,
+              created_to: Optional[float] = None, q: Optional[str] = None,
+              sort: str = 'created_at', order: str = 'desc', limit: int = 50,
+              cursor: Optional[str] = None) -> Dict:
+        """
+        筛选、排序并分页
+
+        Returns:
+            {'items': [...], 'next_cursor': 下一页游标（没有下一页时为 None）}
+        """
+        column = SORT_COLUMNS.get(sort)
+        if column is None:
+            raise ValueError(f'不支持的排序字段: {sort}')
+        descending = order != 'asc'
+        conditions, params = [], []
+        for col, value in (('enterprise', enterprise), ('report_type', report_type), ('format', fmt)):
+            if value:
+                conditions.append(f'{col} = ?')
+                params.append(value)
+        if created_from is not None:
+            conditions.append('created_at >= ?')
+            params.append(created_from)
+        if created_to is not None:
+            conditions.append('created_at <= ?')
+            params.append(created_to)
+        if q:
+            conditions.append("filename LIKE ? ESCAPE '\\'")
+            params.append('%' + re.sub(r'([%_\\])', r'\\\1', q) + '%')
+        if cursor:
+            last_value, last_filename = _decode_cursor(cursor)
+            conditions.append(f"({column}, filename) {'<' if descending else '>'} (?, ?)")
+            params.extend([last_value, last_filename])
+        direction = 'DESC' if descending else 'ASC'
+        where = ' AND '.join(conditions) if conditions else '1=1'
+        limit = max(1, int(limit))
+        rows = self._conn().execute(
+            f'SELECT * FROM reports WHERE {where} ORDER BY {column} {direction}, filename {direction} LIMIT ?',
+            (*params, limit + 1)
+        ).fetchall()
+        items = [dict(row) for row in rows[:limit]]
+        next_cursor = None
+        if len(rows) > limit:
+            last = items[-1]
+            next_cursor = _encode_cursor([last[column], last['filename']])
+        return {'items': items, 'next_cursor': next_cursor}
+
+    def count(self) -> int:
+        return self._conn().execute('SELECT COUNT(*) FROM reports').fetchone()[0]
+
+    # ------------------------------------------------------------------
+    # 对账
+    # ------------------------------------------------------------------
+
+    def reconcile(self) -> Dict[str, int]:
+        """
+        使目录与报告目录一致：新文件、被覆盖（大小/修改时间变化）的文件重新登记，
+        已删除文件的记录移除。只 scandir 一次，未变化的文件不读取内容。
+        """
+        with self._reconcile_lock:
+            conn = self._conn()
+            known = {row['filename']: (row['size'], row['mtime_ns'])
+                     for row in conn.execute('SELECT filename, size, mtime_ns FROM reports')}
+            changed, seen = [], set()
+            try:
+                scanned = list(os.scandir(self.reports_dir))
+            except FileNotFoundError:
+                scanned = []
+            for item in scanned:
+                if item.name.startswith('.') or not item.is_file():
+                    continue
+                seen.add(item.name)
+                st = item.stat()
+                if known.get(item.name) != (st.st_size, st.st_mtime_ns):
+                    try:
+                        changed.append(self._entry(item.name, st, 'reconciler'))
+                    except OSError:
+                        seen.discard(item.name)  # 扫描后被删除
+            removed = [name for name in known if name not in seen]
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                self._upsert(conn, changed)
+                conn.executemany('DELETE FROM reports WHERE filename = ?', [(name,) for name in removed])
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+            self._reconciled_at = time.time()
+        added = sum(1 for entry in changed if entry['filename'] not in known)
+        stats = {'added': added, 'updated': len(changed) - added, 'removed': len(removed)}
+        if any(stats.values()):
+            logger.info(f"报告目录对账: {stats}")
+        return stats
+
+    def reconcile_if_stale(self, interval: float) -> Optional[Dict[str, int]]:
+        """距上次对账超过 interval 秒时对账一次（进程内首次调用必定对账）"""
+        if time.time() - self._reconciled_at < interval:
+            return None
+        return self.reconcile()
+
+    def start_reconciler(self, interval: float) -> None:
+        """
+        后台线程对账：启动时立即对账一次，之后每 interval 秒一次（幂等）。
+        请求路径只查询目录，不在请求内扫描报告目录。
+        """
+        with self._reconcile_lock:
+            if self._reconciler is not None and self._reconciler.is_alive():
+                return
+            self._reconciler_stopping.clear()
+            self._reconciler = threading.Thread(target=self._reconcile_loop, args=(interval,),
+                                                name='report-catalog-reconcile', daemon=True)
+            self._reconciler.start()
+
+    def stop_reconciler(self, timeout: float = 5) -> None:
+        self._reconciler_stopping.set()
+        if self._reconciler is not None:
+            self._reconciler.join(timeout=timeout)
+        self._reconciler = None
+
+    def _reconcile_loop(self, interval: float) -> None:
+        while True:
+            try:
+                self.reconcile()
+            except Exception as e:
+                logger.error(f"报告目录对账失败: {e}")
+            if self._reconciler_stopping.wait(max(interval, 1.0)):
+                return
+
+
+# 工作进程内按数据库路径复用目录实例
+_catalogs: Dict[tuple, ReportCatalog] = {}
+
+
+def record_report(db_path: str, reports_dir: str, path: str, **meta) -> Optional[Dict]:
+    """生成器保存报告后登记；登记失败只记录日志（可由对账补登）"""
+    key = (db_path, reports_dir)
+    catalog = _catalogs.get(key)
+    if catalog is None:
+        catalog = _catalogs[key] = ReportCatalog(db_path, reports_dir)
+    try:
+        return catalog.record(path, **meta)
+    except Exception as e:
+        logger.error(f"报告登记失败: {path}, {e}")
+        return None
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='报告目录维护')
+    parser.add_argument('command', choices=['reconcile'])
+    parser.add_argument('--db', default=DEFAULT_DB_PATH, help='目录数据库')
+    parser.add_argument('--reports-dir', default=DEFAULT_REPORTS_DIR, help='报告目录')
+    args = parser.parse_args(argv)
+    catalog = ReportCatalog(args.db, args.reports_dir)
+    stats = catalog.reconcile()
+    print(f"新增 {stats['added']}，更新 {stats['updated']}，移除 {stats['removed']}；共 {catalog.count()} 份报告")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,305 @@
+# -*- coding: utf-8 -*-
+"""
+report_engine.jobs
+异步报告生成任务队列：请求线程只负责入队，渲染在后台工作进程中完成。
+
+- 任务持久化在 SQLite（默认 storage/report_jobs.sqlite3），进程重启后未完成的任务继续执行
+- 状态：queued → running → done / failed；失败按指数退避重试，超过最大次数后置为 failed
+- 后台调度线程领取到期任务，交给复用 batch_report_renderer 预热逻辑的进程池渲染；
+  workers=0 时在单个后台线程中顺序渲染（适用于不便使用多进程的环境）
+- 同一提交、同一格式的任务在排队/执行中时重复入队直接返回已有任务
+"""
+from __future__ import annotations
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from typing import Callable, Dict, List, Optional
+
+from batch_report_renderer import REPORT_FORMATS, _init_worker, _render_item, report_output_path
+
+logger = logging.getLogger(__name__)
+
+JOB_STATUSES = ('queued', 'running', 'done', 'failed')
+
+_COLUMNS = ('id', 'submission', 'format', 'status', 'attempts', 'max_attempts', 'next_attempt_at',
+            'created_at', 'updated_at', 'started_at', 'finished_at', 'artifact', 'error', 'recipient')
+
+
+class ReportJobError(ValueError):
+    """入队参数不合法（未知格式、提交不存在等）"""
+
+
+class ReportJobQueue:
+    """持久化的报告生成任务队列"""
+
+    def __init__(self, db_path: str, submissions_dir: str, reports_dir: str, workers: int = 2,
+                 max_attempts: int = 3, backoff_base: float = 5.0, backoff_max: float = 300.0,
+                 poll_interval: float = 1.0, stale_after: float = 1800.0,
+                 on_complete: Optional[Callable[[Dict], None]] = None, catalog: Optional[str] = None):
+        """
+        Args:
+            db_path: SQLite 数据库路径
+            submissions_dir: 提交JSON所在目录
+            reports_dir: 报告输出目录
+            workers: 渲染进程数；0 表示在单个后台线程中渲染
+            max_attempts: 最大尝试次数
+            backoff_base: 第 n 次失败后等待 backoff_base * 2**(n-1) 秒再重试（不超过 backoff_max）
+            poll_interval: 调度线程轮询间隔（秒）
+            stale_after: running 超过该时长视为执行进程已退出，重新排队
+            on_complete: 任务成功后的回调（在调度线程中调用），参数为任务字典
+            catalog: 报告目录数据库路径（report_engine.catalog），给出时生成的报告登记到目录
+        """
+        self.db_path = db_path
+        self.submissions_dir = submissions_dir
+        self.reports_dir = reports_dir
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.poll_interval = poll_interval
+        self.stale_after = stale_after
+        self.on_complete = on_complete
+        self.catalog = catalog
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._executor = None
+
+    # ------------------------------------------------------------------
+    # 存储
+    # ------------------------------------------------------------------
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS report_jobs ('
+                ' id TEXT PRIMARY KEY,'
+                ' submission TEXT NOT NULL,'
+                ' format TEXT NOT NULL,'
+                ' status TEXT NOT NULL,'
+                ' attempts INTEGER NOT NULL DEFAULT 0,'
+                ' max_attempts INTEGER NOT NULL,'
+                ' next_attempt_at REAL NOT NULL,'
+                ' created_at REAL NOT NULL,'
+                ' updated_at REAL NOT NULL,'
+                ' started_at REAL,'
+                ' finished_at REAL,'
+                ' artifact TEXT,'
+                " error TEXT NOT NULL DEFAULT '',"
+                ' recipient TEXT)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_report_jobs_due ON report_jobs (status, next_attempt_at)')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_report_jobs_submission ON report_jobs (submission, format)')
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _row_to_job(row) -> Optional[Dict]:
+        return {k: row[k] for k in _COLUMNS} if row is not None else None
+
+    def _update(self, job_id: str, **fields) -> None:
+        fields['updated_at'] = time.time()
+        assignments = ', '.join(f'{k} = ?' for k in fields)
+        self._conn().execute(f'UPDATE report_jobs SET {assignments} WHERE id = ?', (*fields.values(), job_id))
+
+    # ------------------------------------------------------------------
+    # 对外接口
+    # ------------------------------------------------------------------
+
+    def enqueue(self, submission: str, fmt: str = 'professional', recipient: Optional[str] = None) -> Dict:
+        """
+        为一份提交入队一个报告生成任务
+
+        Args:
+            submission: 提交JSON文件名（位于 submissions_dir）
+            fmt: 报告格式（word / pdf / professional）
+            recipient: 生成后需要发送的邮箱（可选）
+
+        Returns:
+            任务字典；已有排队/执行中的相同任务时返回该任务
+        """
+        if fmt not in REPORT_FORMATS:
+            raise ReportJobError(f'未知的报告格式: {fmt}')
+        if not submission or os.path.basename(submission) != submission:
+            raise ReportJobError('提交文件名不合法')
+        if not os.path.exists(os.path.join(self.submissions_dir, submission)):
+            raise ReportJobError(f'提交记录不存在: {submission}')
+
+        conn = self._conn()
+        with self._lock:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = conn.execute(
+                    "SELECT * FROM report_jobs WHERE submission = ? AND format = ? AND status IN ('queued', 'running')"
+                    ' ORDER BY created_at DESC LIMIT 1', (submission, fmt)
+                ).fetchone()
+                if row is not None:
+                    if recipient and not row['recipient']:
+                        conn.execute('UPDATE report_jobs SET recipient = ? WHERE id = ?', (recipient, row['id']))
+                    conn.execute('COMMIT')
+                    return self.get(row['id'])
+                now = time.time()
+                job_id = uuid.uuid4().hex[:16]
+                conn.execute(
+                    'INSERT INTO report_jobs (id, submission, format, status, attempts, max_attempts,'
+                    ' next_attempt_at, created_at, updated_at, recipient) VALUES (?, ?, ?, ?, 0, ?, ?, ?, ?, ?)',
+                    (job_id, submission, fmt, 'queued', self.max_attempts, now, now, now, recipient)
+                )
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        self._wakeup.set()
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        row = self._conn().execute('SELECT * FROM report_jobs WHERE id = ?', (job_id,)).fetchone()
+        return self._row_to_job(row)
+
+    def list_jobs(self, statuses: Optional[List[str]] = None, limit: int = 100) -> List[Dict]:
+        """按创建时间倒序列出任务"""
+        sql = 'SELECT * FROM report_jobs'
+        params: list = []
+        if statuses:
+            sql += f" WHERE status IN ({','.join('?' * len(statuses))})"
+            params.extend(statuses)
+        sql += ' ORDER BY created_at DESC LIMIT ?'
+        params.append(limit)
+        return [self._row_to_job(r) for r in self._conn().execute(sql, params).fetchall()]
+
+    # ------------------------------------------------------------------
+    # 调度
+    # ------------------------------------------------------------------
+
+    def ensure_started(self) -> None:
+        """启动后台调度线程（幂等）"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopping.clear()
+            self._requeue_stale()
+            if self.workers > 0:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                     initializer=_init_worker, initargs=([],))
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=1)
+            self._thread = threading.Thread(target=self._dispatch_loop, name='report-jobs', daemon=True)
+            self._thread.start()
+
+    def stop(self, wait_for_jobs: bool = False) -> None:
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=None if wait_for_jobs else 5)
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait_for_jobs, cancel_futures=not wait_for_jobs)
+        self._thread = None
+        self._executor = None
+
+    def wait_idle(self, timeout: float = 60.0) -> bool:
+        """等待所有排队/执行中的任务结束（测试与命令行使用）"""
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if not self.list_jobs(['queued', 'running'], limit=1):
+                return True
+            time.sleep(0.05)
+        return False
+
+    def _requeue_stale(self) -> None:
+        """执行进程异常退出时遗留的 running 任务重新排队"""
+        now = time.time()
+        self._conn().execute(
+            "UPDATE report_jobs SET status = 'queued', next_attempt_at = ?, updated_at = ?"
+            " WHERE status = 'running' AND started_at < ?",
+            (now, now, now - self.stale_after)
+        )
+
+    def _claim_due(self, limit: int) -> List[Dict]:
+        """领取到期的排队任务（条件更新，多个进程共用同一队列时不会重复领取）"""
+        conn = self._conn()
+        now = time.time()
+        rows = conn.execute(
+            "SELECT id FROM report_jobs WHERE status = 'queued' AND next_attempt_at <= ?"
+            ' ORDER BY next_attempt_at LIMIT ?', (now, limit)
+        ).fetchall()
+        claimed = []
+        for row in rows:
+            cur = conn.execute(
+                "UPDATE report_jobs SET status = 'running', attempts = attempts + 1, started_at = ?, updated_at = ?"
+                " WHERE id = ? AND status = 'queued'", (now, now, row['id'])
+            )
+            if cur.rowcount == 1:
+                claimed.append(self.get(row['id']))
+        return claimed
+
+    def _backoff(self, attempts: int) -> float:
+        return min(self.backoff_max, self.backoff_base * 2 ** max(0, attempts - 1))
+
+    def _finish(self, job: Dict, result: Dict) -> None:
+        now = time.time()
+        if result.get('status') == 'done':
+            artifact = result['outputs'].get(job['format'])
+            self._update(job['id'], status='done', artifact=artifact, error='', finished_at=now)
+            if self.on_complete is not None:
+                try:
+                    self.on_complete(self.get(job['id']))
+                except Exception as e:
+                    logger.error(f"报告任务回调失败: {job['id']}, {e}")
+            return
+        error = result.get('error') or '未知错误'
+        if job['attempts'] < job['max_attempts']:
+            delay = self._backoff(job['attempts'])
+            logger.warning(f"报告任务失败，{delay:.0f}s 后重试（第{job['attempts']}次）: {job['id']}, {error}")
+            self._update(job['id'], status='queued', error=error, next_attempt_at=now + delay)
+        else:
+            logger.error(f"报告任务失败: {job['id']}, {error}")
+            self._update(job['id'], status='failed', error=error, finished_at=now)
+
+    def _dispatch_loop(self) -> None:
+        in_flight = {}
+        capacity = max(1, self.workers)
+        while not self._stopping.is_set():
+            try:
+                if len(in_flight) < capacity:
+                    for job in self._claim_due(capacity - len(in_flight)):
+                        source_path = os.path.join(self.submissions_dir, job['submission'])
+                        task = {'key': job['id'], 'source_path': source_path,
+                                'formats': [job['format']], 'output_dir': self.reports_dir,
+                                'catalog': self.catalog}
+                        in_flight[self._executor.submit(_render_item, task)] = job
+
+                if in_flight:
+                    done, _ = wait(list(in_flight), timeout=self.poll_interval, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        job = in_flight.pop(future)
+                        try:
+                            result = future.result()
+                        except Exception as e:
+                            # 工作进程异常退出
+                            result = {'status': 'failed', 'outputs': {}, 'error': f'{type(e).__name__}: {e}'}
+                        self._finish(job, result)
+                else:
+                    self._wakeup.wait(self.poll_interval)
+                    self._wakeup.clear()
+            except Exception as e:
+                logger.error(f"报告任务调度异常: {e}")
+                time.sleep(self.poll_interval)
+
+
+def report_artifact_path(job: Dict) -> Optional[str]:
+    """已完成任务的报告文件路径（文件仍存在时）"""
+    if job and job.get('status') == 'done' and job.get('artifact') and os.path.exists(job['artifact']):
+        return job['artifact']
+    return None
+
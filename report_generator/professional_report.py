@@ -49,7 +49,7 @@ class ProfessionalReportGenerator:
         生成专业版企业报告
 
         Args:
-            questionnaire_file: 已填写的问卷文件路径
+            questionnaire_file: 已填写的问卷Excel路径、提交JSON路径或 Submission 对象
             output_path: 输出报告文件路径
                         如果为None，将在reports目录生成
 
@@ -60,23 +60,24 @@ class ProfessionalReportGenerator:
             FileNotFoundError: 问卷文件不存在
             Exception: 生成失败
         """
-        if not os.path.exists(questionnaire_file):
+        if isinstance(questionnaire_file, str) and not os.path.exists(questionnaire_file):
             raise FileNotFoundError(f"问卷文件不存在: {questionnaire_file}")
 
         print(f"\n[INFO] 开始生成专业版企业报告...")
 
         # 解析问卷
-        questionnaire_data = self.calculator.parse_questionnaire(questionnaire_file)
+        questionnaire_data = self.calculator.load_questionnaire(questionnaire_file)
         enterprise_info = questionnaire_data['enterprise_info']
         enterprise_name = enterprise_info.get('企业名称', '企业')
 
         # 计算得分
-        score_summary = self.calculator.calculate_total_score(questionnaire_data)
+        score_summary = self.calculator.get_score_summary(questionnaire_file, questionnaire_data)
 
         # 从问卷文件名生成报告文件名，确保关联性
         if output_path is None:
             os.makedirs('reports', exist_ok=True)
-            base_name = os.path.basename(questionnaire_file)
+            from submission_model import source_basename
+            base_name = source_basename(questionnaire_file)
             report_base_name = base_name.replace('问卷_', '专业报告_').replace('.xlsx', '')
             output_path = os.path.join('reports', f"{report_base_name}.docx")
 
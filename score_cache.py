@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""
+计分结果持久化缓存
+以 (问卷内容哈希, 指标体系版本, 计分算法版本) 为键，将 {enterprise_info, score_summary}
+存入 SQLite（默认 storage/score_cache.sqlite3）。专家匹配、各类报告生成器、批量计分
+都先查缓存，只有问卷答案或指标体系文件发生变化时才重新解析Excel并计分。
+
+- Excel 问卷：对文件内容做 SHA-256（按 路径+mtime+size 在进程内记忆，避免重复读文件）
+- 在线提交 JSON：对 answers / questions_snapshot / enterprise_info 等计分相关字段做规范化哈希
+- 环境变量 SCORE_CACHE_PATH 指定数据库路径，SCORE_CACHE_DISABLED=1 关闭缓存
+"""
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DB_PATH = os.path.join('storage', 'score_cache.sqlite3')
+
+# 计分逻辑变化时递增，使旧缓存全部失效
+SCORE_CACHE_VERSION = 2
+
+# 在线提交中参与计分的字段（submission_to_questionnaire_data 读取的全部字段；
+# scores 填入“计算分数”列，计分时优先于按答案计算）
+_SUBMISSION_FIELDS = ('answers', 'scores', 'questions_snapshot', 'enterprise_info', 'user_type', 'user_level')
+
+_digest_memo: Dict[tuple, str] = {}
+_digest_lock = threading.Lock()
+
+
+def file_digest(path: str) -> str:
+    """文件内容的 SHA-256；文件未变化（mtime/size 相同）时直接返回记忆值"""
+    abs_path = os.path.abspath(path)
+    st = os.stat(abs_path)
+    memo_key = (abs_path, st.st_mtime_ns, st.st_size)
+    digest = _digest_memo.get(memo_key)
+    if digest is None:
+        h = hashlib.sha256()
+        with open(abs_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                h.update(chunk)
+        digest = h.hexdigest()
+        with _digest_lock:
+            _digest_memo[memo_key] = digest
+    return digest
+
+
+def _to_jsonable(obj):
+    """json.dumps 的 default：NumPy 标量转 Python 标量，其余转字符串"""
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, pd.Timestamp):
+        return obj.isoformat()
+    return str(obj)
+
+
+def submission_digest(submission: Dict) -> str:
+    """在线提交数据中计分相关字段的规范化哈希"""
+    payload = {k: submission.get(k) for k in _SUBMISSION_FIELDS}
+    raw = json.dumps(payload, ensure_ascii=False, sort_keys=True, default=_to_jsonable)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def make_key(content_digest: str, indicator_version: str) -> str:
+    return f'v{SCORE_CACHE_VERSION}:{indicator_version}:{content_digest}'
+
+
+class ScoreCache:
+    """SQLite 计分缓存（每个线程一个连接，多进程并发写由 SQLite 加锁）"""
+
+    def __init__(self, db_path: str = DEFAULT_DB_PATH):
+        self.db_path = db_path
+        self._local = threading.local()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS score_cache ('
+                ' cache_key TEXT PRIMARY KEY,'
+                ' source TEXT,'
+                ' payload TEXT NOT NULL,'
+                ' created_at REAL NOT NULL)'
+            )
+            conn.commit()
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[Dict]:
+        return self.get_many([key]).get(key)
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Dict]:
+        """批量查询，返回 {key: {'enterprise_info', 'score_summary'}}（未命中的键不出现）"""
+        keys = list(dict.fromkeys(keys))
+        found = {}
+        try:
+            conn = self._conn()
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                rows = conn.execute(
+                    f"SELECT cache_key, payload FROM score_cache WHERE cache_key IN ({','.join('?' * len(chunk))})",
+                    chunk
+                ).fetchall()
+                for key, payload in rows:
+                    found[key] = json.loads(payload)
+        except Exception as e:
+            logger.warning(f"读取计分缓存失败: {e}")
+        return found
+
+    def put(self, key: str, source, entry: Dict) -> None:
+        self.put_many([(key, source, entry)])
+
+    def put_many(self, items) -> None:
+        """写入 [(key, source, {'enterprise_info', 'score_summary'}), ...]"""
+        now = time.time()
+        rows = [(key, str(source), json.dumps(entry, ensure_ascii=False, default=_to_jsonable), now)
+                for key, source, entry in items]
+        if not rows:
+            return
+        try:
+            conn = self._conn()
+            conn.executemany('INSERT OR REPLACE INTO score_cache VALUES (?, ?, ?, ?)', rows)
+            conn.commit()
+        except Exception as e:
+            logger.warning(f"写入计分缓存失败: {e}")
+
+    def clear(self) -> None:
+        conn = self._conn()
+        conn.execute('DELETE FROM score_cache')
+        conn.commit()
+
+    def __len__(self) -> int:
+        return self._conn().execute('SELECT COUNT(*) FROM score_cache').fetchone()[0]
+
+
+_default_cache = None
+
+
+def default_score_cache() -> Optional[ScoreCache]:
+    """进程级默认缓存；SCORE_CACHE_DISABLED=1 时返回 None"""
+    global _default_cache
+    if os.environ.get('SCORE_CACHE_DISABLED') == '1':
+        return None
+    if _default_cache is None:
+        _default_cache = ScoreCache(os.environ.get('SCORE_CACHE_PATH', DEFAULT_DB_PATH))
+    return _default_cache
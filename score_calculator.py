@@ -1,9 +1,170 @@
 """
 答案解析和评分计算模块
 """
+import json
+import os
 import pandas as pd
 import numpy as np
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
+
+from score_cache import default_score_cache, file_digest, make_key, submission_digest
+
+
+# 有效性类答案 -> 得分系数
+EFFECTIVENESS_SCORES = {
+    '很有效': 1.0,
+    '比较有效': 0.8,
+    '一般': 0.6,
+    '不太有效': 0.3,
+    '完全无效': 0
+}
+
+# 默认规则下视为符合的答案
+COMPLIANT_ANSWERS = ['是', '有', '已建立', '已设立', '已制定']
+
+# 指标类型 -> 计分规则编码（与 calculate_score 的分支顺序一致）
+RULE_VETO = 0
+RULE_COMPLIANCE = 1
+RULE_EFFECTIVENESS = 2
+RULE_DEFAULT = 3
+
+
+def _rule_code(indicator_type: str) -> int:
+    """指标类型字符串对应的计分规则"""
+    if '一票否决' in indicator_type or '否决' in indicator_type:
+        return RULE_VETO
+    if '合规' in indicator_type:
+        return RULE_COMPLIANCE
+    if '有效' in indicator_type:
+        return RULE_EFFECTIVENESS
+    return RULE_DEFAULT
+
+
+def _to_base_score(value):
+    """分值转换，规则与逐题计算一致（无法转换时为整数0）"""
+    try:
+        return float(value) if pd.notna(value) else 0
+    except Exception:
+        return 0
+
+
+def _to_computed_score(value) -> Optional[float]:
+    """“计算分数”列取值，缺失或无法转换时返回 None"""
+    try:
+        if value is not None and not pd.isna(value):
+            return float(value)
+    except Exception:
+        pass
+    return None
+
+
+def _parse_checklist_answer(answer) -> Optional[Tuple[float, str]]:
+    """解析清单题JSON答案，返回 (得分, 说明)；不是清单答案时返回 None"""
+    try:
+        if isinstance(answer, str) and answer.strip().startswith('{'):
+            jr = json.loads(answer)
+            if isinstance(jr, dict) and 'score' in jr:
+                return (float(jr.get('score') or 0),
+                        f"清单项{len(jr.get('selected', []))}/{jr.get('total', 0)}，自动计分")
+    except Exception:
+        pass
+    return None
+
+
+def _memo_map(func, values) -> list:
+    """逐格转换，相同取值只计算一次（分值等列取值高度重复）"""
+    memo = {}
+    out = []
+    for v in values:
+        try:
+            key = (type(v), v)
+            result = memo.get(key, memo)
+            if result is memo:
+                result = memo[key] = func(v)
+        except TypeError:
+            result = func(v)
+        out.append(result)
+    return out
+
+
+def _sequential_sums(codes: np.ndarray, values: np.ndarray, n_groups: int) -> np.ndarray:
+    """
+    按组顺序累加（np.add.at 逐元素、按出现顺序相加），
+    与逐题 += 的浮点结果逐位一致；np.sum/groupby.sum 使用成对/补偿求和，结果可能有末位差异
+    """
+    sums = np.zeros(n_groups, dtype=float)
+    np.add.at(sums, codes, values)
+    return sums
+
+
+def _as_python_number(value: float, has_float: bool):
+    """没有任何浮点数参与累加时，逐题实现得到的是整数0"""
+    return float(value) if has_float else 0
+
+
+def parse_questionnaire_excel(questionnaire_file: str) -> Dict:
+    """解析已填写的问卷Excel文件，返回 {'enterprise_info', 'answers': DataFrame}"""
+    # 读取企业信息
+    enterprise_info_df = pd.read_excel(questionnaire_file, sheet_name='企业信息', header=None)
+    enterprise_info = {}
+    for idx, row in enterprise_info_df.iterrows():
+        if idx >= 2 and pd.notna(row[0]) and pd.notna(row[1]):
+            enterprise_info[str(row[0]).strip()] = str(row[1]).strip()
+
+    # 读取问卷答案
+    questionnaire_df = pd.read_excel(questionnaire_file, sheet_name='问卷')
+
+    # 兼容列名（答案/清单选择、问题类型、计算分数）
+    if '答案' not in questionnaire_df.columns and '答案/清单选择' in questionnaire_df.columns:
+        questionnaire_df.rename(columns={'答案/清单选择': '答案'}, inplace=True)
+    if '指标类型' not in questionnaire_df.columns and '问题类型' in questionnaire_df.columns:
+        questionnaire_df.rename(columns={'问题类型': '指标类型'}, inplace=True)
+    # 计算分数列保留为 计算分数
+
+    return {
+        'enterprise_info': enterprise_info,
+        'answers': questionnaire_df
+    }
+
+
+def submission_to_questionnaire_data(submission: Dict, questions: Optional[List[Dict]] = None,
+                                     default_answer: str = '') -> Dict:
+    """
+    在线提交的JSON数据 -> 与 parse_questionnaire 相同结构的问卷数据
+    列与 QuestionnaireSubmissionManager 生成的问卷Excel一致，空字符串视为空单元格
+
+    Args:
+        submission: 提交数据
+        questions: 题目列表，默认使用提交中的题目快照(questions_snapshot)
+        default_answer: 未作答题目的答案
+    """
+    snapshot = questions if questions is not None else submission.get('questions_snapshot')
+    if not snapshot:
+        raise ValueError('提交数据缺少题目快照(questions_snapshot)')
+    answers = submission.get('answers', {}) or {}
+    scores = submission.get('scores', {}) or {}
+
+    def cell(value):
+        return None if value == '' else value
+
+    rows = []
+    for q in snapshot:
+        seq_str = str(q.get('sequence'))
+        rows.append({
+            '序号': cell(q.get('sequence')),
+            '一级指标': cell(q.get('level1', '')),
+            '二级指标': cell(q.get('level2', '')),
+            '三级指标（问题）': cell(q.get('question', '')),
+            '指标类型': cell(q.get('question_type', '')),
+            '分值': cell(q.get('base_score', '')),
+            '答案': cell(answers.get(seq_str, default_answer)),
+            '打分标准': cell(q.get('criteria', '')),
+            '计算分数': cell(scores.get(seq_str, '')),
+        })
+    return {
+        'enterprise_info': dict(submission.get('enterprise_info', {}) or {}),
+        'answers': pd.DataFrame(rows)
+    }
 
 
 class ScoreCalculator:
@@ -21,17 +182,66 @@ class ScoreCalculator:
 
         self.indicator_file = indicator_file
         self.indicators_df = None
+        self.indicator_version = None
+        # 计分结果持久化缓存（可置为 None 关闭）
+        self.score_cache = default_score_cache()
         self.load_indicators()
 
     def load_indicators(self):
         """加载指标体系"""
         try:
             self.indicators_df = pd.read_excel(self.indicator_file, sheet_name=0)
+            self.indicator_version = file_digest(self.indicator_file)[:16]
             print(f"[OK] 加载指标体系: {len(self.indicators_df)} 个问题")
         except Exception as e:
             print(f"[ERROR] 加载指标体系失败: {e}")
             raise
 
+    def _cache_key(self, source) -> Optional[str]:
+        """问卷来源对应的缓存键；DataFrame 形式的问卷数据不缓存"""
+        if self.score_cache is None:
+            return None
+        try:
+            if hasattr(source, 'to_questionnaire_data'):
+                digest = submission_digest(source.data)
+                if not source.questions_snapshot and source.excel_path and os.path.exists(source.excel_path):
+                    # 旧版提交按提交时生成的Excel计分，Excel内容也参与缓存键
+                    digest = f'{digest}:{file_digest(source.excel_path)}'
+                return make_key(digest, self.indicator_version)
+            if isinstance(source, dict):
+                if isinstance(source.get('answers'), pd.DataFrame):
+                    return None
+                return make_key(submission_digest(source), self.indicator_version)
+            return make_key(file_digest(source), self.indicator_version)
+        except OSError:
+            return None
+
+    def get_score_summary(self, questionnaire_file, questionnaire_data: Optional[Dict] = None) -> Dict:
+        """
+        获取问卷得分（先查缓存，问卷或指标体系变化时才重新计分）
+
+        Args:
+            questionnaire_file: 问卷Excel路径（或在线提交的JSON数据）
+            questionnaire_data: 已解析的问卷数据，未命中缓存时直接用于计分
+
+        Returns:
+            得分详情字典（同 calculate_total_score）
+        """
+        key = self._cache_key(questionnaire_file)
+        if key is not None:
+            cached = self.score_cache.get(key)
+            if cached is not None:
+                return cached['score_summary']
+        if questionnaire_data is None:
+            questionnaire_data = self.load_questionnaire(questionnaire_file)
+        score_summary = self.calculate_total_score(questionnaire_data)
+        if key is not None:
+            self.score_cache.put(key, questionnaire_file if isinstance(questionnaire_file, str) else '', {
+                'enterprise_info': questionnaire_data['enterprise_info'],
+                'score_summary': score_summary
+            })
+        return score_summary
+
     def parse_questionnaire(self, questionnaire_file: str) -> Dict:
         """
         解析已填写的问卷Excel文件
@@ -43,27 +253,7 @@ class ScoreCalculator:
             包含企业信息和答案的字典
         """
         try:
-            # 读取企业信息
-            enterprise_info_df = pd.read_excel(questionnaire_file, sheet_name='企业信息', header=None)
-            enterprise_info = {}
-            for idx, row in enterprise_info_df.iterrows():
-                if idx >= 2 and pd.notna(row[0]) and pd.notna(row[1]):
-                    enterprise_info[str(row[0]).strip()] = str(row[1]).strip()
-
-            # 读取问卷答案
-            questionnaire_df = pd.read_excel(questionnaire_file, sheet_name='问卷')
-
-            # 兼容列名（答案/清单选择、问题类型、计算分数）
-            if '答案' not in questionnaire_df.columns and '答案/清单选择' in questionnaire_df.columns:
-                questionnaire_df.rename(columns={'答案/清单选择': '答案'}, inplace=True)
-            if '指标类型' not in questionnaire_df.columns and '问题类型' in questionnaire_df.columns:
-                questionnaire_df.rename(columns={'问题类型': '指标类型'}, inplace=True)
-            # 计算分数列保留为 计算分数
-
-            return {
-                'enterprise_info': enterprise_info,
-                'answers': questionnaire_df
-            }
+            return parse_questionnaire_excel(questionnaire_file)
         except Exception as e:
             print(f"[ERROR] 解析问卷失败: {e}")
             raise
@@ -105,25 +295,445 @@ class ScoreCalculator:
 
         # 处理有效性类
         if '有效' in str(indicator_type):
-            effectiveness_scores = {
-                '很有效': 1.0,
-                '比较有效': 0.8,
-                '一般': 0.6,
-                '不太有效': 0.3,
-                '完全无效': 0
-            }
-            ratio = effectiveness_scores.get(answer, 0)
+            ratio = EFFECTIVENESS_SCORES.get(answer, 0)
             return base_score * ratio, f'有效性：{answer}'
 
         # 默认处理
-        if answer in ['是', '有', '已建立', '已设立', '已制定']:
+        if answer in COMPLIANT_ANSWERS:
             return base_score, '符合'
         else:
             return 0, '不符合或未填写'
 
     def calculate_total_score(self, questionnaire_data: Dict) -> Dict:
         """
-        计算总得分和各维度得分
+        计算总得分和各维度得分（列式计算，结果与逐题计算逐位一致）
+
+        Args:
+            questionnaire_data: 问卷数据（包含企业信息和答案）
+
+        Returns:
+            得分详情字典
+        """
+        answers_df = questionnaire_data['answers']
+        enterprise_info = questionnaire_data['enterprise_info']
+        enterprise_type = enterprise_info.get('企业类型', '所有企业')
+        return self._summarize_scores(self._score_columns(answers_df, enterprise_type))
+
+    def score_many(self, sources: List) -> Dict:
+        """
+        批量计分：将多家企业的答题表纵向拼接为一张长表，一次列式计分后按企业拆分汇总
+
+        Args:
+            sources: 问卷Excel路径、提交JSON路径、Submission 对象、parse_questionnaire
+                     返回的问卷数据，或在线提交的JSON数据组成的列表
+
+        Returns:
+            {
+                'results': [{'source', 'enterprise_info', 'score_summary'}, ...]（与输入顺序一致，跳过失败项）,
+                'errors': [{'source', 'error'}, ...],
+                'level1_matrix': DataFrame，行为企业（与 results 顺序一致），列为一级指标，值为得分率
+            }
+        """
+        # 先查计分缓存，只解析、计分未命中的问卷
+        keys = [self._cache_key(source) for source in sources]
+        cached = self.score_cache.get_many([k for k in keys if k]) if self.score_cache is not None else {}
+
+        positions = []
+        loaded = []
+        errors = []
+        for pos, (source, key) in enumerate(zip(sources, keys)):
+            if key in cached:
+                continue
+            try:
+                loaded.append((source, self.load_questionnaire(source)))
+                positions.append(pos)
+            except Exception as e:
+                errors.append({'source': source, 'error': str(e)})
+
+        # 列名与dtype完全相同的答题表才拼接，保证取值与单独计分时一致
+        schemas: Dict[tuple, List[int]] = {}
+        for i, (_, data) in enumerate(loaded):
+            df = data['answers']
+            key = tuple(zip(map(str, df.columns), map(str, df.dtypes)))
+            schemas.setdefault(key, []).append(i)
+
+        summaries: List[Optional[Dict]] = [None] * len(loaded)
+        for members in schemas.values():
+            frames = [loaded[i][1]['answers'] for i in members]
+            lengths = [len(f) for f in frames]
+            stacked = pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+            enterprise_types = []
+            index_labels = []
+            for i, frame in zip(members, frames):
+                etype = loaded[i][1]['enterprise_info'].get('企业类型', '所有企业')
+                enterprise_types.extend([etype] * len(frame))
+                index_labels.extend(frame.index)
+            scored = self._score_columns(stacked, enterprise_types, index_labels)
+            owners = np.repeat(np.arange(len(members)), lengths)
+            for j, part in enumerate(self._split_scored(scored, owners, len(members))):
+                summaries[members[j]] = self._summarize_scores(part)
+
+        # 新计分结果写入缓存，结果按输入顺序合并
+        by_position = {}
+        to_cache = []
+        for pos, (source, data), summary in zip(positions, loaded, summaries):
+            entry = {'enterprise_info': data['enterprise_info'], 'score_summary': summary}
+            by_position[pos] = {'source': source, **entry}
+            if keys[pos] is not None:
+                to_cache.append((keys[pos], source if isinstance(source, str) else '', entry))
+        if to_cache:
+            self.score_cache.put_many(to_cache)
+        for pos, (source, key) in enumerate(zip(sources, keys)):
+            if key in cached:
+                by_position[pos] = {'source': source, **cached[key]}
+        results = [by_position[pos] for pos in sorted(by_position)]
+
+        names = [r['enterprise_info'].get('企业名称') or str(r['source']) for r in results]
+        level1_matrix = pd.DataFrame(
+            [{k: v['percentage'] for k, v in r['score_summary']['score_by_level1'].items()} for r in results],
+            index=pd.Index(names, name='企业名称')
+        )
+
+        return {
+            'results': results,
+            'errors': errors,
+            'level1_matrix': level1_matrix
+        }
+
+    def load_questionnaire(self, source) -> Dict:
+        """
+        各种问卷来源统一转换为 {'enterprise_info', 'answers': DataFrame}
+
+        Args:
+            source: 问卷Excel路径、提交JSON路径、Submission 对象、
+                    在线提交的JSON数据，或已解析的问卷数据
+        """
+        from submission_model import Submission
+
+        if hasattr(source, 'to_questionnaire_data'):
+            return source.to_questionnaire_data()
+        if isinstance(source, dict):
+            if isinstance(source.get('answers'), pd.DataFrame):
+                return source
+            return Submission(source).to_questionnaire_data()
+        if str(source).lower().endswith('.json'):
+            return Submission.from_json_file(source).to_questionnaire_data()
+        return self.parse_questionnaire(source)
+
+    @staticmethod
+    def _split_scored(scored: Dict, owners: np.ndarray, n_owners: int) -> List[Dict]:
+        """将长表的列式计分结果按企业切分（owners 为各行所属企业编号，升序）"""
+        app_owner = owners[scored['rows']]
+        app_bounds = np.searchsorted(app_owner, np.arange(n_owners + 1))
+        ans_owner = app_owner[scored['answered_rows']]
+        ans_bounds = np.searchsorted(ans_owner, np.arange(n_owners + 1))
+        parts = []
+        for j in range(n_owners):
+            a, b = app_bounds[j], app_bounds[j + 1]
+            c, d = ans_bounds[j], ans_bounds[j + 1]
+            parts.append({
+                'rows': scored['rows'][a:b],
+                'applicable_count': int(b - a),
+                'base': scored['base'][a:b],
+                'base_values': scored['base_values'][a:b],
+                'answered_rows': scored['answered_rows'][c:d] - a,
+                'scores': scored['scores'][c:d],
+                'int_zero': scored['int_zero'][c:d],
+                'comments': scored['comments'][c:d],
+                'level1': scored['level1'][c:d],
+                'level2': scored['level2'][c:d],
+                'seq_nos': scored['seq_nos'][c:d],
+                'questions': scored['questions'][c:d],
+                'answers': scored['answers'][c:d],
+                'remarks': scored['remarks'][c:d],
+            })
+        return parts
+
+    def _score_columns(self, answers_df: pd.DataFrame, enterprise_type, index_labels=None) -> Dict:
+        """
+        对整张答题表做一次列式计分，返回各题的中间结果（仅包含适用题目）
+
+        取值统一来自 answers_df.values，与 iterrows 得到的单元格对象完全相同，
+        保证题目详情中的序号/答案等字段类型与逐题实现一致。
+
+        Args:
+            answers_df: 答题表（可以是多家企业纵向拼接的长表）
+            enterprise_type: 企业类型；长表时为与行对齐的数组
+            index_labels: 各行原始索引（无“序号”列时用于生成序号），默认取 answers_df.index
+        """
+        n = len(answers_df)
+        columns = answers_df.columns
+        values = answers_df.values
+
+        def col(name, default):
+            if name in columns:
+                return values[:, columns.get_loc(name)]
+            arr = np.empty(n, dtype=object)
+            arr[:] = [default] * n
+            return arr
+
+        # 1. 适用性：按不同的“适用对象”取值各判断一次
+        if isinstance(enterprise_type, str):
+            enterprise_types = [enterprise_type] * n
+        else:
+            enterprise_types = enterprise_type
+        applicable_memo = {}
+        applicable_mask = np.zeros(n, dtype=bool)
+        for i, (etype, v) in enumerate(zip(enterprise_types, col('适用对象', '所有企业'))):
+            if isinstance(v, str) and isinstance(etype, str):
+                hit = applicable_memo.get((etype, v))
+                if hit is None:
+                    hit = applicable_memo[(etype, v)] = self._check_applicability(etype, v)
+            else:
+                hit = self._check_applicability(etype, v)
+            applicable_mask[i] = hit
+        rows = np.flatnonzero(applicable_mask)
+
+        # 2. 分值：浮点列直接用 NumPy，其余逐格转换一次
+        raw_base = col('分值', 0)[rows]
+        if raw_base.dtype.kind == 'f':
+            base_is_int = np.isnan(raw_base)
+            base = np.where(base_is_int, 0.0, raw_base)
+            base_values = [0 if is_int else float(b) for b, is_int in zip(base, base_is_int)]
+        else:
+            base_values = _memo_map(_to_base_score, raw_base)
+            base_is_int = np.array([type(b) is int for b in base_values], dtype=bool)
+            base = np.array(base_values, dtype=float)
+
+        # 3. 是否作答
+        raw_answers = col('答案', '')[rows].astype(object)
+        answered = np.asarray(pd.notna(raw_answers), dtype=bool) & np.asarray(raw_answers != '', dtype=bool)
+        ans_rows = np.flatnonzero(answered)
+        m = len(ans_rows)
+        answers = raw_answers[ans_rows]
+        ans_base = base[ans_rows]
+        ans_base_is_int = base_is_int[ans_rows]
+
+        scores = np.zeros(m, dtype=float)
+        int_zero = np.zeros(m, dtype=bool)
+        comments = np.empty(m, dtype=object)
+        comments[:] = '自动计分'
+        resolved = np.zeros(m, dtype=bool)
+
+        # 3.1 优先采用“计算分数”列（清单打分）
+        if '计算分数' in columns:
+            raw_computed = col('计算分数', None)[rows][ans_rows]
+            if raw_computed.dtype.kind == 'f':
+                resolved = ~np.isnan(raw_computed)
+                scores[resolved] = raw_computed[resolved]
+            else:
+                for i, v in enumerate(raw_computed):
+                    computed = _to_computed_score(v)
+                    if computed is not None:
+                        scores[i] = computed
+                        resolved[i] = True
+
+        # 3.2 清单题JSON答案
+        for i in np.flatnonzero(~resolved):
+            parsed = _parse_checklist_answer(answers[i])
+            if parsed is not None:
+                scores[i], comments[i] = parsed
+                resolved[i] = True
+
+        # 3.3 其余按指标类型规则计分
+        pending = np.flatnonzero(~resolved)
+        if len(pending):
+            p_answers = answers[pending]
+            p_base = ans_base[pending]
+            p_base_is_int = ans_base_is_int[pending]
+
+            types = pd.Categorical([str(t) for t in col('指标类型', '')[rows][ans_rows][pending]])
+            rule_table = np.array([_rule_code(t) for t in types.categories], dtype=np.int8)
+            rules = rule_table[types.codes]
+
+            not_applicable = np.array([a == '不适用' for a in p_answers], dtype=bool)
+            norm = pd.Categorical([str(a).strip() for a in p_answers])
+            cats = list(norm.categories)
+            norm_values = np.array(cats, dtype=object)[norm.codes]
+            # 有效性系数查找表：按答案类别计算一次
+            ratio_table = [EFFECTIVENESS_SCORES.get(a, 0) for a in cats]
+            ratio = np.array(ratio_table, dtype=float)[norm.codes]
+            ratio_is_int = np.array([type(r) is int for r in ratio_table], dtype=bool)[norm.codes]
+            is_yes = norm_values == '是'
+            is_no = norm_values == '否'
+            is_compliant = np.isin(norm_values, COMPLIANT_ANSWERS)
+
+            veto = rules == RULE_VETO
+            compliance = rules == RULE_COMPLIANCE
+            effectiveness = rules == RULE_EFFECTIVENESS
+            default = rules == RULE_DEFAULT
+
+            gives_base = (veto & is_no) | (compliance & is_yes) | (default & is_compliant)
+            p_scores = np.where(gives_base, p_base, 0.0)
+            p_scores = np.where(effectiveness, p_base * ratio, p_scores)
+            p_int_zero = np.where(gives_base, p_base_is_int, True)
+            p_int_zero = np.where(effectiveness, p_base_is_int & ratio_is_int, p_int_zero)
+            p_comments = np.select(
+                [
+                    veto & is_no, veto & is_yes, veto,
+                    compliance & is_yes, compliance & is_no, compliance,
+                    effectiveness,
+                    is_compliant,
+                ],
+                [
+                    '一票否决：扣分', '符合要求', '未明确',
+                    '符合要求', '不符合', '未明确',
+                    '有效性：' + norm_values,
+                    '符合',
+                ],
+                default='不符合或未填写'
+            )
+
+            # “不适用”优先于所有规则
+            p_scores[not_applicable] = 0.0
+            p_int_zero[not_applicable] = True
+            p_comments[not_applicable] = '未填写或不适用'
+
+            scores[pending] = p_scores
+            int_zero[pending] = p_int_zero
+            comments[pending] = p_comments
+
+        def text(name):
+            cells = col(name, None)[rows][ans_rows]
+            present = np.asarray(pd.notna(cells), dtype=bool)
+            return [str(v) if ok else '' for v, ok in zip(cells, present)]
+
+        if '序号' in columns:
+            seq_nos = list(col('序号', None)[rows][ans_rows])
+        else:
+            labels = answers_df.index if index_labels is None else index_labels
+            seq_nos = [labels[r] + 1 for r in rows[ans_rows]]
+
+        return {
+            'rows': rows,
+            'applicable_count': len(rows),
+            'base': base,
+            'base_values': base_values,
+            'answered_rows': ans_rows,
+            'scores': scores,
+            'int_zero': int_zero,
+            'comments': comments,
+            'level1': text('一级指标'),
+            'level2': text('二级指标'),
+            'seq_nos': seq_nos,
+            'questions': list(col('三级指标（问题）', '')[rows][ans_rows]),
+            'answers': list(answers),
+            'remarks': list(col('备注说明', '')[rows][ans_rows]),
+        }
+
+    def _summarize_scores(self, scored: Dict) -> Dict:
+        """将列式计分结果汇总为与逐题实现相同结构的得分详情"""
+        base = scored['base']
+        ans_rows = scored['answered_rows']
+        scores = scored['scores']
+        int_zero = scored['int_zero']
+        has_float = ~int_zero
+        ans_base = base[ans_rows]
+        positive = ans_base > 0
+
+        score_summary = {
+            'total_score': 0,
+            'max_possible_score': 0,
+            'score_by_level1': {},
+            'score_by_level2': {},
+            'question_details': [],
+            'negative_points': 0,
+            'answered_count': len(ans_rows),
+            'total_questions': scored['applicable_count'],
+            'applicable_questions': scored['applicable_count']
+        }
+
+        all_positive = base > 0
+        if all_positive.any():
+            score_summary['max_possible_score'] = float(
+                _sequential_sums(np.zeros(all_positive.sum(), dtype=np.intp), base[all_positive], 1)[0])
+        if len(ans_rows):
+            total = _sequential_sums(np.zeros(len(ans_rows), dtype=np.intp), scores, 1)[0]
+            score_summary['total_score'] = _as_python_number(total, has_float.any())
+            negative = scores < 0
+            if negative.any():
+                score_summary['negative_points'] = float(
+                    _sequential_sums(np.zeros(negative.sum(), dtype=np.intp), scores[negative], 1)[0])
+
+        # 一次分组：factorize 按首次出现顺序编码，与字典插入顺序一致
+        for level_key, target in (('level1', 'score_by_level1'), ('level2', 'score_by_level2')):
+            labels = scored[level_key]
+            if not labels:
+                continue
+            codes, uniques = pd.factorize(np.array(labels, dtype=object))
+            k = len(uniques)
+            score_sums = _sequential_sums(codes, scores, k)
+            float_counts = np.bincount(codes, weights=has_float, minlength=k)
+            max_sums = _sequential_sums(codes[positive], ans_base[positive], k)
+            positive_counts = np.bincount(codes[positive], minlength=k)
+            counts = np.bincount(codes, minlength=k)
+            first_rows = np.unique(codes, return_index=True)[1]
+            target_dict = score_summary[target]
+            for g, name in enumerate(uniques):
+                if not name:
+                    continue
+                entry = {}
+                if level_key == 'level2':
+                    entry['level1'] = scored['level1'][first_rows[g]]
+                entry['score'] = _as_python_number(score_sums[g], float_counts[g] > 0)
+                entry['max_score'] = _as_python_number(max_sums[g], positive_counts[g] > 0)
+                entry['count'] = int(counts[g])
+                target_dict[name] = entry
+
+        base_values = scored['base_values']
+        details = score_summary['question_details']
+        for i, r in enumerate(ans_rows):
+            details.append({
+                'seq_no': scored['seq_nos'][i],
+                'level1': scored['level1'][i],
+                'level2': scored['level2'][i],
+                'question': scored['questions'][i],
+                'answer': scored['answers'][i],
+                'base_score': base_values[r],
+                'actual_score': 0 if int_zero[i] else float(scores[i]),
+                'comment': scored['comments'][i],
+                'remark': scored['remarks'][i]
+            })
+
+        return self._finalize_percentages(score_summary)
+
+    def _finalize_percentages(self, score_summary: Dict) -> Dict:
+        """计算总得分率、完成率及各级指标得分率"""
+        # 计算百分比
+        if score_summary['max_possible_score'] > 0:
+            score_summary['score_percentage'] = (
+                score_summary['total_score'] / score_summary['max_possible_score'] * 100
+            )
+        else:
+            score_summary['score_percentage'] = 0
+
+        # 计算完成率
+        if score_summary['applicable_questions'] > 0:
+            score_summary['completion_rate'] = (
+                score_summary['answered_count'] / score_summary['applicable_questions'] * 100
+            )
+        else:
+            score_summary['completion_rate'] = 0
+
+        # 计算各一级指标的得分率
+        for level1, data in score_summary['score_by_level1'].items():
+            if data['max_score'] > 0:
+                data['percentage'] = (data['score'] / data['max_score']) * 100
+            else:
+                data['percentage'] = 0
+
+        # 计算各二级指标的得分率
+        for level2, data in score_summary['score_by_level2'].items():
+            if data['max_score'] > 0:
+                data['percentage'] = (data['score'] / data['max_score']) * 100
+            else:
+                data['percentage'] = 0
+
+        return score_summary
+
+    def _calculate_total_score_by_row(self, questionnaire_data: Dict) -> Dict:
+        """
+        逐题计算总得分和各维度得分（原实现，作为列式计算的对照基准保留）
 
         Args:
             questionnaire_data: 问卷数据（包含企业信息和答案）
@@ -7,6 +7,8 @@ import sys
 from professional_report_generator import ProfessionalReportGenerator
 from notification_service import NotificationService
 from questionnaire_submission_manager import QuestionnaireSubmissionManager
+from batch_report_renderer import BatchManifest, default_workers, render_batch
+from bulk_mailer import BulkMailer, MailOutbox
 
 def batch_send_professional_reports():
     """批量发送专业报告"""
@@ -14,8 +16,7 @@ def batch_send_professional_reports():
     print("批量发送专业报告工具")
     print("="*60)
 
-    # 初始化服务
-    professional_generator = ProfessionalReportGenerator()
+    # 初始化服务（报告生成器在各工作进程中创建）
     notification_service = NotificationService()
     submission_manager = QuestionnaireSubmissionManager()
 
@@ -39,71 +40,104 @@ def batch_send_professional_reports():
         print("\n操作已取消")
         return
 
+    # 检查是否有中断的批量任务
+    manifest = BatchManifest.find_unfinished('professional_reports')
+    if manifest:
+        counts = manifest.summary()
+        print(f"\n检测到未完成的批量任务 {manifest.job_id}（已完成 {counts.get('done', 0)}/{len(manifest.items)}）")
+        if input("是否继续该任务? (y/n): ").strip().lower() != 'y':
+            manifest = None
+    if manifest is None:
+        manifest = BatchManifest.create('professional_reports', ['professional'])
+
+    workers_input = input(f"\n并行进程数 (直接回车使用 {default_workers()}): ").strip()
+    workers = int(workers_input) if workers_input.isdigit() and int(workers_input) > 0 else default_workers()
+
     # 批量处理
     success_count = 0
     failed_count = 0
     no_email_count = 0
 
-    print("\n开始处理...\n")
+    print(f"\n开始处理（任务 {manifest.job_id}，{workers} 个进程）...\n")
 
-    for idx, sub in enumerate(submissions, 1):
+    items = []
+    contacts = {}
+    for sub in submissions:
+        key = sub['filename']
+        enterprise_name = sub['enterprise_name']
         try:
-            enterprise_name = sub['enterprise_name']
-            print(f"[{idx}/{len(submissions)}] 处理: {enterprise_name}")
-
             # 获取提交数据
-            submission_data = submission_manager.get_submission_by_filename(sub['filename'])
+            submission_data = submission_manager.get_submission_by_filename(key)
             enterprise_info = submission_data['enterprise_info']
 
-            # 查找Excel文件
-            excel_path = os.path.join(
-                'submissions',
-                sub['filename'].replace('.json', '.xlsx').replace('submission_', '问卷_')
-            )
-
-            if not os.path.exists(excel_path):
-                print(f"  ❌ Excel文件不存在，跳过")
-                failed_count += 1
-                continue
-
-            # 生成专业版报告
-            print(f"  📄 生成专业版报告...")
-            report_path = professional_generator.generate_report(excel_path)
-            print(f"  ✅ 报告已生成: {os.path.basename(report_path)}")
-
-            # 获取邮箱
-            email = enterprise_info.get('联系人邮箱', '')
-            contact_name = enterprise_info.get('联系人姓名', '')
-
-            if not email:
-                print(f"  ⚠️  未提供邮箱地址，跳过邮件发送")
-                no_email_count += 1
-                success_count += 1  # 报告生成成功
-                continue
-
-            # 发送邮件
-            print(f"  📧 发送邮件到: {email}")
-            email_sent = notification_service.send_email(
-                to_email=email,
-                enterprise_name=enterprise_name,
-                contact_name=contact_name,
-                report_url='',
-                attachment_path=report_path
-            )
-
-            if email_sent:
-                print(f"  ✅ 邮件发送成功")
-                success_count += 1
-            else:
-                print(f"  ❌ 邮件发送失败")
-                failed_count += 1
-
+            contacts[key] = (enterprise_name, enterprise_info.get('联系人邮箱', ''),
+                             enterprise_info.get('联系人姓名', ''))
+            items.append({'key': key, 'source_path': sub['filepath']})
         except Exception as e:
-            print(f"  ❌ 处理失败: {e}")
+            print(f"{enterprise_name}: ❌ 处理失败: {e}")
+            failed_count += 1
+
+    # 邮件由发送线程复用 SMTP 会话并发发送，发送状态记入任务对应的发件箱
+    mailer = BulkMailer(notification_service, outbox=MailOutbox.for_job(manifest.job_id))
+
+    # 并行生成专业版报告，每完成一份立即加入发送队列
+    for idx, result in enumerate(render_batch(items, manifest, workers=workers), 1):
+        key = result['key']
+        enterprise_name, email, contact_name = contacts[key]
+        print(f"[{idx}/{len(items)}] {enterprise_name}")
+
+        if result['status'] != 'done':
+            print(f"  ❌ 处理失败: {result['error']}")
             failed_count += 1
+            print()
+            continue
 
+        report_path = result['outputs']['professional']
+        print(f"  ✅ 报告已生成: {os.path.basename(report_path)}"
+              + ("（此前已生成）" if result['resumed'] else f"（{result['seconds']:.1f}s）"))
+
+        if not email:
+            print(f"  ⚠️  未提供邮箱地址，跳过邮件发送")
+            no_email_count += 1
+            success_count += 1  # 报告生成成功
+            print()
+            continue
+
+        if manifest.items[key].get('email') == 'sent':
+            print(f"  ✅ 邮件此前已发送")
+            success_count += 1
+            print()
+            continue
+
+        # 加入发送队列
+        queued = mailer.submit(key, to_email=email, enterprise_name=enterprise_name,
+                               contact_name=contact_name, report_url='', attachment_path=report_path)
+        if queued is None:
+            # 发件箱中已记录发送成功（上次运行在更新清单前中断）
+            manifest.update(key, email='sent')
+            print(f"  ✅ 邮件此前已发送")
+            success_count += 1
+        else:
+            print(f"  📧 加入发送队列: {email}")
         print()
 
+    # 等待邮件发送完成
+    print("等待邮件发送完成...\n")
+    for result in mailer.as_completed():
+        key = result['key']
+        enterprise_name = contacts[key][0]
+        email_sent = result['status'] == 'sent'
+        manifest.update(key, email='sent' if email_sent else 'failed')
+        if email_sent:
+            print(f"  ✅ {enterprise_name}: 邮件发送成功 ({result['to_email']})")
+            success_count += 1
+        else:
+            print(f"  ❌ {enterprise_name}: 邮件发送失败 - {result['error']}")
+            failed_count += 1
+    mailer.close()
+    # 邮件结果全部登记后再判定任务状态：有发送失败的邮件时保持可续跑
+    manifest.finalize()
+
     # 汇总统计
     print("=" * 60)
     print("处理完成！")
@@ -112,6 +146,7 @@ def batch_send_professional_reports():
     print(f"失败: {failed_count}")
     print(f"无邮箱: {no_email_count}")
     print(f"总计: {len(submissions)}")
+    print(f"任务清单: {manifest.path}")
     print("=" * 60)
 
 
@@ -156,19 +191,9 @@ def send_single_professional_report():
         submission_data = submission_manager.get_submission_by_filename(selected_sub['filename'])
         enterprise_info = submission_data['enterprise_info']
 
-        # 查找Excel文件
-        excel_path = os.path.join(
-            'submissions',
-            selected_sub['filename'].replace('.json', '.xlsx').replace('submission_', '问卷_')
-        )
-
-        if not os.path.exists(excel_path):
-            print(f"\n[ERROR] Excel文件不存在: {excel_path}")
-            return
-
-        # 生成专业版报告
+        # 生成专业版报告（直接使用提交的JSON数据）
         print(f"\n正在生成专业版报告...")
-        report_path = professional_generator.generate_report(excel_path)
+        report_path = professional_generator.generate_report(selected_sub['filepath'])
         print(f"✅ 报告已生成: {report_path}")
 
         # 获取邮箱
@@ -10,6 +10,13 @@ from datetime import datetime, timedelta
 import uuid
 import json
 
+import logging
+
+import feedback_analytics
+import feedback_rollup
+
+logger = logging.getLogger(__name__)
+
 # 创建蓝图
 special_feedback_bp = Blueprint('special_feedback', __name__, url_prefix='/api/portal/chamber/feedbacks')
 
@@ -145,6 +152,7 @@ def create_feedback():
         )
         
         db.session.add(feedback)
+        feedback_rollup.record_change(db.session, None, feedback_rollup.contribution(feedback))
         db.session.commit()
         
         return jsonify({
@@ -206,6 +214,7 @@ def update_feedback(feedback_id):
             return jsonify({'success': False, 'error': '反馈不存在'}), 404
         
         data = request.get_json()
+        before = feedback_rollup.contribution(feedback)
         
         # 更新字段
         if 'title' in data:
@@ -228,6 +237,7 @@ def update_feedback(feedback_id):
             feedback.reviewed_at = datetime.now()
         
         feedback.updated_at = datetime.now()
+        feedback_rollup.record_change(db.session, before, feedback_rollup.contribution(feedback))
         db.session.commit()
         
         return jsonify({
@@ -250,6 +260,7 @@ def delete_feedback(feedback_id):
         if not feedback:
             return jsonify({'success': False, 'error': '反馈不存在'}), 404
         
+        feedback_rollup.record_change(db.session, feedback_rollup.contribution(feedback), None)
         db.session.delete(feedback)
         db.session.commit()
         
@@ -264,31 +275,29 @@ def delete_feedback(feedback_id):
 # 分析接口
 # ============================================================
 
+def _analysis(name, *args):
+    """
+    统计查询：优先从按日汇总表（feedback_rollup）累加，
+    汇总表停用或查询失败时改用明细表聚合查询（feedback_analytics）
+    """
+    if feedback_rollup.rollup_enabled():
+        try:
+            return getattr(feedback_rollup, name)(db.session, *args)
+        except Exception as e:
+            logger.warning(f"汇总表统计失败，改用明细表查询: {e}")
+            db.session.rollback()
+    return getattr(feedback_analytics, name)(db.session, *args)
+
+
 @special_feedback_bp.route('/analysis/category', methods=['GET'])
 def analyze_category():
     """分类分析"""
     try:
-        from models import SpecialFeedback
-        
         date_from = request.args.get('date_from', '')
         date_to = request.args.get('date_to', '')
         
-        query = db.session.query(SpecialFeedback)
-        
-        if date_from:
-            query = query.filter(SpecialFeedback.submitted_at >= date_from)
-        
-        if date_to:
-            query = query.filter(SpecialFeedback.submitted_at <= date_to)
-        
         # 按分类统计
-        category_stats = db.session.query(
-            SpecialFeedback.category,
-            func.count(SpecialFeedback.id).label('count')
-        ).filter(
-            (SpecialFeedback.submitted_at >= date_from) if date_from else True,
-            (SpecialFeedback.submitted_at <= date_to) if date_to else True
-        ).group_by(SpecialFeedback.category).all()
+        category_stats = _analysis('category_breakdown', date_from, date_to)
         
         total = sum([stat[1] for stat in category_stats])
         
@@ -314,41 +323,13 @@ def analyze_category():
 
 @special_feedback_bp.route('/analysis/trend', methods=['GET'])
 def analyze_trend():
-    """时间趋势分析"""
+    """时间趋势分析（按日/周/月计数）"""
     try:
-        from models import SpecialFeedback
-        
         date_from = request.args.get('date_from', '')
         date_to = request.args.get('date_to', '')
         period = request.args.get('period', 'day')  # day, week, month
         
-        query = db.session.query(SpecialFeedback)
-        
-        if date_from:
-            query = query.filter(SpecialFeedback.submitted_at >= date_from)
-        
-        if date_to:
-            query = query.filter(SpecialFeedback.submitted_at <= date_to)
-        
-        feedbacks = query.all()
-        
-        # 按日期分组
-        trend_data = {}
-        for fb in feedbacks:
-            if fb.submitted_at:
-                if period == 'day':
-                    date_key = fb.submitted_at.strftime('%Y-%m-%d')
-                elif period == 'week':
-                    date_key = fb.submitted_at.strftime('%Y-W%W')
-                else:  # month
-                    date_key = fb.submitted_at.strftime('%Y-%m')
-                
-                trend_data[date_key] = trend_data.get(date_key, 0) + 1
-        
-        trend_list = [
-            {'date': date, 'count': count}
-            for date, count in sorted(trend_data.items())
-        ]
+        trend_list = _analysis('trend', date_from, date_to, period)
         
         return jsonify({
             'success': True,
@@ -363,37 +344,12 @@ def analyze_trend():
 def analyze_rating():
     """评分分析"""
     try:
-        from models import SpecialFeedback
-        
         date_from = request.args.get('date_from', '')
         date_to = request.args.get('date_to', '')
         
-        query = db.session.query(SpecialFeedback)
-        
-        if date_from:
-            query = query.filter(SpecialFeedback.submitted_at >= date_from)
-        
-        if date_to:
-            query = query.filter(SpecialFeedback.submitted_at <= date_to)
-        
-        feedbacks = query.filter(SpecialFeedback.rating.isnot(None)).all()
-        
-        # 计算平均评分
-        ratings = [fb.rating for fb in feedbacks if fb.rating]
-        avg_rating = sum(ratings) / len(ratings) if ratings else 0
-        
-        # 分布统计
-        distribution = {1: 0, 2: 0, 3: 0, 4: 0, 5: 0}
-        for rating in ratings:
-            if rating in distribution:
-                distribution[rating] += 1
-        
         return jsonify({
             'success': True,
-            'data': {
-                'average_rating': round(avg_rating, 2),
-                'distribution': distribution
-            }
+            'data': _analysis('rating_summary', date_from, date_to)
         })
     
     except Exception as e:
@@ -404,50 +360,12 @@ def analyze_rating():
 def analyze_metrics():
     """关键指标分析"""
     try:
-        from models import SpecialFeedback
-        
         date_from = request.args.get('date_from', '')
         date_to = request.args.get('date_to', '')
         
-        query = db.session.query(SpecialFeedback)
-        
-        if date_from:
-            query = query.filter(SpecialFeedback.submitted_at >= date_from)
-        
-        if date_to:
-            query = query.filter(SpecialFeedback.submitted_at <= date_to)
-        
-        feedbacks = query.all()
-        total = len(feedbacks)
-        
-        # 计算指标
-        approved_count = len([f for f in feedbacks if f.status == 'approved'])
-        approval_rate = approved_count / total if total > 0 else 0
-        
-        ratings = [f.rating for f in feedbacks if f.rating]
-        avg_rating = sum(ratings) / len(ratings) if ratings else 0
-        
-        # 计算平均处理时间
-        processing_times = []
-        for f in feedbacks:
-            if f.submitted_at and f.reviewed_at:
-                delta = f.reviewed_at - f.submitted_at
-                processing_times.append(delta.days)
-        
-        avg_processing_time = sum(processing_times) / len(processing_times) if processing_times else 0
-        
-        high_priority_count = len([f for f in feedbacks if f.priority == 'urgent'])
-        high_priority_ratio = high_priority_count / total if total > 0 else 0
-        
         return jsonify({
             'success': True,
-            'data': {
-                'total_feedbacks': total,
-                'average_rating': round(avg_rating, 2),
-                'approval_rate': round(approval_rate, 2),
-                'avg_processing_time': round(avg_processing_time, 1),
-                'high_priority_ratio': round(high_priority_ratio, 2)
-            }
+            'data': _analysis('key_metrics', date_from, date_to)
         })
     
     except Exception as e:
@@ -458,30 +376,11 @@ def analyze_metrics():
 def analyze_issues():
     """问题分析"""
     try:
-        from models import SpecialFeedback
-        
         date_from = request.args.get('date_from', '')
         date_to = request.args.get('date_to', '')
         
-        query = db.session.query(SpecialFeedback).filter(
-            SpecialFeedback.category == 'issue_feedback'
-        )
-        
-        if date_from:
-            query = query.filter(SpecialFeedback.submitted_at >= date_from)
-        
-        if date_to:
-            query = query.filter(SpecialFeedback.submitted_at <= date_to)
-        
         # 按子分类统计
-        issue_stats = db.session.query(
-            SpecialFeedback.subcategory,
-            func.count(SpecialFeedback.id).label('count')
-        ).filter(
-            SpecialFeedback.category == 'issue_feedback',
-            (SpecialFeedback.submitted_at >= date_from) if date_from else True,
-            (SpecialFeedback.submitted_at <= date_to) if date_to else True
-        ).group_by(SpecialFeedback.subcategory).all()
+        issue_stats = _analysis('issue_breakdown', date_from, date_to)
         
         total_issues = sum([stat[1] for stat in issue_stats])
         
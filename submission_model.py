@@ -0,0 +1,280 @@
+# -*- coding: utf-8 -*-
+"""
+在线问卷提交的规范化数据模型
+Submission 在内存中保存一次在线提交（企业信息、答案、题目快照等），ScoreCalculator
+与各报告生成器可直接接受 Submission 对象或提交JSON路径，不必再经由Excel中转。
+问卷Excel改为按需导出：下载时才调用 export_excel 生成，已有的Excel文件继续可用。
+"""
+import json
+import os
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+from score_calculator import parse_questionnaire_excel, submission_to_questionnaire_data
+
+# 旧版提交（无题目快照）使用的本地指标文件
+LEGACY_INDICATOR_FILE = '指标体系.xlsx'
+
+_legacy_questions_memo: Dict[tuple, List[Dict]] = {}
+
+
+def excel_path_for(json_path: str) -> str:
+    """提交JSON路径 -> 对应的问卷Excel路径（与JSON同目录）"""
+    base_dir = os.path.dirname(json_path)
+    base_name = os.path.basename(json_path)
+    return os.path.join(base_dir, base_name.replace('submission_', '问卷_').replace('.json', '.xlsx'))
+
+
+def source_basename(source) -> str:
+    """问卷来源对应的Excel文件名，用于派生报告文件名"""
+    if isinstance(source, Submission):
+        if source.excel_path:
+            return os.path.basename(source.excel_path)
+        return f"问卷_{source.enterprise_name}.xlsx"
+    if str(source).lower().endswith('.json'):
+        return os.path.basename(excel_path_for(str(source)))
+    return os.path.basename(str(source))
+
+
+def _legacy_questions(indicator_file: str = LEGACY_INDICATOR_FILE) -> List[Dict]:
+    """
+    旧版提交没有题目快照，按本地指标文件构造题目（与旧的Excel生成逻辑一致）
+    按文件 mtime/size 记忆，指标文件变化后重新读取
+    """
+    st = os.stat(indicator_file)
+    key = (os.path.abspath(indicator_file), st.st_mtime_ns, st.st_size)
+    questions = _legacy_questions_memo.get(key)
+    if questions is None:
+        def cell(value):
+            return None if pd.isna(value) else value
+
+        indicators_df = pd.read_excel(indicator_file)
+        questions = []
+        for idx, row in indicators_df.iterrows():
+            questions.append({
+                'sequence': cell(row.get('序号', idx + 1)),
+                'level1': cell(row.get('一级指标', '')),
+                'level2': cell(row.get('二级指标', '')),
+                'question': cell(row.get('三级指标（问题）', '')),
+                'question_type': cell(row.get('问题类型', '')),
+                'base_score': cell(row.get('分值', 0)),
+                'criteria': '',
+            })
+        _legacy_questions_memo[key] = questions
+    return questions
+
+
+class Submission:
+    """一次在线问卷提交"""
+
+    def __init__(self, data: Dict, json_path: Optional[str] = None):
+        """
+        Args:
+            data: 提交数据 {'enterprise_info', 'answers', 'scores', 'questions_snapshot', ...}
+            json_path: 提交JSON文件路径（已保存时）
+        """
+        self.data = data
+        self.json_path = json_path
+        self._questionnaire_data = None
+
+    @classmethod
+    def from_json_file(cls, json_path: str) -> 'Submission':
+        with open(json_path, 'r', encoding='utf-8') as f:
+            return cls(json.load(f), json_path)
+
+    # ------------------------------------------------------------------
+    # 字段
+    # ------------------------------------------------------------------
+
+    @property
+    def enterprise_info(self) -> Dict:
+        return self.data.get('enterprise_info', {}) or {}
+
+    @property
+    def enterprise_name(self) -> str:
+        return self.enterprise_info.get('企业名称', '') or '未命名企业'
+
+    @property
+    def answers(self) -> Dict:
+        return self.data.get('answers', {}) or {}
+
+    @property
+    def scores(self) -> Dict:
+        return self.data.get('scores', {}) or {}
+
+    @property
+    def questions_snapshot(self) -> List[Dict]:
+        return self.data.get('questions_snapshot') or []
+
+    @property
+    def user_type(self) -> Optional[str]:
+        return self.data.get('user_type')
+
+    @property
+    def user_level(self) -> Optional[str]:
+        return self.data.get('user_level')
+
+    @property
+    def username(self) -> Optional[str]:
+        return self.data.get('username')
+
+    @property
+    def excel_path(self) -> Optional[str]:
+        """导出的问卷Excel路径（文件不一定已生成）"""
+        return excel_path_for(self.json_path) if self.json_path else None
+
+    def __repr__(self):
+        return f"Submission({self.enterprise_name!r}, {self.json_path!r})"
+
+    # ------------------------------------------------------------------
+    # 计分与导出
+    # ------------------------------------------------------------------
+
+    def to_questionnaire_data(self) -> Dict:
+        """与 ScoreCalculator.parse_questionnaire 结构相同的问卷数据（结果在对象内缓存）"""
+        if self._questionnaire_data is None:
+            if self.questions_snapshot:
+                data = submission_to_questionnaire_data(self.data)
+            elif self.excel_path and os.path.exists(self.excel_path):
+                # 旧版提交没有题目快照，提交时生成的Excel记录了当时的指标，以其为准
+                data = parse_questionnaire_excel(self.excel_path)
+            else:
+                data = submission_to_questionnaire_data(self.data, _legacy_questions(), default_answer='未填写')
+            self._questionnaire_data = data
+        return {
+            'enterprise_info': dict(self._questionnaire_data['enterprise_info']),
+            'answers': self._questionnaire_data['answers'].copy()
+        }
+
+    def export_excel(self, output_path: Optional[str] = None, force: bool = False) -> str:
+        """
+        按需导出已填写的问卷Excel；文件已存在且不旧于提交JSON时直接返回
+
+        Args:
+            output_path: 输出路径，默认为 excel_path
+            force: 是否强制重新生成
+
+        Returns:
+            Excel文件路径
+        """
+        output_path = output_path or self.excel_path
+        if not output_path:
+            raise ValueError('未保存的提交需要指定导出路径')
+        if not force and os.path.exists(output_path):
+            if not self.json_path or os.path.getmtime(output_path) >= os.path.getmtime(self.json_path):
+                return output_path
+        write_questionnaire_excel(self.data, output_path)
+        return output_path
+
+
+def write_questionnaire_excel(submission_data: Dict, output_path: str) -> None:
+    """
+    创建已填写的问卷Excel文件
+
+    Args:
+        submission_data: 提交数据
+        output_path: 输出文件路径
+    """
+    from openpyxl import Workbook
+    from openpyxl.styles import Font, Alignment, PatternFill
+
+    # 题目来源：优先使用提交时的题目快照（与本次分级一致）；否则退回读取本地指标文件
+    questions_snapshot = submission_data.get('questions_snapshot')
+
+    # 创建工作簿
+    wb = Workbook()
+
+    # 1. 企业信息工作表
+    ws_info = wb.active
+    ws_info.title = "企业信息"
+
+    enterprise_info = submission_data['enterprise_info']
+    info_data = [
+        ['项目', '内容'],
+        ['企业名称', enterprise_info.get('企业名称', '')],
+        ['统一社会信用代码', enterprise_info.get('统一社会信用代码', '')],
+        ['企业类型', enterprise_info.get('企业类型', '')],
+        ['所属行业', enterprise_info.get('所属行业', '')],
+        ['注册资本（万元）', enterprise_info.get('注册资本（万元）', '')],
+        ['成立时间', enterprise_info.get('成立时间', '')],
+        ['员工人数', enterprise_info.get('员工人数', '')],
+        ['年营业收入（万元）', enterprise_info.get('年营业收入（万元）', '')],
+        ['联系人姓名', enterprise_info.get('联系人姓名', '')],
+        ['联系人邮箱', enterprise_info.get('联系人邮箱', '')],
+        ['联系人电话', enterprise_info.get('联系人电话', '')],
+        ['填写时间', datetime.now().strftime('%Y-%m-%d %H:%M:%S')]
+    ]
+
+    for row in info_data:
+        ws_info.append(row)
+
+    # 设置样式
+    header_fill = PatternFill(start_color='4472C4', end_color='4472C4', fill_type='solid')
+    header_font = Font(color='FFFFFF', bold=True, size=11)
+
+    ws_info['A1'].fill = header_fill
+    ws_info['B1'].fill = header_fill
+    ws_info['A1'].font = header_font
+    ws_info['B1'].font = header_font
+
+    ws_info.column_dimensions['A'].width = 25
+    ws_info.column_dimensions['B'].width = 40
+
+    # 2. 问卷工作表
+    ws_questionnaire = wb.create_sheet("问卷")
+
+    # 表头（兼容清单打分）
+    headers = ['序号', '一级指标', '二级指标', '三级指标（问题）', '问题类型', '分值', '答案/清单选择', '打分标准', '计算分数']
+    ws_questionnaire.append(headers)
+
+    # 设置表头样式
+    for col_num, header in enumerate(headers, 1):
+        cell = ws_questionnaire.cell(row=1, column=col_num)
+        cell.fill = header_fill
+        cell.font = header_font
+        cell.alignment = Alignment(horizontal='center', vertical='center')
+
+    # 填充问题和答案（清单题答案为JSON字符串，直接写入便于后续解析）
+    answers = submission_data.get('answers', {})
+    scores = submission_data.get('scores', {})
+
+    if questions_snapshot:
+        questions = questions_snapshot
+        default_answer = ''
+    else:
+        # 兼容旧路径：读取本地指标文件
+        questions = _legacy_questions()
+        default_answer = '未填写'
+
+    for q in questions:
+        seq = q.get('sequence')
+        seq_str = str(seq)
+        ws_questionnaire.append([
+            seq,
+            q.get('level1', ''),
+            q.get('level2', ''),
+            q.get('question', ''),
+            q.get('question_type', ''),
+            q.get('base_score', ''),
+            answers.get(seq_str, default_answer),
+            q.get('criteria', ''),
+            scores.get(seq_str, '')
+        ])
+
+    # 设置列宽
+    ws_questionnaire.column_dimensions['A'].width = 8
+    ws_questionnaire.column_dimensions['B'].width = 20
+    ws_questionnaire.column_dimensions['C'].width = 20
+    ws_questionnaire.column_dimensions['D'].width = 52
+    ws_questionnaire.column_dimensions['E'].width = 12
+    ws_questionnaire.column_dimensions['F'].width = 8
+    ws_questionnaire.column_dimensions['G'].width = 26
+    ws_questionnaire.column_dimensions['H'].width = 46
+    ws_questionnaire.column_dimensions['I'].width = 10
+
+    # 保存文件
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    wb.save(output_path)
+    print(f"[OK] 已填写问卷文件已生成: {output_path}")
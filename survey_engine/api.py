@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
-from flask import Blueprint, request, jsonify
+import json
+from flask import Blueprint, Response, request, jsonify
 from .services.loader import SurveyLoader
 
 api_bp = Blueprint('survey_api', __name__)
@@ -16,18 +17,20 @@ def get_questions():
 
         level_key = _loader.resolve_level_key(user_type, user_level, excel_level)
 
-        questions = _loader.get_questions(level_key)
+        questions_json = _loader.get_questions_json(level_key)
         source_file = _loader.nk_excel_path
 
-        return jsonify({
+        # 题目部分直接拼接缓存好的JSON字节，无需每次重新序列化
+        meta = json.dumps({
             'success': True,
-            'questions': questions,
             'user_type': user_type,
             'user_level': user_level,
             'excel_level': level_key,
             'source_file': source_file,
-            'total_questions': len(questions)
-        })
+            'total_questions': _loader.count_questions(level_key)
+        }, ensure_ascii=False).encode('utf-8')
+        body = meta[:-1] + b', "questions": ' + questions_json + b'}'
+        return Response(body, mimetype='application/json')
     except FileNotFoundError as e:
         return jsonify({'success': False, 'error': str(e)}), 500
     except Exception as e:
@@ -48,8 +51,7 @@ def health():
             try:
                 overview = {}
                 for lv in ['beginner', 'intermediate', 'advanced']:
-                    qs = _loader.get_questions(lv)
-                    overview[lv] = len(qs)
+                    overview[lv] = _loader.count_questions(lv)
                 result['overview'] = overview
             except Exception as e:
                 result['overview_error'] = str(e)
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""
+IndicatorCache: 进程级指标题目缓存。
+以 (文件路径, mtime, size, level) 为键，首次访问时只打开一次Excel解析全部级别，
+同时预先序列化好题目JSON；指标文件被替换或修改后自动失效并重新解析。
+"""
+from __future__ import annotations
+import json
+import os
+import threading
+from typing import Dict, List, Tuple
+
+from nankai_indicator_loader import SHEET_MAP_CN, load_all_levels
+
+
+class _Entry:
+    __slots__ = ('questions', 'json_bytes', 'error')
+
+    def __init__(self, questions=None, error=None) -> None:
+        self.questions: List[Dict] = questions or []
+        self.error: Exception | None = error
+        self.json_bytes: bytes = json.dumps(self.questions, ensure_ascii=False).encode('utf-8')
+
+
+class IndicatorCache:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        # 键：(绝对路径, mtime_ns, size, level)
+        self._entries: Dict[Tuple[str, int, int, str], _Entry] = {}
+        # 每个文件当前有效的签名，用于清理旧版本
+        self._signatures: Dict[str, Tuple[int, int]] = {}
+
+    @staticmethod
+    def _signature(path: str) -> Tuple[int, int]:
+        st = os.stat(path)
+        return st.st_mtime_ns, st.st_size
+
+    def _get_entry(self, path: str, level_key: str) -> _Entry:
+        abs_path = os.path.abspath(path)
+        mtime, size = self._signature(abs_path)
+        key = (abs_path, mtime, size, level_key)
+        entry = self._entries.get(key)
+        if entry is not None:
+            return entry
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                return entry
+            if self._signatures.get(abs_path) != (mtime, size):
+                # 文件已变化：丢弃旧版本，一次性解析全部标准级别
+                self._entries = {k: v for k, v in self._entries.items() if k[0] != abs_path}
+                self._signatures[abs_path] = (mtime, size)
+                levels = list(SHEET_MAP_CN)
+                if level_key not in levels:
+                    levels.append(level_key)
+            else:
+                levels = [level_key]
+            for lv, result in load_all_levels(abs_path, levels).items():
+                if isinstance(result, Exception):
+                    self._entries[(abs_path, mtime, size, lv)] = _Entry(error=result)
+                else:
+                    self._entries[(abs_path, mtime, size, lv)] = _Entry(questions=result)
+            return self._entries[key]
+
+    def get_questions(self, path: str, level_key: str) -> List[Dict]:
+        """返回题目列表（列表为副本，题目字典共享，调用方请勿修改）"""
+        entry = self._get_entry(path, level_key)
+        if entry.error is not None:
+            raise entry.error
+        return list(entry.questions)
+
+    def get_questions_json(self, path: str, level_key: str) -> bytes:
+        """返回预先序列化好的题目JSON（UTF-8）"""
+        entry = self._get_entry(path, level_key)
+        if entry.error is not None:
+            raise entry.error
+        return entry.json_bytes
+
+    def count(self, path: str, level_key: str) -> int:
+        entry = self._get_entry(path, level_key)
+        if entry.error is not None:
+            raise entry.error
+        return len(entry.questions)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._signatures.clear()
+
+
+# 进程级单例
+indicator_cache = IndicatorCache()
@@ -2,13 +2,15 @@
 """
 SurveyLoader: 统一管理问卷指标文件路径与题目加载逻辑。
 当前为薄封装，内部复用 nankai_indicator_loader，以便后续完全迁移实现。
+题目经进程级 IndicatorCache 缓存，指标文件变化时自动重新解析。
 """
 from __future__ import annotations
 import json
 import os
 from typing import List, Dict
 
-from nankai_indicator_loader import load_questions_by_level, map_user_to_level
+from nankai_indicator_loader import map_user_to_level
+from .indicator_cache import indicator_cache
 
 
 class SurveyLoader:
@@ -43,9 +45,19 @@ class SurveyLoader:
             return map_user_to_level(user_type, user_level)
         return 'advanced'
 
-    def get_questions(self, level_key: str) -> List[Dict]:
+    def _require_path(self) -> str:
         path = self.nk_excel_path
         if not path or not os.path.exists(path):
             raise FileNotFoundError('指标文件不存在，请在config.json配置indicators.nk_excel_path或放置指标体系_备份.xlsx')
-        return load_questions_by_level(path, level_key)
+        return path
+
+    def get_questions(self, level_key: str) -> List[Dict]:
+        return indicator_cache.get_questions(self._require_path(), level_key)
+
+    def get_questions_json(self, level_key: str) -> bytes:
+        """题目列表的JSON字节串（已缓存，避免每次请求重复序列化）"""
+        return indicator_cache.get_questions_json(self._require_path(), level_key)
+
+    def count_questions(self, level_key: str) -> int:
+        return indicator_cache.count(self._require_path(), level_key)
 
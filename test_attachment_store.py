@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""
+测试问卷附件内容寻址存储（attachment_store）与 FileUploadHandler 的去重、引用计数和回收
+"""
+import io
+import os
+
+import pytest
+from werkzeug.datastructures import FileStorage
+
+from attachment_store import AttachmentStore, AttachmentTooLarge
+from file_upload_handler import FileUploadHandler
+
+LICENSE = b'%PDF-1.4 business license ' + b'x' * 4096
+
+
+def upload(name, data):
+    return FileStorage(stream=io.BytesIO(data), filename=name)
+
+
+@pytest.fixture
+def handler(tmp_path):
+    return FileUploadHandler(str(tmp_path / 'uploads'))
+
+
+def test_same_content_stored_once(handler):
+    ok, first = handler.save_file(upload('营业执照.pdf', LICENSE), 'sub-1', 'q1')
+    assert ok and not first['deduplicated']
+    ok, second = handler.save_file(upload('执照扫描.pdf', LICENSE), 'sub-2', 'q7')
+    assert ok and second['deduplicated']
+    assert first['sha256'] == second['sha256']
+    assert handler.store.refcount(first['sha256']) == 2
+
+    blob = os.stat(handler.store.blob_path(first['sha256']))
+    assert os.stat(first['file_path']).st_ino == blob.st_ino
+    assert os.stat(second['file_path']).st_ino == blob.st_ino
+    with open(second['file_path'], 'rb') as f:
+        assert f.read() == LICENSE
+
+    stats = handler.store.stats()
+    assert stats['refs'] == 2 and stats['blobs'] == 1
+    assert stats['saved_bytes'] == len(LICENSE)
+    assert stats['dedup_ratio'] == 2.0
+
+
+def test_reupload_to_same_question_is_idempotent(handler):
+    _, first = handler.save_file(upload('a.pdf', LICENSE), 'sub-1', 'q1')
+    _, again = handler.save_file(upload('a.pdf', LICENSE), 'sub-1', 'q1')
+    assert again['id'] == first['id']
+    assert again['file_path'] == first['file_path']
+    assert handler.store.refcount(first['sha256']) == 1
+    assert [f['name'] for f in handler.list_submission_files('sub-1')] == [first['saved_name']]
+
+
+def test_delete_keeps_shared_content(handler):
+    _, first = handler.save_file(upload('a.pdf', LICENSE), 'sub-1', 'q1')
+    _, second = handler.save_file(upload('b.pdf', LICENSE), 'sub-2', 'q1')
+    blob_path = handler.store.blob_path(first['sha256'])
+
+    assert handler.delete_file(first['file_path'])
+    assert not os.path.exists(first['file_path'])
+    assert os.path.exists(blob_path) and os.path.exists(second['file_path'])
+    assert handler.store.refcount(first['sha256']) == 1
+
+    assert handler.delete_file(second['file_path'])
+    assert handler.store.refcount(first['sha256']) == 0
+    # 宽限期内不回收，之后由 gc 回收
+    assert os.path.exists(blob_path)
+    assert handler.store.gc(grace_seconds=0) == {'blobs_removed': 1, 'bytes_freed': len(LICENSE)}
+    assert not os.path.exists(blob_path)
+
+
+def test_cleanup_old_files_is_refcount_aware(handler):
+    _, old = handler.save_file(upload('a.pdf', LICENSE), 'sub-old', 'q1')
+    _, shared = handler.save_file(upload('b.pdf', LICENSE), 'sub-new', 'q1')
+    _, photo = handler.save_file(upload('photo.jpg', b'\xff\xd8' + b'p' * 2048), 'sub-old', 'q2')
+    conn = handler.store._conn()
+    conn.execute("UPDATE refs SET created_at = 0 WHERE submission_id = 'sub-old'")
+    conn.execute('UPDATE blobs SET created_at = 0')
+    legacy = os.path.join(handler.upload_base_dir, 'sub-legacy', 'q1_deadbeef.pdf')
+    os.makedirs(os.path.dirname(legacy))
+    with open(legacy, 'wb') as f:
+        f.write(b'legacy')
+    os.utime(legacy, (0, 0))
+
+    assert handler.cleanup_old_files(days=30) == 3
+    assert not os.path.exists(old['file_path']) and not os.path.exists(legacy)
+    # 新提交仍引用执照，内容保留；照片已无引用，被回收
+    assert os.path.exists(shared['file_path'])
+    assert os.path.exists(handler.store.blob_path(shared['sha256']))
+    assert not os.path.exists(handler.store.blob_path(photo['sha256']))
+    assert handler.store.stats()['blobs'] == 1
+
+
+def test_size_limit_and_validation(tmp_path):
+    store = AttachmentStore(str(tmp_path / 'uploads'), max_size=1024)
+    with pytest.raises(AttachmentTooLarge):
+        store.put_stream(io.BytesIO(b'x' * 2048))
+    # 超限时不留下临时文件或内容
+    assert all(name.startswith('refs.sqlite3') for name in os.listdir(store.blob_dir))
+    assert store.stats()['blobs'] == 0
+
+    handler = FileUploadHandler(str(tmp_path / 'other'))
+    ok, error = handler.save_file(upload('run.exe', b'MZ'), 'sub-1', 'q1')
+    assert not ok and 'EXE' in error
+
+
+def test_view_name_is_confined_to_submission_dir(handler):
+    info = handler.store_file(upload('a.pdf', LICENSE), 'sub-1', '../../etc/q1', 'a.pdf')
+    assert os.path.dirname(info['file_path']) == os.path.join(handler.upload_base_dir, 'sub-1')
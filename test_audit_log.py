@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+"""
+测试异步批量审计日志（audit_log）
+"""
+import json
+import os
+import threading
+
+import pytest
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.exc import IntegrityError
+
+from audit_log import AuditLogger, multi_row_insert, sqlalchemy_writer
+
+
+class RecordingWriter:
+    def __init__(self):
+        self.calls = []
+        self.ignore_flags = []
+        self.fail = False
+        self.lock = threading.Lock()
+
+    def __call__(self, table, rows, ignore_duplicates=False):
+        if self.fail:
+            raise ConnectionError('MySQL server has gone away')
+        with self.lock:
+            self.calls.append((table, [r['id'] for r in rows]))
+            self.ignore_flags.append(ignore_duplicates)
+
+    def ids(self, table):
+        return [i for t, ids in self.calls if t == table for i in ids]
+
+
+@pytest.fixture
+def writer():
+    return RecordingWriter()
+
+
+def test_batches_by_size_and_table(writer, tmp_path):
+    audit = AuditLogger(writer, batch_size=4, flush_interval=0.5, spill_path=str(tmp_path / 'spill.jsonl'))
+    for i in range(10):
+        audit.record('chamber_user_logs', {'id': f'c{i}', 'action': 'update'})
+    audit.record('audit_logs', {'id': 'a0', 'action': 'update', 'target_type': 'chamber_user'})
+    assert audit.flush(5)
+    audit.close()
+
+    assert writer.ids('chamber_user_logs') == [f'c{i}' for i in range(10)]
+    assert writer.ids('audit_logs') == ['a0']
+    assert all(len(ids) <= 4 for _, ids in writer.calls)
+    metrics = audit.metrics()
+    assert metrics['enqueued'] == metrics['written'] == 11
+    assert metrics['queue_depth'] == 0 and metrics['batches'] == len(writer.calls)
+    assert metrics['max_flush_ms'] >= metrics['avg_flush_ms'] >= 0
+
+
+def test_spill_when_database_unavailable_and_replay(writer, tmp_path):
+    spill = tmp_path / 'spill.jsonl'
+    audit = AuditLogger(writer, batch_size=10, flush_interval=0.05, spill_path=str(spill))
+    writer.fail = True
+    audit.log_user_operation('op', 'u1', 'delete', {'created_at': object()}, None, '127.0.0.1', 'ua' * 200)
+    assert audit.flush(5)
+    lines = [json.loads(line) for line in spill.read_text(encoding='utf-8').splitlines()]
+    assert [entry['table'] for entry in lines] == ['chamber_user_logs', 'audit_logs']
+    assert len(lines[1]['row']['ua']) == 255 and lines[1]['row']['target_type'] == 'chamber_user'
+    assert audit.metrics()['spilled'] == 2 and audit.metrics()['spill_pending']
+
+    # 数据库恢复：下一批写入成功后回放溢出文件
+    writer.fail = False
+    audit.record('chamber_user_logs', {'id': 'later'})
+    assert audit.flush(5)
+    audit.close()
+    assert writer.ids('chamber_user_logs') == ['later', lines[0]['row']['id']]
+    assert writer.ids('audit_logs') == [lines[1]['row']['id']]
+    assert not os.path.exists(spill) and audit.metrics()['replayed'] == 2
+    # 只有回放溢出文件时忽略重复主键
+    assert writer.ignore_flags == [False, True, True]
+
+
+def test_full_queue_spills_instead_of_blocking(writer, tmp_path):
+    gate = threading.Event()
+    blocking = lambda table, rows: gate.wait(5)
+    audit = AuditLogger(blocking, batch_size=1, flush_interval=0, max_queue=1,
+                        spill_path=str(tmp_path / 'spill.jsonl'))
+    for i in range(5):
+        audit.record('chamber_user_logs', {'id': f'c{i}'})
+    assert audit.metrics()['spilled'] >= 3
+    gate.set()
+    assert audit.flush(5)
+    audit.close()
+
+
+def test_sqlalchemy_writer_ignores_duplicates_only_on_replay(tmp_path):
+    sql, params = multi_row_insert('chamber_user_logs', [{'id': 'a'}, {'id': 'b'}])
+    assert sql.startswith('INSERT INTO chamber_user_logs') and sql.count('(:id_') == 2
+    assert multi_row_insert('audit_logs', [{'id': 'a'}], 'ON DUPLICATE KEY UPDATE id = id')[0].endswith(
+        'ON DUPLICATE KEY UPDATE id = id')
+    assert params['id_1'] == 'b' and params['action_0'] is None
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'audit.db'}")
+    with engine.begin() as conn:
+        conn.execute(text("""CREATE TABLE chamber_user_logs (id TEXT PRIMARY KEY, operator_id TEXT,
+            target_user_id TEXT, action TEXT, old_value TEXT, new_value TEXT, created_at TEXT)"""))
+    write = sqlalchemy_writer(engine)
+    rows = [{'id': f'l{i}', 'action': 'create', 'created_at': '2024-01-01 00:00:00'} for i in range(3)]
+    write('chamber_user_logs', rows)
+    # 正常写入不吞掉错误，整批回滚后由调用方转入溢出文件
+    with pytest.raises(IntegrityError):
+        write('chamber_user_logs', [{'id': 'l3', 'action': 'delete'}, rows[0]])
+    write('chamber_user_logs', rows[1:] + [{'id': 'l3', 'action': 'delete'}], ignore_duplicates=True)
+    with engine.connect() as conn:
+        assert conn.execute(text('SELECT COUNT(*) FROM chamber_user_logs')).scalar() == 4
+
+
+def _fk_engine(path):
+    """与 MySQL 表结构相同外键约束的 SQLite 库（chamber_user_logs.target_user_id -> chamber_users.id）"""
+    engine = create_engine(f"sqlite:///{path}")
+    event.listen(engine, 'connect', lambda conn, _: conn.execute('PRAGMA foreign_keys=ON'))
+    with engine.begin() as conn:
+        conn.execute(text('CREATE TABLE chamber_users (id TEXT PRIMARY KEY)'))
+        conn.execute(text("""CREATE TABLE chamber_user_logs (id TEXT PRIMARY KEY, operator_id TEXT,
+            target_user_id TEXT REFERENCES chamber_users (id), action TEXT, old_value TEXT, new_value TEXT,
+            created_at TEXT)"""))
+        conn.execute(text("""CREATE TABLE audit_logs (id TEXT PRIMARY KEY, operator_id TEXT, action TEXT,
+            target_type TEXT, target_id TEXT, old_value TEXT, new_value TEXT, ip TEXT, ua TEXT, created_at TEXT)"""))
+        conn.execute(text("INSERT INTO chamber_users (id) VALUES ('admin'), ('u1'), ('u2')"))
+    return engine
+
+
+def _log_ids(engine):
+    with engine.connect() as conn:
+        return {row[0]: row[1] for row in conn.execute(text('SELECT id, target_user_id FROM chamber_user_logs'))}
+
+
+def test_rejected_row_does_not_fail_its_batch(tmp_path):
+    """外键不满足的行单独转入拒收文件，同批其他行照常写入；删除日志不引用已删除的用户"""
+    engine = _fk_engine(tmp_path / 'audit.db')
+    spill = tmp_path / 'spill.jsonl'
+    audit = AuditLogger(sqlalchemy_writer(engine), batch_size=50, flush_interval=0.2, spill_path=str(spill))
+    for i in range(10):
+        audit.record('chamber_user_logs', {'id': f'ok{i}', 'operator_id': 'admin', 'target_user_id': 'u1',
+                                           'action': 'update'})
+    audit.record('chamber_user_logs', {'id': 'bad', 'operator_id': 'admin', 'target_user_id': 'ghost',
+                                       'action': 'update'})
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM chamber_users WHERE id = 'u2'"))
+    audit.log_user_operation('admin', 'u2', 'delete', {'id': 'u2'}, None, target_deleted=True)
+    assert audit.flush(5)
+    audit.close()
+
+    logs = _log_ids(engine)
+    assert len(logs) == 11 and all(logs[f'ok{i}'] == 'u1' for i in range(10))
+    assert list(logs.values()).count(None) == 1  # 删除日志已写入，target_user_id 为 NULL
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT target_id FROM audit_logs WHERE action = 'delete'")).scalar() == 'u2'
+    rejected = [json.loads(line) for line in (tmp_path / 'spill.jsonl.rejected').read_text('utf-8').splitlines()]
+    assert [entry['row']['id'] for entry in rejected] == ['bad'] and 'FOREIGN KEY' in rejected[0]['error']
+    assert not spill.exists()
+    metrics = audit.metrics()
+    assert metrics['rejected'] == 1 and metrics['flush_failures'] == 0 and metrics['written'] == 12
+
+
+def test_replay_rejects_bad_rows_instead_of_dropping(tmp_path):
+    """回放只忽略重复主键：外键错误的行转入拒收文件，不会被静默丢弃"""
+    engine = _fk_engine(tmp_path / 'audit.db')
+    spill = tmp_path / 'spill.jsonl'
+    rows = [{'id': 'r1', 'target_user_id': 'u1'}, {'id': 'r2', 'target_user_id': 'ghost'},
+            {'id': 'r3', 'target_user_id': 'u2'}]
+    sqlalchemy_writer(engine)('chamber_user_logs', rows[:1])  # 上次回放中断前已写入
+    spill.write_text(''.join(json.dumps({'table': 'chamber_user_logs', 'row': r}) + '\n' for r in rows),
+                     encoding='utf-8')
+
+    audit = AuditLogger(sqlalchemy_writer(engine), flush_interval=0.05, spill_path=str(spill))
+    audit.record('chamber_user_logs', {'id': 'new', 'target_user_id': 'u1'})
+    assert audit.flush(5)
+    audit.close()
+    assert sorted(_log_ids(engine)) == ['new', 'r1', 'r3']
+    rejected = (tmp_path / 'spill.jsonl.rejected').read_text('utf-8').splitlines()
+    assert [json.loads(line)['row']['id'] for line in rejected] == ['r2']
+    assert not spill.exists() and audit.metrics()['rejected'] == 1
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+测试批量报告并行渲染与可续跑任务清单（batch_report_renderer）
+"""
+import os
+
+import pytest
+
+import batch_report_renderer
+from batch_report_renderer import BatchManifest, render_batch
+
+
+class FakeGenerator:
+    """替代真实报告生成器：写一个文本文件，文件名含“坏”时报错"""
+
+    def generate_report(self, questionnaire_file, output_path=None):
+        if '坏' in questionnaire_file:
+            raise ValueError('问卷格式错误')
+        with open(output_path, 'w', encoding='utf-8') as f:
+            f.write(f'{os.getpid()}:{questionnaire_file}')
+        return output_path
+
+
+@pytest.fixture
+def fake_format(monkeypatch):
+    monkeypatch.setitem(batch_report_renderer.REPORT_FORMATS, 'fake',
+                        (__name__, 'FakeGenerator', '报告_{base}.txt'))
+
+
+def _items(n, bad=()):
+    return [{'key': f'submission_{i}.json',
+             'source_path': f'问卷_{"坏" if i in bad else "企业"}{i}.xlsx'} for i in range(n)]
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_render_batch_reports_each_item(tmp_path, fake_format, workers):
+    """每项产出一个结果，失败项记录错误，不影响其他条目"""
+    manifest = BatchManifest.create('test', ['fake'], manifest_dir=str(tmp_path / 'jobs'))
+    out_dir = str(tmp_path / 'reports')
+    results = list(render_batch(_items(6, bad={3}), manifest, workers=workers, output_dir=out_dir))
+
+    assert sorted(r['key'] for r in results) == sorted(i['key'] for i in _items(6))
+    failed = [r for r in results if r['status'] == 'failed']
+    assert [r['key'] for r in failed] == ['submission_3.json']
+    assert '问卷格式错误' in failed[0]['error']
+    assert os.path.exists(os.path.join(out_dir, '报告_企业0.txt'))
+
+    saved = BatchManifest.load(manifest.path)
+    assert saved.data['status'] == 'incomplete'
+    assert saved.items['submission_0.json']['status'] == 'done'
+    assert saved.items['submission_3.json']['attempts'] == 1
+
+
+def test_resume_skips_rendered_items(tmp_path, fake_format):
+    """续跑时跳过已生成的报告，报告文件被删除的条目重新生成"""
+    jobs = str(tmp_path / 'jobs')
+    out_dir = str(tmp_path / 'reports')
+    manifest = BatchManifest.create('test', ['fake'], manifest_dir=jobs)
+    list(render_batch(_items(4, bad={2}), manifest, workers=1, output_dir=out_dir))
+    os.remove(os.path.join(out_dir, '报告_企业1.txt'))
+
+    resumed = BatchManifest.find_unfinished('test', manifest_dir=jobs)
+    assert resumed.job_id == manifest.job_id
+    results = {r['key']: r for r in render_batch(_items(4), resumed, workers=1, output_dir=out_dir)}
+    assert results['submission_0.json']['resumed'] is True
+    assert results['submission_1.json']['resumed'] is False
+    assert results['submission_2.json']['status'] == 'done'
+    assert resumed.items['submission_2.json']['attempts'] == 2
+    assert BatchManifest.find_unfinished('test', manifest_dir=jobs) is None
+
+
+def test_failed_email_keeps_job_unfinished(tmp_path, fake_format):
+    """邮件发送失败的任务视为未完成，可再次续跑"""
+    jobs = str(tmp_path / 'jobs')
+    manifest = BatchManifest.create('test', ['fake'], manifest_dir=jobs)
+    for result in render_batch(_items(2), manifest, workers=1, output_dir=str(tmp_path / 'reports')):
+        manifest.update(result['key'], email='failed' if result['key'].endswith('1.json') else 'sent')
+    assert BatchManifest.find_unfinished('test', manifest_dir=jobs).job_id == manifest.job_id
+
+
+def test_email_failure_after_rendering_keeps_job_resumable(tmp_path, fake_format):
+    """与批量发送脚本相同的顺序：渲染全部结束后才收到邮件结果，其中一封失败，任务仍可续跑"""
+    jobs = str(tmp_path / 'jobs')
+    out_dir = str(tmp_path / 'reports')
+    manifest = BatchManifest.create('test', ['fake'], manifest_dir=jobs)
+    keys = [result['key'] for result in render_batch(_items(3), manifest, workers=1, output_dir=out_dir)]
+    assert BatchManifest.load(manifest.path).data['status'] == 'completed'
+
+    for key in keys:
+        manifest.update(key, email='failed' if key == 'submission_1.json' else 'sent')
+    manifest.finalize()
+    resumed = BatchManifest.find_unfinished('test', manifest_dir=jobs)
+    assert resumed is not None and resumed.job_id == manifest.job_id
+    assert resumed.data['status'] == 'incomplete'
+
+    # 续跑：报告无需重新生成，只补发失败的邮件
+    results = list(render_batch(_items(3), resumed, workers=1, output_dir=out_dir))
+    assert all(result['resumed'] for result in results)
+    resumed.update('submission_1.json', email='sent')
+    resumed.finalize()
+    assert BatchManifest.find_unfinished('test', manifest_dir=jobs) is None
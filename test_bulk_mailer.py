@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+"""
+测试批量邮件发送（bulk_mailer），使用本地 SMTP 替身服务器代替真实邮件服务商
+"""
+import email
+import smtplib
+import socket
+import socketserver
+import threading
+
+import pytest
+
+from bulk_mailer import BulkMailer, MailOutbox, RateLimiter, SMTPPool
+from notification_service import NotificationService
+
+
+class SMTPStandIn(socketserver.ThreadingTCPServer):
+    """最小 SMTP 服务器：记录连接数与收到的邮件，可按收件人返回指定错误、每个连接只收 N 封后断开"""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), SMTPHandler)
+        self.connections = 0
+        self.messages = []
+        self.reject = {}           # 收件人 -> [响应, ...]（按顺序使用，用完后正常接收）
+        self.drop_after = None     # 每个连接收满 N 封后断开
+        self.lock = threading.Lock()
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+
+    def reply(self, line):
+        self.wfile.write((line + '\r\n').encode())
+
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.connections += 1
+        received = 0
+        rcpt = None
+        self.reply('220 stand-in ESMTP')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode().strip()
+            verb = command[:4].upper()
+            if verb in ('EHLO', 'HELO'):
+                self.reply('250 stand-in')
+            elif verb == 'MAIL':
+                if server.drop_after is not None and received >= server.drop_after:
+                    return  # 模拟服务器关闭长连接
+                self.reply('250 OK')
+            elif verb == 'RCPT':
+                rcpt = command.split(':', 1)[1].strip('<> ')
+                with server.lock:
+                    queued = server.reject.get(rcpt)
+                    response = queued.pop(0) if queued else None
+                self.reply(response or '250 OK')
+            elif verb == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                data = []
+                while True:
+                    chunk = self.rfile.readline()
+                    if chunk in (b'.\r\n', b''):
+                        break
+                    data.append(chunk)
+                with server.lock:
+                    server.messages.append((rcpt, b''.join(data)))
+                received += 1
+                self.reply('250 queued')
+            elif verb in ('RSET', 'NOOP'):
+                self.reply('250 OK')
+            elif verb == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('502 not implemented')
+
+
+@pytest.fixture
+def smtp_server():
+    server = SMTPStandIn()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def service(smtp_server, tmp_path):
+    service = NotificationService(config_file=str(tmp_path / 'missing.json'))
+    service.config['email'].update(smtp_server='127.0.0.1', smtp_port=smtp_server.server_address[1],
+                                   username='sender@example.com')
+    # 替身服务器不支持 STARTTLS/AUTH：直接建立明文会话
+    service.open_smtp = lambda: smtplib.SMTP('127.0.0.1', smtp_server.server_address[1], timeout=5)
+    return service
+
+
+def test_bulk_send_reuses_sessions_and_attachments(service, smtp_server, tmp_path):
+    report = tmp_path / '专业报告_测试.docx'
+    report.write_bytes(b'PK' + bytes(range(256)) * 200)
+    outbox = MailOutbox(str(tmp_path / 'outbox.jsonl'))
+
+    with BulkMailer(service, workers=3, outbox=outbox) as mailer:
+        for i in range(30):
+            mailer.submit(f'k{i}', f'user{i}@example.com', f'企业{i}', f'联系人{i}', attachment_path=str(report))
+        results = list(mailer.as_completed())
+        stats = mailer.stats()
+
+    assert len(results) == 30 and all(r['status'] == 'sent' and r['attempts'] == 1 for r in results)
+    assert len(smtp_server.messages) == 30
+    # 30 封邮件只建立了至多 3 个连接（逐封发送需要 30 个）
+    assert smtp_server.connections <= 3 and stats['sessions_opened'] <= 3
+    assert stats['attachment_cache_misses'] == 1 and stats['attachment_cache_hits'] == 29
+
+    rcpt, raw = smtp_server.messages[0]
+    msg = email.message_from_bytes(raw)
+    attachment = [part for part in msg.walk() if part.get_filename()][0]
+    assert attachment.get_filename() == '专业报告_测试.docx'
+    assert attachment.get_payload(decode=True) == report.read_bytes()
+    assert msg['To'] == rcpt
+
+    # 重新运行时已发送的邮件不会重复发送
+    with BulkMailer(service, workers=2, outbox=MailOutbox(str(tmp_path / 'outbox.jsonl'))) as mailer:
+        assert mailer.submit('k0', 'user0@example.com', '企业0', '联系人0') is None
+    assert len(smtp_server.messages) == 30
+
+
+def test_reconnects_when_server_drops_connection(service, smtp_server):
+    smtp_server.drop_after = 4
+    with BulkMailer(service, workers=2) as mailer:
+        for i in range(12):
+            mailer.submit(f'k{i}', f'user{i}@example.com', '企业', '联系人')
+        results = list(mailer.as_completed())
+        stats = mailer.stats()
+    assert all(r['status'] == 'sent' for r in results)
+    assert len(smtp_server.messages) == 12
+    assert stats['reconnects'] >= 2
+
+
+def test_transient_errors_retry_and_permanent_errors_fail(service, smtp_server, tmp_path):
+    smtp_server.reject = {
+        'busy@example.com': ['451 try again later'],
+        'gone@example.com': ['550 mailbox unavailable'] * 5,
+    }
+    outbox = MailOutbox(str(tmp_path / 'outbox.jsonl'))
+    with BulkMailer(service, workers=2, outbox=outbox, retry_delay=0.01) as mailer:
+        for name in ('ok', 'busy', 'gone'):
+            mailer.submit(name, f'{name}@example.com', '企业', '联系人')
+        results = {r['key']: r for r in mailer.as_completed()}
+
+    assert results['ok']['status'] == 'sent'
+    assert results['busy']['status'] == 'sent' and results['busy']['attempts'] == 2
+    assert results['gone']['status'] == 'failed' and results['gone']['attempts'] == 1
+    assert results['gone']['permanent'] and '550' in results['gone']['error']
+    assert sorted(rcpt for rcpt, _ in smtp_server.messages) == ['busy@example.com', 'ok@example.com']
+
+    # 发件箱落盘：重新加载后可重发失败的邮件
+    smtp_server.reject = {}
+    reloaded = MailOutbox(str(tmp_path / 'outbox.jsonl'))
+    assert reloaded.summary() == {'sent': 2, 'failed': 1}
+    with BulkMailer(service, workers=1, outbox=reloaded) as mailer:
+        assert mailer.retry_failed() == 1
+        assert [r['status'] for r in mailer.as_completed()] == ['sent']
+    assert MailOutbox(str(tmp_path / 'outbox.jsonl')).summary() == {'sent': 3}
+
+
+def test_rate_limiter_token_bucket():
+    now = [0.0]
+    sleeps = []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        now[0] += seconds
+
+    limiter = RateLimiter(120, burst=2, clock=lambda: now[0], sleep=sleep)
+    for _ in range(6):
+        limiter.acquire()
+    # 突发 2 封，之后每 0.5 秒 1 封
+    assert now[0] == pytest.approx(2.0)
+    assert limiter.waited == pytest.approx(2.0)
+
+
+def test_pool_health_check_replaces_dead_session(smtp_server):
+    port = smtp_server.server_address[1]
+    pool = SMTPPool(lambda: smtplib.SMTP('127.0.0.1', port, timeout=5), size=1, health_check_interval=0)
+    session = pool.acquire()
+    pool.release(session)
+    session.raw.sock.shutdown(socket.SHUT_RDWR)  # 连接在空闲期间失效
+    replacement = pool.acquire()
+    assert replacement is not session
+    pool.release(replacement)
+    pool.close()
+    stats = pool.stats()
+    assert stats['health_check_failures'] == 1 and stats['sessions_opened'] == 2 and stats['open'] == 0
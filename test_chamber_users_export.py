@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""
+测试工商联用户流式导出（chamber_users_export 与 /users/export 接口）
+"""
+import csv
+import io
+from datetime import datetime
+
+import pytest
+from flask import Flask
+from openpyxl import load_workbook
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+import chamber_users_export as exporter
+
+
+def _user(i, **extra):
+    user = {'id': f'u{i:04d}', 'username': f'user{i}', 'email': f'user{i}@example.com',
+            'real_name': f'用户{i}', 'phone': None, 'level': 'county', 'region': '北京',
+            'role': 'operator', 'review_level': None, 'department': '', 'position': '',
+            'status': 'active', 'created_at': datetime(2024, 1, 1, 8, 0, i % 60)}
+    user.update(extra)
+    return user
+
+
+class FakeCursor:
+    def __init__(self, rows):
+        self.rows = list(rows)
+        self.fetches = 0
+
+    def fetchmany(self, size):
+        self.fetches += 1
+        batch, self.rows = self.rows[:size], self.rows[size:]
+        return batch
+
+
+def test_chunks_from_cursor_and_csv():
+    cursor = FakeCursor(_user(i) for i in range(5))
+    chunks = list(exporter.iter_chunks(cursor, chunk_size=2))
+    assert [len(c) for c in chunks] == [2, 2, 1] and cursor.fetches == 4
+    assert chunks[0][0][-1] == '2024-01-01T08:00:00' and chunks[0][0][4] is None
+
+    parts = list(exporter.iter_csv(chunks))
+    assert len(parts) == 3 and parts[0].startswith(b'\xef\xbb\xbf')
+    rows = list(csv.reader(io.StringIO(b''.join(parts).decode('utf-8-sig'))))
+    assert rows[0] == exporter.HEADERS and rows[5][1] == 'user4'
+
+
+def test_write_only_xlsx(tmp_path):
+    long_email = 'x' * 80 + '@example.com'
+    chunks = [[exporter.format_row(_user(0, email=long_email)), exporter.format_row(_user(1))],
+              [exporter.format_row(_user(2))]]
+    path = tmp_path / 'users.xlsx'
+    assert exporter.write_xlsx(chunks, path) == 3
+
+    ws = load_workbook(path).active
+    assert ws.title == '工商联用户'
+    assert [c.value for c in ws[1]] == exporter.HEADERS
+    assert ws['A1'].font.bold and ws['A1'].fill.start_color.rgb.endswith('4472C4')
+    assert ws.max_row == 4 and ws['B4'].value == 'user2'
+    assert ws.column_dimensions['C'].width == exporter.MAX_COLUMN_WIDTH
+    assert ws.column_dimensions['B'].width == len('user0') + 2
+
+
+def test_unknown_format_rejected():
+    with pytest.raises(exporter.ExportFormatError):
+        exporter.check_format('pdf')
+    assert exporter.check_format(None) == 'xlsx'
+
+
+@pytest.fixture
+def client(monkeypatch):
+    chamber_users_management = pytest.importorskip('chamber_users_management')  # 依赖 bcrypt
+    engine = create_engine('sqlite://', poolclass=StaticPool, connect_args={'check_same_thread': False})
+    with engine.begin() as conn:
+        conn.execute(text("""CREATE TABLE chamber_users (id TEXT PRIMARY KEY, username TEXT, email TEXT,
+            real_name TEXT, phone TEXT, level TEXT, region TEXT, role TEXT, review_level TEXT,
+            department TEXT, position TEXT, status TEXT, created_at TIMESTAMP)"""))
+        users = [_user(i) for i in range(25)] + [_user(99, level='national', role='admin')]
+        conn.execute(text("""INSERT INTO chamber_users VALUES (:id, :username, :email, :real_name, :phone,
+            :level, :region, :role, :review_level, :department, :position, :status, :created_at)"""), users)
+
+    class FakeDB:
+        session = Session(engine)
+
+    monkeypatch.setattr(chamber_users_management, 'get_db', lambda: FakeDB)
+    monkeypatch.setattr(exporter, 'DEFAULT_CHUNK_SIZE', 10)
+    app = Flask(__name__)
+    app.secret_key = 'test'
+    app.register_blueprint(chamber_users_management.chamber_users_bp)
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = 'u0099'
+    return client
+
+
+def test_export_endpoint_formats(client):
+    response = client.get('/api/portal/chamber/users/export?format=csv')
+    assert response.status_code == 200 and response.is_streamed
+    assert response.mimetype == 'text/csv'
+    rows = list(csv.reader(io.StringIO(response.get_data().decode('utf-8-sig'))))
+    assert len(rows) == 27 and rows[0][0] == '用户ID'
+
+    response = client.get('/api/portal/chamber/users/export')
+    assert response.status_code == 200
+    assert '.xlsx' in response.headers['Content-Disposition']
+    ws = load_workbook(io.BytesIO(response.get_data())).active
+    assert ws.max_row == 27
+
+    assert client.get('/api/portal/chamber/users/export?format=pdf').status_code == 400
@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+"""
+测试工商联用户列表查询（chamber_users_query）与游标分页接口
+"""
+from datetime import datetime, timedelta
+
+import pytest
+from flask import Flask
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+from audit_log import AuditLogger, sqlalchemy_writer
+import chamber_users_query as query
+
+
+def test_scope_and_filter_params_do_not_collide():
+    province = {'level': 'province', 'region': '浙江'}
+    conditions, params = query.filter_conditions(province, {'region': '北京', 'status': 'active'})
+    assert params == {'scope_region': '浙江', 'region': '北京', 'status': 'active'}
+    assert len(conditions) == 3
+    assert query.filter_conditions({'level': 'national'}, {'keyword': '  '}) == ([], {})
+    # 未知层级按县市级范围处理
+    assert query.scope_conditions({'level': 'unknown', 'region': '北京'}) == (
+        [query.SCOPE_FRAGMENTS['county']], {'scope_region': '北京'})
+
+
+def test_search_condition_modes():
+    condition, params = query.search_condition('张三', fulltext=True)
+    assert condition.startswith('MATCH(username, real_name)') and params == {'kw_phrase': '"张三"'}
+    condition, params = query.search_condition('a"b', fulltext=True)
+    assert params == {'kw_phrase': '"a b"'}
+    # 单字短于 ngram 分词长度、索引不可用时退回 LIKE
+    assert query.search_condition('张', fulltext=True)[1] == {'keyword': '%张%'}
+    assert query.search_condition('张三', fulltext=False)[1] == {'keyword': '%张三%'}
+    assert query.search_condition('50%_x', fulltext=False)[1] == {'keyword': '%50\\%\\_x%'}
+    assert query.search_condition('li@corp', fulltext=True) == ('email LIKE :kw_prefix', {'kw_prefix': 'li@corp%'})
+
+
+def test_cursor_round_trip():
+    cursor = query.encode_cursor(datetime(2024, 5, 1, 8, 30), 'u-1')
+    assert query.decode_cursor(cursor) == ('2024-05-01 08:30:00', 'u-1')
+    for bad in ('not-a-cursor', query.encode_cursor('x', 'y')[:-2] + '!!'):
+        with pytest.raises(ValueError):
+            query.decode_cursor(bad)
+
+
+def test_count_cache_ttl_and_invalidate():
+    cache = query.CountCache(ttl=60)
+    calls = []
+    key = query.CountCache.key(['level = :level'], {'level': 'county'})
+    assert cache.get(key, lambda: calls.append(1) or 5) == 5
+    assert cache.get(key, lambda: calls.append(1) or 6) == 5
+    cache.invalidate()
+    assert cache.get(key, lambda: calls.append(1) or 7) == 7
+    assert len(calls) == 2 and cache.hits == 1
+    expired = query.CountCache(ttl=0)
+    expired.get(key, lambda: 1)
+    assert expired.get(key, lambda: 2) == 2
+
+
+def test_user_context_cache():
+    cache = query.UserContextCache(ttl=60)
+    assert cache.get('u1') is None
+    cache.put('u1', {'id': 'u1', 'level': 'province'})
+    user = cache.get('u1')
+    user['level'] = 'national'  # 返回副本，修改不影响缓存
+    assert cache.get('u1')['level'] == 'province'
+    cache.invalidate('u1')
+    assert cache.get('u1') is None
+    disabled = query.UserContextCache(ttl=0)
+    disabled.put('u1', {'id': 'u1'})
+    assert disabled.get('u1') is None
+
+
+@pytest.fixture
+def client(monkeypatch, tmp_path):
+    chamber_users_management = pytest.importorskip('chamber_users_management')  # 依赖 bcrypt
+    engine = create_engine('sqlite://', poolclass=StaticPool, connect_args={'check_same_thread': False})
+    # MySQL 的 NOW()
+    event.listen(engine, 'connect', lambda conn, record: conn.create_function(
+        'NOW', 0, lambda: datetime.now().isoformat(sep=' ')))
+    with engine.begin() as conn:
+        conn.execute(text("""CREATE TABLE chamber_users (id TEXT PRIMARY KEY, username TEXT, email TEXT,
+            real_name TEXT, phone TEXT, level TEXT, region TEXT, role TEXT, review_level TEXT,
+            department TEXT, position TEXT, status TEXT, remark TEXT, created_at TIMESTAMP,
+            updated_at TIMESTAMP)"""))
+        conn.execute(text("""CREATE TABLE chamber_user_logs (id TEXT, operator_id TEXT, target_user_id TEXT,
+            action TEXT, old_value TEXT, new_value TEXT, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)"""))
+        conn.execute(text("""CREATE TABLE audit_logs (id TEXT, operator_id TEXT, action TEXT, target_type TEXT,
+            target_id TEXT, old_value TEXT, new_value TEXT, ip TEXT, ua TEXT, created_at TIMESTAMP)"""))
+        base = datetime(2024, 1, 1)
+        # 每 3 个用户共享同一创建时间，验证 (created_at, id) 游标的稳定顺序
+        users = [{'id': f'u{i:03d}', 'username': f'user{i}', 'real_name': f'张{i}' if i % 2 else f'李{i}',
+                  'level': 'county', 'region': '北京', 'created_at': base + timedelta(minutes=i // 3)}
+                 for i in range(23)]
+        users.append({'id': 'admin', 'username': 'admin', 'real_name': '管理员', 'level': 'national',
+                      'region': '全国', 'created_at': base - timedelta(days=1), 'role': 'admin'})
+        conn.execute(text("""INSERT INTO chamber_users (id, username, email, real_name, level, region, role,
+            status, created_at) VALUES (:id, :username, :username || '@example.com', :real_name, :level,
+            :region, :role, 'active', :created_at)"""), [dict({'role': 'operator'}, **u) for u in users])
+
+    statements = []
+    event.listen(engine, 'before_cursor_execute',
+                 lambda conn, cursor, sql, *args: statements.append(sql))
+
+    class FakeDB:
+        session = Session(engine)
+
+    monkeypatch.setattr(chamber_users_management, 'get_db', lambda: FakeDB)
+    audit = AuditLogger(sqlalchemy_writer(engine), flush_interval=0.05, spill_path=str(tmp_path / 'spill.jsonl'))
+    monkeypatch.setattr(chamber_users_management, '_audit_logger', audit)
+    monkeypatch.setattr(query, 'count_cache', query.CountCache(ttl=60))
+    monkeypatch.setattr(query, 'user_context_cache', query.UserContextCache(ttl=60))
+    monkeypatch.setitem(query._fulltext, 'enabled', True)
+    app = Flask(__name__)
+    app.secret_key = 'test'
+    app.register_blueprint(chamber_users_management.chamber_users_bp)
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = 'admin'
+    client.statements = statements
+    client.engine = engine
+    client.audit = audit
+    yield client
+    audit.close()
+
+
+def test_keyset_pagination(client):
+    seen, cursor = [], ''
+    while cursor is not None:
+        data = client.get('/api/portal/chamber/users', query_string={'cursor': cursor, 'page_size': 10}).get_json()['data']
+        assert data['total'] == 24
+        seen += [u['id'] for u in data['users']]
+        cursor = data['next_cursor']
+    assert seen[0] == 'u022' and seen[-1] == 'admin'
+    assert len(seen) == len(set(seen)) == 24
+    assert seen[:3] == ['u022', 'u021', 'u020']
+    # 总数只查询一次
+    assert sum('COUNT(*)' in sql for sql in client.statements) == 1
+
+    # 页码分页仍然可用
+    page2 = client.get('/api/portal/chamber/users?page=2&page_size=10').get_json()['data']
+    assert [u['id'] for u in page2['users']] == seen[10:20] and page2['has_more']
+    assert client.get('/api/portal/chamber/users?cursor=broken').status_code == 400
+
+
+def test_keyword_search_falls_back_to_like(client):
+    data = client.get('/api/portal/chamber/users', query_string={'keyword': '张1', 'cursor': ''}).get_json()['data']
+    assert sorted(u['id'] for u in data['users']) == ['u001', 'u011', 'u013', 'u015', 'u017', 'u019']
+    # SQLite 没有 FULLTEXT：首次失败后改用 LIKE
+    assert not query.fulltext_enabled()
+
+
+def test_current_user_cached_per_request_and_across_requests(client):
+    def lookups():
+        return sum('FROM chamber_users WHERE id = ' in sql for sql in client.statements)
+
+    client.get('/api/portal/chamber/users?cursor=')
+    # require_login、require_chamber_admin 与接口本身共用一次查询
+    assert lookups() == 1
+    client.get('/api/portal/chamber/users?cursor=')
+    client.get('/api/portal/chamber/users/export?format=csv')
+    assert lookups() == 1
+    assert query.user_context_cache.hits == 2
+
+    # 修改自己的角色后缓存失效，下一次请求重新读取
+    response = client.put('/api/portal/chamber/users/admin', json={'role': 'operator'})
+    assert response.status_code == 200
+    before = lookups()
+    assert client.get('/api/portal/chamber/users?cursor=').status_code == 403
+    assert lookups() == before + 1
+
+    # 操作日志由后台批量写入两张日志表
+    assert client.audit.flush(5)
+    with client.engine.connect() as conn:
+        assert conn.execute(text("SELECT action FROM chamber_user_logs")).scalars().all() == ['update']
+        assert conn.execute(text("SELECT target_type, target_id FROM audit_logs")).all() == [('chamber_user', 'admin')]
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""
+测试报告图表服务（chart_service）：内存渲染、按输入缓存、并发安全
+"""
+import os
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+
+import docx
+import pytest
+
+from chart_service import CHART_TEMPLATES, ChartService, risk_pie_data, score_radar
+
+PNG_MAGIC = b'\x89PNG\r\n\x1a\n'
+
+DIMENSIONS = [
+    {'name': '公司治理结构', 'percentage': 85.3, 'risk_level': '低风险'},
+    {'name': '财务管理', 'percentage': 62.0, 'risk_level': '中等风险'},
+    {'name': '人力资源', 'percentage': 45.5, 'risk_level': '高风险'},
+]
+
+
+@pytest.fixture(autouse=True)
+def _quiet_missing_glyphs():
+    # 测试环境没有中文字体，忽略缺字警告
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        yield
+
+
+def _bar_data(offset=0.0):
+    return {'names': [d['name'] for d in DIMENSIONS],
+            'percentages': [d['percentage'] + offset for d in DIMENSIONS]}
+
+
+def test_render_is_memoized_by_input(tmp_path, monkeypatch):
+    """相同输入只绘制一次，每次返回独立的 BytesIO；不在当前目录写临时文件"""
+    monkeypatch.chdir(tmp_path)
+    service = ChartService()
+    first = service.render('dimension_bar', _bar_data())
+    second = service.render('dimension_bar', _bar_data())
+    assert first is not second
+    assert first.read() == second.read()
+    assert first.getvalue().startswith(PNG_MAGIC)
+    assert (service.hits, service.misses) == (1, 1)
+
+    service.render('dimension_bar', _bar_data(offset=1.0))
+    service.render('dimension_bar', _bar_data(), {'title': '另一个标题'})
+    assert service.misses == 3
+    assert os.listdir(tmp_path) == []
+
+
+def test_cache_is_bounded():
+    service = ChartService(max_entries=2)
+    for i in range(3):
+        service.render('score_distribution', {'counts': [i, 1, 2, 3, 4]})
+    service.render('score_distribution', {'counts': [0, 1, 2, 3, 4]})
+    assert service.misses == 4 and len(service._cache) == 2
+
+
+def test_concurrent_renders_match_sequential():
+    """多线程并发渲染（无 pyplot 全局状态）结果与顺序渲染一致"""
+    inputs = [_bar_data(offset=i) for i in range(4)]
+    expected = [ChartService(max_entries=0).render_png('dimension_bar', d) for d in inputs]
+    service = ChartService(max_entries=0)
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        actual = list(pool.map(lambda d: service.render_png('dimension_bar', d), inputs))
+    assert actual == expected
+
+
+def test_buffers_embed_in_word_document():
+    """BytesIO 可直接交给 python-docx"""
+    doc = docx.Document()
+    summary = {'score_by_level1': {d['name']: {'percentage': d['percentage']} for d in DIMENSIONS}}
+    doc.add_picture(score_radar(summary, '测试企业', ChartService()))
+    doc.add_picture(ChartService().render('risk_pie', risk_pie_data(d['risk_level'] for d in DIMENSIONS)))
+    assert len(doc.inline_shapes) == 2
+    assert score_radar({'score_by_level1': {}}, '测试企业') is None
+
+
+def test_unknown_kind_rejected():
+    with pytest.raises(ValueError):
+        ChartService().render('histogram3d', {})
+    assert 'dimension_radar' in CHART_TEMPLATES
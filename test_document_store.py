@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+"""
+测试 JSON 文档存储引擎（document_store）
+"""
+import json
+import multiprocessing
+import os
+
+from document_store import DocumentStore, WalTable, JsonTable
+
+
+def _write(path, items):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'items': items}, f, ensure_ascii=False, indent=2)
+
+
+def test_load_and_index_lookup(tmp_path):
+    """加载旧格式文件后可按主键与二级索引查询"""
+    path = str(tmp_path / 'enterprises.json')
+    _write(path, [
+        {'id': 'e1', 'name': '企业A', 'level': 'beginner'},
+        {'id': 'e2', 'name': '企业B', 'level': 'advanced'},
+        {'id': 'e3', 'name': '企业C', 'level': 'beginner'},
+    ])
+    table = WalTable(path, indexes=('name', 'level'))
+    assert len(table) == 3
+    assert table.get('e2')['name'] == '企业B'
+    assert {r['id'] for r in table.find('level', 'beginner')} == {'e1', 'e3'}
+    assert table.find_one('name', '企业C')['id'] == 'e3'
+    assert table.find_one('name', '不存在') is None
+
+
+def test_mutations_go_to_wal_and_replay(tmp_path):
+    """变更只追加日志，重新打开时回放日志得到相同结果"""
+    path = str(tmp_path / 'experts.json')
+    _write(path, [{'id': 'x1', 'name': '张三', 'level': 'county'}])
+    table = WalTable(path, indexes=('name', 'level'))
+    table.insert({'id': 'x2', 'name': '李四', 'level': 'province'})
+    table.update('x1', {'level': 'national'})
+    table.delete('x2')
+
+    # 快照未被重写
+    with open(path, 'r', encoding='utf-8') as f:
+        assert json.load(f)['items'] == [{'id': 'x1', 'name': '张三', 'level': 'county'}]
+    assert os.path.exists(path + '.wal')
+
+    reopened = WalTable(path, indexes=('name', 'level'))
+    assert [r['id'] for r in reopened.all()] == ['x1']
+    assert reopened.get('x1')['level'] == 'national'
+    assert reopened.find('level', 'county') == []
+
+
+def test_compaction_writes_snapshot(tmp_path):
+    """达到阈值后压缩为快照并清空日志"""
+    path = str(tmp_path / 'evals.json')
+    table = WalTable(path, indexes=('expert',), compact_every=5)
+    for i in range(12):
+        table.insert({'id': f'v{i}', 'expert': '张三' if i % 2 else '李四'})
+    with open(path, 'r', encoding='utf-8') as f:
+        snapshot = json.load(f)['items']
+    assert len(snapshot) >= 10
+    assert len(WalTable(path).all()) == 12
+    table.compact()
+    assert not os.path.exists(path + '.wal')
+    assert len(table.find('expert', '张三')) == 6
+
+
+def test_returned_records_are_copies(tmp_path):
+    """查询结果被修改不会影响表内数据"""
+    table = WalTable(str(tmp_path / 't.json'))
+    table.insert({'id': 'a', 'name': 'x'})
+    table.get('a')['name'] = 'y'
+    table.all()[0]['name'] = 'z'
+    assert table.get('a')['name'] == 'x'
+
+
+def test_sees_writes_from_other_instance(tmp_path):
+    """另一个实例（模拟其他进程）追加的日志可被增量读到"""
+    path = str(tmp_path / 'shared.json')
+    a = WalTable(path, indexes=('name',))
+    b = WalTable(path, indexes=('name',))
+    a.insert({'id': '1', 'name': '甲'})
+    a.insert({'id': '2', 'name': '乙'})
+    assert b.find_one('name', '乙')['id'] == '2'
+    b.update('1', {'name': '丙'})
+    assert a.find_one('name', '丙')['id'] == '1'
+    a.compact()
+    assert len(b) == 2
+
+
+def test_compaction_keeps_rows_appended_by_other_instance(tmp_path):
+    """压缩前先回放其他实例追加的日志，不会丢失对方的记录"""
+    path = str(tmp_path / 'shared.json')
+    a = WalTable(path)
+    b = WalTable(path)
+    a.insert({'id': '1'})
+    b.insert({'id': '2'})
+    a.compact()
+    assert not os.path.exists(path + '.wal')
+    assert sorted(r['id'] for r in WalTable(path).all()) == ['1', '2']
+
+    b.insert({'id': '3'})
+    a.insert({'id': '4'})
+    DocumentStore().compact_all()
+    b.compact()
+    assert sorted(r['id'] for r in WalTable(path).all()) == ['1', '2', '3', '4']
+
+
+def _insert_many(path, worker, count):
+    table = WalTable(path, compact_every=7)
+    for i in range(count):
+        table.insert({'id': f'{worker}-{i}'})
+    table.compact()
+
+
+def test_concurrent_processes_with_compaction(tmp_path):
+    """多个进程同时写入并按阈值压缩，所有记录都保留"""
+    path = str(tmp_path / 'shared.json')
+    workers = [multiprocessing.Process(target=_insert_many, args=(path, w, 40)) for w in range(4)]
+    for proc in workers:
+        proc.start()
+    for proc in workers:
+        proc.join(60)
+        assert proc.exitcode == 0
+    assert len(WalTable(path)) == 4 * 40
+
+
+def test_replace_all_and_json_engine(tmp_path):
+    """整表替换与旧 json 引擎均直接写快照"""
+    store = DocumentStore(engine='json')
+    path = str(tmp_path / 'ledger.json')
+    table = store.table(path, indexes=('expert',))
+    assert isinstance(table, JsonTable)
+    table.insert({'id': 'l1', 'expert': '张三'})
+    assert not os.path.exists(path + '.wal')
+    table.replace_all([{'id': 'l2', 'expert': '李四'}])
+    with open(path, 'r', encoding='utf-8') as f:
+        assert json.load(f) == {'items': [{'id': 'l2', 'expert': '李四'}]}
+    assert store.table(path) is table
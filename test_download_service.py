@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""
+测试文件下载（download_service）：ETag/条件请求、Range、前端服务器传输与 ZIP 打包
+"""
+import io
+import zipfile
+from urllib.parse import quote
+
+import pytest
+from flask import Flask
+
+import download_service
+from report_engine.catalog import ReportCatalog
+
+
+@pytest.fixture
+def reports(tmp_path):
+    directory = tmp_path / 'reports'
+    directory.mkdir()
+    (directory / '专业报告_企业A_20240101_080000.pdf').write_bytes(bytes(range(256)) * 40)
+    (directory / '自评报告_企业A_20240102_080000.docx').write_bytes(b'PK' + b'a' * 5000)
+    (directory / '专业报告_企业B_20240103_080000.pdf').write_bytes(b'b' * 100)
+    catalog = ReportCatalog(str(tmp_path / 'catalog.sqlite3'), str(directory))
+    catalog.reconcile()
+    return catalog
+
+
+@pytest.fixture
+def client(reports):
+    app = Flask(__name__)
+
+    @app.route('/file/<filename>')
+    def file(filename):
+        path = download_service.resolve(reports.reports_dir, filename)
+        if not path:
+            return 'missing', 404
+        return download_service.send_download(path, catalog=reports)
+
+    @app.route('/bundle/<enterprise>')
+    def bundle(enterprise):
+        rows = reports.query(enterprise=enterprise, sort='filename', order='asc')['items']
+        return download_service.send_bundle(
+            [(r['filename'], download_service.resolve(reports.reports_dir, r['filename']), r['checksum'])
+             for r in rows], f'{enterprise}_报告.zip')
+
+    return app.test_client()
+
+
+def test_etag_from_catalog_and_conditional_requests(client, reports):
+    name = '专业报告_企业A_20240101_080000.pdf'
+    resp = client.get(f'/file/{name}')
+    assert resp.status_code == 200 and len(resp.data) == 10240
+    assert resp.headers['ETag'] == f'"{reports.get(name)["checksum"]}"'
+    assert resp.headers['Last-Modified'] and resp.headers['Accept-Ranges'] == 'bytes'
+    assert "filename*=UTF-8''" in resp.headers['Content-Disposition']
+
+    assert client.get(f'/file/{name}', headers={'If-None-Match': resp.headers['ETag']}).status_code == 304
+
+    # 断点续传：只发送请求的区间
+    partial = client.get(f'/file/{name}', headers={'Range': 'bytes=1000-1999', 'If-Range': resp.headers['ETag']})
+    assert partial.status_code == 206 and partial.data == (bytes(range(256)) * 40)[1000:2000]
+    assert partial.headers['Content-Range'] == 'bytes 1000-1999/10240'
+    # 文件已变化（If-Range 不匹配）时发送整份文件
+    assert client.get(f'/file/{name}', headers={'Range': 'bytes=0-9', 'If-Range': '"old"'}).status_code == 200
+
+
+def test_file_changed_outside_catalog_gets_new_etag(client, reports):
+    name = '专业报告_企业B_20240103_080000.pdf'
+    before = client.get(f'/file/{name}').headers['ETag']
+    with open(f'{reports.reports_dir}/{name}', 'ab') as f:
+        f.write(b'more')
+    after = client.get(f'/file/{name}').headers['ETag']
+    assert before != after and after == f'"{reports.get(name)["checksum"]}"'
+
+
+def test_rejects_paths_outside_base(reports):
+    assert download_service.resolve(reports.reports_dir, '..', 'catalog.sqlite3') is None
+    assert download_service.resolve(reports.reports_dir, '不存在.pdf') is None
+
+
+@pytest.mark.parametrize('mode,header', [('x-sendfile', 'X-Sendfile'), ('x-accel-redirect', 'X-Accel-Redirect')])
+def test_offload_to_front_server(client, reports, monkeypatch, mode, header):
+    monkeypatch.setitem(download_service._offload, 'mode', mode)
+    monkeypatch.setitem(download_service._offload, 'accel_root', str(reports.reports_dir))
+    name = '专业报告_企业B_20240103_080000.pdf'
+    resp = client.get(f'/file/{name}')
+    assert resp.status_code == 200 and resp.data == b''
+    if mode == 'x-sendfile':
+        assert resp.headers[header].endswith(name)
+    else:
+        assert resp.headers[header] == '/protected/' + quote(name)
+    assert client.get(f'/file/{name}', headers={'If-None-Match': resp.headers['ETag']}).status_code == 304
+
+
+def test_streamed_zip_bundle(client, reports):
+    resp = client.get('/bundle/企业A')
+    assert resp.status_code == 200 and resp.mimetype == 'application/zip'
+    assert resp.is_streamed
+    with zipfile.ZipFile(io.BytesIO(resp.data)) as archive:
+        assert archive.testzip() is None
+        assert sorted(archive.namelist()) == ['专业报告_企业A_20240101_080000.pdf',
+                                              '自评报告_企业A_20240102_080000.docx']
+        assert archive.read('专业报告_企业A_20240101_080000.pdf') == bytes(range(256)) * 40
+    assert client.get('/bundle/企业A', headers={'If-None-Match': resp.headers['ETag']}).status_code == 304
+
+
+def test_app_download_routes(reports, monkeypatch):
+    app_module = pytest.importorskip('app')
+    monkeypatch.setattr(app_module, 'REPORTS_DIR', reports.reports_dir)
+    monkeypatch.setattr(app_module, '_report_catalog', reports)
+    client = app_module.app.test_client()
+
+    resp = client.get('/download/专业报告_企业B_20240103_080000.pdf', headers={'Range': 'bytes=0-9'})
+    assert resp.status_code == 206 and resp.data == b'b' * 10
+    assert client.get('/download/..').status_code == 404
+    with zipfile.ZipFile(io.BytesIO(client.get('/download/bundle/企业A').data)) as archive:
+        assert len(archive.namelist()) == 2
+    assert client.get('/download/bundle/企业Z').status_code == 404
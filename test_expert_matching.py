@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""
+测试企业-专家匹配引擎（expert_matching），与逐位专家打分后全排序的结果对照
+"""
+import glob
+import random
+
+import numpy as np
+import pytest
+
+import expert_matching
+from expert_matching import ExpertIndex
+
+REGIONS = [('天津市', '天津'), ('北京市', '北京'), ('石家庄市', '河北'), ('济南市', '山东')]
+INDUSTRIES = ['制造业', '信息技术', '批发零售', '建筑业']
+SKILLS = ['企业管理', '质量控制', '数字化转型', 'IT管理', '财务审计', '风险合规', '股权设计', '党建工作',
+          '战略规划', '人力资源', '品牌建设', '家族传承', '技术研发']
+LEVEL1 = list(expert_matching.DIMENSION_KEYWORDS)
+
+
+def make_experts(n=400, seed=5):
+    rng = random.Random(seed)
+    experts = []
+    for i in range(n):
+        region, province = rng.choice(REGIONS)
+        experts.append({'id': f'e{i:05d}', 'name': f'专家{i}', 'region': region, 'province': province,
+                        'industry': rng.choice(INDUSTRIES), 'level': rng.choice(['county', 'province', 'national']),
+                        'skills': '、'.join(rng.sample(SKILLS, rng.randint(1, 3)))})
+    return experts
+
+
+def make_profiles(n=200, seed=9):
+    rng = random.Random(seed)
+    profiles = []
+    for i in range(n):
+        region, _ = rng.choice(REGIONS)
+        profiles.append({'name': f'企业{i}', 'region': region, 'industry': rng.choice(INDUSTRIES),
+                         'level': rng.choice(['beginner', 'intermediate', 'advanced']),
+                         'level1_scores': {dim: round(rng.uniform(20, 100), 1) for dim in LEVEL1}})
+    return profiles
+
+
+def brute_force(experts, profile):
+    """逐位专家计算亲和度"""
+    need = expert_matching.weakest_dimensions(profile['level1_scores'])
+    norm = expert_matching._normalize
+    target = expert_matching.ENTERPRISE_LEVEL_RANK.get(profile['level'], 1)
+    scores = []
+    for e in experts:
+        tokens = expert_matching.tokenize_skills(e['skills'])
+        score = 0.0
+        for dim, weight in need:
+            keywords = expert_matching.dimension_keywords(dim)
+            if any(kw in t or t in kw for t in tokens for kw in keywords):
+                score += expert_matching.WEIGHTS['skill'] * weight
+        if norm('region', e['region']) == norm('region', profile['region']):
+            score += expert_matching.WEIGHTS['region']
+        if norm('province', e['province']) == norm('province', profile['region']):
+            score += expert_matching.WEIGHTS['province']
+        if e['industry'] == profile['industry']:
+            score += expert_matching.WEIGHTS['industry']
+        gap = abs(expert_matching.EXPERT_LEVEL_RANK[e['level']] - target)
+        score += expert_matching.WEIGHTS['level'] / (2 ** gap)
+        scores.append(score)
+    return scores
+
+
+def test_top_k_matches_full_sort():
+    experts = make_experts()
+    index = ExpertIndex(experts)
+    for profile in make_profiles(30):
+        scores = brute_force(experts, profile)
+        expected = sorted(range(len(experts)), key=lambda i: (-round(scores[i], 9), i))[:5]
+        got = index.top_k(profile, 5)
+        assert [m['score'] for m in got] == [round(scores[i], 3) for i in expected]
+        assert np.allclose(index.scores(profile), scores)
+
+
+def test_top_k_explains_matched_dimensions():
+    experts = [
+        {'id': 'a', 'name': '张三', 'region': '天津市', 'province': '天津', 'industry': '制造业',
+         'level': 'county', 'skills': '企业管理、质量控制'},
+        {'id': 'b', 'name': '李四', 'region': '北京市', 'province': '北京', 'industry': '信息技术',
+         'level': 'province', 'skills': '数字化转型、IT管理'},
+        {'id': 'c', 'name': '王五', 'region': '天津市', 'province': '天津', 'industry': '信息技术',
+         'level': 'province', 'skills': '财务审计'},
+    ]
+    profile = {'region': '天津市', 'industry': '制造业', 'level': 'intermediate',
+               'level1_scores': {'科技创新': 30.0, '内控、风险与合规管理': 40.0, '战略管理': 95.0, '党建引领': 100}}
+    matches = ExpertIndex(experts).top_k(profile, 3)
+    assert [m['name'] for m in matches] == ['张三', '王五', '李四']
+    assert matches[0]['matched_dimensions'] == ['内控、风险与合规管理', '战略管理']
+    assert matches[2]['matched_dimensions'] == ['科技创新']
+    # 满分维度不算短板
+    assert [d for d, _ in expert_matching.weakest_dimensions(profile['level1_scores'])] == \
+        ['科技创新', '内控、风险与合规管理', '战略管理']
+
+
+def test_bulk_assignment_respects_capacity():
+    experts = make_experts(60)
+    profiles = make_profiles(150)
+    index = ExpertIndex(experts)
+    assignments = index.assign(profiles, k=2, capacity=5)
+
+    load = {}
+    for experts_for_one in assignments:
+        assert len({m['id'] for m in experts_for_one}) == len(experts_for_one) <= 2
+        assert [m['score'] for m in experts_for_one] == sorted((m['score'] for m in experts_for_one), reverse=True)
+        for m in experts_for_one:
+            load[m['id']] = load.get(m['id'], 0) + 1
+    assert max(load.values()) <= 5
+    # 总容量 300 = 需求 300：满额时每家企业都分到了 2 位专家
+    assert all(len(a) == 2 for a in assignments)
+
+    # 按专家设置容量：容量为 0 的专家不参与分配
+    capacity = {e['id']: 3 for e in experts[:10]}
+    assignments = index.assign(profiles[:20], k=1, capacity=capacity)
+    assert all(m['id'] in capacity for a in assignments for m in a)
+    assert sum(len(a) for a in assignments) == 20
+
+
+def test_index_lookup_and_rebuild_on_change():
+    experts = make_experts(50)
+    index = expert_matching.get_index(experts)
+    assert expert_matching.get_index([dict(e) for e in experts]) is index
+    tianjin = index.lookup(region='天津', level='national')
+    assert tianjin and all(e['region'] == '天津市' and e['level'] == 'national' for e in tianjin)
+
+    changed = [dict(e) for e in experts]
+    changed[0]['skills'] = '家族传承'
+    rebuilt = expert_matching.get_index(changed)
+    assert rebuilt is not index
+    assert 0 in rebuilt.dimension_postings('家族企业治理')
+
+    # 非索引字段（姓名、单位）变化同样重建，匹配结果不返回旧信息
+    renamed = [dict(e) for e in changed]
+    renamed[0].update(name='新姓名', org='新单位')
+    refreshed = expert_matching.get_index(renamed)
+    assert refreshed is not rebuilt
+    assert refreshed.match(0, 1.0, {})['name'] == '新姓名'
+    assert refreshed.match(0, 1.0, {})['org'] == '新单位'
+
+
+def test_submission_scores_from_real_scoring():
+    """score_many 的真实结果：总得分率取 score_percentage，一级指标取各自 percentage"""
+    from score_calculator import ScoreCalculator
+
+    paths = sorted(glob.glob('storage/submissions/submission_*.json'))
+    if not paths:
+        pytest.skip('没有已提交的问卷')
+    calculator = ScoreCalculator('指标体系.xlsx')
+    calculator.score_cache = None
+    by_path = {f'企业{i}': path for i, path in enumerate(paths)}
+    batch = calculator.score_many(paths)
+    scores = expert_matching.submission_scores(by_path, calculator)
+    assert batch['results'] and len(scores) == len(batch['results'])
+
+    expected = {r['source']: r['score_summary'] for r in batch['results']}
+    for name, entry in scores.items():
+        summary = expected[by_path[name]]
+        assert entry['score_pct'] == summary['score_percentage']
+        assert entry['level1_scores'] == {dim: data['percentage']
+                                          for dim, data in summary['score_by_level1'].items()}
+    if any(summary['score_percentage'] for summary in expected.values()):
+        assert any(entry['score_pct'] for entry in scores.values())
+
+
+def test_expert_match_endpoint(monkeypatch):
+    app_module = pytest.importorskip('app')
+    monkeypatch.setattr(app_module, '_get_score_calculator', lambda: None)
+    client = app_module.app.test_client()
+    enterprises = app_module._read_json(app_module.ENTERPRISES_DB)
+    if not enterprises or not app_module._read_json(app_module.EXPERTS_DB):
+        pytest.skip('缺少企业/专家示例数据')
+
+    name = enterprises[0]['name']
+    data = client.get(f'/api/portal/chamber/expert-match?enterprise={name}&k=2').get_json()
+    assert data['success'] and data['data']['enterprise'] == name
+    assert len(data['data']['experts']) <= 2
+    assert data['data']['recommend_group'] == '、'.join(e['name'] for e in data['data']['experts'])
+    assert client.get('/api/portal/chamber/expert-match?enterprise=不存在的企业').status_code == 404
+
+    data = client.post('/api/portal/chamber/expert-match/bulk', json={'k': 1, 'capacity': 1}).get_json()
+    assert data['success'] and len(data['items']) == len(enterprises)
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+"""
+测试专家门户匹配（expert_portal.services.matcher）：得分率走 score_many 批量计分
+"""
+import glob
+
+import pytest
+
+from expert_portal.services import matcher
+from score_calculator import ScoreCalculator
+from submission_model import Submission
+
+
+@pytest.fixture
+def submissions():
+    paths = sorted(glob.glob('storage/submissions/submission_*.json'))
+    if not paths:
+        pytest.skip('没有已提交的问卷')
+    return [Submission.from_json_file(path) for path in paths]
+
+
+def test_score_percentages_use_batch_scoring(monkeypatch, submissions):
+    calculator = ScoreCalculator('指标体系.xlsx')
+    calculator.score_cache = None
+    monkeypatch.setattr(matcher, '_get_calculator', lambda: calculator)
+
+    def no_fallback(*args, **kwargs):
+        raise AssertionError('不应退回导出Excel的简化打分')
+
+    monkeypatch.setattr(matcher, '_compute_score_from_excel', no_fallback)
+    monkeypatch.setattr(Submission, 'export_excel', no_fallback)
+
+    pcts = matcher._score_percentages(submissions)
+    expected = {id(r['source']): r['score_summary']['score_percentage']
+                for r in calculator.score_many(submissions)['results']}
+    assert pcts == [expected.get(id(sub), 0.0) for sub in submissions]
+    if any(expected.values()):
+        assert any(pcts)
+
+
+def test_missing_indicator_file_falls_back(monkeypatch, submissions):
+    def unavailable():
+        raise FileNotFoundError('指标体系.xlsx')
+
+    monkeypatch.setattr(matcher, '_get_calculator', unavailable)
+    monkeypatch.setattr(Submission, 'export_excel', lambda self: 'exported.xlsx')
+    monkeypatch.setattr(matcher, '_compute_score_from_excel', lambda path: {'percentage': 42.0})
+    assert matcher._score_percentages(submissions[:2]) == [42.0] * len(submissions[:2])
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""
+测试专项反馈统计查询（feedback_analytics），与原先逐行读取后在 Python 中统计的结果对照
+"""
+import random
+from datetime import datetime, timedelta
+
+import pytest
+from flask import Flask
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.orm import Session
+
+import feedback_analytics
+import feedback_rollup
+import special_feedback_api
+
+CATEGORIES = ['typical_case', 'issue_feedback', 'chamber_feedback', 'expert_feedback', 'material']
+STATUSES = ['draft', 'submitted', 'reviewing', 'approved', 'rejected']
+PRIORITIES = ['low', 'medium', 'high', 'urgent']
+
+
+def make_rows(n=300, seed=7):
+    rng = random.Random(seed)
+    base = datetime(2024, 12, 20)
+    rows = []
+    for i in range(n):
+        submitted = base + timedelta(days=rng.randint(0, 60), hours=rng.randint(0, 23)) if rng.random() > 0.1 else None
+        reviewed = submitted + timedelta(hours=rng.randint(1, 24 * 20)) if submitted and rng.random() > 0.4 else None
+        rows.append({
+            'id': f'f{i:04d}', 'category': rng.choice(CATEGORIES), 'subcategory': '其他', 'title': f'反馈{i}',
+            'status': rng.choice(STATUSES), 'priority': rng.choice(PRIORITIES),
+            'rating': rng.choice([None, None, 0, 1, 2, 3, 4, 5]),
+            'submitted_at': submitted, 'reviewed_at': reviewed,
+        })
+    return rows
+
+
+@pytest.fixture
+def session():
+    engine = create_engine('sqlite://')
+    with engine.begin() as conn:
+        conn.execute(text("""CREATE TABLE special_feedbacks (id TEXT PRIMARY KEY, category TEXT, subcategory TEXT,
+            title TEXT, status TEXT, priority TEXT, rating INT, submitted_at TIMESTAMP, reviewed_at TIMESTAMP)"""))
+        conn.execute(text("""INSERT INTO special_feedbacks VALUES (:id, :category, :subcategory, :title, :status,
+            :priority, :rating, :submitted_at, :reviewed_at)"""), make_rows())
+    statements = []
+    event.listen(engine, 'before_cursor_execute', lambda conn, cursor, sql, *args: statements.append(sql))
+    session = Session(engine)
+    session.statements = statements
+    yield session
+    session.close()
+
+
+def in_range(row, date_from, date_to):
+    # 原实现：submitted_at 与字符串比较，NULL 被范围条件排除
+    at = row['submitted_at']
+    if date_from and (at is None or at.isoformat(sep=' ') < date_from):
+        return False
+    if date_to and (at is None or at.isoformat(sep=' ') > date_to):
+        return False
+    return True
+
+
+def reference(rows, period):
+    """原 analyze_trend / analyze_rating / analyze_metrics 的 Python 统计逻辑"""
+    fmt = {'day': '%Y-%m-%d', 'week': '%Y-W%W'}.get(period, '%Y-%m')
+    trend = {}
+    for r in rows:
+        if r['submitted_at']:
+            key = r['submitted_at'].strftime(fmt)
+            trend[key] = trend.get(key, 0) + 1
+    ratings = [r['rating'] for r in rows if r['rating']]
+    distribution = {level: ratings.count(level) for level in (1, 2, 3, 4, 5)}
+    days = [(r['reviewed_at'] - r['submitted_at']).days for r in rows if r['submitted_at'] and r['reviewed_at']]
+    total = len(rows)
+    return {
+        'trend': [{'date': d, 'count': c} for d, c in sorted(trend.items())],
+        'rating': {'average_rating': round(sum(ratings) / len(ratings), 2) if ratings else 0,
+                   'distribution': distribution},
+        'metrics': {
+            'total_feedbacks': total,
+            'average_rating': round(sum(ratings) / len(ratings), 2) if ratings else 0,
+            'approval_rate': round(sum(r['status'] == 'approved' for r in rows) / total, 2) if total else 0,
+            'avg_processing_time': round(sum(days) / len(days), 1) if days else 0,
+            'high_priority_ratio': round(sum(r['priority'] == 'urgent' for r in rows) / total, 2) if total else 0,
+        },
+    }
+
+
+@pytest.mark.parametrize('date_from,date_to', [('', ''), ('2025-01-01', '2025-01-31 23:59:59'), ('2025-02-01', '')])
+@pytest.mark.parametrize('period', ['day', 'week', 'month'])
+def test_matches_python_reference(session, period, date_from, date_to):
+    rows = [r for r in make_rows() if in_range(r, date_from, date_to)]
+    expected = reference(rows, period)
+    assert feedback_analytics.trend(session, date_from, date_to, period) == expected['trend']
+    assert feedback_analytics.rating_summary(session, date_from, date_to) == expected['rating']
+    assert feedback_analytics.key_metrics(session, date_from, date_to) == expected['metrics']
+
+
+def test_period_keys_for_mysql():
+    assert feedback_analytics.period_key('week') == \
+        "CONCAT(YEAR(submitted_at), '-W', LPAD(WEEK(submitted_at, 5), 2, '0'))"
+    assert feedback_analytics.period_key('quarter', 'sqlite') == "strftime('%Y-%m', submitted_at)"
+
+
+def test_analysis_endpoints_aggregate_in_sql(session, monkeypatch):
+    monkeypatch.setattr(special_feedback_api, 'db', type('FakeDB', (), {'session': session}), raising=False)
+    monkeypatch.setitem(feedback_rollup._source, 'rollup', False)
+    app = Flask(__name__)
+    special_feedback_api.register_special_feedback_api(app)
+    client = app.test_client()
+
+    expected = reference(make_rows(), 'month')
+    data = client.get('/api/portal/chamber/feedbacks/analysis/trend?period=month').get_json()['data']
+    assert data['trend'] == expected['trend']
+    data = client.get('/api/portal/chamber/feedbacks/analysis/rating').get_json()['data']
+    assert data['average_rating'] == expected['rating']['average_rating']
+    assert sum(data['distribution'].values()) == sum(expected['rating']['distribution'].values())
+    data = client.get('/api/portal/chamber/feedbacks/analysis/metrics').get_json()['data']
+    assert data == expected['metrics']
+
+    # 每个接口一条聚合查询，不再逐行读取
+    assert len(session.statements) == 3
+    assert all('GROUP BY' in sql or 'COUNT(*)' in sql for sql in session.statements)
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""
+测试专项反馈按日汇总表（feedback_rollup）：增量维护、重建、一致性检查与统计查询
+"""
+import random
+from datetime import timedelta
+
+import pytest
+from flask import Flask
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.orm import Session
+
+import feedback_analytics
+import feedback_rollup
+import special_feedback_api
+from test_feedback_analytics import PRIORITIES, STATUSES, make_rows
+
+COLUMNS = ('id', 'category', 'subcategory', 'title', 'status', 'priority', 'rating', 'submitted_at', 'reviewed_at')
+
+ROLLUP_DDL = f"""CREATE TABLE feedback_daily_rollup (day DATE NOT NULL, category TEXT NOT NULL,
+    subcategory TEXT NOT NULL DEFAULT '', status TEXT NOT NULL DEFAULT '', priority TEXT NOT NULL DEFAULT '',
+    {', '.join(f'{m} INT NOT NULL DEFAULT 0' for m in feedback_rollup.ROLLUP_MEASURES)},
+    PRIMARY KEY (day, category, subcategory, status, priority))"""
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'feedback.db'}")
+    with engine.begin() as conn:
+        conn.execute(text("""CREATE TABLE special_feedbacks (id TEXT PRIMARY KEY, category TEXT, subcategory TEXT,
+            title TEXT, status TEXT, priority TEXT, rating INT, submitted_at TIMESTAMP, reviewed_at TIMESTAMP)"""))
+        conn.execute(text(ROLLUP_DDL))
+    return engine
+
+
+def create(conn, row):
+    conn.execute(text(f"INSERT INTO special_feedbacks VALUES ({', '.join(':' + c for c in COLUMNS)})"), row)
+    feedback_rollup.record_change(conn, None, feedback_rollup.contribution(row))
+
+
+def update(conn, row, **changes):
+    before = feedback_rollup.contribution(row)
+    row.update(changes)
+    conn.execute(text('UPDATE special_feedbacks SET ' + ', '.join(f'{c} = :{c}' for c in changes)
+                      + ' WHERE id = :id'), row)
+    feedback_rollup.record_change(conn, before, feedback_rollup.contribution(row))
+
+
+def delete(conn, row):
+    feedback_rollup.record_change(conn, feedback_rollup.contribution(row), None)
+    conn.execute(text('DELETE FROM special_feedbacks WHERE id = :id'), row)
+
+
+@pytest.fixture
+def populated(engine):
+    """逐条创建、审核、删除反馈，汇总表只做增量维护"""
+    rng = random.Random(3)
+    rows = make_rows()
+    with engine.begin() as conn:
+        for row in rows:
+            create(conn, row)
+        for row in rng.sample(rows, 80):
+            reviewed_at = (row['submitted_at'] or row['reviewed_at'] or rows[0]['submitted_at']) \
+                + timedelta(days=rng.randint(0, 9), hours=5)
+            update(conn, row, status=rng.choice(STATUSES), rating=rng.choice([None, 2, 5]),
+                   priority=rng.choice(PRIORITIES), reviewed_at=reviewed_at)
+        for row in rng.sample(rows, 40):
+            delete(conn, row)
+    return engine
+
+
+def test_incremental_maintenance_is_consistent(populated):
+    with populated.begin() as conn:
+        assert feedback_rollup.check(conn) == []
+        # 汇总行数远小于明细行数
+        assert conn.execute(text('SELECT COUNT(*) FROM feedback_daily_rollup')).scalar() < 260
+
+
+@pytest.mark.parametrize('date_from,date_to', [('', ''), ('2025-01-01', '2025-01-31'), ('', '2025-01-10')])
+def test_rollup_queries_match_table_queries(populated, date_from, date_to):
+    # 汇总表按天统计，date_to 当天全天计入
+    table_to = f'{date_to} 23:59:59.999999' if date_to else ''
+    with populated.connect() as conn:
+        for name in ('rating_summary', 'key_metrics'):
+            assert getattr(feedback_rollup, name)(conn, date_from, date_to) == \
+                getattr(feedback_analytics, name)(conn, date_from, table_to)
+        for period in ('day', 'week', 'month'):
+            assert feedback_rollup.trend(conn, date_from, date_to, period) == \
+                feedback_analytics.trend(conn, date_from, table_to, period)
+        for name in ('category_breakdown', 'issue_breakdown'):
+            assert sorted(getattr(feedback_rollup, name)(conn, date_from, date_to), key=str) == \
+                sorted(getattr(feedback_analytics, name)(conn, date_from, table_to), key=str)
+
+
+def test_rolled_back_change_leaves_rollup_untouched(populated):
+    row = dict(make_rows(1)[0], id='extra', submitted_at=None, reviewed_at=None)
+    with pytest.raises(RuntimeError):
+        with populated.begin() as conn:
+            create(conn, row)
+            raise RuntimeError('写入失败')
+    with populated.begin() as conn:
+        assert feedback_rollup.check(conn) == []
+
+
+def test_check_detects_drift_and_rebuild_repairs(populated):
+    with populated.begin() as conn:
+        conn.execute(text('UPDATE feedback_daily_rollup SET rating_sum = rating_sum + 1 '
+                          'WHERE rowid = (SELECT MIN(rowid) FROM feedback_daily_rollup)'))
+        conn.execute(text("INSERT INTO special_feedbacks (id, category, status, priority) "
+                          "VALUES ('stray', 'material', 'draft', 'low')"))
+    with populated.begin() as conn:
+        mismatches = feedback_rollup.check(conn)
+    assert len(mismatches) == 2
+    assert any(m['actual'] is None and m['key']['category'] == 'material' for m in mismatches)
+
+    url = str(populated.url)
+    assert feedback_rollup.main(['check', '--url', url]) == 1
+    assert feedback_rollup.main(['rebuild', '--url', url]) == 0
+    assert feedback_rollup.main(['check', '--url', url]) == 0
+
+
+def test_analysis_endpoints_read_rollup(populated, monkeypatch):
+    session = Session(populated)
+    statements = []
+    event.listen(populated, 'before_cursor_execute', lambda conn, cursor, sql, *args: statements.append(sql))
+    monkeypatch.setattr(special_feedback_api, 'db', type('FakeDB', (), {'session': session}), raising=False)
+    app = Flask(__name__)
+    special_feedback_api.register_special_feedback_api(app)
+    client = app.test_client()
+
+    for name in ('category', 'trend', 'rating', 'metrics', 'issues'):
+        assert client.get(f'/api/portal/chamber/feedbacks/analysis/{name}').get_json()['success']
+    assert len(statements) == 5
+    assert all('FROM feedback_daily_rollup' in sql for sql in statements)
+
+    # 汇总表不可用时改用明细表查询
+    with populated.begin() as conn:
+        conn.execute(text('DROP TABLE feedback_daily_rollup'))
+    data = client.get('/api/portal/chamber/feedbacks/analysis/metrics').get_json()
+    assert data['success'] and data['data']['total_feedbacks'] == 260
+    assert 'FROM special_feedbacks' in statements[-1]
+    session.close()
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""
+测试指标题目缓存（survey_engine.services.indicator_cache）
+"""
+import json
+import os
+
+import pandas as pd
+
+from nankai_indicator_loader import load_questions_by_level
+from survey_engine.services.indicator_cache import IndicatorCache
+
+
+def _make_workbook(path, rows_per_level=3):
+    with pd.ExcelWriter(path, engine='openpyxl') as writer:
+        for sheet in ['初级', '中级', '高级']:
+            df = pd.DataFrame({
+                '序号': list(range(1, rows_per_level + 1)),
+                '一级指标': ['党建引领'] * rows_per_level,
+                '二级指标': ['组织建设'] * rows_per_level,
+                '三级指标': [f'{sheet}问题{i}' for i in range(rows_per_level)],
+                '指标类型': ['合规项'] * rows_per_level,
+                '分值': [0.5] * rows_per_level,
+                '适用对象': ['所有企业'] * rows_per_level,
+            })
+            df.to_excel(writer, sheet_name=sheet, index=False)
+
+
+def test_cache_matches_uncached_loader(tmp_path):
+    """缓存结果与直接读取Excel一致，JSON字节可直接反序列化"""
+    path = str(tmp_path / 'indicators.xlsx')
+    _make_workbook(path)
+    cache = IndicatorCache()
+    for level in ['beginner', 'intermediate', 'advanced']:
+        expected = load_questions_by_level(path, level)
+        assert cache.get_questions(path, level) == expected
+        assert json.loads(cache.get_questions_json(path, level)) == expected
+        assert cache.count(path, level) == 3
+
+
+def test_cache_parses_workbook_once(tmp_path, monkeypatch):
+    """三个级别共享一次解析，重复访问不再读取文件"""
+    import survey_engine.services.indicator_cache as mod
+    path = str(tmp_path / 'indicators.xlsx')
+    _make_workbook(path)
+    calls = []
+    real = mod.load_all_levels
+    monkeypatch.setattr(mod, 'load_all_levels', lambda p, levels: calls.append(levels) or real(p, levels))
+    cache = IndicatorCache()
+    for _ in range(3):
+        for level in ['beginner', 'intermediate', 'advanced']:
+            cache.get_questions(path, level)
+    assert len(calls) == 1
+
+
+def test_cache_invalidates_when_file_changes(tmp_path):
+    """指标文件修改后自动重新解析"""
+    path = str(tmp_path / 'indicators.xlsx')
+    _make_workbook(path, rows_per_level=3)
+    cache = IndicatorCache()
+    assert cache.count(path, 'advanced') == 3
+    _make_workbook(path, rows_per_level=5)
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+    assert cache.count(path, 'advanced') == 5
+
+
+def test_missing_sheet_raises(tmp_path):
+    """工作表缺失时与原加载器一样抛出 ValueError"""
+    path = str(tmp_path / 'single.xlsx')
+    pd.DataFrame({'三级指标': ['问题']}).to_excel(path, sheet_name='Sheet1', index=False)
+    cache = IndicatorCache()
+    try:
+        cache.get_questions(path, 'beginner')
+        assert False, '应抛出异常'
+    except ValueError:
+        pass
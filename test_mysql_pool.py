@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+"""
+测试 MySQL 连接池（mysql_pool），使用基于 SQLite 的本地替身代替 MySQL 服务器
+"""
+import sqlite3
+import threading
+
+import pytest
+from flask import Flask
+
+import mysql_pool
+import questionnaire_management_api
+from mysql_pool import Error, MySQLPool, PoolTimeout
+
+
+class FakeCursor:
+    """模拟 mysql.connector 游标：%s 占位符、column_names"""
+
+    def __init__(self, conn, prepared=False):
+        self.conn = conn
+        self.prepared = prepared
+        self.column_names = ()
+        self.rowcount = -1
+        self._cur = conn.db.cursor()
+        self._executed = None
+
+    def execute(self, sql, params=()):
+        if self.conn.closed:
+            raise Error('Lost connection to MySQL server')
+        if self.prepared and sql is not self._executed:
+            # 与 mysql.connector 相同：按对象身份判断是否重新预处理
+            self._executed = sql
+            self.conn.server_prepares += 1
+        self._cur.execute(sql.replace('%s', '?'), tuple(params))
+        self.rowcount = self._cur.rowcount
+        self.column_names = tuple(d[0] for d in self._cur.description or ())
+
+    def executemany(self, sql, seq_params):
+        self._cur.executemany(sql.replace('%s', '?'), list(seq_params))
+        self.rowcount = self._cur.rowcount
+
+    def fetchall(self):
+        return self._cur.fetchall()
+
+    def close(self):
+        self._cur.close()
+
+
+class FakeConnection:
+    """模拟 mysql.connector 连接（数据存放在同一个 SQLite 文件中）"""
+
+    opened = []
+
+    def __init__(self, database, **config):
+        self.db = sqlite3.connect(database, check_same_thread=False)
+        self.closed = False
+        self.prepared_cursors = 0
+        self.server_prepares = 0
+        FakeConnection.opened.append(self)
+
+    def cursor(self, prepared=False, **kwargs):
+        self.prepared_cursors += prepared
+        return FakeCursor(self, prepared)
+
+    @property
+    def in_transaction(self):
+        return self.db.in_transaction
+
+    def ping(self, reconnect=False):
+        if self.closed:
+            raise Error('MySQL server has gone away')
+
+    def commit(self):
+        self.db.commit()
+
+    def rollback(self):
+        if self.closed:
+            raise Error('Lost connection to MySQL server')
+        self.db.rollback()
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def pool(tmp_path):
+    database = str(tmp_path / 'standin.db')
+    db = sqlite3.connect(database)
+    db.executescript("""
+        CREATE TABLE questionnaire_templates (id TEXT PRIMARY KEY, level TEXT, name TEXT, description TEXT,
+                                              total_questions INT, status TEXT, source_file TEXT);
+        CREATE TABLE questionnaire_template_questions (id TEXT PRIMARY KEY, template_id TEXT, seq_no TEXT,
+            level1 TEXT, level2 TEXT, question_text TEXT, question_type TEXT, score REAL, applicable TEXT,
+            remarks TEXT, requires_file INT, sort_order INT);
+        INSERT INTO questionnaire_templates VALUES ('t1', '初级', '初级问卷', '', 2, 'active', 'a.docx');
+        INSERT INTO questionnaire_template_questions VALUES ('q1', 't1', '1', '治理', '', '问题一', '单选', 2, '', '', 0, 1);
+        INSERT INTO questionnaire_template_questions VALUES ('q2', 't1', '2', '治理', '', '问题二', '单选', 3, '', '', 1, 2);
+    """)
+    db.commit()
+    db.close()
+    FakeConnection.opened = []
+    return MySQLPool({'database': database}, size=2, timeout=0.2, connect=FakeConnection)
+
+
+def test_connections_and_statements_are_reused(pool):
+    for _ in range(5):
+        # 每次构造新的（相等的）SQL 字符串
+        sql = ' '.join(['SELECT * FROM questionnaire_templates', 'WHERE level=%s'])
+        row = pool.fetch_one(sql, ('初级',))
+        assert row['id'] == 't1' and row['name'] == '初级问卷'
+    stats = pool.stats()
+    assert stats['connections_created'] == 1 and stats['acquired'] == 5
+    assert stats['statements_prepared'] == 1 and stats['statements_reused'] == 4
+    assert FakeConnection.opened[0].server_prepares == 1
+    assert (stats['open'], stats['idle'], stats['in_use']) == (1, 1, 0)
+
+
+def test_pool_exhaustion_times_out(pool):
+    with pool.connection(), pool.connection():
+        with pytest.raises(PoolTimeout):
+            pool.acquire()
+    assert pool.stats()['timeouts'] == 1
+
+    # 归还后等待中的线程拿到连接
+    held = pool.acquire()
+    other = pool.acquire()
+    results = []
+    waiter = threading.Thread(target=lambda: results.append(pool.fetch_one('SELECT 1 AS one')))
+    waiter.start()
+    pool.release(held)
+    waiter.join(2)
+    pool.release(other)
+    assert results == [{'one': 1}]
+    assert pool.stats()['connections_created'] == 2
+
+
+def test_health_check_replaces_dead_connection(pool):
+    pool.health_check_interval = 0
+    pool.fetch_one('SELECT 1')
+    FakeConnection.opened[0].closed = True  # 服务器断开
+    assert pool.fetch_one('SELECT 2 AS two') == {'two': 2}
+    stats = pool.stats()
+    assert stats['health_check_failures'] == 1 and stats['connections_created'] == 2
+    assert stats['open'] == 1
+
+
+def test_uncommitted_writes_are_rolled_back_on_release(pool):
+    with pool.connection() as conn:
+        conn.execute("UPDATE questionnaire_templates SET name=%s WHERE id=%s", ('未提交', 't1'))
+    assert pool.fetch_one("SELECT name FROM questionnaire_templates")['name'] == '初级问卷'
+
+    with pool.transaction() as conn:
+        conn.execute("UPDATE questionnaire_templates SET name=%s WHERE id=%s", ('已提交', 't1'))
+    assert pool.fetch_one("SELECT name FROM questionnaire_templates")['name'] == '已提交'
+
+    with pytest.raises(ValueError):
+        with pool.transaction() as conn:
+            conn.execute("UPDATE questionnaire_templates SET name=%s WHERE id=%s", ('出错', 't1'))
+            raise ValueError('中途失败')
+    assert pool.fetch_one("SELECT name FROM questionnaire_templates")['name'] == '已提交'
+
+
+def test_survey_api_shares_one_connection(pool, monkeypatch):
+    """问卷页面的多次查询复用同一连接"""
+    monkeypatch.setattr(questionnaire_management_api, 'get_pool', lambda: pool)
+    monkeypatch.setattr(questionnaire_management_api.template_cache, 'ttl', 0)
+    app = Flask(__name__)
+    app.register_blueprint(questionnaire_management_api.questionnaire_bp)
+    client = app.test_client()
+
+    for _ in range(3):
+        data = client.get('/api/questionnaire/survey/level/初级').get_json()
+        assert data['survey']['id'] == 't1'
+        assert [q['score'] for q in data['questions']] == [2.0, 3.0]
+        assert data['questions'][1]['requires_file'] is True
+    assert client.get('/api/questionnaire/survey/t1').get_json()['total_questions'] == 2
+    assert client.get('/api/questionnaire/surveys').get_json()['total'] == 1
+
+    stats = pool.stats()
+    assert stats['connections_created'] == 1
+    assert stats['acquired'] == 3 * 2 + 2 + 1
+
+
+def test_get_pool_is_shared_per_config():
+    config = {'host': 'db.example', 'database': 'x'}
+    try:
+        assert mysql_pool.get_pool(config) is mysql_pool.get_pool(dict(config))
+        assert mysql_pool.get_pool(config) is not mysql_pool.get_pool({'host': 'other'})
+    finally:
+        mysql_pool.close_pools()
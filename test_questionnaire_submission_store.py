@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+"""
+测试问卷填报记录分片存储（questionnaire_submission_store）与填报接口
+"""
+import io
+import json
+import os
+
+import pytest
+from flask import Flask
+
+import questionnaire_management_api as api
+from docx_questionnaire_importer import DocxQuestionnaireImporter
+from file_upload_handler import FileUploadHandler
+import questionnaire_submission_store
+from questionnaire_submission_store import RevisionConflict, SubmissionStore
+from questionnaire_template_cache import TemplateCache
+
+
+def _submission(submission_id, enterprise_id='e1'):
+    return {'id': submission_id, 'enterprise_id': enterprise_id, 'survey_id': 's1',
+            'status': 'draft', 'created_at': '2024-01-01T00:00:00', 'updated_at': '2024-01-01T00:00:00'}
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SubmissionStore(str(tmp_path / 'submissions'))
+
+
+def test_patch_only_writes_changed_answers(store):
+    store.create(_submission('sub-0001'), answers={'q1': 'A', 'q2': 'B'})
+    path = store.record_path('sub-0001')
+    mtime = os.stat(path).st_mtime_ns
+
+    record, changed = store.patch_answers('sub-0001', {'q1': 'A', 'q2': 'B'})
+    assert changed == [] and os.stat(path).st_mtime_ns == mtime
+    assert not os.path.exists(store.log_path('sub-0001'))
+
+    record, changed = store.replace_answers('sub-0001', {'q1': 'A', 'q3': 'C'})
+    assert sorted(changed) == ['q2', 'q3']
+    assert record['answers'] == {'q1': 'A', 'q3': 'C'}
+    assert record['submission']['updated_at'] != '2024-01-01T00:00:00'
+    # 增量只追加到日志，快照不变；另一个实例读取时重放日志
+    assert os.stat(path).st_mtime_ns == mtime
+    with open(store.log_path('sub-0001'), encoding='utf-8') as f:
+        entry = json.loads(f.readline())
+    assert entry['rev'] == 1 and entry['set'] == {'q3': 'C'} and entry['removed'] == ['q2']
+    assert SubmissionStore(store.base_dir).load('sub-0001')['answers'] == {'q1': 'A', 'q3': 'C'}
+
+    record, changed = store.replace_answers('sub-0001', {'q1': 'A', 'q3': 'C'}, extra={'status': 'submitted'})
+    assert changed == [] and store.get('sub-0001')['status'] == 'submitted'
+
+
+def test_delta_revisions_and_conflicts(store):
+    store.create(_submission('sub-0001'))
+    record, _ = store.patch_answers('sub-0001', {'q1': 'A', 'q2': 'B'}, base_revision=0)
+    assert record['revision'] == 1
+
+    # 标签页 1 基于版本 1 修改 q1
+    record, _ = store.patch_answers('sub-0001', {'q1': 'A1'}, base_revision=1)
+    assert record['revision'] == 2 and record['answer_revisions'] == {'q1': 2, 'q2': 1}
+
+    # 标签页 2 仍基于版本 1：修改其他题目自动合并，改成相同值也不算冲突
+    record, changed = store.patch_answers('sub-0001', {'q2': 'B2', 'q1': 'A1'}, base_revision=1)
+    assert changed == ['q2'] and record['revision'] == 3
+
+    # 同一道题改成不同的值 → 冲突，不写入
+    with pytest.raises(RevisionConflict) as info:
+        store.patch_answers('sub-0001', {'q1': 'X', 'q3': 'C'}, base_revision=1)
+    assert info.value.revision == 3 and info.value.conflicts == {'q1': 'A1'}
+    assert info.value.remote_changes == {'q1': 'A1', 'q2': 'B2'}
+    with pytest.raises(RevisionConflict) as info:
+        store.patch_answers('sub-0001', {}, removed=['q2'], base_revision=2)
+    assert info.value.conflicts == {'q2': 'B2'}
+    assert store.load('sub-0001')['answers'] == {'q1': 'A1', 'q2': 'B2'}
+
+
+def test_log_compacts_into_snapshot(store, monkeypatch):
+    monkeypatch.setattr(questionnaire_submission_store, 'LOG_COMPACT_EVERY', 4)
+    store.create(_submission('sub-0001'))
+    for n in range(3):
+        store.patch_answers('sub-0001', {'q1': n})
+    with open(store.log_path('sub-0001'), encoding='utf-8') as f:
+        assert len(f.readlines()) == 3
+
+    store.patch_answers('sub-0001', {'q2': 'x'})
+    assert not os.path.exists(store.log_path('sub-0001'))
+    with open(store.record_path('sub-0001'), encoding='utf-8') as f:
+        snapshot = json.load(f)
+    assert snapshot['revision'] == 4 and snapshot['answers'] == {'q1': 2, 'q2': 'x'}
+
+    # 崩溃留下的半行日志被忽略
+    store.patch_answers('sub-0001', {'q3': 'y'})
+    with open(store.log_path('sub-0001'), 'a', encoding='utf-8') as f:
+        f.write('{"rev": 6, "set": {"q3"')
+    record = store.load('sub-0001')
+    assert record['revision'] == 5 and record['answers']['q3'] == 'y'
+    store.patch_answers('sub-0001', {'q4': 'z'})
+    assert not os.path.exists(store.log_path('sub-0001'))
+    assert store.load('sub-0001')['answers'] == {'q1': 2, 'q2': 'x', 'q3': 'y', 'q4': 'z'}
+
+
+def test_enterprise_index_and_invalid_ids(store):
+    store.create(_submission('sub-0001', 'e1'))
+    store.create(_submission('sub-0002', 'e2'))
+    store.create(_submission('sub-0003', 'e1'))
+    assert [s['id'] for s in store.list_by_enterprise('e1')] == ['sub-0001', 'sub-0003']
+    assert store.list_by_enterprise('e3') == []
+
+    assert store.load('../../etc/passwd') is None
+    assert store.patch_answers('../sub-0001', {'q1': 'x'}) == (None, [])
+    with pytest.raises(ValueError):
+        store.create(_submission('../escape'))
+
+
+def test_import_legacy_keeps_existing_records(store):
+    store.create(_submission('sub-0001'), answers={'q1': '新'})
+    legacy = {
+        'submissions': [_submission('sub-0001'), _submission('sub-0002', 'e2')],
+        'answers': {'sub-0001': {'q1': '旧'}, 'sub-0002': {'q9': 'Y'}},
+        'attachments': {'sub-0002': [{'id': 'a1', 'question_id': 'q9'}]},
+    }
+    assert store.import_legacy(legacy) == 1
+    assert store.load('sub-0001')['answers'] == {'q1': '新'}
+    record = store.load('sub-0002')
+    assert record['answers'] == {'q9': 'Y'} and record['attachments'][0]['id'] == 'a1'
+    assert [s['id'] for s in store.list_by_enterprise('e2')] == ['sub-0002']
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    importer = DocxQuestionnaireImporter(db_path=str(tmp_path / 'questionnaires.json'))
+    importer.save_db({
+        'surveys': [{'id': 's1', 'name': '初级问卷', 'level': '初级', 'status': 'active'}],
+        'questions': [{'id': f'q{i}', 'survey_id': 's1', 'question_text': f'问题{i}',
+                       'requires_file': False} for i in range(3)],
+        'submissions': [_submission('legacy-0001')],
+        'answers': {'legacy-0001': {'q0': '旧答案'}},
+    })
+    monkeypatch.setattr(api, 'importer', importer)
+    monkeypatch.setattr(api, 'template_cache', TemplateCache(ttl=300))
+    monkeypatch.setattr(api, 'get_pool', lambda: (_ for _ in ()).throw(ConnectionError('MySQL 不可用')))
+    monkeypatch.setattr(api, 'submission_store', SubmissionStore(str(tmp_path / 'submissions')))
+
+    app = Flask(__name__)
+    app.secret_key = 'test'
+    app.register_blueprint(api.questionnaire_bp)
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess.update(user_id='u1', user_type='enterprise', enterprise_id='e1')
+    client.importer = importer
+    return client
+
+
+def test_submission_api_round_trip(client):
+    # 旧数据首次访问时迁移，并从 questionnaires.json 中移除
+    listed = client.get('/api/questionnaire/submissions/list').get_json()
+    assert [s['id'] for s in listed['submissions']] == ['legacy-0001']
+    assert 'submissions' not in client.importer.load_db()
+    assert client.importer.load_db()['surveys'][0]['id'] == 's1'
+    assert client.get('/api/questionnaire/submission/legacy-0001').get_json()['answers'] == {'q0': '旧答案'}
+
+    submission_id = client.post('/api/questionnaire/submission/create',
+                                json={'survey_level': '初级'}).get_json()['submission_id']
+    saved = client.post(f'/api/questionnaire/submission/{submission_id}/save',
+                        json={'answers': {'q0': 'A', 'q1': 'B'}}).get_json()
+    assert saved['changed'] == 2
+    again = client.post(f'/api/questionnaire/submission/{submission_id}/save',
+                        json={'answers': {'q0': 'A', 'q1': 'B'}}).get_json()
+    assert again['changed'] == 0
+
+    submitted = client.post(f'/api/questionnaire/submission/{submission_id}/submit',
+                            json={'answers': {'q0': 'A'}}).get_json()
+    assert submitted['success']
+    detail = client.get(f'/api/questionnaire/submission/{submission_id}').get_json()
+    assert detail['answers'] == {'q0': 'A'}
+    assert detail['submission']['status'] == 'submitted'
+    assert detail['submission']['submitted_at'] == submitted['submitted_at']
+    assert client.get('/api/questionnaire/submissions/list').get_json()['total'] == 2
+
+    # 其他企业无权访问
+    with client.session_transaction() as sess:
+        sess['enterprise_id'] = 'e2'
+    assert client.get(f'/api/questionnaire/submission/{submission_id}').status_code == 403
+    assert client.get('/api/questionnaire/submission/not-a-submission').status_code == 404
+
+
+def test_draft_patch_api(client):
+    submission_id = client.post('/api/questionnaire/submission/create',
+                                json={'survey_level': '初级'}).get_json()['submission_id']
+    url = f'/api/questionnaire/submission/{submission_id}/draft'
+
+    tab1 = client.patch(url, json={'revision': 0, 'changes': {'q0': 'A', 'q1': 'B'}}).get_json()
+    assert tab1['revision'] == 1 and sorted(tab1['changed']) == ['q0', 'q1'] and tab1['remote_changes'] == {}
+
+    # 标签页 2 基于版本 0 修改另一题：自动合并，并拿到标签页 1 的修改
+    tab2 = client.patch(url, json={'revision': 0, 'changes': {'q2': 'C'}}).get_json()
+    assert tab2['revision'] == 2 and tab2['remote_changes'] == {'q0': 'A', 'q1': 'B'}
+
+    # 标签页 2 基于版本 0 修改 q0 → 冲突
+    conflict = client.patch(url, json={'revision': 0, 'changes': {'q0': 'X'}})
+    assert conflict.status_code == 409
+    assert conflict.get_json()['conflicts'] == {'q0': 'A'} and conflict.get_json()['revision'] == 2
+    # 基础版本之后的全部修改（含本次未涉及的题目）一并返回，客户端合并后才推进版本号
+    assert conflict.get_json()['remote_changes'] == {'q0': 'A', 'q1': 'B', 'q2': 'C'}
+
+    cleared = client.patch(url, json={'revision': 2, 'changes': {}, 'removed': ['q1']}).get_json()
+    assert cleared['revision'] == 3 and cleared['changed'] == ['q1']
+    detail = client.get(f'/api/questionnaire/submission/{submission_id}').get_json()
+    assert detail['answers'] == {'q0': 'A', 'q2': 'C'} and detail['revision'] == 3
+
+    assert client.patch(url, json={'changes': {'q0': 'A'}}).status_code == 400
+    client.post(f'/api/questionnaire/submission/{submission_id}/submit', json={'answers': detail['answers']})
+    assert client.patch(url, json={'revision': 3, 'changes': {'q0': 'B'}}).status_code == 409
+
+
+def test_reupload_same_attachment_is_recorded_once(client, tmp_path, monkeypatch):
+    """同一问题重复上传相同内容：返回已登记的附件，提交中只记录一次"""
+    monkeypatch.setattr(api, 'upload_handler', FileUploadHandler(str(tmp_path / 'uploads')))
+    submission_id = client.post('/api/questionnaire/submission/create',
+                                json={'survey_level': '初级'}).get_json()['submission_id']
+    url = f'/api/questionnaire/submission/{submission_id}/upload'
+
+    def upload(question_id, data):
+        return client.post(url, data={'question_id': question_id, 'file': (io.BytesIO(data), '执照.pdf')},
+                           content_type='multipart/form-data')
+
+    first = upload('q0', b'%PDF license')
+    assert first.status_code == 201
+    again = upload('q0', b'%PDF license')
+    assert again.status_code == 200
+    assert again.get_json()['attachment'] == first.get_json()['attachment']
+    assert upload('q1', b'%PDF license').status_code == 201
+
+    attachments = api.submission_store.load(submission_id)['attachments']
+    assert [a['question_id'] for a in attachments] == ['q0', 'q1']
+    # 存储层同样按 id 去重（并发上传时两个请求都可能走到登记）
+    api.submission_store.add_attachment(submission_id, dict(attachments[0]))
+    assert len(api.submission_store.load(submission_id)['attachments']) == 2
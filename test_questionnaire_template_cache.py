@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""
+测试问卷模板读穿缓存（questionnaire_template_cache）与问卷接口的 ETag/304
+"""
+import pytest
+from flask import Flask
+
+import questionnaire_management_api as api
+from docx_questionnaire_importer import DocxQuestionnaireImporter
+from questionnaire_submission_store import SubmissionStore
+from questionnaire_template_cache import TemplateCache
+
+
+class CountingImporter(DocxQuestionnaireImporter):
+    """统计 JSON 读取次数的导入器"""
+
+    loads = 0
+
+    def load_db(self):
+        CountingImporter.loads += 1
+        return super().load_db()
+
+
+def _unavailable_pool():
+    raise ConnectionError('MySQL 不可用')
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    importer = CountingImporter(db_path=str(tmp_path / 'questionnaires.json'))
+    importer.save_db({
+        'surveys': [{'id': 's1', 'name': '初级问卷', 'level': '初级', 'status': 'active'}],
+        'questions': [{'id': f'q{i}', 'survey_id': 's1', 'question_text': f'问题{i}',
+                       'requires_file': i == 0} for i in range(3)],
+        'submissions': []
+    })
+    cache = TemplateCache(ttl=300)
+    monkeypatch.setattr(api, 'importer', importer)
+    monkeypatch.setattr(api, 'template_cache', cache)
+    monkeypatch.setattr('docx_questionnaire_importer.template_cache', cache)
+    monkeypatch.setattr(api, 'get_pool', _unavailable_pool)
+    monkeypatch.setattr(api, 'submission_store', SubmissionStore(str(tmp_path / 'submissions')))
+
+    app = Flask(__name__)
+    app.secret_key = 'test'
+    app.register_blueprint(api.questionnaire_bp)
+    client = app.test_client()
+    client.importer = importer
+    client.cache = cache
+    return client
+
+
+def test_template_served_from_cache_with_etag(client):
+    first = client.get('/api/questionnaire/survey/level/初级')
+    assert first.status_code == 200 and first.headers['ETag']
+    loads = CountingImporter.loads
+    second = client.get('/api/questionnaire/survey/level/初级')
+    assert second.get_json() == first.get_json()
+    assert CountingImporter.loads == loads
+    assert client.cache.stats()['hits'] == 1
+
+    not_modified = client.get('/api/questionnaire/survey/level/初级',
+                              headers={'If-None-Match': first.headers['ETag']})
+    assert not_modified.status_code == 304 and not_modified.data == b''
+
+    by_id = client.get('/api/questionnaire/survey/s1')
+    assert by_id.headers['ETag'] == first.headers['ETag']
+
+
+def test_delete_bumps_generation(client):
+    client.get('/api/questionnaire/survey/s1')
+    generation = client.cache.generation
+    assert client.delete('/api/questionnaire/survey/s1/delete').status_code == 200
+    assert client.cache.generation == generation + 1
+    assert client.get('/api/questionnaire/survey/s1').status_code == 404
+
+
+def test_ttl_expiry_reloads(client):
+    client.cache.ttl = 0
+    client.get('/api/questionnaire/survey/s1')
+    client.get('/api/questionnaire/survey/s1')
+    assert client.cache.stats()['misses'] == 2
+
+
+def test_submission_endpoints_use_cached_template(client):
+    with client.session_transaction() as sess:
+        sess.update(user_id='u1', user_type='enterprise', enterprise_id='e1')
+    created = client.post('/api/questionnaire/submission/create', json={'survey_level': '初级'}).get_json()
+    assert created['survey']['id'] == 's1' and len(created['questions']) == 3
+
+    submission_id = created['submission_id']
+    detail = client.get(f'/api/questionnaire/submission/{submission_id}').get_json()
+    assert [q['id'] for q in detail['questions']] == ['q0', 'q1', 'q2']
+
+    # 必须上传文件的题目未作答时拒绝提交
+    rejected = client.post(f'/api/questionnaire/submission/{submission_id}/submit', json={'answers': {}})
+    assert rejected.status_code == 400
+    stats = client.cache.stats()
+    assert stats['misses'] == 2 and stats['hits'] == 1
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""
+测试报告目录（report_engine.catalog）：登记、筛选排序、游标分页与目录对账
+"""
+import hashlib
+import os
+import time
+
+import pytest
+
+import batch_report_renderer
+from report_engine.catalog import ReportCatalog, main, parse_report_filename
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    reports = tmp_path / 'reports'
+    reports.mkdir()
+    return ReportCatalog(str(tmp_path / 'catalog.sqlite3'), str(reports))
+
+
+def write_report(catalog, filename, size, mtime):
+    path = os.path.join(catalog.reports_dir, filename)
+    with open(path, 'wb') as f:
+        f.write(b'x' * size)
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+def test_parse_report_filename():
+    assert parse_report_filename('专业报告_今麦郎_20251126_013257.docx') == \
+        {'report_type': 'professional', 'format': 'Word', 'enterprise': '今麦郎'}
+    assert parse_report_filename('专业评价报告_北京_某某有限公司_20240101_080000.pdf') == \
+        {'report_type': 'pdf', 'format': 'PDF', 'enterprise': '北京_某某有限公司'}
+    assert parse_report_filename('自评报告_企业A.docx')['enterprise'] == '企业A'
+
+
+def test_record_and_query_with_cursor_pagination(catalog):
+    for i in range(23):
+        path = write_report(catalog, f'专业报告_企业{i % 4}_20240101_{i:06d}.docx', 100 + i % 5, 1_700_000_000 + i)
+        catalog.record(path, submission=f'submission_企业{i % 4}.json', report_type='professional')
+    entry = catalog.get('专业报告_企业0_20240101_000000.docx')
+    assert entry['enterprise'] == '企业0' and entry['size'] == 100 and entry['source'] == 'generator'
+    assert entry['checksum'] == hashlib.sha256(b'x' * 100).hexdigest()
+
+    # 按大小升序翻页，拼接结果与整体排序一致（大小相同时按文件名）
+    seen, cursor = [], None
+    while True:
+        page = catalog.query(sort='size', order='asc', limit=5, cursor=cursor)
+        seen.extend(page['items'])
+        cursor = page['next_cursor']
+        if cursor is None:
+            break
+    assert len(seen) == 23
+    assert [(r['size'], r['filename']) for r in seen] == sorted((r['size'], r['filename']) for r in seen)
+
+    page = catalog.query(enterprise='企业1', limit=100)
+    assert [r['created_at'] for r in page['items']] == sorted((r['created_at'] for r in page['items']), reverse=True)
+    assert len(page['items']) == 6 and page['next_cursor'] is None
+    assert len(catalog.query(created_from=1_700_000_020, limit=100)['items']) == 3
+    assert len(catalog.query(q='_2024', fmt='Word', report_type='professional', limit=100)['items']) == 23
+    assert catalog.query(q='%')['items'] == []
+    with pytest.raises(ValueError):
+        catalog.query(sort='checksum')
+    with pytest.raises(ValueError):
+        catalog.query(cursor='not-a-cursor')
+
+
+def test_reconcile_picks_up_outside_changes(catalog):
+    recorded = write_report(catalog, '自评报告_企业A_20240101_080000.docx', 10, 1_700_000_000)
+    catalog.record(recorded)
+    write_report(catalog, '专业报告_企业B_20240102_080000.docx', 20, 1_700_100_000)   # 目录外写入
+    write_report(catalog, '自评报告_企业A_20240101_080000.docx', 30, 1_700_200_000)   # 被覆盖
+    stale = write_report(catalog, '专业评价报告_企业C_20240103_080000.pdf', 5, 1_700_300_000)
+    catalog.record(stale)
+    os.remove(stale)                                                                   # 被删除
+
+    assert catalog.reconcile() == {'added': 1, 'updated': 1, 'removed': 1}
+    assert catalog.get('专业报告_企业B_20240102_080000.docx')['source'] == 'reconciler'
+    assert catalog.get('自评报告_企业A_20240101_080000.docx')['size'] == 30
+    assert catalog.reconcile() == {'added': 0, 'updated': 0, 'removed': 0}
+    assert catalog.reconcile_if_stale(3600) is None
+
+    os.remove(recorded)
+    assert main(['reconcile', '--db', catalog.db_path, '--reports-dir', catalog.reports_dir]) == 0
+    assert catalog.count() == 1
+
+
+
+def test_background_reconciler_runs_at_start(catalog):
+    """对账在后台线程进行：启动即对账一次，请求路径只查询目录"""
+    write_report(catalog, '专业报告_企业B_20240102_080000.docx', 20, 1_700_100_000)
+    catalog.start_reconciler(3600)
+    catalog.start_reconciler(3600)   # 幂等
+    thread = catalog._reconciler
+    try:
+        deadline = time.time() + 5
+        while catalog.count() == 0 and time.time() < deadline:
+            time.sleep(0.01)
+        assert catalog.count() == 1
+        assert catalog.reconcile_if_stale(3600) is None
+    finally:
+        catalog.stop_reconciler()
+    assert not thread.is_alive()
+
+def test_rendered_reports_are_recorded(catalog, tmp_path, monkeypatch):
+    monkeypatch.setitem(batch_report_renderer.REPORT_FORMATS, 'fake',
+                        ('test_report_jobs', 'FakeGenerator', '专业报告_{base}.txt'))
+    monkeypatch.setattr(batch_report_renderer, '_worker_generators', {})
+    source = tmp_path / 'submission_企业D_20240105_101010.json'
+    source.write_text('{}', encoding='utf-8')
+    result = batch_report_renderer._render_item({'key': 'k', 'source_path': str(source), 'formats': ['fake'],
+                                                 'output_dir': catalog.reports_dir, 'catalog': catalog.db_path})
+    assert result['status'] == 'done'
+    entry = catalog.get('专业报告_企业D_20240105_101010.txt')
+    assert entry['enterprise'] == '企业D' and entry['report_type'] == 'fake'
+    assert entry['submission'] == source.name
+
+
+def test_all_reports_endpoint_queries_catalog(catalog, monkeypatch):
+    app_module = pytest.importorskip('app')
+    monkeypatch.setattr(app_module, '_report_catalog', catalog)
+    for i in range(3):
+        write_report(catalog, f'专业报告_企业{i}_20240101_08000{i}.docx', 10 * (i + 1), 1_700_000_000 + i)
+    catalog.reconcile()   # 由后台对账线程完成
+    client = app_module.app.test_client()
+
+    data = client.get('/api/portal/chamber/all-reports?limit=2&sort=size').get_json()
+    assert [r['file_size'] for r in data['reports']] == [30, 20]
+    assert data['reports'][0]['enterprise_name'] == '企业2' and data['reports'][0]['type'] == 'Word'
+    data = client.get(f"/api/portal/chamber/all-reports?limit=2&sort=size&cursor={data['next_cursor']}").get_json()
+    assert [r['file_size'] for r in data['reports']] == [10] and data['next_cursor'] is None
+    assert client.get('/api/portal/chamber/all-reports?sort=bad').status_code == 400
+
+    # 请求内不扫描报告目录：目录外新写入的文件等下次对账后才出现
+    write_report(catalog, '专业报告_企业9_20240101_080009.docx', 5, 1_700_000_009)
+    catalog._reconciled_at = 0
+    assert len(client.get('/api/portal/chamber/all-reports').get_json()['reports']) == 3
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""
+测试异步报告生成任务队列（report_engine.jobs）
+"""
+import os
+import time
+
+import pytest
+
+import batch_report_renderer
+from report_engine.jobs import ReportJobError, ReportJobQueue, report_artifact_path
+
+
+class FakeGenerator:
+    """替代真实报告生成器：提交文件名含“坏”时报错，含“慢”时先失败一次再成功"""
+
+    failures = {}
+
+    def generate_report(self, source, output_path=None):
+        name = os.path.basename(source)
+        if '坏' in name:
+            raise ValueError('问卷格式错误')
+        if '慢' in name and not FakeGenerator.failures.get(name):
+            FakeGenerator.failures[name] = True
+            raise IOError('暂时不可用')
+        with open(output_path, 'w', encoding='utf-8') as f:
+            f.write(name)
+        return output_path
+
+
+@pytest.fixture
+def queue(tmp_path, monkeypatch):
+    monkeypatch.setitem(batch_report_renderer.REPORT_FORMATS, 'fake',
+                        (__name__, 'FakeGenerator', '报告_{base}.txt'))
+    monkeypatch.setattr(batch_report_renderer, '_worker_generators', {})
+    FakeGenerator.failures = {}
+    submissions = tmp_path / 'submissions'
+    submissions.mkdir()
+    for name in ('企业A', '坏企业', '慢企业'):
+        (submissions / f'submission_{name}.json').write_text('{}', encoding='utf-8')
+    completed = []
+    q = ReportJobQueue(str(tmp_path / 'jobs.sqlite3'), str(submissions), str(tmp_path / 'reports'),
+                       workers=0, max_attempts=2, backoff_base=0.05, poll_interval=0.02,
+                       on_complete=completed.append)
+    q.completed = completed
+    yield q
+    q.stop()
+
+
+def test_job_runs_to_done(queue):
+    """入队后立即返回 queued，后台生成后状态为 done 并记录报告路径"""
+    job = queue.enqueue('submission_企业A.json', 'fake', recipient='a@example.com')
+    assert job['status'] == 'queued' and job['attempts'] == 0
+    queue.ensure_started()
+    assert queue.wait_idle(10)
+
+    job = queue.get(job['id'])
+    assert job['status'] == 'done' and job['attempts'] == 1
+    assert report_artifact_path(job).endswith('报告_企业A.txt')
+    assert [j['id'] for j in queue.completed] == [job['id']]
+    assert queue.completed[0]['recipient'] == 'a@example.com'
+
+
+def test_retry_with_backoff_then_fail(queue):
+    """失败后退避重试，超过最大次数置为 failed 并保留错误信息"""
+    flaky = queue.enqueue('submission_慢企业.json', 'fake')
+    broken = queue.enqueue('submission_坏企业.json', 'fake')
+    queue.ensure_started()
+    assert queue.wait_idle(10)
+
+    flaky = queue.get(flaky['id'])
+    assert flaky['status'] == 'done' and flaky['attempts'] == 2
+    broken = queue.get(broken['id'])
+    assert broken['status'] == 'failed' and broken['attempts'] == 2
+    assert '问卷格式错误' in broken['error']
+    assert report_artifact_path(broken) is None
+
+
+def test_enqueue_validation_and_dedupe(queue):
+    """未知格式、路径穿越、不存在的提交拒绝入队；排队中的相同任务不重复创建"""
+    with pytest.raises(ReportJobError):
+        queue.enqueue('submission_企业A.json', 'excel')
+    with pytest.raises(ReportJobError):
+        queue.enqueue('../submission_企业A.json', 'fake')
+    with pytest.raises(ReportJobError):
+        queue.enqueue('submission_不存在.json', 'fake')
+
+    first = queue.enqueue('submission_企业A.json', 'fake')
+    second = queue.enqueue('submission_企业A.json', 'fake', recipient='b@example.com')
+    assert second['id'] == first['id'] and second['recipient'] == 'b@example.com'
+    assert len(queue.list_jobs(['queued'])) == 1
+
+
+def test_stale_running_job_is_requeued(queue):
+    """进程异常退出遗留的 running 任务在重启后重新执行"""
+    job = queue.enqueue('submission_企业A.json', 'fake')
+    queue._claim_due(1)
+    queue._update(job['id'], started_at=time.time() - queue.stale_after - 1)
+    assert queue.get(job['id'])['status'] == 'running'
+
+    queue.ensure_started()
+    assert queue.wait_idle(10)
+    assert queue.get(job['id'])['status'] == 'done'
+
+
+def test_app_starts_dispatcher_at_startup():
+    """应用启动即开始调度，重启前遗留的任务不必等新任务入队"""
+    app_module = pytest.importorskip('app')
+    if os.environ.get('REPORT_JOBS_AUTOSTART', '1') == '0':
+        pytest.skip('已关闭自动启动')
+    thread = app_module._report_jobs._thread
+    assert thread is not None and thread.is_alive()
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+测试计分结果持久化缓存（score_cache）
+"""
+import glob
+import json
+import os
+import shutil
+
+import pytest
+
+from score_cache import ScoreCache
+from score_calculator import ScoreCalculator
+from test_score_calculator_parity import _assert_identical
+
+
+@pytest.fixture
+def calculator(tmp_path):
+    calc = ScoreCalculator('指标体系.xlsx')
+    calc.score_cache = ScoreCache(str(tmp_path / 'score_cache.sqlite3'))
+    return calc
+
+
+@pytest.fixture
+def questionnaire(tmp_path):
+    files = sorted(glob.glob('storage/submissions/*.xlsx'))
+    if not files:
+        pytest.skip('没有已提交的问卷')
+    path = str(tmp_path / '问卷_测试企业.xlsx')
+    shutil.copy(files[0], path)
+    return path
+
+
+def test_cached_summary_is_identical(calculator, questionnaire):
+    """命中缓存时返回的结果与重新计分逐位一致，且不再解析Excel"""
+    expected = calculator.calculate_total_score(calculator.parse_questionnaire(questionnaire))
+    _assert_identical(calculator.get_score_summary(questionnaire), expected)
+    assert len(calculator.score_cache) == 1
+
+    calculator.parse_questionnaire = None  # 命中缓存时不应再被调用
+    _assert_identical(calculator.get_score_summary(questionnaire), expected)
+    batch = calculator.score_many([questionnaire])
+    _assert_identical(batch['results'][0]['score_summary'], expected)
+    assert batch['level1_matrix'].shape[0] == 1
+
+
+def test_changed_answers_rescore(calculator, questionnaire):
+    """问卷内容变化后重新计分"""
+    calculator.get_score_summary(questionnaire)
+    with open(questionnaire, 'ab') as f:
+        f.write(b'\0')  # 改变文件内容哈希（xlsx 为 zip，末尾追加字节仍可读取）
+    calculator.get_score_summary(questionnaire)
+    assert len(calculator.score_cache) == 2
+
+
+def test_indicator_version_is_part_of_key(calculator, questionnaire):
+    """指标体系版本变化时旧缓存不再命中"""
+    calculator.get_score_summary(questionnaire)
+    calculator.indicator_version = 'changed'
+    assert calculator.score_cache.get_many([calculator._cache_key(questionnaire)]) == {}
+    calculator.get_score_summary(questionnaire)
+    assert len(calculator.score_cache) == 2
+
+
+def test_score_many_mixes_hits_and_misses(calculator, questionnaire):
+    """批量计分时部分命中缓存，结果顺序与输入一致"""
+    files = sorted(glob.glob('storage/submissions/*.xlsx'))[:3]
+    calculator.score_many(files[:1])
+    batch = calculator.score_many(files + ['不存在的文件.xlsx'])
+    assert [r['source'] for r in batch['results']] == files
+    assert len(batch['errors']) == 1
+    assert len(calculator.score_cache) == len(set(files))
+
+
+def test_submission_json_is_cached(calculator):
+    """在线提交的JSON按计分相关字段哈希缓存"""
+    for path in sorted(glob.glob('storage/submissions/submission_*.json')):
+        with open(path, 'r', encoding='utf-8') as f:
+            submission = json.load(f)
+        if submission.get('questions_snapshot'):
+            break
+    else:
+        pytest.skip('没有带题目快照的提交')
+    first = calculator.score_many([submission])['results'][0]['score_summary']
+    key = calculator._cache_key(submission)
+    assert calculator.score_cache.get(key) is not None
+    submission['username'] = '其他用户'  # 与计分无关的字段不影响缓存键
+    assert calculator._cache_key(submission) == key
+    _assert_identical(calculator.score_many([submission])['results'][0]['score_summary'], first)
+
+
+def test_changed_scores_miss_cache(calculator):
+    """只修改 scores（计算分数列）时不命中旧缓存，结果与重新计分一致"""
+    from submission_model import Submission
+
+    for path in sorted(glob.glob('storage/submissions/submission_*.json')):
+        submission = Submission.from_json_file(path)
+        if submission.questions_snapshot and submission.data.get('answers'):
+            break
+    else:
+        pytest.skip('没有已作答、带题目快照的提交')
+    first = calculator.score_many([submission])['results'][0]['score_summary']
+    key = calculator._cache_key(submission)
+
+    data = dict(submission.data)
+    # 已作答题目的计算分数全部改为同一个值
+    data['scores'] = {str(q.get('sequence')): 987.5 for q in data['questions_snapshot']
+                      if data['answers'].get(str(q.get('sequence')))}
+    changed = Submission(data)
+    assert calculator._cache_key(changed) != key
+    summary = calculator.score_many([changed])['results'][0]['score_summary']
+    expected = calculator.calculate_total_score(changed.to_questionnaire_data())
+    _assert_identical(summary, expected)
+    assert summary['total_score'] != first['total_score']
+
+
+def test_unwritable_cache_does_not_break_scoring(calculator, questionnaire, tmp_path):
+    """缓存不可用时照常计分"""
+    blocker = tmp_path / 'blocker'
+    blocker.write_text('')
+    calculator.score_cache = ScoreCache(os.path.join(str(blocker), 'score_cache.sqlite3'))
+    assert calculator.score_many([questionnaire])['results'][0]['score_summary']['total_questions'] > 0
@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+"""
+列式计分与逐题计分一致性测试
+calculate_total_score 的结果必须与 _calculate_total_score_by_row 逐位一致（含数值类型与 -0.0）
+"""
+import glob
+import json
+import math
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from score_cache import ScoreCache
+from score_calculator import ScoreCalculator
+
+
+@pytest.fixture(scope='module')
+def calculator(tmp_path_factory):
+    calc = ScoreCalculator('指标体系.xlsx')
+    calc.score_cache = ScoreCache(str(tmp_path_factory.mktemp('cache') / 'score_cache.sqlite3'))
+    return calc
+
+
+def _assert_identical(a, b, path='root'):
+    assert type(a) is type(b), f'{path}: 类型不同 {type(a)} != {type(b)}'
+    if isinstance(a, dict):
+        assert list(a.keys()) == list(b.keys()), f'{path}: 键顺序不同'
+        for k in a:
+            _assert_identical(a[k], b[k], f'{path}.{k}')
+    elif isinstance(a, list):
+        assert len(a) == len(b), f'{path}: 长度不同'
+        for i, (x, y) in enumerate(zip(a, b)):
+            _assert_identical(x, y, f'{path}[{i}]')
+    elif isinstance(a, float):
+        if math.isnan(a):
+            assert math.isnan(b), f'{path}: {a} != {b}'
+        else:
+            assert a.hex() == b.hex(), f'{path}: {a!r} != {b!r}'
+    else:
+        assert a == b or (pd.isna(a) and pd.isna(b)), f'{path}: {a!r} != {b!r}'
+
+
+def _both(calculator, data):
+    expected = calculator._calculate_total_score_by_row(data)
+    actual = calculator.calculate_total_score(data)
+    _assert_identical(actual, expected)
+    return actual
+
+
+TYPES = ['一票否决项', '调节项', '否决', '合规项', '有效项', '有效性', '其他', '', None, np.nan]
+ANSWERS = ['是', '否', ' 是 ', '否 ', '不适用', ' 不适用', '', None, np.nan, '很有效', '比较有效', '一般',
+           '不太有效', '完全无效', '有', '已建立', '已设立', '已制定', '无', '未填写', 1, 0.5,
+           '{"score": 1.5, "selected": [1, 2], "total": 4}', '{"score": null}', '{"selected": 3, "score": 2}',
+           '{bad json', '{"total": 3}']
+BASES = [0.5, 1, 2.0, -10, -0.5, 0, None, np.nan, 'abc', '', '1.5', 3.3333333333333335]
+APPLICABLE = ['所有企业', '有限责任公司', '股份有限公司', '公司制企业', '国有企业', None, np.nan, '所有企业、合伙企业']
+LEVEL1 = ['党建引领', '产权结构', '公司治理', '', None, np.nan, 1.0]
+LEVEL2 = ['组织建设', '政治引领', '股权', '董事会', '', None, np.nan]
+COMPUTED = [None, np.nan, 0.7, 1, '2.5', 'x', '', 0, -1.25]
+
+
+def _random_frame(rng, n, with_computed, with_seq=True, with_remark=True):
+    data = {}
+    if with_seq:
+        data['序号'] = list(range(1, n + 1))
+    data['一级指标'] = [rng.choice(LEVEL1) for _ in range(n)]
+    data['二级指标'] = [rng.choice(LEVEL2) for _ in range(n)]
+    data['三级指标（问题）'] = [f'问题{i}' for i in range(n)]
+    data['指标类型'] = [rng.choice(TYPES) for _ in range(n)]
+    data['分值'] = [rng.choice(BASES) for _ in range(n)]
+    data['适用对象'] = [rng.choice(APPLICABLE) for _ in range(n)]
+    data['答案'] = [rng.choice(ANSWERS) for _ in range(n)]
+    if with_computed:
+        data['计算分数'] = [rng.choice(COMPUTED) for _ in range(n)]
+    if with_remark:
+        data['备注说明'] = [rng.choice(['', '说明', None]) for _ in range(n)]
+    return pd.DataFrame(data)
+
+
+@pytest.mark.parametrize('seed', range(40))
+def test_random_frames_parity(calculator, seed):
+    """随机构造的答题表（覆盖各类指标、异常分值、清单JSON、计算分数列）"""
+    rng = random.Random(seed)
+    df = _random_frame(rng, rng.randint(1, 120), with_computed=seed % 2 == 0,
+                       with_seq=seed % 5 != 0, with_remark=seed % 3 != 0)
+    if seed % 7 == 0:
+        df.index = df.index + 100
+    for enterprise_type in ['有限责任公司', '股份有限公司', '国有企业', '所有企业']:
+        _both(calculator, {'enterprise_info': {'企业类型': enterprise_type}, 'answers': df})
+
+
+def test_numeric_columns_parity(calculator):
+    """分值/计算分数为纯数值列时走 NumPy 快速路径"""
+    df = pd.DataFrame({
+        '序号': [1, 2, 3, 4, 5],
+        '一级指标': ['A', 'A', 'B', 'B', 'C'],
+        '二级指标': ['a1', 'a2', 'b1', 'b1', 'c1'],
+        '指标类型': ['有效项', '合规项', '一票否决项', '有效项', '合规项'],
+        '分值': [-0.5, 0.1, -10.0, 0.2, np.nan],
+        '答案': ['完全无效', '是', '否', '比较有效', '是'],
+        '计算分数': [np.nan, np.nan, np.nan, 0.15, np.nan],
+    })
+    result = _both(calculator, {'enterprise_info': {}, 'answers': df})
+    # 负分值 × 0 得到 -0.0，累加后应为 0.0
+    assert result['question_details'][0]['actual_score'] == 0
+    assert result['negative_points'] == -10.0
+
+
+def test_empty_and_unanswered_parity(calculator):
+    """空表、全部未作答、缺少答案列"""
+    _both(calculator, {'enterprise_info': {}, 'answers': pd.DataFrame({'答案': []})})
+    _both(calculator, {'enterprise_info': {}, 'answers': pd.DataFrame({'分值': [1.0, 2.0], '答案': [None, '']})})
+    _both(calculator, {'enterprise_info': {}, 'answers': pd.DataFrame({'分值': [1.0], '一级指标': ['A']})})
+
+
+def test_many_small_floats_order(calculator):
+    """大量小数累加时顺序求和的末位与逐题累加一致"""
+    n = 2000
+    rng = random.Random(7)
+    df = pd.DataFrame({
+        '一级指标': ['A'] * n,
+        '二级指标': [f'B{i % 3}' for i in range(n)],
+        '指标类型': ['有效项'] * n,
+        '分值': [rng.random() / 3 for _ in range(n)],
+        '答案': [rng.choice(['很有效', '比较有效', '一般', '不太有效']) for _ in range(n)],
+    })
+    _both(calculator, {'enterprise_info': {}, 'answers': df})
+
+
+def test_stored_submissions_parity(calculator):
+    """仓库中已提交的问卷文件"""
+    files = sorted(glob.glob('storage/submissions/*.xlsx'))
+    for path in files:
+        data = calculator.parse_questionnaire(path)
+        _both(calculator, data)
+
+
+def test_result_is_json_serialisable(calculator):
+    """结果可直接用于接口返回"""
+    rng = random.Random(3)
+    df = _random_frame(rng, 50, with_computed=True)
+    result = calculator.calculate_total_score({'enterprise_info': {}, 'answers': df})
+    json.dumps({k: v for k, v in result.items() if k != 'question_details'})
+
+
+def test_score_many_matches_single(calculator):
+    """批量计分与逐家计分结果一致，一级指标矩阵与各家得分率一致"""
+    rng = random.Random(11)
+    sources = []
+    for i in range(30):
+        df = _random_frame(rng, rng.randint(0, 60), with_computed=i % 3 == 0)
+        sources.append({'enterprise_info': {'企业名称': f'企业{i}', '企业类型': rng.choice(APPLICABLE[:5])},
+                        'answers': df})
+    sources.extend(sorted(glob.glob('storage/submissions/*.xlsx'))[:3])
+    sources.append('不存在的文件.xlsx')
+
+    batch = calculator.score_many(sources)
+    assert len(batch['results']) == len(sources) - 1
+    assert batch['errors'][0]['source'] == '不存在的文件.xlsx'
+
+    matrix = batch['level1_matrix']
+    for row, result in enumerate(batch['results']):
+        source = result['source']
+        data = source if isinstance(source, dict) else calculator.parse_questionnaire(source)
+        expected = calculator._calculate_total_score_by_row(data)
+        _assert_identical(result['score_summary'], expected)
+        for level1, item in expected['score_by_level1'].items():
+            assert matrix.iloc[row][level1] == item['percentage']
+
+
+def test_score_many_accepts_submission_json(calculator):
+    """在线提交的JSON数据可直接计分"""
+    files = sorted(glob.glob('storage/submissions/submission_*.json'))
+    submissions = []
+    for path in files:
+        with open(path, 'r', encoding='utf-8') as f:
+            submissions.append(json.load(f))
+    batch = calculator.score_many(submissions)
+    assert len(batch['results']) + len(batch['errors']) == len(files)
+    for result in batch['results']:
+        assert result['score_summary']['total_questions'] > 0
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""
+测试在线提交数据模型（submission_model）：直接从JSON计分、按需导出Excel
+"""
+import glob
+import json
+import os
+import shutil
+
+import pandas as pd
+import pytest
+
+import questionnaire_submission_manager
+from score_calculator import ScoreCalculator
+from submission_model import Submission, excel_path_for, source_basename
+from test_score_calculator_parity import _assert_identical
+
+
+@pytest.fixture(scope='module')
+def calculator():
+    calc = ScoreCalculator('指标体系.xlsx')
+    calc.score_cache = None
+    return calc
+
+
+def _snapshot_submission():
+    for path in sorted(glob.glob('storage/submissions/submission_*.json')):
+        submission = Submission.from_json_file(path)
+        if submission.questions_snapshot:
+            return submission
+    pytest.skip('没有带题目快照的提交')
+
+
+def test_json_scoring_matches_stored_excel(calculator):
+    """已有提交：直接从JSON计分与读取提交时生成的Excel计分逐位一致"""
+    paths = sorted(glob.glob('storage/submissions/submission_*.json'))
+    for path in paths:
+        excel_path = excel_path_for(path)
+        if not os.path.exists(excel_path):
+            continue
+        expected = calculator.calculate_total_score(calculator.parse_questionnaire(excel_path))
+        actual = calculator.calculate_total_score(calculator.load_questionnaire(path))
+        _assert_identical(actual, expected)
+
+
+def test_lazy_export_round_trip(calculator, tmp_path):
+    """按需导出的Excel与JSON计分结果一致，且只在需要时生成"""
+    stored = _snapshot_submission()
+    json_path = str(tmp_path / os.path.basename(stored.json_path))
+    shutil.copy(stored.json_path, json_path)
+    submission = Submission.from_json_file(json_path)
+    assert not os.path.exists(submission.excel_path)
+
+    excel_path = submission.export_excel()
+    assert excel_path == submission.excel_path and os.path.exists(excel_path)
+    mtime = os.path.getmtime(excel_path)
+    assert submission.export_excel() == excel_path
+    assert os.path.getmtime(excel_path) == mtime  # 未过期不重复生成
+
+    expected = calculator.calculate_total_score(calculator.parse_questionnaire(excel_path))
+    _assert_identical(calculator.calculate_total_score(submission.to_questionnaire_data()), expected)
+
+
+def test_save_submission_skips_excel(tmp_path, monkeypatch):
+    """保存提交只写JSON，返回可直接计分的 Submission"""
+    monkeypatch.setattr(questionnaire_submission_manager, 'ScoreCalculator',
+                        lambda: ScoreCalculator('指标体系.xlsx'))
+    manager = questionnaire_submission_manager.QuestionnaireSubmissionManager(str(tmp_path))
+    result = manager.save_submission(dict(_snapshot_submission().data))
+    assert os.path.exists(result['json_path'])
+    assert not os.path.exists(result['excel_path'])
+    assert isinstance(result['submission'], Submission)
+
+    filename = os.path.basename(result['json_path'])
+    assert manager.export_excel(filename) == result['excel_path']
+    assert os.path.exists(result['excel_path'])
+
+
+def test_legacy_submission_without_snapshot(calculator):
+    """无题目快照且无Excel的旧提交按本地指标文件构造题目"""
+    submission = Submission({'enterprise_info': {'企业名称': '旧企业'}, 'answers': {'1': '是'}})
+    data = submission.to_questionnaire_data()
+    assert len(data['answers']) == len(pd.read_excel('指标体系.xlsx'))
+    assert data['answers']['答案'].iloc[1] == '未填写'
+    assert calculator.calculate_total_score(data)['total_questions'] == len(data['answers'])
+
+
+def test_score_many_accepts_models_and_paths(calculator):
+    """批量计分接受 Submission 对象与提交JSON路径"""
+    submission = _snapshot_submission()
+    batch = calculator.score_many([submission, submission.json_path])
+    assert len(batch['results']) == 2
+    _assert_identical(batch['results'][0]['score_summary'], batch['results'][1]['score_summary'])
+    assert source_basename(submission) == os.path.basename(submission.excel_path)
+    assert source_basename(submission.json_path).startswith('问卷_')
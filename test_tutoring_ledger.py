@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+测试辅导台账索引（tutoring_ledger）：增量追加、按专家/企业分页查询、多进程追加回放与重建
+"""
+import json
+
+import pytest
+
+from document_store import DocumentStore
+from tutoring_ledger import TutoringLedger, main
+
+
+def test_append_and_paginate(tmp_path):
+    ledger = TutoringLedger(str(tmp_path / 'ledger.jsonl'), str(tmp_path / 'logs'))
+    for i in range(25):
+        ledger.append(f'企业{i % 3}', '张三' if i % 2 == 0 else '李四', f'第{i}次辅导',
+                      f'2024-01-{i + 1:02d} 10:00', f'r{i}')
+
+    total, items = ledger.for_expert('张三', page=1, limit=5)
+    assert total == 13
+    assert [r['id'] for r in items] == ['r24', 'r22', 'r20', 'r18', 'r16']
+    total, items = ledger.for_expert('张三', page=3, limit=5)
+    assert [r['id'] for r in items] == ['r4', 'r2', 'r0']
+    assert ledger.for_expert('张三', page=4, limit=5) == (13, [])
+
+    total, items = ledger.for_enterprise('企业1')
+    assert total == 8 and [r['time'] for r in items] == sorted(r['time'] for r in items)
+    assert items[0] == {'id': 'r1', 'enterprise': '企业1', 'expert': '李四', 'time': '2024-01-02 10:00',
+                        'note': '第1次辅导'}
+    assert ledger.for_expert('王五') == (0, [])
+
+
+def test_other_process_appends_are_replayed(tmp_path):
+    path = str(tmp_path / 'ledger.jsonl')
+    reader = TutoringLedger(path, None)
+    writer = TutoringLedger(path, None)
+    writer.append('企业A', '张三', '首次', '2024-02-01 09:00', 'a1')
+    assert reader.for_expert('张三')[0] == 1
+
+    # 同 id 再次追加以最后一行为准（专家变更后从原专家索引中移除）
+    writer.append('企业A', '李四', '更正', '2024-02-01 09:00', 'a1')
+    assert reader.for_expert('张三') == (0, [])
+    assert reader.for_expert('李四')[1][0]['note'] == '更正'
+
+    # 写了一半的行等写完后再读
+    with open(path, 'ab') as f:
+        f.write(json.dumps({'id': 'a2', 'enterprise': '企业B', 'expert': '李四'}, ensure_ascii=False)
+                .encode('utf-8')[:20])
+    assert reader.for_expert('李四')[0] == 1
+    with open(path, 'ab') as f:
+        f.write(json.dumps({'id': 'a2', 'enterprise': '企业B', 'expert': '李四'}, ensure_ascii=False)
+                .encode('utf-8')[20:] + b'\n')
+    assert reader.for_expert('李四')[0] == 2
+
+
+def test_rebuild_from_enterprise_ledgers(tmp_path):
+    logs = tmp_path / 'logs'
+    store = DocumentStore()
+    store.table(str(logs / '企业A.json')).insert({'id': 'x1', 'time': '2024-03-02 10:00', 'expert': '张三',
+                                                 'note': '治理'})
+    # 尚未压缩、只在预写日志中的记录也要读到
+    store.table(str(logs / '企业A.json')).insert({'id': 'x2', 'time': '2024-03-05 10:00', 'expert': '张三 ',
+                                                 'note': '合规'})
+    store.table(str(logs / '企业B.json')).insert({'id': 'x3', 'time': '2024-03-01 10:00', 'expert': '张三',
+                                                 'note': '战略'})
+    path = str(tmp_path / 'ledger.jsonl')
+
+    # 日志不存在时首次打开自动生成
+    ledger = TutoringLedger(path, str(logs))
+    total, items = ledger.for_expert('张三')
+    assert total == 3 and [r['enterprise'] for r in items] == ['企业A', '企业A', '企业B']
+
+    # 日志损坏/丢失记录后由命令行重建，打开中的实例重新加载
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('not json\n')
+    assert ledger.for_expert('张三') == (0, [])
+    assert main(['rebuild', '--logs-dir', str(logs), '--ledger', path]) == 0
+    assert ledger.for_expert('张三')[0] == 3
+
+
+def test_tutoring_endpoints_use_index(tmp_path, monkeypatch):
+    app_module = pytest.importorskip('app')
+    logs = tmp_path / 'logs'
+    logs.mkdir()
+    monkeypatch.setattr(app_module, 'TUTORING_LOGS_DIR', str(logs))
+    monkeypatch.setattr(app_module, '_tutoring_ledger', TutoringLedger(str(tmp_path / 'ledger.jsonl'), str(logs)))
+    client = app_module.app.test_client()
+
+    for i, (enterprise, expert) in enumerate([('企业A', '张三'), ('企业B', '张三'), ('企业A', '李四')]):
+        resp = client.post('/api/portal/chamber/tutoring-ledger',
+                           json={'enterprise': enterprise, 'expert': expert, 'note': f'记录{i}',
+                                 'time': f'2024-04-0{i + 1} 10:00'})
+        assert resp.get_json()['success']
+
+    data = client.get('/api/portal/chamber/expert-tutoring?expert=张三&limit=1').get_json()
+    assert data['total'] == 2
+    assert data['items'] == [{'time': '2024-04-02 10:00', 'enterprise': '企业B', 'content': '记录1'}]
+    data = client.get('/api/portal/chamber/tutoring-ledger?enterprise=企业A').get_json()
+    assert data['total'] == 2 and [r['expert'] for r in data['items']] == ['张三', '李四']
+    # 企业台账文件照常写入
+    assert len(DocumentStore().table(str(logs / '企业A.json')).all()) == 2
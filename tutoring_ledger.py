@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+"""
+辅导台账索引
+各企业的辅导台账仍保存在 storage/tutoring_logs/<企业名称>.json（原数据），另维护：
+- 追加式日志 storage/tutoring_ledger.jsonl：每条辅导记录一行（同 id 以最后一行为准）
+- 内存索引：专家 -> 记录、企业 -> 记录，均按时间有序，查询为索引查找 + 分页切片，
+  不再每次请求遍历全部企业台账文件
+台账 POST 写入企业台账后调用 append 增量维护；读取前仅做一次 stat，
+其他进程追加的日志尾部增量回放，日志被重建（替换）时重新加载。
+日志不存在时首次打开自动由企业台账生成；也可手动重建：
+    python tutoring_ledger.py rebuild [--logs-dir storage/tutoring_logs] [--ledger storage/tutoring_ledger.jsonl]
+"""
+import argparse
+import bisect
+import json
+import logging
+import os
+import threading
+import uuid
+from typing import Dict, List, Optional, Tuple
+
+from document_store import DocumentStore, _file_signature
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LOGS_DIR = os.path.join('storage', 'tutoring_logs')
+DEFAULT_LEDGER_PATH = os.path.join('storage', 'tutoring_ledger.jsonl')
+
+# 日志行保留的字段
+FIELDS = ('id', 'enterprise', 'expert', 'time', 'note')
+
+
+def read_enterprise_ledgers(logs_dir: str) -> List[Dict]:
+    """读取全部企业台账（含尚未压缩的预写日志），记录补上所属企业"""
+    entries = []
+    if not os.path.isdir(logs_dir):
+        return entries
+    store = DocumentStore()
+    for fn in sorted(os.listdir(logs_dir)):
+        if not fn.endswith('.json'):
+            continue
+        enterprise = fn[:-len('.json')]
+        try:
+            items = store.table(os.path.join(logs_dir, fn)).all()
+        except Exception as e:
+            logger.warning(f"跳过无法读取的台账: {fn}, {e}")
+            continue
+        for item in items:
+            entries.append({**{field: item.get(field) for field in FIELDS}, 'enterprise': enterprise})
+    return entries
+
+
+class TutoringLedger:
+    """辅导记录追加日志 + 专家/企业索引"""
+
+    def __init__(self, path: str = DEFAULT_LEDGER_PATH, logs_dir: Optional[str] = DEFAULT_LOGS_DIR):
+        self.path = path
+        self.logs_dir = logs_dir
+        self._lock = threading.RLock()
+        self._entries: Dict[str, Dict] = {}
+        self._by_expert: Dict[str, List[Tuple[str, int, str]]] = {}
+        self._by_enterprise: Dict[str, List[Tuple[str, int, str]]] = {}
+        self._seq = 0
+        self._offset = 0
+        self._sig = None
+        if not os.path.exists(path) and logs_dir and os.path.isdir(logs_dir):
+            self.rebuild()
+        else:
+            self._load()
+
+    # ------------------------------------------------------------------
+    # 加载 / 同步
+    # ------------------------------------------------------------------
+
+    def _load(self) -> None:
+        self._entries = {}
+        self._by_expert = {}
+        self._by_enterprise = {}
+        self._seq = 0
+        self._offset = 0
+        self._tail()
+
+    def _tail(self) -> None:
+        """从上次读到的位置继续回放日志"""
+        if not os.path.exists(self.path):
+            self._sig = None
+            return
+        with open(self.path, 'rb') as f:
+            f.seek(self._offset)
+            for raw in f:
+                if not raw.endswith(b'\n'):
+                    # 另一个写入者尚未写完这一行，下次再读
+                    break
+                self._offset += len(raw)
+                try:
+                    self._index(json.loads(raw.decode('utf-8')))
+                except Exception:
+                    logger.warning(f"跳过损坏的台账日志行: {self.path}")
+        self._sig = _file_signature(self.path)
+
+    def _sync(self) -> None:
+        """日志被其他进程追加则回放尾部，被替换（重建）或截断则重新加载"""
+        sig = _file_signature(self.path)
+        if sig == self._sig:
+            return
+        if sig is None or self._sig is None or sig[0] != self._sig[0] or sig[2] < self._offset:
+            self._load()
+        else:
+            self._tail()
+
+    # ------------------------------------------------------------------
+    # 索引维护
+    # ------------------------------------------------------------------
+
+    def _index(self, entry: Dict) -> None:
+        key = entry['id']
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._unlink(self._by_expert, old['_expert'], old['_pos'])
+            self._unlink(self._by_enterprise, old['enterprise'], old['_pos'])
+        self._seq += 1
+        entry = dict(entry, _expert=(entry.get('expert') or '').strip(),
+                     _pos=(entry.get('time') or '', self._seq, key))
+        self._entries[key] = entry
+        bisect.insort(self._by_expert.setdefault(entry['_expert'], []), entry['_pos'])
+        bisect.insort(self._by_enterprise.setdefault(entry['enterprise'], []), entry['_pos'])
+
+    @staticmethod
+    def _unlink(index: Dict[str, List], name: str, pos: Tuple) -> None:
+        positions = index.get(name, [])
+        i = bisect.bisect_left(positions, pos)
+        if i < len(positions) and positions[i] == pos:
+            del positions[i]
+        if not positions:
+            index.pop(name, None)
+
+    def append(self, enterprise: str, expert: str = '', note: str = '', time: Optional[str] = None,
+               entry_id: Optional[str] = None) -> Dict:
+        """追加一条辅导记录（写入企业台账之后调用）"""
+        entry = {'id': entry_id or uuid.uuid4().hex[:12], 'enterprise': enterprise,
+                 'expert': expert or '', 'time': time or '', 'note': note or ''}
+        line = (json.dumps(entry, ensure_ascii=False) + '\n').encode('utf-8')
+        with self._lock:
+            self._sync()
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            with open(self.path, 'ab') as f:
+                f.write(line)
+                f.flush()
+            # 其他进程可能在此之前追加过，回放到文件末尾（含本条）
+            self._sync()
+        return entry
+
+    # ------------------------------------------------------------------
+    # 查询
+    # ------------------------------------------------------------------
+
+    def _page(self, positions: List[Tuple], newest_first: bool, page: int,
+              limit: Optional[int]) -> Tuple[int, List[Dict]]:
+        total = len(positions)
+        if limit is None:
+            start, stop = 0, total
+        else:
+            limit = max(limit, 0)
+            start = max(page - 1, 0) * limit
+            stop = min(start + limit, total)
+        if newest_first:
+            picked = positions[total - stop:total - start][::-1] if start < total else []
+        else:
+            picked = positions[start:stop]
+        return total, [self._public(self._entries[key]) for _, _, key in picked]
+
+    @staticmethod
+    def _public(entry: Dict) -> Dict:
+        return {field: entry.get(field) for field in FIELDS}
+
+    def for_expert(self, expert: str, page: int = 1, limit: Optional[int] = None,
+                   newest_first: bool = True) -> Tuple[int, List[Dict]]:
+        """专家的辅导记录 (总数, 当前页记录)，按时间排序"""
+        with self._lock:
+            self._sync()
+            return self._page(self._by_expert.get((expert or '').strip(), []), newest_first, page, limit)
+
+    def for_enterprise(self, enterprise: str, page: int = 1, limit: Optional[int] = None,
+                       newest_first: bool = False) -> Tuple[int, List[Dict]]:
+        """企业的辅导记录 (总数, 当前页记录)，按时间排序"""
+        with self._lock:
+            self._sync()
+            return self._page(self._by_enterprise.get(enterprise, []), newest_first, page, limit)
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._sync()
+            return len(self._entries)
+
+    # ------------------------------------------------------------------
+    # 重建
+    # ------------------------------------------------------------------
+
+    def rebuild(self, logs_dir: Optional[str] = None) -> int:
+        """由企业台账重新生成日志与索引（先写临时文件再原子替换），返回记录数"""
+        logs_dir = logs_dir or self.logs_dir
+        entries = read_enterprise_ledgers(logs_dir) if logs_dir else []
+        for entry in entries:
+            entry['id'] = entry['id'] or uuid.uuid4().hex[:12]
+        entries.sort(key=lambda e: e.get('time') or '')
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = f'{self.path}.{uuid.uuid4().hex[:8]}.tmp'
+        with self._lock:
+            try:
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    for entry in entries:
+                        f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, self.path)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+            self._load()
+        logger.info(f"辅导台账索引已重建: {len(entries)} 条记录")
+        return len(entries)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='辅导台账索引维护')
+    parser.add_argument('command', choices=['rebuild'])
+    parser.add_argument('--logs-dir', default=DEFAULT_LOGS_DIR, help='企业台账目录')
+    parser.add_argument('--ledger', default=DEFAULT_LEDGER_PATH, help='台账日志文件')
+    args = parser.parse_args(argv)
+    count = TutoringLedger(args.ledger, logs_dir=None).rebuild(args.logs_dir)
+    print(f'已重建 {args.ledger}: {count} 条记录')
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())